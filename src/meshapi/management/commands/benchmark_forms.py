@@ -0,0 +1,642 @@
+import json
+import random
+import socket
+import statistics
+import threading
+import time
+import uuid
+from argparse import ArgumentParser
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from zlib import crc32
+
+from datadog import statsd
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from prettytable import PrettyTable
+from requests import PreparedRequest
+from requests import Response as HTTPResponse
+from requests.adapters import HTTPAdapter
+
+from meshapi.models import Building, Install, Member, Node
+from meshapi.util import http_client
+from meshapi.util.constants import JOIN_FORM_IDEMPOTENCY_KEY_HEADER, RECAPTCHA_INVISIBLE_TOKEN_HEADER
+from meshapi.util.email_domains import remember_email_domain
+from meshapi.validation import (
+    DOB_BUILDING_HEIGHT_API_URL,
+    NYC_PLANNING_LABS_GEOCODE_URL,
+    RECAPTCHA_SECRET_KEY_V2,
+    RECAPTCHA_SECRET_KEY_V3,
+    RECAPTCHA_TOKEN_VALIDATION_URL,
+)
+from meshapi.views import forms
+from meshdb.celery import app as celery_app
+from meshdb.environment import (
+    OSTICKET_NEW_TICKET_ENDPOINT,
+    PELIAS_ADDRESS_PARSER_URL,
+    SLACK_JOIN_REQUESTS_CHANNEL_WEBHOOK_URL,
+)
+
+# Made up, so that we can tell (and clean up) everything the benchmark creates
+BENCHMARK_EMAIL_DOMAIN = "meshdb-benchmark.invalid"
+BENCHMARK_USERNAME = "meshdb-benchmark"
+# Well clear of any BIN the city hands out (the first digit is the borough)
+BENCHMARK_BIN_MIN = 8000001
+BENCHMARK_STREETS = ["Broome Street", "Clinton Street", "Grand Street", "Delancey Street", "Rivington Street"]
+
+# Everything we'd otherwise call out to. Requests to any other host go to "other"
+STAND_IN_SERVICES = ["geosearch", "open_data", "pelias", "recaptcha", "slack", "osticket", "other"]
+
+LOCK_WAIT_METRICS = {
+    "join": "meshdb.join_form.lock_wait",
+    "nn-assign": "meshdb.nn_assignment.lock_wait",
+}
+
+
+def get_benchmark_bin(street_address: str) -> int:
+    return BENCHMARK_BIN_MIN + crc32(street_address.lower().encode("utf-8")) % 999_998
+
+
+def geosearch_response(query: Dict[str, List[str]], body: bytes) -> Tuple[int, Any]:
+    # e.g. "151 Broome Street, New York, NY 10002"
+    street_address, _, rest = query["text"][0].partition(",")
+    housenumber, _, street = street_address.strip().partition(" ")
+    bin = get_benchmark_bin(street_address.strip())
+    return 200, {
+        "features": [
+            {
+                "geometry": {"coordinates": [-74.0 + (bin % 1000) / 10000, 40.7 + (bin % 997) / 10000]},
+                "properties": {
+                    "housenumber": housenumber,
+                    "street": street.upper(),
+                    "borough": "Manhattan",
+                    "region_a": "NY",
+                    "postalcode": rest.strip().split(" ")[-1],
+                    "addendum": {"pad": {"bin": bin}},
+                },
+            }
+        ]
+    }
+
+
+def open_data_response(query: Dict[str, List[str]], body: bytes) -> Tuple[int, Any]:
+    return 200, [{"heightroof": 40.0, "groundelev": 20.0}]
+
+
+def pelias_response(query: Dict[str, List[str]], body: bytes) -> Tuple[int, Any]:
+    text = query["text"][0]
+    housenumber, _, street = text.partition(" ")
+    return 200, {
+        "solutions": [
+            {
+                "score": 1.0,
+                "classifications": [
+                    {"label": "housenumber", "start": 0, "end": len(housenumber)},
+                    {"label": "street", "start": len(housenumber) + 1, "end": len(text)},
+                ],
+            }
+        ]
+    }
+
+
+def recaptcha_response(query: Dict[str, List[str]], body: bytes) -> Tuple[int, Any]:
+    return 200, {"success": True, "score": 0.9}
+
+
+def slack_response(query: Dict[str, List[str]], body: bytes) -> Tuple[int, Any]:
+    return 200, "ok"
+
+
+def osticket_response(query: Dict[str, List[str]], body: bytes) -> Tuple[int, Any]:
+    # The number of the new ticket
+    return 201, str(random.randint(100000, 999999))
+
+
+def other_response(query: Dict[str, List[str]], body: bytes) -> Tuple[int, Any]:
+    return 200, {}
+
+
+STAND_IN_RESPONSES: Dict[str, Callable[[Dict[str, List[str]], bytes], Tuple[int, Any]]] = {
+    "geosearch": geosearch_response,
+    "open_data": open_data_response,
+    "pelias": pelias_response,
+    "recaptcha": recaptcha_response,
+    "slack": slack_response,
+    "osticket": osticket_response,
+    "other": other_response,
+}
+
+
+@dataclass
+class StandInBehaviour:
+    latency_ms: float
+    jitter_ms: float
+    error_rate: float
+
+
+class StandInServer:
+    """
+    One local HTTP server standing in for every service we call out to (told apart by the first part
+    of the path), which answers after the configured latency, or with a 503 at the configured error rate
+    """
+
+    def __init__(self, behaviours: Dict[str, StandInBehaviour], seed: int) -> None:
+        self.behaviours = behaviours
+        self.requests: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, service: str, query: Dict[str, List[str]], body: bytes) -> Tuple[int, Any]:
+        behaviour = self.behaviours[service]
+        with self._lock:
+            self.requests[service] += 1
+            delay_ms = max(0.0, behaviour.latency_ms + self._rng.uniform(-behaviour.jitter_ms, behaviour.jitter_ms))
+            failed = self._rng.random() < behaviour.error_rate
+            if failed:
+                self.errors[service] += 1
+
+        time.sleep(delay_ms / 1000)
+        if failed:
+            return 503, {"detail": "Stand-in error"}
+        return STAND_IN_RESPONSES[service](query, body)
+
+    def _make_handler(self) -> type[BaseHTTPRequestHandler]:
+        stand_in = self
+
+        class StandInRequestHandler(BaseHTTPRequestHandler):
+            # So that the connection pool gets to keep its connections, as it would with the real thing
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                self.respond()
+
+            def do_POST(self) -> None:
+                self.respond()
+
+            def respond(self) -> None:
+                url = urlsplit(self.path)
+                service = url.path.split("/")[1]
+                if service not in STAND_IN_RESPONSES:
+                    service = "other"
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+                status, content = stand_in.respond(service, parse_qs(url.query), body)
+
+                payload = (content if isinstance(content, str) else json.dumps(content)).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/plain" if isinstance(content, str) else "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return StandInRequestHandler
+
+
+class StandInAdapter(HTTPAdapter):
+    """
+    Sends requests meant for `service` to the stand-in server instead, keeping their path and query
+    string. Pooled and retried the same as requests to the real thing
+    """
+
+    def __init__(self, stand_in_url: str, service: str) -> None:
+        super().__init__(
+            pool_connections=http_client.HTTP_POOL_HOSTS,
+            pool_maxsize=http_client.HTTP_POOL_CONNECTIONS_PER_HOST,
+            max_retries=http_client.HTTP_RETRY,
+        )
+        self.stand_in_url = stand_in_url
+        self.service = service
+
+    def send(self, request: PreparedRequest, *args: Any, **kwargs: Any) -> HTTPResponse:
+        url = urlsplit(request.url or "")
+        request.url = f"{self.stand_in_url}/{self.service}{url.path}" + (f"?{url.query}" if url.query else "")
+        return super().send(request, *args, **kwargs)
+
+
+def get_origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}/"
+
+
+@contextmanager
+def stand_ins_mounted(stand_in: StandInServer) -> Iterator[None]:
+    service_urls = {
+        "geosearch": get_origin(NYC_PLANNING_LABS_GEOCODE_URL),
+        "open_data": get_origin(DOB_BUILDING_HEIGHT_API_URL),
+        "pelias": PELIAS_ADDRESS_PARSER_URL,
+        "recaptcha": RECAPTCHA_TOKEN_VALIDATION_URL,
+    }
+    if SLACK_JOIN_REQUESTS_CHANNEL_WEBHOOK_URL:
+        service_urls["slack"] = SLACK_JOIN_REQUESTS_CHANNEL_WEBHOOK_URL
+    if OSTICKET_NEW_TICKET_ENDPOINT:
+        service_urls["osticket"] = OSTICKET_NEW_TICKET_ENDPOINT
+
+    session = http_client.get_session()
+    original_adapters = session.adapters.copy()
+    try:
+        # Anything we don't have a stand-in for specifically still mustn't leave the machine
+        for prefix in ["http://", "https://"]:
+            session.mount(prefix, StandInAdapter(stand_in.url, "other"))
+        for service, url in service_urls.items():
+            session.mount(url, StandInAdapter(stand_in.url, service))
+        yield
+    finally:
+        session.adapters = original_adapters
+
+
+class StatsdListener:
+    """
+    Stands in for the Datadog agent, keeping the value of every timing reported to statsd as one of
+    `metrics` (e.g. how long the join form waited for its locks)
+    """
+
+    def __init__(self, metrics: List[str]) -> None:
+        self.metrics = metrics
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.settimeout(0.1)
+        self._running = False
+        self._thread = threading.Thread(target=self._listen, daemon=True)
+
+    def _listen(self) -> None:
+        while self._running:
+            try:
+                packet = self._socket.recv(65535)
+            except socket.timeout:
+                continue
+
+            # e.g. "meshdb.join_form.lock_wait:12.5|ms|#tag:value", one metric per line
+            for line in packet.decode("utf-8", errors="replace").splitlines():
+                name, _, rest = line.partition(":")
+                fields = rest.split("|")
+                if name in self.metrics and len(fields) > 1 and fields[1] == "ms":
+                    self.timings[name].append(float(fields[0]))
+
+    @contextmanager
+    def capturing(self) -> Iterator[None]:
+        original_destination = (statsd.host, statsd.port, statsd.socket_path)
+        statsd.host, statsd.port, statsd.socket_path = (
+            self._socket.getsockname()[0],
+            self._socket.getsockname()[1],
+            None,
+        )
+        statsd.close_socket()  # type: ignore[no-untyped-call]
+
+        self._running = True
+        self._thread.start()
+        try:
+            yield
+        finally:
+            statsd.host, statsd.port, statsd.socket_path = original_destination
+            statsd.close_socket()  # type: ignore[no-untyped-call]
+
+            # Anything already sent is waiting for us on the socket
+            self._running = False
+            self._thread.join()
+            self._socket.close()
+
+
+@dataclass
+class PhaseResult:
+    name: str
+    elapsed_seconds: float = 0.0
+    latencies_ms: List[float] = field(default_factory=list)
+    statuses: Counter[int] = field(default_factory=Counter)
+    responses: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def get_percentiles(values: List[float]) -> Optional[Tuple[float, float, float]]:
+    """
+    The p50, p95 and p99 of `values`, or None if there aren't any
+    """
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0], values[0], values[0]
+
+    quantiles = statistics.quantiles(values, n=100, method="inclusive")
+    return quantiles[49], quantiles[94], quantiles[98]
+
+
+def format_percentiles(values: List[float]) -> List[str]:
+    percentiles = get_percentiles(values)
+    if percentiles is None:
+        return ["-", "-", "-"]
+    return [f"{percentile:.1f}" for percentile in percentiles]
+
+
+def parse_service_options(values: Optional[List[str]], option: str) -> Dict[str, float]:
+    parsed = {}
+    for value in values or []:
+        service, _, number = value.partition("=")
+        if service not in STAND_IN_SERVICES:
+            raise CommandError(f"Unknown service for {option}: {service}. Choose from {STAND_IN_SERVICES}")
+        try:
+            parsed[service] = float(number)
+        except ValueError:
+            raise CommandError(f"Expected SERVICE=NUMBER for {option}, got {value}")
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the join form and NN assignment endpoints with parallel requests, against this "
+        "database and local stand-ins for every service they call out to, so that it runs offline. "
+        "Reports latency, throughput, and time spent waiting for locks. The members, buildings, "
+        "installs and nodes it creates are deleted afterwards (though not their history). "
+        "Don't run this against production."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument("--submissions", type=int, default=200, help="Number of join form submissions")
+        parser.add_argument("--concurrency", type=int, default=8, help="Number of requests in flight at once")
+        parser.add_argument(
+            "--buildings",
+            type=int,
+            default=50,
+            help="Number of addresses to spread the submissions over (fewer means more of them wait for each other)",
+        )
+        parser.add_argument(
+            "--latency-ms", type=float, default=50, help="How long each stand-in takes to answer, on average"
+        )
+        parser.add_argument(
+            "--jitter-ms", type=float, default=25, help="How far either side of --latency-ms the stand-ins vary"
+        )
+        parser.add_argument(
+            "--error-rate", type=float, default=0.0, help="Fraction of stand-in requests answered with a 503"
+        )
+        parser.add_argument(
+            "--service-latency-ms",
+            action="append",
+            metavar="SERVICE=MS",
+            help=f"--latency-ms for one of {STAND_IN_SERVICES}. Can be repeated",
+        )
+        parser.add_argument(
+            "--service-error-rate",
+            action="append",
+            metavar="SERVICE=RATE",
+            help=f"--error-rate for one of {STAND_IN_SERVICES}. Can be repeated",
+        )
+        parser.add_argument("--skip-nn-assignment", action="store_true", help="Only benchmark the join form")
+        parser.add_argument(
+            "--use-broker",
+            action="store_true",
+            help="Send Celery tasks (e.g. the Slack and OSTicket integrations) to the broker, rather than "
+            "running them against the stand-ins as soon as each request commits",
+        )
+        parser.add_argument("--keep", action="store_true", help="Don't delete what the benchmark created")
+        parser.add_argument("--seed", type=int, default=0, help="Seed for the submissions and stand-in behaviour")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if not forms.DISABLE_RECAPTCHA_VALIDATION and not (RECAPTCHA_SECRET_KEY_V2 and RECAPTCHA_SECRET_KEY_V3):
+            raise CommandError(
+                "Set RECAPTCHA_SERVER_SECRET_KEY_V2 and RECAPTCHA_SERVER_SECRET_KEY_V3 (to anything, the stand-in "
+                "accepts any token), or set RECAPTCHA_DISABLE_VALIDATION=true"
+            )
+
+        latencies_ms = parse_service_options(options["service_latency_ms"], "--service-latency-ms")
+        error_rates = parse_service_options(options["service_error_rate"], "--service-error-rate")
+        behaviours = {
+            service: StandInBehaviour(
+                latency_ms=latencies_ms.get(service, options["latency_ms"]),
+                jitter_ms=options["jitter_ms"],
+                error_rate=error_rates.get(service, options["error_rate"]),
+            )
+            for service in STAND_IN_SERVICES
+        }
+
+        rng = random.Random(options["seed"])
+        submissions = self.build_submissions(options["submissions"], options["buildings"], rng)
+
+        # There's nobody to ask DNS about our made-up addresses
+        remember_email_domain(BENCHMARK_EMAIL_DOMAIN)
+
+        stand_in = StandInServer(behaviours, options["seed"])
+        statsd_listener = StatsdListener(list(LOCK_WAIT_METRICS.values()))
+        # For NN assignment. Left behind if a previous run was killed part way through
+        User.objects.filter(username=BENCHMARK_USERNAME).delete()
+        user = User.objects.create_superuser(username=BENCHMARK_USERNAME, email=f"admin@{BENCHMARK_EMAIL_DOMAIN}")
+
+        results: List[PhaseResult] = []
+        was_eager = celery_app.conf.task_always_eager
+        stand_in.start()
+        try:
+            with stand_ins_mounted(stand_in), statsd_listener.capturing():
+                celery_app.conf.task_always_eager = not options["use_broker"]
+
+                self.stdout.write(f"Submitting {len(submissions)} join forms, {options['concurrency']} at a time...")
+                join_result = self.run_phase("join", submissions, options["concurrency"], self.submit_join_form)
+                results.append(join_result)
+
+                if not options["skip_nn_assignment"]:
+                    install_numbers = sorted(
+                        {
+                            response["install_number"]
+                            for response in join_result.responses
+                            if response.get("install_number")
+                        }
+                    )
+                    self.stdout.write(f"Assigning network numbers to {len(install_numbers)} installs...")
+                    results.append(
+                        self.run_phase(
+                            "nn-assign",
+                            install_numbers,
+                            options["concurrency"],
+                            self.assign_network_number,
+                            lambda client: client.force_login(user),
+                        )
+                    )
+        finally:
+            celery_app.conf.task_always_eager = was_eager
+            stand_in.stop()
+            if not options["keep"]:
+                self.clean_up()
+            user.delete()
+
+        self.report(results, statsd_listener, stand_in)
+
+    @staticmethod
+    def build_submissions(count: int, buildings: int, rng: random.Random) -> List[Tuple[Dict[str, Any], str]]:
+        """
+        `count` join form submissions, from a different member each, spread over `buildings` addresses,
+        with the idempotency key the website would send along with each
+        """
+        street_addresses = [
+            f"{100 + i // len(BENCHMARK_STREETS)} {BENCHMARK_STREETS[i % len(BENCHMARK_STREETS)]}"
+            for i in range(buildings)
+        ]
+        return [
+            (
+                {
+                    "first_name": "Benchmark",
+                    "last_name": f"Member {i}",
+                    "email_address": f"member{i}@{BENCHMARK_EMAIL_DOMAIN}",
+                    "phone_number": "+1 212-555-5555",
+                    "street_address": rng.choice(street_addresses),
+                    "city": "New York",
+                    "state": "NY",
+                    "zip_code": "10002",
+                    "apartment": str(rng.randint(1, 20)),
+                    "roof_access": rng.random() < 0.5,
+                    "referral": "benchmark_forms",
+                    "ncl": True,
+                    "trust_me_bro": False,
+                },
+                # Never seeded, or a second run would get back the (since deleted) installs of the first
+                str(uuid.uuid4()),
+            )
+            for i in range(count)
+        ]
+
+    @staticmethod
+    def submit_join_form(client: Client, submission: Tuple[Dict[str, Any], str]) -> Any:
+        body, idempotency_key = submission
+        return client.post(
+            "/api/v1/join/",
+            body,
+            content_type="application/json",
+            headers={RECAPTCHA_INVISIBLE_TOKEN_HEADER: "benchmark", JOIN_FORM_IDEMPOTENCY_KEY_HEADER: idempotency_key},
+        )
+
+    @staticmethod
+    def assign_network_number(client: Client, install_number: int) -> Any:
+        return client.post("/api/v1/nn-assign/", {"install_number": install_number}, content_type="application/json")
+
+    @staticmethod
+    def get_host() -> str:
+        # The Django test client's requests need to get past ALLOWED_HOSTS like anyone else's
+        for host in settings.ALLOWED_HOSTS:
+            if "*" not in host and not host.startswith("."):
+                return host
+        return "localhost"
+
+    def run_phase(
+        self,
+        name: str,
+        payloads: List[Any],
+        concurrency: int,
+        send: Callable[[Client, Any], Any],
+        prepare_client: Optional[Callable[[Client], None]] = None,
+    ) -> PhaseResult:
+        result = PhaseResult(name)
+        pending = iter(payloads)
+        lock = threading.Lock()
+        host = self.get_host()
+
+        def send_requests() -> None:
+            try:
+                client = Client(raise_request_exception=False, HTTP_HOST=host)
+                if prepare_client:
+                    prepare_client(client)
+
+                while True:
+                    with lock:
+                        payload = next(pending, None)
+                    if payload is None:
+                        return
+
+                    start = time.perf_counter()
+                    response = send(client, payload)
+                    latency_ms = (time.perf_counter() - start) * 1000
+
+                    with lock:
+                        result.latencies_ms.append(latency_ms)
+                        result.statuses[response.status_code] += 1
+                        if response.get("Content-Type") == "application/json":
+                            result.responses.append(response.json())
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=send_requests) for _ in range(max(1, concurrency))]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result.elapsed_seconds = time.perf_counter() - start
+
+        return result
+
+    def clean_up(self) -> None:
+        members = Member.objects.filter(primary_email_address__endswith=f"@{BENCHMARK_EMAIL_DOMAIN}")
+        installs = Install.objects.filter(member__in=members)
+        building_ids = set(installs.filter(building__bin__gte=BENCHMARK_BIN_MIN).values_list("building_id", flat=True))
+        node_ids = set(installs.exclude(node=None).values_list("node_id", flat=True))
+
+        self.stdout.write(f"Deleting {installs.count()} installs created by the benchmark...")
+        installs.delete()
+        Building.objects.filter(id__in=building_ids).delete()
+        Node.objects.filter(id__in=node_ids, installs=None).delete()
+        members.delete()
+
+    def report(self, results: List[PhaseResult], statsd_listener: StatsdListener, stand_in: StandInServer) -> None:
+        table = PrettyTable(
+            [
+                "Endpoint",
+                "Requests",
+                "Statuses",
+                "Req/s",
+                "p50 (ms)",
+                "p95 (ms)",
+                "p99 (ms)",
+                "Lock wait p50 (ms)",
+                "Lock wait p95 (ms)",
+                "Lock wait p99 (ms)",
+            ]
+        )
+        for result in results:
+            requests = len(result.latencies_ms)
+            table.add_row(
+                [
+                    result.name,
+                    requests,
+                    ", ".join(f"{code}: {count}" for code, count in sorted(result.statuses.items())),
+                    f"{requests / result.elapsed_seconds:.1f}" if result.elapsed_seconds else "-",
+                    *format_percentiles(result.latencies_ms),
+                    *format_percentiles(statsd_listener.timings[LOCK_WAIT_METRICS[result.name]]),
+                ]
+            )
+        self.stdout.write(str(table))
+
+        stand_in_table = PrettyTable(["Stand-in", "Requests", "Errors", "Latency (ms)", "Error rate"])
+        for service in STAND_IN_SERVICES:
+            behaviour = stand_in.behaviours[service]
+            stand_in_table.add_row(
+                [
+                    service,
+                    stand_in.requests[service],
+                    stand_in.errors[service],
+                    f"{behaviour.latency_ms:.0f} ± {behaviour.jitter_ms:.0f}",
+                    f"{behaviour.error_rate:.2f}",
+                ]
+            )
+        self.stdout.write(str(stand_in_table))
@@ -0,0 +1,218 @@
+import random
+import statistics
+import time
+import uuid
+from argparse import ArgumentParser
+from datetime import date, datetime, timezone
+from typing import Any, Callable, List
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q, QuerySet, Subquery
+from prettytable import PrettyTable
+
+from meshapi.models import LOS, Building, Device, Install, Link, Member, Node
+from meshapi.views.map import MapDataLinkList
+
+
+def legacy_link_queryset() -> QuerySet[Link]:
+    # The correlated-subquery de-duplication MapDataLinkList used before it switched to a window function,
+    # kept here as a baseline to compare against
+    return (
+        Link.objects.exclude(status__in=[Link.LinkStatus.INACTIVE])
+        .exclude(to_device__node__status=Node.NodeStatus.INACTIVE)
+        .exclude(from_device__node__status=Node.NodeStatus.INACTIVE)
+        .exclude(from_device__node__network_number=F("to_device__node__network_number"))
+        .filter(
+            Q(
+                pk__in=Link.objects.values("from_device__node__network_number", "to_device__node__network_number")
+                .distinct()
+                .annotate(
+                    pk=Subquery(
+                        Link.objects.filter(
+                            from_device__node__network_number=OuterRef("from_device__node__network_number"),
+                            to_device__node__network_number=OuterRef("to_device__node__network_number"),
+                        )
+                        .order_by("pk")
+                        .values("pk")[:1]
+                    )
+                )
+                .values_list("pk", flat=True)
+            )
+            | Q(from_device__node__network_number__isnull=True)
+            | Q(to_device__node__network_number__isnull=True)
+        )
+        .order_by("from_device__node__network_number", "to_device__node__network_number")
+    )
+
+
+def legacy_los_queryset() -> QuerySet[LOS]:
+    return (
+        LOS.objects.filter(
+            Exists(Install.objects.filter(building=OuterRef("from_building")))
+            & Exists(Install.objects.filter(building=OuterRef("to_building")))
+            & ~Q(from_building=F("to_building"))
+        )
+        .exclude(
+            Exists(
+                Link.objects.filter(
+                    (
+                        Q(from_device__node__buildings=OuterRef("from_building"))
+                        & Q(to_device__node__buildings=OuterRef("to_building"))
+                    )
+                    | (
+                        Q(from_device__node__buildings=OuterRef("to_building"))
+                        & Q(to_device__node__buildings=OuterRef("from_building"))
+                    )
+                )
+            )
+        )
+        .filter(
+            pk__in=LOS.objects.values("from_building", "to_building")
+            .distinct()
+            .annotate(
+                pk=Subquery(
+                    LOS.objects.filter(
+                        from_building=OuterRef("from_building"),
+                        to_building=OuterRef("to_building"),
+                    )
+                    .order_by("pk")
+                    .values("pk")[:1]
+                )
+            )
+            .values_list("pk", flat=True)
+        )
+    )
+
+
+def explain_analyze(queryset: QuerySet) -> str:
+    # QuerySet.explain() can't cope with queries which filter on a window function (as Django wraps
+    # those in a subquery), so run EXPLAIN against the compiled SQL ourselves
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN ANALYZE {sql}", params)
+        return "\n".join(row[0] for row in cursor.fetchall())
+
+
+class BenchmarkRollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the map link/LOS de-duplication queries against their legacy correlated-subquery versions, "
+        "using a synthetic mesh which is rolled back afterwards. Don't run this against production."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument("--nodes", type=int, default=2_000, help="Number of synthetic nodes to create")
+        parser.add_argument("--links", type=int, default=20_000, help="Number of synthetic links (and LOSes) to create")
+        parser.add_argument("--repeat", type=int, default=5, help="Number of times to time each query")
+        parser.add_argument("--explain", action="store_true", help="Print EXPLAIN ANALYZE output for each query")
+        parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data generator")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        try:
+            with transaction.atomic():
+                self.create_synthetic_mesh(options["nodes"], options["links"], random.Random(options["seed"]))
+                self.compare(options["repeat"], options["explain"])
+                raise BenchmarkRollback()
+        except BenchmarkRollback:
+            pass
+
+    def create_synthetic_mesh(self, num_nodes: int, num_links: int, rng: random.Random) -> None:
+        self.stdout.write(f"Creating {num_nodes} nodes with {num_links} links and {num_links} LOSes...")
+        member = Member.objects.create(name="Benchmark Member")
+
+        nodes = Node.objects.bulk_create(
+            Node(
+                network_number=nn,
+                status=rng.choice([Node.NodeStatus.ACTIVE] * 9 + [Node.NodeStatus.INACTIVE]),
+                latitude=40 + rng.random(),
+                longitude=-74 + rng.random(),
+            )
+            for nn in range(1, num_nodes + 1)
+        )
+        buildings = Building.objects.bulk_create(
+            Building(address_truth_sources=[], latitude=node.latitude, longitude=node.longitude) for node in nodes
+        )
+        Building.nodes.through.objects.bulk_create(
+            Building.nodes.through(building_id=building.id, node_id=node.id) for building, node in zip(buildings, nodes)
+        )
+        Install.objects.bulk_create(
+            Install(
+                install_number=node.network_number,
+                node=node,
+                building=building,
+                member=member,
+                status=Install.InstallStatus.ACTIVE,
+                request_date=datetime(2024, 1, 1, tzinfo=timezone.utc),
+            )
+            for building, node in zip(buildings, nodes)
+        )
+
+        # A few devices per node, so that we get plenty of parallel links between the same node pair
+        devices = Device.objects.bulk_create(
+            Device(node=node, status=Device.DeviceStatus.ACTIVE) for node in nodes for _ in range(3)
+        )
+
+        # Pick links between "nearby" nodes to keep the number of distinct pairs realistic
+        def pick_pair(items: List[Any]) -> tuple:
+            i = rng.randrange(len(items))
+            j = min(len(items) - 1, max(0, i + rng.randint(-10, 10)))
+            return items[i], items[j]
+
+        link_pairs = [pick_pair(devices) for _ in range(num_links)]
+        Link.objects.bulk_create(
+            Link(
+                id=uuid.UUID(int=rng.getrandbits(128)),
+                from_device=from_device,
+                to_device=to_device,
+                status=rng.choice(list(Link.LinkStatus)),
+                type=rng.choice(list(Link.LinkType)),
+            )
+            for from_device, to_device in link_pairs
+        )
+
+        los_pairs = [pick_pair(buildings) for _ in range(num_links)]
+        LOS.objects.bulk_create(
+            LOS(
+                id=uuid.UUID(int=rng.getrandbits(128)),
+                from_building=from_building,
+                to_building=to_building,
+                source=LOS.LOSSource.HUMAN_ANNOTATED,
+                analysis_date=date(2024, 1, 1),
+            )
+            for from_building, to_building in los_pairs
+        )
+
+        # Otherwise the planner goes on whatever it last saw in these tables (e.g. the empty tables of
+        # a test database), and can pick plans for the legacy queries which take hours to finish
+        with connection.cursor() as cursor:
+            for model in [Member, Node, Building, Building.nodes.through, Install, Device, Link, LOS]:
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+
+    def compare(self, repeat: int, explain: bool) -> None:
+        cases: List[tuple[str, Callable[[], QuerySet]]] = [
+            ("links (legacy)", legacy_link_queryset),
+            ("links (window)", lambda: MapDataLinkList().get_queryset()),
+            ("LOS (legacy)", legacy_los_queryset),
+            ("LOS (window)", lambda: MapDataLinkList.get_los_queryset()),
+        ]
+
+        table = PrettyTable(["Query", "Rows", "Median (ms)", "Min (ms)"])
+        for name, build_queryset in cases:
+            timings = []
+            rows = 0
+            for _ in range(repeat):
+                start = time.perf_counter()
+                rows = len(list(build_queryset().values_list("pk", flat=True)))
+                timings.append((time.perf_counter() - start) * 1000)
+
+            table.add_row([name, rows, f"{statistics.median(timings):.1f}", f"{min(timings):.1f}"])
+
+            if explain:
+                self.stdout.write(f"\n=== {name} ===")
+                self.stdout.write(explain_analyze(build_queryset().values_list("pk", flat=True)))
+
+        self.stdout.write(str(table))
@@ -0,0 +1,59 @@
+import re
+from argparse import ArgumentParser
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+
+from meshapi.models import Building
+from meshapi.pelias import humanify_street_address_locally, humanify_street_address_with_pelias
+
+# "229 East 13th Street" -> "229 EAST 13 STREET", roughly what the DOB would have given us originally
+_ORDINAL_PATTERN = re.compile(r"\b(\d+)(?:ST|ND|RD|TH)\b")
+
+
+def to_dob_address(street_address: str) -> str:
+    return _ORDINAL_PATTERN.sub(r"\1", street_address.upper())
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that humanifying street addresses locally gives the same result as asking Pelias, "
+        "for the street address of every building in MeshDB. Requires Pelias to be running"
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument("--limit", type=int, help="Only check this many addresses")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        street_addresses = (
+            Building.objects.exclude(street_address__isnull=True)
+            .exclude(street_address="")
+            .order_by("street_address")
+            .values_list("street_address", flat=True)
+            .distinct()
+        )
+        if options["limit"]:
+            street_addresses = street_addresses[: options["limit"]]
+
+        checked = 0
+        local = 0
+        mismatches = 0
+        for street_address in street_addresses:
+            checked += 1
+            dob_address = to_dob_address(street_address)
+            local_result = humanify_street_address_locally(dob_address)
+            if local_result is None:
+                # Pelias gets these anyway
+                continue
+
+            local += 1
+            pelias_result = humanify_street_address_with_pelias(dob_address)
+            if local_result != pelias_result:
+                mismatches += 1
+                self.stdout.write(f"'{dob_address}': locally '{local_result}', Pelias '{pelias_result}'")
+
+        self.stdout.write(
+            f"Checked {checked} addresses, {local} of which can be humanified locally. {mismatches} mismatches."
+        )
+        if mismatches:
+            raise CommandError(f"{mismatches} addresses were humanified differently to Pelias")
@@ -0,0 +1,175 @@
+import csv
+import json
+import logging
+import os
+from argparse import ArgumentParser
+from typing import Any, Dict, Iterator, List, Optional
+
+from datadog import statsd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from simple_history.utils import bulk_update_with_history
+
+from meshapi.models import Building, BuildingFootprint
+from meshapi.util.events.snapshot_invalidation import invalidate_snapshots_on_change
+from meshapi.validation import INVALID_BIN_NUMBERS
+
+DEFAULT_BATCH_SIZE = 5000
+
+# The dataset has been published with a few different column names over the years
+# (e.g. HEIGHTROOF in the CSV export, height_roof in the current version), so we compare
+# them lowercased and without underscores or spaces
+BIN_COLUMNS = {"bin"}
+HEIGHT_ROOF_COLUMNS = {"heightroof"}
+GROUND_ELEVATION_COLUMNS = {"groundelev", "groundelevation"}
+
+
+def _normalize_column(column: str) -> str:
+    return column.lower().replace("_", "").replace(" ", "")
+
+
+def _parse_float(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+def parse_footprint_row(row: Dict[str, Any]) -> Optional[BuildingFootprint]:
+    """
+    Convert a row (or GeoJSON feature properties) of the DOB Building Footprints dataset into a
+    BuildingFootprint, or None if it doesn't have a usable BIN
+    """
+    values: Dict[str, Any] = {}
+    for column, value in row.items():
+        column = _normalize_column(column)
+        if column in BIN_COLUMNS:
+            values["bin"] = value
+        elif column in HEIGHT_ROOF_COLUMNS:
+            values["height_roof"] = value
+        elif column in GROUND_ELEVATION_COLUMNS:
+            values["ground_elevation"] = value
+
+    try:
+        bin = int(float(values["bin"]))
+        height_roof = _parse_float(values.get("height_roof"))
+        ground_elevation = _parse_float(values.get("ground_elevation"))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    if bin in INVALID_BIN_NUMBERS:
+        return None
+
+    return BuildingFootprint(bin=bin, height_roof=height_roof, ground_elevation=ground_elevation)
+
+
+def iter_footprint_rows(path: str) -> Iterator[Dict[str, Any]]:
+    if os.path.splitext(path)[1].lower() in [".geojson", ".json"]:
+        with open(path) as f:
+            for feature in json.load(f)["features"]:
+                yield feature.get("properties") or {}
+    else:
+        with open(path, newline="") as f:
+            yield from csv.DictReader(f)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the DOB Building Footprints dataset "
+        "(https://data.cityofnewyork.us/City-Government/Building-Footprints/5zhs-2jue/about_data) "
+        "from a CSV or GeoJSON export, so that building altitudes can be looked up without asking NYC OpenData"
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument("path", help="The CSV or GeoJSON (.geojson or .json) export of the dataset")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="How many footprints to write to the database at a time",
+        )
+        parser.add_argument(
+            "--backfill-altitudes",
+            action="store_true",
+            help="Once loaded, fill in the altitude of every building which has a BIN but no altitude",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        statsd.increment("meshdb.commands.import_building_footprints", tags=[])
+        if not os.path.exists(options["path"]):
+            raise CommandError(f"No such file: {options['path']}")
+
+        imported, skipped = self.import_footprints(options["path"], options["batch_size"])
+        self.stdout.write(f"Imported {imported} building footprints. Skipped {skipped} rows without a valid BIN.")
+
+        if options["backfill_altitudes"]:
+            self.stdout.write(f"Filled in the altitude of {self.backfill_altitudes(options['batch_size'])} buildings.")
+
+    def import_footprints(self, path: str, batch_size: int) -> tuple[int, int]:
+        skipped = 0
+        footprints: Dict[int, BuildingFootprint] = {}
+
+        for row in iter_footprint_rows(path):
+            footprint = parse_footprint_row(row)
+            if footprint is None:
+                skipped += 1
+                continue
+
+            # A BIN can have more than one footprint (e.g. a building and its annex), in which case
+            # we want the tallest. They can be anywhere in the file, so we find it before writing
+            # anything, otherwise whichever came last would overwrite the others
+            existing = footprints.get(footprint.bin)
+            if existing is None or (footprint.height_roof or 0) > (existing.height_roof or 0):
+                footprints[footprint.bin] = footprint
+
+        imported = 0
+        batch: List[BuildingFootprint] = []
+        for footprint in footprints.values():
+            batch.append(footprint)
+            if len(batch) >= batch_size:
+                imported += self.write_footprints(batch)
+                batch = []
+
+        if batch:
+            imported += self.write_footprints(batch)
+
+        return imported, skipped
+
+    def write_footprints(self, footprints: List[BuildingFootprint]) -> int:
+        BuildingFootprint.objects.bulk_create(
+            footprints,
+            update_conflicts=True,
+            unique_fields=["bin"],
+            update_fields=["height_roof", "ground_elevation"],
+        )
+        logging.info(f"Wrote {len(footprints)} building footprints")
+        return len(footprints)
+
+    def backfill_altitudes(self, batch_size: int) -> int:
+        buildings = Building.objects.filter(altitude__isnull=True, bin__isnull=False).exclude(
+            bin__in=INVALID_BIN_NUMBERS
+        )
+        altitudes = {
+            footprint.bin: footprint.altitude
+            for footprint in BuildingFootprint.objects.filter(bin__in=buildings.values("bin")).iterator()
+        }
+
+        updated: List[Building] = []
+        for building in buildings.iterator():
+            altitude = altitudes.get(building.bin)
+            if altitude is not None:
+                building.altitude = altitude
+                updated.append(building)
+
+        with transaction.atomic():
+            bulk_update_with_history(
+                updated,
+                Building,
+                ["altitude"],
+                batch_size=batch_size,
+                default_change_reason="Altitude filled in from the DOB building footprints",
+            )
+            # Bulk updates don't send post_save
+            if updated:
+                invalidate_snapshots_on_change(Building)
+
+        return len(updated)
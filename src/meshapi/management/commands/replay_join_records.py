@@ -6,9 +6,11 @@ from typing import Any
 
 from django.core.management.base import BaseCommand
 from prettytable import PrettyTable
+from rest_framework import status
+from rest_framework.response import Response
 
 from meshapi.util.join_records import JoinRecord, JoinRecordProcessor, SubmissionStage
-from meshapi.views.forms import JoinFormRequest, process_join_form
+from meshapi.views.forms import JoinFormRequest, get_stored_join_form_response, process_join_form
 
 
 class Command(BaseCommand):
@@ -106,11 +108,31 @@ class Command(BaseCommand):
         print("Replaying Join Records...")
 
         for record in join_records_to_replay.values():
-            # Make the request
             r = JoinFormRequest(
                 **{k: v for k, v in record.__dict__.items() if k in JoinFormRequest.__dataclass_fields__}
             )
-            response = process_join_form(r)
+
+            # The website sends the record's UUID as the submission's idempotency key. If we have a
+            # response stored under it, the submission went through (even if the record doesn't know it)
+            # and we just need to fix up the record
+            stored_response = get_stored_join_form_response(record.uuid, r)
+            if stored_response and stored_response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY:
+                logging.error(
+                    "A different submission was processed under the UUID of record: "
+                    f"{JoinRecordProcessor.get_key(record, SubmissionStage.POST)}, not replaying it."
+                )
+                continue
+
+            if stored_response:
+                logging.info(
+                    "Already processed record: "
+                    f"{JoinRecordProcessor.get_key(record, SubmissionStage.POST)}, not replaying it."
+                )
+                self.update_record(p, record, stored_response)
+                continue
+
+            # Make the request
+            response = process_join_form(r, idempotency_key=record.uuid)
 
             print(f"{response.status_code} : {response.data}")
 
@@ -143,7 +165,7 @@ class Command(BaseCommand):
                     r.__dict__.update(response.data["changed_info"])
 
                     # If this doesn't work, then uh, skill issue.
-                    response = process_join_form(r)
+                    response = process_join_form(r, idempotency_key=record.uuid)
                     logging.info(f"Code: {response.status_code}")
 
                 elif user_input.lower() in ["reject", "r"]:
@@ -152,26 +174,30 @@ class Command(BaseCommand):
                     record.trust_me_bro = True
 
                     # If this doesn't work, then uh, skill issue.
-                    response = process_join_form(r)
+                    response = process_join_form(r, idempotency_key=record.uuid)
                     logging.info(f"Code: {response.status_code}")
 
                 elif user_input.lower() in ["skip", "s"]:
                     logging.info("Skipping...")
                     continue
 
-            record.code = str(response.status_code)
             record.replayed += 1
-            if response.data.get("install_number"):
-                record.install_number = response.data["install_number"]
-                logging.info("OK")
-            else:
-                logging.error(
-                    "Replay failed! Did not get an install number for "
-                    f"record: {JoinRecordProcessor.get_key(record, SubmissionStage.POST)}."
-                )
+            self.update_record(p, record, response)
+
+    @staticmethod
+    def update_record(p: JoinRecordProcessor, record: JoinRecord, response: Response) -> None:
+        record.code = str(response.status_code)
+        if response.data.get("install_number"):
+            record.install_number = response.data["install_number"]
+            logging.info("OK")
+        else:
+            logging.error(
+                "Replay failed! Did not get an install number for "
+                f"record: {JoinRecordProcessor.get_key(record, SubmissionStage.POST)}."
+            )
 
-            key = JoinRecordProcessor.get_key(record, SubmissionStage.POST)
-            p.upload(record, key)
+        key = JoinRecordProcessor.get_key(record, SubmissionStage.POST)
+        p.upload(record, key)
 
     @staticmethod
     def past_week() -> datetime:
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:56
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+import meshapi.models.util.spatial
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meshapi", "0006_install_additional_members"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="building",
+            index=django.contrib.postgres.indexes.GistIndex(
+                meshapi.models.util.spatial.Point(), name="meshapi_building_location_gist"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="node",
+            index=django.contrib.postgres.indexes.GistIndex(
+                meshapi.models.util.spatial.Point(), name="meshapi_node_location_gist"
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meshapi", "0007_building_node_location_gist"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GeocodeCacheEntry",
+            fields=[
+                (
+                    "address_key",
+                    models.CharField(
+                        help_text="The normalized street address, city, state, and zip code which were looked up",
+                        max_length=512,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "result",
+                    models.JSONField(
+                        blank=True,
+                        help_text="The address info the city's APIs returned, or null if the address could not be found",
+                        null=True,
+                    ),
+                ),
+                (
+                    "error",
+                    models.TextField(
+                        blank=True, help_text="Why the address could not be found, if it couldn't", null=True
+                    ),
+                ),
+                (
+                    "updated",
+                    models.DateTimeField(
+                        auto_now=True,
+                        help_text="When the address was last looked up. Each lookup replaces the result of the one before",
+                    ),
+                ),
+                ("expires", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "verbose_name": "Geocode Cache Entry",
+                "verbose_name_plural": "Geocode Cache Entries",
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meshapi", "0008_geocode_cache_entry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BuildingFootprint",
+            fields=[
+                (
+                    "bin",
+                    models.IntegerField(
+                        help_text="NYC DOB Building Identification Number", primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "height_roof",
+                    models.FloatField(
+                        blank=True, help_text="The height of the roof above the ground, in feet", null=True
+                    ),
+                ),
+                (
+                    "ground_elevation",
+                    models.FloatField(
+                        blank=True, help_text="The elevation of the ground, in feet above sea level", null=True
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Building Footprint",
+                "verbose_name_plural": "Building Footprints",
+            },
+        ),
+    ]
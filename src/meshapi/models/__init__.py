@@ -1,5 +1,7 @@
 from .building import *
+from .building_footprint import *
 from .devices import *
+from .geocode_cache import *
 from .install import *
 from .link import *
 from .los import *
@@ -3,6 +3,7 @@ from enum import Enum
 from typing import Any
 
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GistIndex
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.db.models import ManyToManyField
@@ -10,6 +11,7 @@ from django_jsonform.models.fields import ArrayField as JSONFormArrayField
 from simple_history.models import HistoricalRecords
 
 from .node import Node
+from .util.spatial import Point
 
 
 class AddressTruthSource(Enum):
@@ -35,6 +37,10 @@ class Building(models.Model):
 
     class Meta:
         ordering = ["id"]
+        indexes = [
+            # Used to find everything on a given map tile, see meshapi.models.util.spatial
+            GistIndex(Point(), name="meshapi_building_location_gist"),
+        ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
@@ -0,0 +1,41 @@
+from typing import Optional
+
+from django.db import models
+
+FEET_PER_METER = 3.28084
+
+
+def get_absolute_altitude(height_roof: float, ground_elevation: float) -> float:
+    """
+    Convert the DOB's roof height (relative to the ground) and ground elevation, both in feet, to an
+    absolute altitude in meters above mean sea level, rounded to the nearest 0.1 m
+    """
+    return round((height_roof + ground_elevation) / FEET_PER_METER, 1)
+
+
+class BuildingFootprint(models.Model):
+    """
+    The height of each building in NYC, by BIN, from the DOB "Building Footprints" dataset
+    (https://data.cityofnewyork.us/City-Government/Building-Footprints/5zhs-2jue/about_data). Loaded in
+    bulk with the import_building_footprints command, so that we don't have to ask NYC Open Data for the
+    height of every address we look up
+    """
+
+    class Meta:
+        verbose_name = "Building Footprint"
+        verbose_name_plural = "Building Footprints"
+
+    bin = models.IntegerField(primary_key=True, help_text="NYC DOB Building Identification Number")
+    height_roof = models.FloatField(null=True, blank=True, help_text="The height of the roof above the ground, in feet")
+    ground_elevation = models.FloatField(
+        null=True, blank=True, help_text="The elevation of the ground, in feet above sea level"
+    )
+
+    @property
+    def altitude(self) -> Optional[float]:
+        if self.height_roof is None or self.ground_elevation is None:
+            return None
+        return get_absolute_altitude(self.height_roof, self.ground_elevation)
+
+    def __str__(self) -> str:
+        return f"BIN {self.bin}"
@@ -0,0 +1,38 @@
+from django.db import models
+
+
+class GeocodeCacheEntry(models.Model):
+    """
+    The outcome of looking up an address with the city's APIs (see meshapi.validation.geocode_nyc_address()),
+    so that when the same address comes up again (join form resubmissions, replayed join records, the admin
+    address auto-populate) we can skip the round trips. Addresses which the city couldn't find are kept too,
+    with the reason, so that we can reject them again straight away
+    """
+
+    class Meta:
+        verbose_name = "Geocode Cache Entry"
+        verbose_name_plural = "Geocode Cache Entries"
+
+    address_key = models.CharField(
+        primary_key=True,
+        max_length=512,
+        help_text="The normalized street address, city, state, and zip code which were looked up",
+    )
+    result = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="The address info the city's APIs returned, or null if the address could not be found",
+    )
+    error = models.TextField(
+        null=True,
+        blank=True,
+        help_text="Why the address could not be found, if it couldn't",
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        help_text="When the address was last looked up. Each lookup replaces the result of the one before",
+    )
+    expires = models.DateTimeField(db_index=True)
+
+    def __str__(self) -> str:
+        return self.address_key
@@ -1,6 +1,7 @@
 import uuid
 from typing import TYPE_CHECKING, Any
 
+from django.contrib.postgres.indexes import GistIndex
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator
 from django.db import models, transaction
@@ -14,6 +15,8 @@ from meshapi.util.network_number import (
     validate_network_number_unused_and_claim_install_if_needed,
 )
 
+from .util.spatial import Point
+
 if TYPE_CHECKING:
     # Gate the import to avoid cycles
     from meshapi.models.building import Building
@@ -28,6 +31,10 @@ class Node(models.Model):
 
     class Meta:
         ordering = ["network_number"]
+        indexes = [
+            # Used to find everything on a given map tile, see meshapi.models.util.spatial
+            GistIndex(Point(), name="meshapi_node_location_gist"),
+        ]
 
     class NodeStatus(models.TextChoices):
         INACTIVE = "Inactive"
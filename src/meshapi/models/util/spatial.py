@@ -0,0 +1,118 @@
+import math
+from dataclasses import dataclass
+from typing import Any, List, Tuple
+
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import BooleanField, F, Func, Value
+from django.db.models.sql.compiler import SQLCompiler
+
+# Web mercator can't represent the poles, slippy map tiles stop here
+MAX_TILE_LATITUDE = 85.0511287798
+MAX_TILE_ZOOM = 22
+
+
+@dataclass(frozen=True)
+class BoundingBox:
+    west: float
+    south: float
+    east: float
+    north: float
+
+    def __post_init__(self) -> None:
+        if not (-180 <= self.west <= self.east <= 180):
+            raise ValueError(f"Invalid longitude range {self.west} to {self.east}")
+        if not (-90 <= self.south <= self.north <= 90):
+            raise ValueError(f"Invalid latitude range {self.south} to {self.north}")
+
+    def contains(self, longitude: float, latitude: float) -> bool:
+        return self.west <= longitude <= self.east and self.south <= latitude <= self.north
+
+    def buffered(self, fraction: float) -> "BoundingBox":
+        """
+        This bounding box grown by the given fraction of its width/height on every side
+        """
+        longitude_buffer = (self.east - self.west) * fraction
+        latitude_buffer = (self.north - self.south) * fraction
+        return BoundingBox(
+            west=max(-180, self.west - longitude_buffer),
+            south=max(-90, self.south - latitude_buffer),
+            east=min(180, self.east + longitude_buffer),
+            north=min(90, self.north + latitude_buffer),
+        )
+
+    @classmethod
+    def from_string(cls, bbox: str) -> "BoundingBox":
+        """
+        Parse a bounding box in the usual "west,south,east,north" (i.e. "min lon,min lat,max lon,max lat") format
+        """
+        parts = bbox.split(",")
+        if len(parts) != 4:
+            raise ValueError("Bounding box must have exactly four comma separated values: west,south,east,north")
+
+        west, south, east, north = (float(part) for part in parts)
+        return cls(west=west, south=south, east=east, north=north)
+
+    @classmethod
+    def from_tile(cls, z: int, x: int, y: int) -> "BoundingBox":
+        """
+        The area covered by the given slippy map (XYZ / web mercator) tile
+        """
+        if not (0 <= z <= MAX_TILE_ZOOM):
+            raise ValueError(f"Zoom level must be between 0 and {MAX_TILE_ZOOM}")
+
+        tile_count = 2**z
+        if not (0 <= x < tile_count and 0 <= y < tile_count):
+            raise ValueError(f"Tile coordinates must be between 0 and {tile_count - 1} at zoom level {z}")
+
+        def tile_latitude(tile_y: int) -> float:
+            return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / tile_count))))
+
+        return cls(
+            west=x / tile_count * 360 - 180,
+            south=tile_latitude(y + 1),
+            east=(x + 1) / tile_count * 360 - 180,
+            north=tile_latitude(y),
+        )
+
+
+class Point(Func):
+    """
+    A native postgres point, as (longitude, latitude), used to build the GiST indexes which let us
+    find everything within a bounding box without scanning the whole table
+    """
+
+    function = "point"
+
+    def __init__(self, longitude: str = "longitude", latitude: str = "latitude") -> None:
+        super().__init__(F(longitude), F(latitude))
+
+
+class WithinBoundingBox(Func):
+    """
+    True if point(longitude, latitude) is inside the bounding box. This matches the expression of the
+    GiST indexes on Building and Node, so postgres can answer it from the index
+    """
+
+    output_field = BooleanField()
+
+    def __init__(self, bbox: BoundingBox, longitude: str = "longitude", latitude: str = "latitude") -> None:
+        super().__init__(
+            Point(longitude, latitude),
+            Value(bbox.west),
+            Value(bbox.south),
+            Value(bbox.east),
+            Value(bbox.north),
+        )
+
+    def as_sql(
+        self, compiler: SQLCompiler, connection: BaseDatabaseWrapper, *args: Any, **kwargs: Any
+    ) -> Tuple[str, List[Any]]:
+        sql_parts = []
+        params: List[Any] = []
+        for expression in self.get_source_expressions():
+            expression_sql, expression_params = compiler.compile(expression)
+            sql_parts.append(expression_sql)
+            params.extend(expression_params)
+
+        point, west, south, east, north = sql_parts
+        return f"({point} <@ box(point({west}, {south}), point({east}, {north})))", params
@@ -1,16 +1,91 @@
 import logging
 import os
 import re
+from functools import lru_cache
+from typing import Optional
 
 import inflect
-import requests
+from datadog import statsd
 from meshdb.environment import PELIAS_ADDRESS_PARSER_URL
 
+from meshapi.util import http_client
 from meshapi.util.constants import DEFAULT_EXTERNAL_API_TIMEOUT_SECONDS
 from meshdb import environment
 
+# Buildings don't get renamed often, and the same ones come up over and over (e.g. every
+# apartment in a building that joins), so this is plenty
+HUMANIFY_STREET_ADDRESS_CACHE_SIZE = 4096
+
+# The last word of a street name, for the streets we're sure Pelias would parse as
+# "<housenumber> <street>" (see humanify_street_address_locally())
+STREET_SUFFIXES = {
+    "ALLEY",
+    "AVE",
+    "AVENUE",
+    "BLVD",
+    "BOULEVARD",
+    "BROADWAY",
+    "CIRCLE",
+    "COURT",
+    "CT",
+    "DR",
+    "DRIVE",
+    "EXPRESSWAY",
+    "HIGHWAY",
+    "LANE",
+    "LN",
+    "PARKWAY",
+    "PKWY",
+    "PL",
+    "PLACE",
+    "PLAZA",
+    "RD",
+    "ROAD",
+    "ST",
+    "STREET",
+    "TER",
+    "TERRACE",
+    "TURNPIKE",
+    "WAY",
+}
+
+# e.g. "229", "215A", or the Queens style "37-12"
+_LOCAL_ADDRESS_PATTERN = re.compile(
+    r"(?P<housenumber>\d+[A-Z]?(?:-\d+[A-Z]?)?) (?P<street>(?:[A-Z0-9']+ )*(?P<suffix>[A-Z]+))"
+)
+
+# Constructing one of these is surprisingly slow, and ordinal() doesn't change it
+_inflect_engine = inflect.engine()
+
+
+def _humanify_street(street: str) -> str:
+    # e.g. "EAST 13 STREET" -> "East 13th Street"
+    street_title = street.title().replace("'S", "'s")
+
+    street_ordinals = ""
+    last_touched = 0
+    for match in re.finditer(r"(\d+)\W", street_title):
+        street_ordinals += street_title[last_touched : match.start(1)]
+        street_ordinals += _inflect_engine.ordinal(match[1])
+        last_touched = match.end(1)
+
+    return street_ordinals + street_title[last_touched:]
+
+
+def humanify_street_address_locally(dob_address_str: str) -> Optional[str]:
+    """
+    humanify_street_address() without asking Pelias, for addresses in the handful of shapes the DOB
+    almost always gives us (e.g. "229 EAST 13 STREET"), where we know which part Pelias would call the
+    house number and which the street. None if it's anything more ambiguous than that
+    """
+    match = _LOCAL_ADDRESS_PATTERN.fullmatch(dob_address_str.upper())
+    if not match or match["suffix"] not in STREET_SUFFIXES:
+        return None
+
+    return match["housenumber"] + " " + _humanify_street(dob_address_str[match.start("street") :])
 
 
+@lru_cache(maxsize=HUMANIFY_STREET_ADDRESS_CACHE_SIZE)
 def humanify_street_address(dob_address_str: str) -> str:
     """
     Convert an address from UPPERCASE to Title Case and add ordinal indicators
@@ -18,12 +93,23 @@ def humanify_street_address(dob_address_str: str) -> str:
     This is useful making  the output of the DOB APIs more gentle
 
     To make sure we don't make silly mistakes like "229th East 13 Street"
-    we call pelias and only add ordinal indicators to street names
+    we only add ordinal indicators to street names. Most addresses are simple
+    enough that we can tell which part that is ourselves, for the rest we call pelias
 
     :param dob_address_str: The address (line 1 only) string to convert
     :return: A softened version of the input string
     """
-    response = requests.get(
+    humanified = humanify_street_address_locally(dob_address_str)
+    if humanified is not None:
+        statsd.increment("meshdb.pelias.humanify", tags=["source:local"])
+        return humanified
+
+    statsd.increment("meshdb.pelias.humanify", tags=["source:pelias"])
+    return humanify_street_address_with_pelias(dob_address_str)
+
+
+def humanify_street_address_with_pelias(dob_address_str: str) -> str:
+    response = http_client.get(
         PELIAS_ADDRESS_PARSER_URL, params={"text": dob_address_str}, timeout=DEFAULT_EXTERNAL_API_TIMEOUT_SECONDS
     )
 
@@ -69,20 +155,8 @@ def humanify_street_address(dob_address_str: str) -> str:
             street_character_range = (classification["start"], classification["end"])
 
             street_substr = dob_address_str[street_character_range[0] : street_character_range[1]]
-            street_substr_title = street_substr.title().replace("'S", "'s")
-
-            street_substr_ordinals = ""
-            last_touched_in_street = 0
-            p = inflect.engine()
-            for match in re.finditer(r"(\d+)\W", street_substr_title):
-                street_substr_ordinals += street_substr_title[last_touched_in_street : match.start(1)]
-                street_substr_ordinals += p.ordinal(match[1])
-                last_touched_in_street = match.end(1)
-
-            street_substr_ordinals += street_substr_title[last_touched_in_street:]
-
-            output_string += (
-                dob_address_str[last_touched_orig : street_character_range[0]].lower() + street_substr_ordinals
+            output_string += dob_address_str[last_touched_orig : street_character_range[0]].lower() + _humanify_street(
+                street_substr
             )
             last_touched_orig = street_character_range[1]
         if classification["label"] == "housenumber":
@@ -20,6 +20,18 @@ def dt_to_javascript_time(datetime_val: Optional[datetime.datetime]) -> Optional
     return int(datetime_val.timestamp() * 1000)
 
 
+def date_to_javascript_time(date_val: Optional[datetime.date]) -> Optional[int]:
+    if date_val is None:
+        return None
+
+    return dt_to_javascript_time(
+        datetime.datetime.combine(
+            date_val,
+            datetime.datetime.min.time(),
+        ).astimezone(datetime.timezone.utc)
+    )
+
+
 @extend_schema_field(OpenApiTypes.INT)
 class JavascriptDatetimeField(serializers.Field):
     def to_internal_value(self, date_int_val: Optional[int]) -> Optional[datetime.datetime]:
@@ -39,12 +51,4 @@ class JavascriptDateField(serializers.Field):
         return internal_dt.date()
 
     def to_representation(self, date_val: Optional[datetime.date]) -> Optional[int]:
-        if date_val is None:
-            return None
-
-        return dt_to_javascript_time(
-            datetime.datetime.combine(
-                date_val,
-                datetime.datetime.min.time(),
-            ).astimezone(datetime.timezone.utc)
-        )
+        return date_to_javascript_time(date_val)
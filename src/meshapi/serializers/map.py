@@ -1,6 +1,6 @@
 import os
 from collections import OrderedDict
-from typing import List, Optional, Tuple
+from typing import TYPE_CHECKING, List, Optional, Tuple
 from urllib.parse import urlparse
 
 from rest_framework import serializers
@@ -8,6 +8,10 @@ from rest_framework import serializers
 from meshapi.models import Device, Install, Link, Node, Sector
 from meshapi.serializers.javascript_date_field import JavascriptDateField, JavascriptDatetimeField
 
+if TYPE_CHECKING:
+    # Gate the import to avoid cycles
+    from meshapi.util.map_data import MapNodeNumberResolver
+
 EXCLUDED_INSTALL_STATUSES = {
     Install.InstallStatus.CLOSED,
     Install.InstallStatus.NN_REASSIGNED,
@@ -169,6 +173,10 @@ class MapDataLinkSerializer(serializers.ModelSerializer):
         return "active"
 
     def _get_node_number_from_device(self, device: Device) -> Optional[int]:
+        node_number_resolver: Optional["MapNodeNumberResolver"] = self.context.get("node_number_resolver")
+        if node_number_resolver:
+            return node_number_resolver.get_map_number(device.node_id)
+
         node = device.node
 
         if node.network_number:
@@ -7,6 +7,8 @@ from django.core import management
 from flags.state import disable_flag, enable_flag
 
 from meshapi.util.django_flag_decorator import skip_if_flag_disabled
+from meshapi.util.email_domains import warm_email_domain_cache
+from meshapi.util.kiosks import refresh_kiosk_list
 from meshapi.util.panoramas import sync_github_panoramas
 from meshapi.util.uisp_import.fetch_uisp import get_uisp_devices, get_uisp_links
 from meshapi.util.uisp_import.sync_handlers import (
@@ -14,6 +16,7 @@ from meshapi.util.uisp_import.sync_handlers import (
     import_and_sync_uisp_links,
     sync_link_table_into_los_objects,
 )
+from meshapi.views.geography import write_geography_artifacts
 from meshdb.celery import app as celery_app
 from meshdb.settings import MESHDB_ENVIRONMENT
 
@@ -98,6 +101,52 @@ def run_update_from_uisp() -> None:
     statsd.increment("meshdb.tasks.run_update_from_uisp", tags=["status:success"])
 
 
+@celery_app.task
+@skip_if_flag_disabled("TASK_ENABLED_REFRESH_LINKNYC_KIOSKS")
+def refresh_linknyc_kiosks() -> None:
+    logging.info("Refreshing LinkNYC kiosk list")
+    try:
+        refresh_kiosk_list()
+    except Exception as e:
+        # Make sure the failure gets logged. The website keeps serving the last list we fetched
+        logging.exception(e)
+        statsd.increment("meshdb.tasks.refresh_linknyc_kiosks", tags=["status:failure"])
+        raise e
+
+    statsd.increment("meshdb.tasks.refresh_linknyc_kiosks", tags=["status:success"])
+
+
+@celery_app.task
+@skip_if_flag_disabled("TASK_ENABLED_BUILD_GEOGRAPHY_ARTIFACTS")
+def build_geography_artifacts() -> None:
+    logging.info("Building whole mesh KML/KMZ/GeoJSON files")
+    try:
+        write_geography_artifacts()
+    except Exception as e:
+        # Make sure the failure gets logged. nginx keeps serving the last files we built
+        logging.exception(e)
+        statsd.increment("meshdb.tasks.build_geography_artifacts", tags=["status:failure"])
+        raise e
+
+    statsd.increment("meshdb.tasks.build_geography_artifacts", tags=["status:success"])
+
+
+@celery_app.task
+@skip_if_flag_disabled("TASK_ENABLED_WARM_EMAIL_DOMAIN_CACHE")
+def run_warm_email_domain_cache() -> None:
+    logging.info("Looking up the MX records of our members' most common email domains")
+    try:
+        warmed = warm_email_domain_cache()
+        logging.info(f"Cached the MX records of {warmed} email domains")
+    except Exception as e:
+        # Make sure the failure gets logged. The join form looks up anything which isn't cached itself
+        logging.exception(e)
+        statsd.increment("meshdb.tasks.warm_email_domain_cache", tags=["status:failure"])
+        raise e
+
+    statsd.increment("meshdb.tasks.warm_email_domain_cache", tags=["status:success"])
+
+
 jitter_minutes = 0 if MESHDB_ENVIRONMENT == "prod2" else 2
 
 celery_app.conf.beat_schedule = {
@@ -109,6 +158,20 @@ celery_app.conf.beat_schedule = {
         "task": "meshapi.tasks.run_update_from_uisp",
         "schedule": crontab(minute=str(jitter_minutes + 10), hour="*/1"),
     },
+    "refresh-linknyc-kiosks-hourly": {
+        "task": "meshapi.tasks.refresh_linknyc_kiosks",
+        "schedule": crontab(minute=str(jitter_minutes + 20), hour="*/1"),
+    },
+    # A backstop for writes which don't fire signals (e.g. QuerySet.update()), see schedule_geography_artifact_rebuild()
+    "build-geography-artifacts-hourly": {
+        "task": "meshapi.tasks.build_geography_artifacts",
+        "schedule": crontab(minute=str(jitter_minutes + 30), hour="*/1"),
+    },
+    # Well within EMAIL_DOMAIN_CACHE_TTL_SECONDS, so the common domains never expire
+    "warm-email-domain-cache-hourly": {
+        "task": "meshapi.tasks.run_warm_email_domain_cache",
+        "schedule": crontab(minute=str(jitter_minutes + 50), hour="*/1"),
+    },
 }
 
 if MESHDB_ENVIRONMENT == "prod2":
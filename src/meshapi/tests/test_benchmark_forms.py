@@ -0,0 +1,96 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core import management
+from django.test import TransactionTestCase
+
+from meshapi.management.commands.benchmark_forms import BENCHMARK_BIN_MIN, StatsdListener
+from meshapi.models import Building, Install, Member, Node
+
+
+# The benchmark's requests run on threads of their own, which can't see inside a TestCase's transaction
+@patch("meshapi.views.forms.DISABLE_RECAPTCHA_VALIDATION", True)
+class TestBenchmarkForms(TransactionTestCase):
+    def test_benchmark_runs_and_cleans_up(self):
+        out = StringIO()
+        management.call_command(
+            "benchmark_forms",
+            "--submissions",
+            "12",
+            "--concurrency",
+            "4",
+            "--buildings",
+            "3",
+            "--latency-ms",
+            "5",
+            stdout=out,
+        )
+
+        output = out.getvalue()
+        self.assertRegex(output, r"\|\s+join\s+\|\s+12\s+\|\s+201: 12\s+\|")
+        self.assertRegex(output, r"\|\s+nn-assign\s+\|\s+12\s+\|\s+201: 12\s+\|")
+        self.assertRegex(output, r"\|\s+geosearch\s+\|\s+[1-9]")
+
+        # Nothing the benchmark created should outlive it
+        self.assertEqual(Member.objects.count(), 0)
+        self.assertEqual(Install.objects.count(), 0)
+        self.assertEqual(Building.objects.count(), 0)
+        self.assertEqual(Node.objects.count(), 0)
+
+    def test_benchmark_keep(self):
+        management.call_command(
+            "benchmark_forms",
+            "--submissions",
+            "6",
+            "--buildings",
+            "2",
+            "--latency-ms",
+            "0",
+            "--keep",
+            stdout=StringIO(),
+        )
+
+        self.assertEqual(Member.objects.count(), 6)
+        self.assertEqual(Install.objects.count(), 6)
+        self.assertEqual(Install.objects.filter(node__network_number__isnull=False).count(), 6)
+
+        # Everything came from the stand-ins
+        self.assertEqual(Building.objects.count(), 2)
+        for building in Building.objects.all():
+            self.assertGreaterEqual(building.bin, BENCHMARK_BIN_MIN)
+            self.assertIsNotNone(building.altitude)
+
+    def test_benchmark_stand_in_errors(self):
+        out = StringIO()
+        management.call_command(
+            "benchmark_forms",
+            "--submissions",
+            "4",
+            "--latency-ms",
+            "0",
+            "--service-error-rate",
+            "geosearch=1",
+            "--skip-nn-assignment",
+            stdout=out,
+        )
+
+        # The city's APIs being down is our problem, not the member's
+        self.assertRegex(out.getvalue(), r"\|\s+join\s+\|\s+4\s+\|\s+500: 4\s+\|")
+        self.assertNotIn("nn-assign", out.getvalue())
+
+    def test_benchmark_unknown_service(self):
+        with self.assertRaises(management.CommandError):
+            management.call_command("benchmark_forms", "--service-latency-ms", "mapquest=5", stdout=StringIO())
+
+
+class TestStatsdListener(TransactionTestCase):
+    def test_captures_timings(self):
+        from datadog import statsd
+
+        listener = StatsdListener(["meshdb.join_form.lock_wait"])
+        with listener.capturing():
+            statsd.timing("meshdb.join_form.lock_wait", 12.5, tags=["a:b"])
+            statsd.timing("meshdb.something_else", 1)
+            statsd.increment("meshdb.join_form.lock_wait")
+
+        self.assertEqual([12.5], listener.timings["meshdb.join_form.lock_wait"])
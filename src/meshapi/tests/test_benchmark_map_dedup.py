@@ -0,0 +1,23 @@
+from io import StringIO
+
+from django.core import management
+from django.test import TestCase
+
+from meshapi.models import LOS, Link, Node
+
+
+class TestBenchmarkMapDedup(TestCase):
+    def test_benchmark_runs_and_rolls_back(self):
+        out = StringIO()
+        management.call_command(
+            "benchmark_map_dedup", "--nodes", "50", "--links", "500", "--repeat", "1", "--explain", stdout=out
+        )
+
+        output = out.getvalue()
+        for query_name in ["links (legacy)", "links (window)", "LOS (legacy)", "LOS (window)"]:
+            self.assertIn(query_name, output)
+
+        # The synthetic mesh shouldn't outlive the benchmark
+        self.assertEqual(Node.objects.count(), 0)
+        self.assertEqual(Link.objects.count(), 0)
+        self.assertEqual(LOS.objects.count(), 0)
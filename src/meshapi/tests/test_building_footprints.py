@@ -0,0 +1,129 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+from django.core import management
+from django.test import TestCase
+
+from meshapi.models import Building, BuildingFootprint
+from meshapi.tests.sample_data import sample_address_response
+from meshapi.validation import NYCAddressInfo
+
+from .util import mock_nyc_address_apis
+
+
+class TestImportBuildingFootprints(TestCase):
+    def write_file(self, suffix, content):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        self.addCleanup(os.unlink, path)
+        return path
+
+    def import_footprints(self, path, *args):
+        out = StringIO()
+        management.call_command("import_building_footprints", path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_import_csv(self):
+        path = self.write_file(
+            ".csv",
+            "the_geom,BIN,CNSTRCT_YR,HEIGHTROOF,GROUNDELEV\n"
+            "MULTIPOLYGON (((0 0)),1234,1920,123.456,76.544\n"
+            "MULTIPOLYGON (((0 0)),1234,1920,12,76.544\n"
+            "MULTIPOLYGON (((0 0)),5678,1920,,20\n"
+            "MULTIPOLYGON (((0 0)),1000000,1920,10,20\n",
+        )
+        output = self.import_footprints(path, "--batch-size", "2")
+
+        self.assertIn("Imported 2 building footprints. Skipped 1 rows", output)
+        self.assertEqual(BuildingFootprint.objects.count(), 2)
+        # The tallest footprint for the BIN wins
+        self.assertEqual(BuildingFootprint.objects.get(bin=1234).altitude, 61.0)
+        self.assertIsNone(BuildingFootprint.objects.get(bin=5678).altitude)
+
+    def test_tallest_footprint_across_batches(self):
+        path = self.write_file(
+            ".csv",
+            "BIN,HEIGHTROOF,GROUNDELEV\n1234,123.456,76.544\n5678,10,20\n1234,12,76.544\n",
+        )
+        output = self.import_footprints(path, "--batch-size", "1")
+
+        self.assertIn("Imported 2 building footprints", output)
+        # Not the annex which happened to come later in the file
+        self.assertEqual(BuildingFootprint.objects.get(bin=1234).altitude, 61.0)
+
+    def test_import_geojson_updates_existing(self):
+        BuildingFootprint(bin=1234, height_roof=1, ground_elevation=1).save()
+        path = self.write_file(
+            ".geojson",
+            json.dumps(
+                {
+                    "type": "FeatureCollection",
+                    "features": [
+                        {
+                            "type": "Feature",
+                            "geometry": None,
+                            "properties": {"bin": "1234", "height_roof": "123.456", "ground_elevation": "76.544"},
+                        }
+                    ],
+                }
+            ),
+        )
+        self.import_footprints(path)
+
+        self.assertEqual(BuildingFootprint.objects.count(), 1)
+        self.assertEqual(BuildingFootprint.objects.get(bin=1234).altitude, 61.0)
+
+    def test_backfill_altitudes(self):
+        BuildingFootprint(bin=1234, height_roof=123.456, ground_elevation=76.544).save()
+        missing = Building(address_truth_sources=[], latitude=40.7, longitude=-73.9, bin=1234)
+        missing.save()
+        known = Building(address_truth_sources=[], latitude=40.7, longitude=-73.9, bin=1234, altitude=10)
+        known.save()
+        unknown = Building(address_truth_sources=[], latitude=40.7, longitude=-73.9, bin=5678)
+        unknown.save()
+
+        output = self.import_footprints(self.write_file(".csv", "BIN,HEIGHTROOF,GROUNDELEV\n"), "--backfill-altitudes")
+
+        self.assertIn("Filled in the altitude of 1 buildings", output)
+        missing.refresh_from_db()
+        self.assertEqual(missing.altitude, 61.0)
+        self.assertEqual(missing.history.count(), 2)
+        known.refresh_from_db()
+        self.assertEqual(known.altitude, 10)
+        unknown.refresh_from_db()
+        self.assertIsNone(unknown.altitude)
+
+
+class TestBuildingFootprintLookup(TestCase):
+    def mock_responses(self, mock_open_data=None):
+        mock_geosearch = MagicMock()
+        mock_geosearch.content = json.dumps(sample_address_response).encode("utf-8")
+        mock_pelias = MagicMock()
+        mock_pelias.content = "{}".encode("utf-8")
+        return mock_nyc_address_apis(mock_geosearch, mock_pelias, mock_open_data)
+
+    @patch("meshapi.validation.http_client.get")
+    def test_lookup_skips_open_data(self, mock_requests):
+        BuildingFootprint(bin=1234, height_roof=123.456, ground_elevation=76.544).save()
+        mock_requests.side_effect = self.mock_responses()
+
+        nyc_addr_info = NYCAddressInfo("151 Broome St", "New York", "NY", "10002")
+
+        self.assertEqual(nyc_addr_info.altitude, 61.0)
+        # Just geosearch
+        self.assertEqual(mock_requests.call_count, 1)
+
+    @patch("meshapi.validation.http_client.get")
+    def test_lookup_falls_back_to_open_data(self, mock_requests):
+        mock_open_data = MagicMock()
+        mock_open_data.content = '[{"heightroof":123.456, "groundelev":76.544}]'.encode("utf-8")
+        mock_requests.side_effect = self.mock_responses(mock_open_data)
+
+        nyc_addr_info = NYCAddressInfo("151 Broome St", "New York", "NY", "10002")
+
+        self.assertEqual(nyc_addr_info.altitude, 61.0)
+        self.assertEqual(mock_requests.call_count, 2)
@@ -0,0 +1,248 @@
+import datetime
+import json
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+
+from meshapi.models import Building, Device, Install, Link, Member, Node, Sector
+from meshapi.tests.sample_data import sample_member
+from meshapi.util.change_feed import CHANGE_FEED_SETTLE_SECONDS, parse_since
+
+
+class TestParseSince(TestCase):
+    def test_parse_since(self):
+        self.assertEqual(
+            parse_since("2024-01-27T12:00:00+00:00"),
+            datetime.datetime(2024, 1, 27, 12, tzinfo=datetime.timezone.utc),
+        )
+        # An unescaped + in the query string arrives as a space
+        self.assertEqual(
+            parse_since("2024-01-27T12:00:00 00:00"),
+            datetime.datetime(2024, 1, 27, 12, tzinfo=datetime.timezone.utc),
+        )
+        self.assertEqual(
+            parse_since("2024-01-27 12:00:00.123 05"),
+            datetime.datetime(2024, 1, 27, 7, 0, 0, 123000, tzinfo=datetime.timezone.utc),
+        )
+        self.assertTrue(timezone.is_aware(parse_since("2024-01-27 12:00")))
+
+        with self.assertRaises(ValueError):
+            parse_since("yesterday")
+
+
+class TestModelChangeFeed(TestCase):
+    c = Client()
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username="admin", password="admin_password", email="admin@example.com"
+        )
+        self.c.login(username="admin", password="admin_password")
+
+        self.unchanged_member = Member(**sample_member)
+        self.unchanged_member.save()
+
+        self.since = timezone.now()
+
+    def get_changes(self, since):
+        response = self.c.get("/api/v1/members/", {"since": since.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_upserted_and_deleted(self):
+        created_member = Member(**sample_member)
+        created_member.save()
+
+        modified_member = Member(**sample_member)
+        modified_member.save()
+        deleted_member = Member(**sample_member)
+        deleted_member.save()
+
+        changes = self.get_changes(self.since)
+        self.assertEqual(
+            {member["id"] for member in changes["upserted"]},
+            {str(created_member.id), str(modified_member.id), str(deleted_member.id)},
+        )
+        self.assertEqual(changes["deleted"], [])
+
+        since = timezone.now()
+        modified_member.name = "Jane Smith"
+        modified_member.save()
+        deleted_id = deleted_member.id
+        deleted_member.delete()
+
+        changes = self.get_changes(since)
+        self.assertEqual(len(changes["upserted"]), 1)
+        self.assertEqual(changes["upserted"][0]["id"], str(modified_member.id))
+        self.assertEqual(changes["upserted"][0]["name"], "Jane Smith")
+        self.assertEqual(changes["deleted"], [str(deleted_id)])
+
+    def test_cursor(self):
+        changes = self.get_changes(self.since)
+        self.assertEqual(changes, {"cursor": self.since.isoformat(), "upserted": [], "deleted": []})
+
+        # The cursor trails behind the current time, to leave room for transactions which were in flight
+        long_ago = self.since - datetime.timedelta(days=1)
+        changes = self.get_changes(long_ago)
+        cursor = datetime.datetime.fromisoformat(changes["cursor"])
+        self.assertLessEqual(cursor, timezone.now() - datetime.timedelta(seconds=CHANGE_FEED_SETTLE_SECONDS))
+        self.assertGreater(cursor, long_ago)
+        self.assertEqual([member["id"] for member in changes["upserted"]], [str(self.unchanged_member.id)])
+
+        # Resuming from the cursor doesn't miss anything written after it was handed out (though
+        # we may see recent changes again)
+        member = Member(**sample_member)
+        member.save()
+
+        changes = self.get_changes(cursor)
+        self.assertIn(str(member.id), [m["id"] for m in changes["upserted"]])
+
+    def test_without_since_is_unchanged(self):
+        response = self.c.get("/api/v1/members/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["count"], 1)
+
+    def test_invalid_since(self):
+        response = self.c.get("/api/v1/members/", {"since": "not a time"})
+        self.assertEqual(response.status_code, 400)
+
+    @patch("meshapi.util.change_feed.CHANGE_FEED_MAX_UPSERTED", 2)
+    def test_too_many_changes(self):
+        for _ in range(2):
+            Member(**sample_member).save()
+        self.assertEqual(len(self.get_changes(self.since)["upserted"]), 2)
+
+        Member(**sample_member).save()
+        response = self.c.get("/api/v1/members/", {"since": self.since.isoformat()})
+        self.assertEqual(response.status_code, 410)
+        self.assertIn("download the full list", json.loads(response.content)["detail"])
+
+    def test_child_device_models(self):
+        node = Node(status=Node.NodeStatus.ACTIVE, latitude=0, longitude=0)
+        node.save()
+        sector = Sector(node=node, status=Device.DeviceStatus.ACTIVE, radius=1, azimuth=0, width=120)
+        sector.save()
+
+        response = self.c.get("/api/v1/sectors/", {"since": self.since.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s["id"] for s in json.loads(response.content)["upserted"]], [str(sector.id)])
+
+        since = timezone.now()
+        sector_id = sector.id
+        sector.delete()
+        response = self.c.get("/api/v1/sectors/", {"since": since.isoformat()})
+        self.assertEqual(json.loads(response.content)["deleted"], [str(sector_id)])
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestMapDataChangeFeed(TestCase):
+    c = Client()
+
+    def setUp(self):
+        cache.clear()
+        self.member = Member(name="Fake Name")
+        self.member.save()
+
+        self.nodes = {}
+        self.devices = {}
+        for network_number in [100, 101, 102]:
+            node = Node(
+                network_number=network_number,
+                status=Node.NodeStatus.ACTIVE,
+                latitude=40.7,
+                longitude=-73.9,
+            )
+            node.save()
+            building = Building(address_truth_sources=[], latitude=40.7, longitude=-73.9)
+            building.save()
+            building.nodes.add(node)
+            Install(
+                install_number=network_number,
+                status=Install.InstallStatus.ACTIVE,
+                request_date=datetime.datetime(2024, 1, 27, tzinfo=datetime.timezone.utc),
+                node=node,
+                member=self.member,
+                building=building,
+            ).save()
+            device = Device(node=node, status=Device.DeviceStatus.ACTIVE)
+            device.save()
+            self.nodes[network_number] = node
+            self.devices[network_number] = device
+
+        self.since = timezone.now()
+
+    def get_changes(self, path):
+        response = self.c.get(path, {"since": self.since.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_nothing_changed(self):
+        for path in ["/api/v1/mapdata/nodes/", "/api/v1/mapdata/links/", "/api/v1/mapdata/sectors/"]:
+            changes = self.get_changes(path)
+            self.assertEqual(changes["invalidated"], [])
+            self.assertEqual(changes["upserted"], [])
+
+    def test_node_changes(self):
+        node = self.nodes[101]
+        node.name = "Renamed"
+        node.save()
+
+        changes = self.get_changes("/api/v1/mapdata/nodes/")
+        self.assertEqual(changes["invalidated"], [101])
+        self.assertEqual([row["id"] for row in changes["upserted"]], [101])
+        self.assertEqual(changes["upserted"][0]["name"], "Renamed")
+
+        # The same rows as the full list
+        full = json.loads(self.c.get("/api/v1/mapdata/nodes/").content)
+        self.assertEqual(changes["upserted"], [row for row in full if row["id"] == 101])
+
+    def test_install_deleted(self):
+        Install.objects.get(install_number=102).delete()
+        node = self.nodes[102]
+        node.status = Node.NodeStatus.INACTIVE
+        node.save()
+
+        changes = self.get_changes("/api/v1/mapdata/nodes/")
+        self.assertEqual(changes["invalidated"], [102])
+        self.assertEqual(changes["upserted"], [])
+
+    def test_device_moved_between_nodes(self):
+        device = self.devices[100]
+        device.name = "Omni"
+        device.save()
+
+        changes = self.get_changes("/api/v1/mapdata/nodes/")
+        self.assertEqual(changes["invalidated"], [100])
+        self.assertEqual(changes["upserted"][0]["notes"], "Omni")
+
+        # Both the node it left and the node it joined are invalidated
+        device.node = self.nodes[101]
+        device.save()
+        changes = self.get_changes("/api/v1/mapdata/nodes/")
+        self.assertEqual(changes["invalidated"], [100, 101])
+
+    def test_link_changes(self):
+        Link(
+            from_device=self.devices[100],
+            to_device=self.devices[101],
+            status=Link.LinkStatus.ACTIVE,
+            type=Link.LinkType.FIVE_GHZ,
+        ).save()
+
+        changes = self.get_changes("/api/v1/mapdata/links/")
+        self.assertEqual(changes["invalidated"], [100, 101])
+        self.assertEqual(changes["upserted"], [{"from": 100, "to": 101, "status": "active"}])
+
+    def test_sector_changes(self):
+        Sector(node=self.nodes[102], status=Device.DeviceStatus.ACTIVE, radius=1, azimuth=0, width=120).save()
+
+        changes = self.get_changes("/api/v1/mapdata/sectors/")
+        self.assertEqual(changes["invalidated"], [102])
+        self.assertEqual([row["nodeId"] for row in changes["upserted"]], [102])
+
+    def test_invalid_since(self):
+        response = self.c.get("/api/v1/mapdata/nodes/", {"since": "not a time"})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,101 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from validate_email.exceptions import DNSTimeoutError, DomainNotFoundError, NoMXError
+
+from meshapi.models import Member
+from meshapi.util.email_domains import (
+    check_email_domain_dns,
+    clear_email_domain_cache,
+    get_most_common_email_domains,
+    warm_email_domain_cache,
+)
+from meshapi.validation import validate_email_address
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+@patch("meshapi.util.email_domains.dns_check", return_value=["mx.example.com"])
+class TestEmailDomainCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_email_domain_cache()
+        self.addCleanup(clear_email_domain_cache)
+
+    def test_domain_looked_up_once(self, mock_dns_check):
+        check_email_domain_dns("someone@gmail.com", timeout=5)
+        check_email_domain_dns("someone.else@GMAIL.com", timeout=5)
+        mock_dns_check.assert_called_once()
+
+        check_email_domain_dns("someone@yahoo.com", timeout=5)
+        self.assertEqual(2, mock_dns_check.call_count)
+
+    def test_shared_between_processes(self, mock_dns_check):
+        check_email_domain_dns("someone@gmail.com", timeout=5)
+
+        # As if we were another process, with nothing in memory
+        clear_email_domain_cache()
+        check_email_domain_dns("someone.else@gmail.com", timeout=5)
+        mock_dns_check.assert_called_once()
+
+    def test_bad_domain_remembered(self, mock_dns_check):
+        mock_dns_check.side_effect = NoMXError()
+
+        for _ in range(2):
+            with self.assertRaises(NoMXError):
+                check_email_domain_dns("someone@gmial.com", timeout=5)
+        mock_dns_check.assert_called_once()
+
+        clear_email_domain_cache()
+        with self.assertRaises(NoMXError):
+            check_email_domain_dns("someone@gmial.com", timeout=5)
+        mock_dns_check.assert_called_once()
+
+    def test_timeout_not_remembered(self, mock_dns_check):
+        mock_dns_check.side_effect = DNSTimeoutError()
+
+        for _ in range(2):
+            with self.assertRaises(DNSTimeoutError):
+                check_email_domain_dns("someone@gmail.com", timeout=5)
+        self.assertEqual(2, mock_dns_check.call_count)
+
+    def test_redis_down(self, mock_dns_check):
+        with patch("meshapi.util.email_domains.cache") as mock_cache:
+            mock_cache.get.side_effect = ConnectionError()
+            mock_cache.set.side_effect = ConnectionError()
+
+            check_email_domain_dns("someone@gmail.com", timeout=5)
+            check_email_domain_dns("someone.else@gmail.com", timeout=5)
+
+        mock_dns_check.assert_called_once()
+
+    def test_validate_email_address(self, mock_dns_check):
+        self.assertTrue(validate_email_address("someone@gmail.com"))
+        self.assertFalse(validate_email_address("not an email address"))
+
+        mock_dns_check.side_effect = DomainNotFoundError()
+        self.assertFalse(validate_email_address("someone@gmail.con"))
+
+        mock_dns_check.side_effect = DNSTimeoutError()
+        with self.assertRaises(DNSTimeoutError):
+            validate_email_address("someone@hotmail.com")
+
+    def test_warm(self, mock_dns_check):
+        for i, domain in enumerate(["gmail.com", "gmail.com", "GMAIL.COM", "yahoo.com", "yahoo.com", "nycmesh.net"]):
+            Member.objects.create(name=f"Member {i}", primary_email_address=f"member{i}@{domain}")
+        Member.objects.create(name="No email", primary_email_address=None)
+
+        self.assertEqual(["gmail.com", "yahoo.com"], get_most_common_email_domains(2))
+
+        self.assertEqual(2, warm_email_domain_cache(count=2))
+        self.assertEqual(2, mock_dns_check.call_count)
+
+        check_email_domain_dns("someone@gmail.com", timeout=5)
+        check_email_domain_dns("someone@yahoo.com", timeout=5)
+        self.assertEqual(2, mock_dns_check.call_count)
+
+    def test_warm_timeout(self, mock_dns_check):
+        Member.objects.create(name="Member", primary_email_address="member@gmail.com")
+        mock_dns_check.side_effect = DNSTimeoutError()
+
+        self.assertEqual(0, warm_email_domain_cache())
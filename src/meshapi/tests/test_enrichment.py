@@ -0,0 +1,60 @@
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from meshapi.util.enrichment import EnrichmentGraph
+
+
+class TestEnrichmentGraph(SimpleTestCase):
+    def test_independent_steps_overlap(self):
+        both_started = threading.Barrier(2, timeout=5)
+
+        def step(value):
+            # Only returns if the other step is running at the same time
+            both_started.wait()
+            return value
+
+        graph = EnrichmentGraph("test", deadline_seconds=5)
+        graph.add("a", lambda: step("a"))
+        graph.add("b", lambda: step("b"))
+
+        self.assertEqual(graph.result("a"), "a")
+        self.assertEqual(graph.result("b"), "b")
+
+    def test_dependencies(self):
+        graph = EnrichmentGraph("test", deadline_seconds=5)
+        graph.add("a", lambda: 2)
+        graph.add("b", lambda: 3)
+        graph.add("product", lambda a, b: a * b, depends_on=["a", "b"])
+
+        self.assertEqual(graph.result("product"), 6)
+
+    def test_errors_propagate(self):
+        def fail():
+            raise ValueError("Pretend this is a network issue")
+
+        graph = EnrichmentGraph("test", deadline_seconds=5)
+        graph.add("a", fail)
+        graph.add("b", lambda a: a, depends_on=["a"])
+
+        with self.assertRaises(ValueError):
+            graph.result("a")
+        with self.assertRaises(ValueError):
+            graph.result("b")
+
+    def test_deadline(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        graph = EnrichmentGraph("test", deadline_seconds=0.2)
+        graph.add("slow", release.wait)
+        graph.add("fast", lambda: "fast")
+
+        start = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            graph.result("slow")
+        self.assertLess(time.monotonic() - start, 1)
+
+        # Whatever finished in time is still there
+        self.assertEqual(graph.result("fast"), "fast")
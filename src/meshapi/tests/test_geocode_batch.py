@@ -0,0 +1,244 @@
+import copy
+import json
+import time
+from typing import Any, Dict, List
+from unittest.mock import MagicMock, patch
+
+import requests
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TransactionTestCase
+
+from meshapi.exceptions import AddressError
+from meshapi.tests.sample_data import sample_address_response
+from meshapi.util import http_client
+from meshapi.util.rate_limiter import RateLimiter
+from meshapi.validation import NYC_PLANNING_LABS_GEOCODE_URL, geocode_nyc_addresses
+from meshapi.views.geography import GEOCODE_BATCH_MAX_ADDRESSES
+
+from .util import mock_nyc_address_apis
+
+BIN_BY_STREET_ADDRESS = {
+    "151 Broome St": 1234,
+    "3 Bridge St": 5678,
+}
+
+
+def mock_response(content: Any) -> MagicMock:
+    response = MagicMock()
+    response.content = json.dumps(content).encode("utf-8")
+    return response
+
+
+class MockGeosearch:
+    """
+    Answers geosearch for each of BIN_BY_STREET_ADDRESS with its BIN, and nothing for any other address,
+    remembering which addresses it was asked about. Every building is the same height
+    """
+
+    def __init__(self) -> None:
+        self.searches: List[str] = []
+        self._other_apis = mock_nyc_address_apis(
+            None, mock_response({}), mock_response([{"heightroof": 123.456, "groundelev": 76.544}])
+        )
+
+    def get(self, url: str, *args: Any, **kwargs: Any) -> Any:
+        if url != NYC_PLANNING_LABS_GEOCODE_URL:
+            return self._other_apis(url, *args, **kwargs)
+
+        text = kwargs["params"]["text"]
+        self.searches.append(text)
+
+        street_address = text.split(",")[0]
+        if street_address not in BIN_BY_STREET_ADDRESS:
+            return mock_response({"features": []})
+
+        response: Dict[str, Any] = copy.deepcopy(sample_address_response)
+        response["features"][0]["properties"]["addendum"]["pad"]["bin"] = BIN_BY_STREET_ADDRESS[street_address]
+        return mock_response(response)
+
+
+# The lookups run on threads of their own, which can't see inside a TestCase's transaction
+@patch("meshapi.validation._geocode_batch_rate_limiter", MagicMock())
+class TestGeocodeNYCAddresses(TransactionTestCase):
+    def setUp(self):
+        self.geosearch = MockGeosearch()
+        patcher = patch("meshapi.validation.http_client.get", side_effect=self.geosearch.get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_results_in_input_order(self):
+        results = geocode_nyc_addresses(
+            [
+                ("3 Bridge St", "New York", "NY", "10002"),
+                ("12341 Whackadoole Ave", "New York", "NY", "10002"),
+                ("12341 Whackadoole Ave", "Beverly Hills", "CA", "90210"),
+                ("151 Broome St", "New York", "NY", "10002"),
+            ],
+            max_concurrency=4,
+        )
+
+        self.assertEqual(4, len(results))
+        self.assertEqual(5678, results[0].nyc_addr_info.bin)
+        self.assertIsNone(results[0].error)
+        self.assertIsNone(results[1].nyc_addr_info)
+        self.assertIsInstance(results[1].error, AddressError)
+        self.assertIsNone(results[2].nyc_addr_info)
+        self.assertIsInstance(results[2].error, ValueError)
+        self.assertEqual(1234, results[3].nyc_addr_info.bin)
+        self.assertEqual(40.716245, results[3].nyc_addr_info.latitude)
+        self.assertEqual(-73.98492, results[3].nyc_addr_info.longitude)
+
+    def test_duplicate_addresses_looked_up_once(self):
+        results = geocode_nyc_addresses(
+            [
+                ("151 Broome St", "New York", "NY", "10002"),
+                ("151 BROOME ST", "new york", "NY", "10002"),
+                ("151 Broome St", "New York", "NY", "10002"),
+            ]
+        )
+
+        self.assertEqual([1234, 1234, 1234], [result.nyc_addr_info.bin for result in results])
+        self.assertEqual(1, len(self.geosearch.searches))
+
+    def test_cached_addresses_not_looked_up(self):
+        addresses = [
+            ("151 Broome St", "New York", "NY", "10002"),
+            ("12341 Whackadoole Ave", "New York", "NY", "10002"),
+        ]
+        geocode_nyc_addresses(addresses)
+        self.assertEqual(2, len(self.geosearch.searches))
+
+        results = geocode_nyc_addresses(addresses + [("3 Bridge St", "New York", "NY", "10002")])
+
+        # Only the address we hadn't seen before
+        self.assertEqual(3, len(self.geosearch.searches))
+        self.assertEqual(1234, results[0].nyc_addr_info.bin)
+        self.assertIsInstance(results[1].error, AddressError)
+        self.assertEqual(5678, results[2].nyc_addr_info.bin)
+
+    @patch("meshapi.validation.time.sleep")
+    def test_city_api_down(self, mock_sleep):
+        with patch("meshapi.validation.http_client.get", side_effect=requests.exceptions.ConnectionError):
+            results = geocode_nyc_addresses([("151 Broome St", "New York", "NY", "10002")])
+
+        self.assertIsNone(results[0].nyc_addr_info)
+        self.assertIsNone(results[0].error)
+
+    @patch("meshapi.validation.GEOCODE_BATCH_DEADLINE_SECONDS", -1)
+    def test_out_of_time(self):
+        with patch("meshapi.validation._geocode_batch_rate_limiter", RateLimiter(10)):
+            results = geocode_nyc_addresses([("151 Broome St", "New York", "NY", "10002")])
+
+        # Left to be tried again, rather than holding up the request
+        self.assertEqual(0, len(self.geosearch.searches))
+        self.assertIsNone(results[0].nyc_addr_info)
+        self.assertIsNone(results[0].error)
+
+    def test_retry_after_slows_down_the_batch(self):
+        rate_limiter = MagicMock()
+
+        def get(url: str, **kwargs: Any) -> MagicMock:
+            http_client._notify_retry_after(MagicMock(status_code=429, headers={"Retry-After": "7"}))
+            return self.geosearch.get(url, **kwargs)
+
+        with patch("meshapi.validation._geocode_batch_rate_limiter", rate_limiter):
+            with patch("meshapi.validation.http_client.get", side_effect=get):
+                geocode_nyc_addresses([("151 Broome St", "New York", "NY", "10002")])
+
+        rate_limiter.defer.assert_called_once_with(7)
+
+
+@patch("meshapi.validation._geocode_batch_rate_limiter", MagicMock())
+class TestGeocodeBatchAPI(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="user", password="password", email="user@example.com")
+        self.client.force_login(self.user)
+
+        patcher = patch("meshapi.validation.http_client.get", side_effect=MockGeosearch().get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, body: Any) -> Any:
+        return self.client.post("/api/v1/geography/nyc-geocode/v2/batch", body, content_type="application/json")
+
+    def test_geocode_batch_unauth(self):
+        self.client.logout()
+        response = self.post({"addresses": [{"street_address": "151 Broome St"}]})
+        self.assertEqual(403, response.status_code)
+
+    def test_geocode_batch_invalid(self):
+        for body in [
+            {},
+            {"addresses": []},
+            {"addresses": [{"street_address": "151 Broome St"}]},
+            {
+                "addresses": [{"street_address": "151 Broome St", "city": "New York", "state": "NY", "zip": "10002"}]
+                * (GEOCODE_BATCH_MAX_ADDRESSES + 1)
+            },
+            {
+                "addresses": [{"street_address": "151 Broome St", "city": "New York", "state": "NY", "zip": "10002"}],
+                "max_concurrency": 0,
+            },
+        ]:
+            response = self.post(body)
+            self.assertEqual(400, response.status_code, body)
+
+    def test_geocode_batch(self):
+        response = self.post(
+            {
+                "addresses": [
+                    {"street_address": "151 Broome St", "city": "New York", "state": "NY", "zip": "10002"},
+                    {"street_address": "12341 Whackadoole Ave", "city": "Beverly Hills", "state": "CA", "zip": "90210"},
+                    {"street_address": "12341 Whackadoole Ave", "city": "New York", "state": "NY", "zip": "10002"},
+                ],
+                "max_concurrency": 2,
+            }
+        )
+
+        self.assertEqual(200, response.status_code)
+        results = response.json()["results"]
+        self.assertEqual(
+            {"status": "ok", "BIN": 1234, "latitude": 40.716245, "longitude": -73.98492, "altitude": 61.0},
+            results[0],
+        )
+        self.assertEqual("not_found", results[1]["status"])
+        self.assertIn("Non-NYC", results[1]["detail"])
+        self.assertEqual("not_found", results[2]["status"])
+        self.assertIn("not found", results[2]["detail"])
+
+    @patch("meshapi.validation.time.sleep")
+    def test_geocode_batch_city_api_down(self, mock_sleep):
+        with patch("meshapi.validation.http_client.get", side_effect=requests.exceptions.ConnectionError):
+            response = self.post(
+                {"addresses": [{"street_address": "151 Broome St", "city": "New York", "state": "NY", "zip": "10002"}]}
+            )
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("error", response.json()["results"][0]["status"])
+
+
+class TestRateLimiter(SimpleTestCase):
+    def test_spaces_out_calls(self):
+        rate_limiter = RateLimiter(50)
+
+        start = time.monotonic()
+        for _ in range(5):
+            rate_limiter.acquire()
+
+        # The first goes straight away, the rest wait their turn
+        self.assertGreaterEqual(time.monotonic() - start, 4 / 50)
+
+    def test_gives_up_after_deadline(self):
+        rate_limiter = RateLimiter(1)
+
+        self.assertTrue(rate_limiter.acquire(deadline=time.monotonic() + 0.5))
+        # Our next turn is a second away
+        start = time.monotonic()
+        self.assertFalse(rate_limiter.acquire(deadline=time.monotonic() + 0.5))
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_defer(self):
+        rate_limiter = RateLimiter(1000)
+
+        rate_limiter.defer(60)
+        self.assertFalse(rate_limiter.acquire(deadline=time.monotonic() + 30))
@@ -0,0 +1,125 @@
+import datetime
+import gzip
+import io
+import os
+import tempfile
+import zipfile
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from flags.state import enable_flag
+
+from meshapi.models import Building, Install, Member
+from meshapi.tasks import build_geography_artifacts
+from meshapi.util.geography_artifacts import schedule_geography_artifact_rebuild
+from meshapi.views.geography import iter_whole_mesh_kml_chunks
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestGeographyArtifacts(TestCase):
+    c = Client()
+
+    def setUp(self):
+        cache.clear()
+        self.artifact_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.artifact_dir.cleanup)
+        for patcher in [
+            patch("meshapi.util.geography_artifacts.GEOGRAPHY_ARTIFACT_DIR", self.artifact_dir.name),
+            patch("meshapi.util.geography_artifacts.GEOGRAPHY_ARTIFACT_ACCEL_REDIRECT_PREFIX", None),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        member = Member(name="Stacy Fakename")
+        member.save()
+        building = Building(address_truth_sources=[], latitude=40.7, longitude=-73.9)
+        building.save()
+        Install(
+            install_number=8000,
+            status=Install.InstallStatus.ACTIVE,
+            request_date=datetime.datetime(2024, 1, 27, tzinfo=datetime.timezone.utc),
+            member=member,
+            building=building,
+        ).save()
+
+    def build(self):
+        enable_flag("TASK_ENABLED_BUILD_GEOGRAPHY_ARTIFACTS")
+        build_geography_artifacts()
+
+    def test_falls_back_to_building_on_demand(self):
+        response = self.c.get("/api/v1/geography/whole-mesh.kml")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Accel-Redirect", response)
+        self.assertIn(b"<name>8000</name>", response.getvalue())
+
+    def test_build(self):
+        self.build()
+
+        kml = b"".join(iter_whole_mesh_kml_chunks())
+        with open(os.path.join(self.artifact_dir.name, "whole-mesh.kml"), "rb") as f:
+            self.assertEqual(f.read(), kml)
+        with open(os.path.join(self.artifact_dir.name, "whole-mesh.kml.gz"), "rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), kml)
+        with open(os.path.join(self.artifact_dir.name, "whole-mesh.kmz"), "rb") as f:
+            with zipfile.ZipFile(io.BytesIO(f.read())) as kmz:
+                self.assertEqual(kmz.read("doc.kml"), kml)
+
+        # The zip archive is already compressed
+        self.assertFalse(os.path.exists(os.path.join(self.artifact_dir.name, "whole-mesh.kmz.gz")))
+        # And nothing is left behind
+        self.assertEqual(
+            sorted(os.listdir(self.artifact_dir.name)),
+            ["whole-mesh.geojson", "whole-mesh.geojson.gz", "whole-mesh.kml", "whole-mesh.kml.gz", "whole-mesh.kmz"],
+        )
+
+    def test_served_from_disk(self):
+        self.build()
+
+        response = self.c.get("/api/v1/geography/whole-mesh.geojson")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/geo+json")
+        with open(os.path.join(self.artifact_dir.name, "whole-mesh.geojson"), "rb") as f:
+            self.assertEqual(response.getvalue(), f.read())
+
+    def test_handed_off_to_nginx(self):
+        self.build()
+
+        with patch("meshapi.util.geography_artifacts.GEOGRAPHY_ARTIFACT_ACCEL_REDIRECT_PREFIX", "/internal/geography/"):
+            for path, content_type in [
+                ("whole-mesh.kml", "application/vnd.google-earth.kml+xml; charset=utf-8"),
+                ("whole-mesh.kmz", "application/vnd.google-earth.kmz"),
+                ("whole-mesh.geojson", "application/geo+json"),
+            ]:
+                response = self.c.get(f"/api/v1/geography/{path}")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["X-Accel-Redirect"], f"/internal/geography/{path}")
+                self.assertEqual(response["Content-Type"], content_type)
+                self.assertEqual(response.getvalue(), b"")
+
+    def test_build_flag_disabled(self):
+        build_geography_artifacts()
+        self.assertEqual(os.listdir(self.artifact_dir.name), [])
+
+    @patch("meshapi.util.geography_artifacts.celery_app.send_task")
+    def test_rebuild_debounced(self, mock_send_task):
+        for _ in range(3):
+            schedule_geography_artifact_rebuild()
+        mock_send_task.assert_called_once_with("meshapi.tasks.build_geography_artifacts", countdown=60)
+
+        # Once the rebuild starts, the next change schedules another one
+        self.build()
+        schedule_geography_artifact_rebuild()
+        self.assertEqual(mock_send_task.call_count, 2)
+
+    @patch("meshapi.util.geography_artifacts.celery_app.send_task")
+    def test_rebuild_scheduled_on_commit(self, mock_send_task):
+        with self.captureOnCommitCallbacks(execute=True):
+            Building(address_truth_sources=[], latitude=40.7, longitude=-73.9).save()
+        mock_send_task.assert_called_once()
+
+    @patch("meshapi.util.geography_artifacts.celery_app.send_task")
+    def test_not_scheduled_when_disabled(self, mock_send_task):
+        with patch("meshapi.util.geography_artifacts.GEOGRAPHY_ARTIFACT_DIR", None):
+            schedule_geography_artifact_rebuild()
+        mock_send_task.assert_not_called()
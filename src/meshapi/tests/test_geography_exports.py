@@ -0,0 +1,239 @@
+import datetime
+import json
+
+from django.test import Client, TestCase, override_settings
+
+from meshapi.models import LOS, Building, Device, Install, Link, Member, Node
+from meshapi.util.mvt import MVT_EXTENT, MVTLayer, encode_tile, lon_lat_to_tile_coordinate
+
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return result, pos
+
+
+def _read_fields(data):
+    # Just enough protobuf to read back what we wrote
+    pos = 0
+    fields = []
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        field_number, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = data[pos : pos + 8], pos + 8
+        else:
+            length, pos = _read_varint(data, pos)
+            value, pos = data[pos : pos + length], pos + length
+        fields.append((field_number, value))
+    return fields
+
+
+def _read_packed(data):
+    values = []
+    pos = 0
+    while pos < len(data):
+        value, pos = _read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def decode_tile(data):
+    layers = {}
+    for field_number, layer_data in _read_fields(data):
+        assert field_number == 3
+        layer_fields = _read_fields(layer_data)
+        name = next(value for number, value in layer_fields if number == 1).decode()
+        keys = [value.decode() for number, value in layer_fields if number == 3]
+        values = []
+        for number, value_data in layer_fields:
+            if number == 4:
+                value_number, value = _read_fields(value_data)[0]
+                values.append(value.decode() if value_number == 1 else value)
+
+        features = []
+        for number, feature_data in layer_fields:
+            if number == 2:
+                feature = dict(_read_fields(feature_data))
+                tags = _read_packed(feature[2])
+                features.append(
+                    {
+                        "type": feature[3],
+                        "geometry": _read_packed(feature[4]),
+                        "properties": {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)},
+                    }
+                )
+        layers[name] = features
+    return layers
+
+
+def get_tile(longitude, latitude, z):
+    world_x, world_y = lon_lat_to_tile_coordinate(longitude, latitude, z, 0, 0)
+    return z, world_x // MVT_EXTENT, world_y // MVT_EXTENT
+
+
+class TestMVTEncoder(TestCase):
+    def test_encode_point_and_line(self):
+        layer = MVTLayer("test")
+        layer.add_point((25, 17), {"name": "a", "active": True, "count": 3})
+        self.assertTrue(layer.add_line([(1, 1), (3, 2), (3, 2), (0, 0)], {"name": "b"}))
+        self.assertFalse(layer.add_line([(5, 5), (5, 5)], {"name": "c"}))
+
+        tile = decode_tile(encode_tile([layer, MVTLayer("empty")]))
+        self.assertEqual(list(tile.keys()), ["test"])
+
+        point, line = tile["test"]
+        self.assertEqual(point["type"], 1)
+        # MoveTo(1), zigzag(25), zigzag(17)
+        self.assertEqual(point["geometry"], [9, 50, 34])
+        self.assertEqual(point["properties"], {"name": "a", "active": 1, "count": 3})
+
+        self.assertEqual(line["type"], 2)
+        # MoveTo(1) +1,+1 then LineTo(2) +2,+1 -3,-2 (the repeated point is dropped)
+        self.assertEqual(line["geometry"], [9, 2, 2, 18, 4, 2, 5, 3])
+        self.assertEqual(line["properties"], {"name": "b"})
+
+    def test_tile_coordinates(self):
+        self.assertEqual(lon_lat_to_tile_coordinate(-180, 0, 0, 0, 0), (0, MVT_EXTENT // 2))
+        self.assertEqual(lon_lat_to_tile_coordinate(0, 0, 1, 1, 1), (0, 0))
+        self.assertEqual(get_tile(-73.99, 40.72, 12), (12, 1206, 1539))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestGeographyExports(TestCase):
+    c = Client()
+
+    def setUp(self):
+        member = Member(name="Fake Name")
+        member.save()
+
+        def make_install(install_number, latitude, longitude, status, node=None):
+            building = Building(address_truth_sources=[], latitude=latitude, longitude=longitude, altitude=10)
+            building.save()
+            if node:
+                building.nodes.add(node)
+            Install(
+                install_number=install_number,
+                status=status,
+                request_date=datetime.datetime(2024, 1, 27, tzinfo=datetime.timezone.utc),
+                node=node,
+                member=member,
+                building=building,
+                roof_access=True,
+            ).save()
+            return building
+
+        devices = []
+        for network_number, latitude, longitude in [(100, 40.72, -73.99), (101, 40.71, -74.0)]:
+            node = Node(
+                network_number=network_number,
+                status=Node.NodeStatus.ACTIVE,
+                latitude=latitude,
+                longitude=longitude,
+            )
+            node.save()
+            make_install(network_number, latitude, longitude, Install.InstallStatus.ACTIVE, node)
+            device = Device(node=node, status=Device.DeviceStatus.ACTIVE)
+            device.save()
+            devices.append(device)
+
+        Link(
+            from_device=devices[0],
+            to_device=devices[1],
+            status=Link.LinkStatus.ACTIVE,
+            type=Link.LinkType.FIVE_GHZ,
+        ).save()
+
+        self.pending_building = make_install(200, 40.715, -73.995, Install.InstallStatus.PENDING)
+        LOS(
+            from_building=self.pending_building,
+            to_building=Building.objects.get(installs__install_number=100),
+            source=LOS.LOSSource.HUMAN_ANNOTATED,
+            analysis_date=datetime.date(2024, 1, 1),
+        ).save()
+
+    def test_whole_mesh_geojson(self):
+        response = self.c.get("/api/v1/geography/whole-mesh.geojson")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/geo+json")
+
+        collection = json.loads(response.content)
+        self.assertEqual(collection["type"], "FeatureCollection")
+
+        features = {
+            (feature["properties"]["kind"], feature["properties"]["name"]): feature
+            for feature in collection["features"]
+        }
+        self.assertEqual(
+            sorted(name for kind, name in features if kind in ["install", "node"]),
+            ["100", "100", "101", "101", "200"],
+        )
+        self.assertEqual(sorted(kind for kind, _ in features if kind in ["link", "los"]), ["link", "los"])
+
+        install = features[("install", "100")]
+        self.assertEqual(install["geometry"], {"type": "Point", "coordinates": [-73.99, 40.72, 10]})
+        self.assertEqual(
+            install["properties"],
+            {
+                "name": "100",
+                "roofAccess": "True",
+                "marker-color": "#F00",
+                "id": "100",
+                "status": "Active",
+                "kind": "install",
+            },
+        )
+
+        link = next(feature for (kind, _), feature in features.items() if kind == "link")
+        self.assertEqual(link["geometry"]["type"], "LineString")
+        self.assertEqual(link["properties"]["from"], "100")
+        self.assertEqual(link["properties"]["to"], "101")
+
+        # Cached with an ETag like the other snapshots
+        response = self.c.get("/api/v1/geography/whole-mesh.geojson", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_vector_tile(self):
+        z, x, y = get_tile(-73.99, 40.72, 14)
+        response = self.c.get(f"/api/v1/geography/tiles/{z}/{x}/{y}.mvt")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/vnd.mapbox-vector-tile")
+
+        tile = decode_tile(response.content)
+        self.assertEqual(set(tile.keys()), {"nodes", "links", "los"})
+        self.assertIn(("100", "install"), {(f["properties"]["name"], f["properties"]["kind"]) for f in tile["nodes"]})
+        self.assertEqual(len(tile["links"]), 1)
+        self.assertEqual(len(tile["los"]), 1)
+
+        # Points are placed within the tile's pixel grid
+        for feature in tile["nodes"]:
+            self.assertEqual(feature["type"], 1)
+
+        response = self.c.get(f"/api/v1/geography/tiles/{z}/{x}/{y}.mvt", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_vector_tile_simplified_at_low_zoom(self):
+        z, x, y = get_tile(-73.99, 40.72, 10)
+        tile = decode_tile(self.c.get(f"/api/v1/geography/tiles/{z}/{x}/{y}.mvt").content)
+
+        # No LOS lines, and no pending installs
+        self.assertEqual(set(tile.keys()), {"nodes", "links"})
+        self.assertNotIn("200", {feature["properties"]["name"] for feature in tile["nodes"]})
+
+    def test_vector_tile_outside_the_mesh(self):
+        z, x, y = get_tile(2.35, 48.85, 14)
+        response = self.c.get(f"/api/v1/geography/tiles/{z}/{x}/{y}.mvt")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"")
+
+    def test_invalid_tile(self):
+        response = self.c.get("/api/v1/geography/tiles/3/8/0.mvt")
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,117 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import requests
+import requests_mock
+from django.test import SimpleTestCase
+
+from meshapi.util import http_client
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    # Fails the first request to each path, then succeeds
+    seen_paths: set = set()
+    request_count = 0
+
+    def respond(self):
+        type(self).request_count += 1
+        if self.path == "/slow":
+            time.sleep(0.5)
+        status = 200 if self.path in self.seen_paths else 503
+        if self.path.startswith("/throttled"):
+            status = 429
+        self.seen_paths.add(self.path)
+        self.send_response(status)
+        if self.path.startswith("/throttled") or self.path == "/retry-after":
+            self.send_header("Retry-After", "60")
+        self.send_header("Content-Length", "0")
+        self.send_header("Set-Cookie", "session=secret")
+        self.end_headers()
+
+    do_GET = respond
+    do_POST = respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHTTPClient(SimpleTestCase):
+    def setUp(self):
+        FlakyHandler.seen_paths = set()
+        FlakyHandler.request_count = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def test_get_retried(self):
+        response = http_client.get(f"{self.base_url}/get")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(FlakyHandler.request_count, 2)
+
+    def test_read_timeout_not_retried(self):
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            http_client.get(f"{self.base_url}/slow", timeout=(1, 0.1))
+        self.assertEqual(FlakyHandler.request_count, 1)
+
+    def test_retry_after_not_waited_out(self):
+        start = time.monotonic()
+        response = http_client.get(f"{self.base_url}/throttled")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(FlakyHandler.request_count, 1)
+
+        response = http_client.get(f"{self.base_url}/retry-after")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(FlakyHandler.request_count, 3)
+        self.assertLess(time.monotonic() - start, 10)
+
+    def test_notify_retry_after(self):
+        retry_afters = []
+        with http_client.notify_retry_after(retry_afters.append):
+            http_client.get(f"{self.base_url}/throttled")
+            http_client.get(f"{self.base_url}/get")
+        self.assertEqual(retry_afters, [60])
+
+        # Only while in the context
+        http_client.get(f"{self.base_url}/throttled/again")
+        self.assertEqual(retry_afters, [60])
+
+    def test_post_not_retried(self):
+        response = http_client.post(f"{self.base_url}/post", json={})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(FlakyHandler.request_count, 1)
+
+    def test_no_cookies_kept(self):
+        http_client.get(f"{self.base_url}/cookies")
+        self.assertEqual(len(http_client.get_session().cookies), 0)
+
+    def test_session_shared_until_fork(self):
+        session = http_client.get_session()
+        self.assertIs(http_client.get_session(), session)
+
+        with patch("meshapi.util.http_client.os.getpid", return_value=-1):
+            self.assertIsNot(http_client.get_session(), session)
+
+    @requests_mock.Mocker()
+    @patch("meshapi.util.http_client.statsd")
+    def test_default_timeout_and_metrics(self, requests_mocker, mock_statsd):
+        requests_mocker.get("https://example.com/a", status_code=200)
+        requests_mocker.get("https://example.com/b", status_code=500)
+
+        http_client.get("https://example.com/a")
+        self.assertEqual(requests_mocker.request_history[0].timeout, http_client.DEFAULT_HTTP_TIMEOUT)
+        http_client.get("https://example.com/b", timeout=60)
+        self.assertEqual(requests_mocker.request_history[1].timeout, 60)
+
+        timings = [call.kwargs["tags"] for call in mock_statsd.timing.call_args_list]
+        self.assertEqual(
+            timings,
+            [
+                ["host:example.com", "method:GET", "status:200"],
+                ["host:example.com", "method:GET", "status:500"],
+            ],
+        )
+        mock_statsd.increment.assert_called_once_with("meshdb.http.error", tags=["host:example.com", "error:http_500"])
@@ -1,16 +1,32 @@
 import json
 from unittest.mock import patch
 
+import requests
 import requests_mock
-from django.test import TestCase
+from celery.exceptions import Retry
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from flags.state import disable_flag, enable_flag
 
 from meshapi.models import Building, Install, Member, Node
 from meshapi.tests.sample_data import sample_building, sample_install, sample_member
+from meshapi.util.events.join_requests_slack_channel import (
+    SLACK_COALESCE_SECONDS,
+    enqueue_join_request_slack_message,
+    send_join_request_slack_messages_task,
+)
+from meshapi.util.events.osticket_creation import OSTICKET_CREATE_TIMEOUT_SECONDS, create_os_ticket_task
+from meshdb.celery import app as celery_app
 
 
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
 class TestInstallCreateSignals(TestCase):
     def setUp(self):
+        cache.clear()
+        # Run the integrations' tasks right away, rather than sending them to a worker
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, "task_always_eager", False)
+
         self.sample_install_copy = sample_install.copy()
         self.building_1 = Building(**sample_building)
         self.building_1.save()
@@ -22,10 +38,15 @@ class TestInstallCreateSignals(TestCase):
 
         self.maxDiff = None
 
+    def save(self, install: Install) -> None:
+        # The integrations only run once the install has been committed
+        with self.captureOnCommitCallbacks(execute=True):
+            install.save()
+
     @requests_mock.Mocker()
     def test_no_events_happen_by_default(self, request_mocker):
         install = Install(**self.sample_install_copy)
-        install.save()
+        self.save(install)
 
         self.assertEqual(len(request_mocker.request_history), 0)
 
@@ -40,7 +61,7 @@ class TestInstallCreateSignals(TestCase):
         enable_flag("INTEGRATION_ENABLED_SEND_JOIN_REQUEST_SLACK_MESSAGES")
         disable_flag("INTEGRATION_ENABLED_CREATE_OSTICKET_TICKETS")
         install = Install(**self.sample_install_copy)
-        install.save()
+        self.save(install)
 
         self.assertEqual(len(request_mocker.request_history), 1)
         self.assertEqual(
@@ -82,7 +103,7 @@ class TestInstallCreateSignals(TestCase):
 
         install = Install(**self.sample_install_copy)
         install.node = node
-        install.save()
+        self.save(install)
 
         self.assertEqual(len(request_mocker.request_history), 1)
         self.assertEqual(
@@ -145,14 +166,14 @@ class TestInstallCreateSignals(TestCase):
 
         install = Install(**self.sample_install_copy)
         install.node = node
-        install.save()
+        self.save(install)
 
         install2 = Install(**self.sample_install_copy)
-        install2.save()
+        self.save(install2)
 
         install3 = Install(**self.sample_install_copy)
         install3.node = inactive_node
-        install3.save()
+        self.save(install3)
 
         self.assertEqual(len(request_mocker.request_history), 3)
         self.assertEqual(
@@ -235,7 +256,7 @@ class TestInstallCreateSignals(TestCase):
         enable_flag("INTEGRATION_ENABLED_CREATE_OSTICKET_TICKETS")
 
         install = Install(**self.sample_install_copy)
-        install.save()
+        self.save(install)
 
         self.assertEqual(len(request_mocker.request_history), 0)
 
@@ -252,7 +273,7 @@ class TestInstallCreateSignals(TestCase):
         enable_flag("INTEGRATION_ENABLED_CREATE_OSTICKET_TICKETS")
 
         install = Install(**self.sample_install_copy)
-        install.save()
+        self.save(install)
 
         self.assertEqual(len(request_mocker.request_history), 0)
 
@@ -271,13 +292,13 @@ class TestInstallCreateSignals(TestCase):
     @requests_mock.Mocker()
     def test_no_events_for_install_edit(self, request_mocker):
         install = Install(**self.sample_install_copy)
-        install.save()
+        self.save(install)
 
         enable_flag("INTEGRATION_ENABLED_SEND_JOIN_REQUEST_SLACK_MESSAGES")
         enable_flag("INTEGRATION_ENABLED_CREATE_OSTICKET_TICKETS")
 
         install.notes = "foo"
-        install.save()
+        self.save(install)
 
         self.assertEqual(len(request_mocker.request_history), 0)
 
@@ -302,7 +323,7 @@ class TestInstallCreateSignals(TestCase):
         enable_flag("INTEGRATION_ENABLED_CREATE_OSTICKET_TICKETS")
 
         install = Install(**self.sample_install_copy)
-        install.save()
+        self.save(install)
 
         self.assertEqual(
             len(
@@ -324,3 +345,196 @@ class TestInstallCreateSignals(TestCase):
             ),
             4,
         )
+
+    @patch(
+        "meshapi.util.events.join_requests_slack_channel.SLACK_JOIN_REQUESTS_CHANNEL_WEBHOOK_URL",
+        "http://example.com/test-url-slack",
+    )
+    @patch(
+        "meshapi.util.events.osticket_creation.OSTICKET_NEW_TICKET_ENDPOINT",
+        "http://example.com/test-url-os-ticket",
+    )
+    @patch(
+        "meshapi.util.events.osticket_creation.OSTICKET_API_TOKEN",
+        "mock-token",
+    )
+    @requests_mock.Mocker()
+    def test_no_events_until_commit(self, request_mocker):
+        request_mocker.post("http://example.com/test-url-slack", text="ok")
+        request_mocker.post("http://example.com/test-url-os-ticket", text="00123456", status_code=201)
+        enable_flag("INTEGRATION_ENABLED_SEND_JOIN_REQUEST_SLACK_MESSAGES")
+        enable_flag("INTEGRATION_ENABLED_CREATE_OSTICKET_TICKETS")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            install = Install(**self.sample_install_copy)
+            install.save()
+
+        self.assertEqual(len(request_mocker.request_history), 0)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(request_mocker.request_history), 2)
+
+    @patch(
+        "meshapi.util.events.join_requests_slack_channel.SLACK_JOIN_REQUESTS_CHANNEL_WEBHOOK_URL",
+        "http://example.com/test-url",
+    )
+    @patch("meshapi.util.events.join_requests_slack_channel.send_join_request_slack_messages_task.apply_async")
+    @requests_mock.Mocker()
+    def test_slack_messages_coalesced(self, mock_apply_async, request_mocker):
+        request_mocker.post("http://example.com/test-url", text="ok")
+        enable_flag("INTEGRATION_ENABLED_SEND_JOIN_REQUEST_SLACK_MESSAGES")
+
+        installs = [Install(**self.sample_install_copy) for _ in range(3)]
+        for install in installs:
+            self.save(install)
+
+        # Only the first schedules a message, the others are picked up by it
+        mock_apply_async.assert_called_once_with(countdown=SLACK_COALESCE_SECONDS)
+        self.assertEqual(len(request_mocker.request_history), 0)
+
+        send_join_request_slack_messages_task()
+        self.assertEqual(len(request_mocker.request_history), 1)
+        self.assertEqual(
+            json.loads(request_mocker.request_history[0].text)["text"].split("\n"),
+            [
+                line
+                for install in installs
+                for line in [
+                    f"*<https://www.nycmesh.net/map/nodes/{install.install_number}|3333 Chom St, Brooklyn NY, 11111>*",
+                    "Altitude not found · Roof access · No LoS Data Available",
+                ]
+            ],
+        )
+
+        # Nothing new to announce
+        send_join_request_slack_messages_task()
+        self.assertEqual(len(request_mocker.request_history), 1)
+
+        # Nor anything we've announced before
+        enqueue_join_request_slack_message(installs[0].install_number)
+        send_join_request_slack_messages_task()
+        self.assertEqual(len(request_mocker.request_history), 1)
+
+    @patch(
+        "meshapi.util.events.osticket_creation.OSTICKET_NEW_TICKET_ENDPOINT",
+        "http://example.com/test-url",
+    )
+    @patch(
+        "meshapi.util.events.osticket_creation.OSTICKET_API_TOKEN",
+        "mock-token",
+    )
+    @requests_mock.Mocker()
+    def test_osticket_created_once(self, request_mocker):
+        request_mocker.post("http://example.com/test-url", text="00123456", status_code=201)
+        enable_flag("INTEGRATION_ENABLED_CREATE_OSTICKET_TICKETS")
+
+        install = Install(**self.sample_install_copy)
+        self.save(install)
+        self.assertEqual(len(request_mocker.request_history), 1)
+
+        # e.g. the task was delivered twice
+        create_os_ticket_task(install.install_number)
+        self.assertEqual(len(request_mocker.request_history), 1)
+
+    @patch(
+        "meshapi.util.events.osticket_creation.OSTICKET_NEW_TICKET_ENDPOINT",
+        "http://example.com/test-url",
+    )
+    @patch(
+        "meshapi.util.events.osticket_creation.OSTICKET_API_TOKEN",
+        "mock-token",
+    )
+    @requests_mock.Mocker()
+    def test_osticket_retry_backoff(self, request_mocker):
+        request_mocker.post("http://example.com/test-url", text="Unavailable", status_code=503)
+
+        install = Install(**self.sample_install_copy)
+        install.save()
+
+        with patch.object(create_os_ticket_task, "retry", side_effect=Retry()) as mock_retry:
+            with self.assertRaises(Retry):
+                create_os_ticket_task(install.install_number)
+
+        mock_retry.assert_called_once_with(countdown=2)
+
+        # Someone else can try again
+        request_mocker.post("http://example.com/test-url", text="00123456", status_code=201)
+        create_os_ticket_task(install.install_number)
+        install.refresh_from_db()
+        self.assertEqual(install.ticket_number, "00123456")
+
+    @patch(
+        "meshapi.util.events.osticket_creation.OSTICKET_NEW_TICKET_ENDPOINT",
+        "http://example.com/test-url",
+    )
+    @patch(
+        "meshapi.util.events.osticket_creation.OSTICKET_API_TOKEN",
+        "mock-token",
+    )
+    @requests_mock.Mocker()
+    def test_osticket_keeps_concurrent_edits(self, request_mocker):
+        install = Install(**self.sample_install_copy)
+        install.save()
+
+        def edit_install(request, context):
+            # Somebody edits the install while OSTicket is creating the ticket
+            Install.objects.filter(pk=install.pk).update(notes="Edited while creating the ticket")
+            context.status_code = 201
+            return "00123456"
+
+        request_mocker.post("http://example.com/test-url", text=edit_install)
+        create_os_ticket_task(install.install_number)
+
+        install.refresh_from_db()
+        self.assertEqual(install.ticket_number, "00123456")
+        self.assertEqual(install.notes, "Edited while creating the ticket")
+        self.assertEqual(install.history.latest().ticket_number, "00123456")
+
+    @patch(
+        "meshapi.util.events.osticket_creation.OSTICKET_NEW_TICKET_ENDPOINT",
+        "http://example.com/test-url",
+    )
+    @patch(
+        "meshapi.util.events.osticket_creation.OSTICKET_API_TOKEN",
+        "mock-token",
+    )
+    @requests_mock.Mocker()
+    def test_osticket_not_retried_after_read_timeout(self, request_mocker):
+        # OSTicket may or may not have opened the ticket before we gave up waiting
+        request_mocker.post("http://example.com/test-url", exc=requests.exceptions.ReadTimeout)
+
+        install = Install(**self.sample_install_copy)
+        install.save()
+
+        with patch.object(create_os_ticket_task, "retry", side_effect=Retry()) as mock_retry:
+            create_os_ticket_task(install.install_number)
+            # e.g. the task was delivered twice
+            create_os_ticket_task(install.install_number)
+
+        mock_retry.assert_not_called()
+        self.assertEqual(len(request_mocker.request_history), 1)
+        self.assertEqual(request_mocker.request_history[0].timeout, OSTICKET_CREATE_TIMEOUT_SECONDS)
+        install.refresh_from_db()
+        self.assertEqual(install.ticket_number, self.sample_install_copy["ticket_number"])
+
+    @patch(
+        "meshapi.util.events.osticket_creation.OSTICKET_NEW_TICKET_ENDPOINT",
+        "http://example.com/test-url",
+    )
+    @patch(
+        "meshapi.util.events.osticket_creation.OSTICKET_API_TOKEN",
+        "mock-token",
+    )
+    @requests_mock.Mocker()
+    def test_osticket_retried_after_connection_error(self, request_mocker):
+        request_mocker.post("http://example.com/test-url", exc=requests.exceptions.ConnectionError)
+
+        install = Install(**self.sample_install_copy)
+        install.save()
+
+        with patch.object(create_os_ticket_task, "retry", side_effect=Retry()) as mock_retry:
+            with self.assertRaises(Retry):
+                create_os_ticket_task(install.install_number)
+
+        mock_retry.assert_called_once_with(countdown=2)
@@ -7,8 +7,9 @@ from unittest.mock import ANY, patch
 
 import requests_mock
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db.models import Q
-from django.test import Client, TestCase, TransactionTestCase
+from django.test import Client, TestCase, TransactionTestCase, override_settings
 from flags.state import enable_flag
 from parameterized import parameterized
 from validate_email.exceptions import DNSTimeoutError, SMTPTemporaryError
@@ -17,7 +18,11 @@ from meshapi.models import Building, Install, Member, Node
 from meshapi.views import JoinFormRequest
 
 from ..serializers import MemberSerializer
-from ..util.constants import RECAPTCHA_CHECKBOX_TOKEN_HEADER, RECAPTCHA_INVISIBLE_TOKEN_HEADER
+from ..util.constants import (
+    JOIN_FORM_IDEMPOTENCY_KEY_HEADER,
+    RECAPTCHA_CHECKBOX_TOKEN_HEADER,
+    RECAPTCHA_INVISIBLE_TOKEN_HEADER,
+)
 from ..validation import DOB_BUILDING_HEIGHT_API_URL, NYC_PLANNING_LABS_GEOCODE_URL, NYCAddressInfo
 from .sample_data import sample_building, sample_node
 from .sample_join_form_data import (
@@ -1439,3 +1444,176 @@ class TestJoinFormRaceCondition(TransactionTestCase):
         assert response1.data["building_id"] == response2.data["building_id"]
         assert response1.data["member_id"] != response2.data["member_id"]
         assert response1.data["install_number"] != response2.data["install_number"]
+
+
+def slow_geocode_nyc_address(street_address, city, state, zip_code):
+    # Stands in for the city's APIs taking their time
+    time.sleep(1)
+    return fake_geocode_nyc_address(street_address, city, state, zip_code)
+
+
+def fake_geocode_nyc_address(street_address, city, state, zip_code):
+    return NYCAddressInfo.from_cache_dict(
+        {
+            "street_address": street_address,
+            "city": city,
+            "state": state,
+            "zip": zip_code,
+            "longitude": -73.98492,
+            "latitude": 40.716245,
+            "altitude": 10.0,
+            # A different structure for each street address
+            "bin": 1000000 + int(street_address.split(" ")[0]),
+        }
+    )
+
+
+@patch("meshapi.views.forms.DISABLE_RECAPTCHA_VALIDATION", True)
+@patch("meshapi.views.forms.validate_email_address", return_value=True)
+@patch("meshapi.views.forms.geocode_nyc_address", slow_geocode_nyc_address)
+class TestJoinFormConcurrency(TransactionTestCase):
+    def invoke_join_forms(self, submissions):
+        results = {}
+
+        def invoke_join_form(i, submission):
+            request, _ = pull_apart_join_form_submission(submission)
+            results[i] = Client().post("/api/v1/join/", request, content_type="application/json")
+
+        threads = [TestThread(target=invoke_join_form, args=(i, s)) for i, s in enumerate(submissions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return [results[i] for i in range(len(submissions))]
+
+    def test_unrelated_submissions_dont_wait_for_each_other(self, mock_validate_email):
+        submissions = []
+        for i in range(1, 5):
+            submission = valid_join_form_submission.copy()
+            submission["email_address"] = f"member{i}@xyz.com"
+            submission["street_address"] = f"{i} Broome Street"
+            submission["parsed_street_address"] = f"{i} Broome Street"
+            submissions.append(submission)
+
+        start = time.monotonic()
+        responses = self.invoke_join_forms(submissions)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual([201] * 4, [response.status_code for response in responses])
+        self.assertEqual(4, len({response.data["building_id"] for response in responses}))
+        # One after another, this would take at least 4 seconds
+        self.assertLess(elapsed, 2.5)
+
+    def test_same_building_submissions_share_a_building(self, mock_validate_email):
+        submissions = []
+        for i in range(1, 5):
+            submission = valid_join_form_submission.copy()
+            submission["email_address"] = f"member{i}@xyz.com"
+            submission["apartment"] = str(i)
+            submissions.append(submission)
+
+        responses = self.invoke_join_forms(submissions)
+
+        self.assertEqual([201] * 4, [response.status_code for response in responses])
+        self.assertEqual(1, len({response.data["building_id"] for response in responses}))
+        self.assertEqual(4, len({response.data["install_number"] for response in responses}))
+        self.assertEqual(1, Building.objects.filter(street_address="151 Broome Street").count())
+
+    def test_same_member_submissions_share_a_member(self, mock_validate_email):
+        submissions = []
+        for i in range(1, 5):
+            submission = valid_join_form_submission.copy()
+            submission["street_address"] = f"{i} Broome Street"
+            submission["parsed_street_address"] = f"{i} Broome Street"
+            submissions.append(submission)
+
+        responses = self.invoke_join_forms(submissions)
+
+        self.assertEqual([201] * 4, [response.status_code for response in responses])
+        self.assertEqual(1, len({response.data["member_id"] for response in responses}))
+        self.assertEqual(1, Member.objects.filter(primary_email_address="jsmith@gmail.com").count())
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+@patch("meshapi.views.forms.validate_email_address", return_value=True)
+@patch("meshapi.views.forms.geocode_nyc_address", side_effect=fake_geocode_nyc_address)
+class TestJoinFormIdempotency(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def post(self, request, idempotency_key="1a55b949-0490-4b78-a2e8-10aea41d6f1d", **headers):
+        if idempotency_key:
+            headers[JOIN_FORM_IDEMPOTENCY_KEY_HEADER] = idempotency_key
+        return self.client.post("/api/v1/join/", request, content_type="application/json", headers=headers)
+
+    @patch("meshapi.views.forms.DISABLE_RECAPTCHA_VALIDATION", False)
+    @patch("meshapi.views.forms.validate_recaptcha_tokens")
+    def test_retry_gets_original_response(self, mock_validate_captcha_tokens, mock_geocode, mock_validate_email):
+        request, _ = pull_apart_join_form_submission(valid_join_form_submission)
+        headers = {RECAPTCHA_INVISIBLE_TOKEN_HEADER: "token"}
+
+        response1 = self.post(request, **headers)
+        self.assertEqual(201, response1.status_code)
+
+        # The retry's captcha token has already been used by the original
+        mock_validate_captcha_tokens.side_effect = ValueError("timeout-or-duplicate")
+        response2 = self.post(request, **headers)
+
+        self.assertEqual(201, response2.status_code)
+        self.assertEqual(response1.json(), response2.json())
+        self.assertEqual(1, mock_validate_captcha_tokens.call_count)
+        self.assertEqual(1, mock_geocode.call_count)
+        self.assertEqual(1, Install.objects.count())
+
+    @patch("meshapi.views.forms.DISABLE_RECAPTCHA_VALIDATION", True)
+    def test_submissions_without_key_processed_every_time(self, mock_geocode, mock_validate_email):
+        request, _ = pull_apart_join_form_submission(valid_join_form_submission)
+
+        responses = [
+            self.post(request, idempotency_key=None),
+            self.post(request, idempotency_key=None),
+            self.post(request, idempotency_key="another-submission"),
+        ]
+
+        # Caught by the usual de-duplication instead
+        self.assertEqual([201, 200, 200], [response.status_code for response in responses])
+
+        self.assertEqual(3, mock_geocode.call_count)
+
+    @patch("meshapi.views.forms.DISABLE_RECAPTCHA_VALIDATION", True)
+    def test_only_successful_responses_stored(self, mock_geocode, mock_validate_email):
+        request, _ = pull_apart_join_form_submission(valid_join_form_submission)
+        request["phone_number"] = "212 555 5555"
+        request["trust_me_bro"] = False
+
+        response = self.post(request)
+        self.assertEqual(409, response.status_code)
+
+        # The member confirms the changes, and tries again with the same submission
+        request.update(response.data["changed_info"])
+        response = self.post(request)
+        self.assertEqual(201, response.status_code)
+
+    @patch("meshapi.views.forms.DISABLE_RECAPTCHA_VALIDATION", True)
+    def test_key_reused_for_different_submission(self, mock_geocode, mock_validate_email):
+        request, _ = pull_apart_join_form_submission(valid_join_form_submission)
+
+        response = self.post(request)
+        self.assertEqual(201, response.status_code)
+
+        request["apartment"] = "5B"
+        response = self.post(request)
+
+        self.assertEqual(422, response.status_code)
+        self.assertEqual(1, mock_geocode.call_count)
+        self.assertEqual(1, Install.objects.count())
+
+    @patch("meshapi.views.forms.DISABLE_RECAPTCHA_VALIDATION", True)
+    def test_idempotency_key_too_long(self, mock_geocode, mock_validate_email):
+        request, _ = pull_apart_join_form_submission(valid_join_form_submission)
+
+        response = self.post(request, idempotency_key="a" * 129)
+
+        self.assertEqual(400, response.status_code)
+        mock_geocode.assert_not_called()
@@ -1,9 +1,19 @@
 import datetime
-
-from django.test import Client, TestCase
-from fastkml import kml
+import io
+import zipfile
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from fastkml import Data, ExtendedData, geometry, kml, styles
+from fastkml.enums import AltitudeMode
+from lxml import etree
+from pygeoif import LineString, Point
 
 from meshapi.models import LOS, Building, Device, Install, Link, Member, Node
+from meshapi.util.kml import KMLStreamWriter, build_placemark
+from meshapi.views.geography import iter_link_folder_kml_chunks, iter_whole_mesh_kml_chunks
 
 
 def create_building_install_node_and_device(member_ref, nn, install_number=None):
@@ -203,7 +213,7 @@ class TestKMLEndpoint(TestCase):
         self.maxDiff = None
         response = self.c.get("/api/v1/geography/whole-mesh.kml")
 
-        kml_doc = kml.KML.class_from_string(response.content.decode("UTF8")).features[0]
+        kml_doc = kml.KML.class_from_string(response.getvalue().decode("UTF8")).features[0]
 
         self.assertEqual(len(kml_doc.styles), 5)
         self.assertEqual(len(kml_doc.features), 2)
@@ -234,3 +244,286 @@ class TestKMLEndpoint(TestCase):
 
         self.assertEqual(len(active_links.features), 4)
         self.assertEqual(len(inactive_links.features), 3)  # 1 inactive link + 2 LOSes
+
+
+class TestKMLStreamWriter(TestCase):
+    def test_placemarks_match_fastkml(self):
+        extended_data = {"name": "Links-1-2", "stroke": "#F00", "fill-opacity": "0", "empty": "", "missing": None}
+        coordinates = [(-73.9, 40.7, 5), (-73.95, 40.71234567891, 12.5)]
+
+        fastkml_placemark = kml.Placemark(
+            name="Links-1-2",
+            style_url=styles.StyleUrl(url="#red_line"),
+            kml_geometry=geometry.LineString(
+                geometry=LineString(coordinates),
+                altitude_mode=AltitudeMode.absolute,
+                extrude=True,
+            ),
+        )
+        fastkml_placemark.extended_data = ExtendedData(
+            elements=[Data(name=key, value=val) for key, val in extended_data.items()]
+        )
+
+        fastkml_point = kml.Placemark(
+            name="3",
+            style_url=styles.StyleUrl(url="#red_dot"),
+            kml_geometry=geometry.Point(geometry=Point(-73.9, 40.7, 5), altitude_mode=AltitudeMode.absolute),
+        )
+        fastkml_point.extended_data = ExtendedData(elements=[Data(name="id", value="3")])
+
+        fastkml_root = kml.KML()
+        fastkml_document = kml.Document("{http://www.opengis.net/kml/2.2}")
+        fastkml_root.append(fastkml_document)
+        fastkml_folder = kml.Folder(name="Links")
+        fastkml_document.append(fastkml_folder)
+        fastkml_folder.append(fastkml_placemark)
+        fastkml_document.append(fastkml_point)
+
+        writer = KMLStreamWriter()
+        with writer.document():
+            with writer.element("Document"):
+                with writer.folder("Links"):
+                    writer.write(build_placemark("Links-1-2", "#red_line", extended_data, coordinates, is_line=True))
+                writer.write(build_placemark("3", "#red_dot", {"id": "3"}, [(-73.9, 40.7, 5)], is_line=False))
+
+        self.assertEqual(writer.final_chunk().decode("utf-8"), fastkml_root.to_string())
+
+    def test_chunks(self):
+        writer = KMLStreamWriter(chunk_size=100)
+        chunks = []
+        with writer.document():
+            with writer.element("Document"):
+                for i in range(10):
+                    writer.write(build_placemark(str(i), "#red_dot", {"id": str(i)}, [(0, 0, 5)], is_line=False))
+                    chunk = writer.take_chunk()
+                    if chunk:
+                        self.assertGreaterEqual(len(chunk), 100)
+                        chunks.append(chunk)
+        chunks.append(writer.final_chunk())
+
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(len(etree.fromstring(b"".join(chunks))[0]), 10)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestKMLEndpointStreaming(TestCase):
+    c = Client()
+
+    def setUp(self):
+        member = Member(name="Stacy Fakename")
+        member.save()
+        for nn in [227, 1934, 713]:
+            create_building_install_node_and_device(member, nn)
+
+    def test_streamed_then_cached(self):
+        with patch("meshapi.util.kml.KML_STREAM_CHUNK_SIZE", 512):
+            response = self.c.get("/api/v1/geography/whole-mesh.kml")
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            streamed_chunks = list(response.streaming_content)
+
+        self.assertGreater(len(streamed_chunks), 1)
+        self.assertEqual(b"".join(streamed_chunks), b"".join(iter_whole_mesh_kml_chunks()))
+
+        # Once the whole file has been sent, it's served from the snapshot
+        response = self.c.get("/api/v1/geography/whole-mesh.kml")
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content, b"".join(streamed_chunks))
+        self.assertEqual(response["Content-Type"], "application/vnd.google-earth.kml+xml; charset=utf-8")
+
+        response = self.c.get("/api/v1/geography/whole-mesh.kml", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+
+class TestKMLQueryCount(TestCase):
+    def setUp(self):
+        self.member = Member(name="Stacy Fakename")
+        self.member.save()
+        self.hub_building, _, _, _ = create_building_install_node_and_device(self.member, 1934)
+
+    def add_los(self, nns):
+        for nn in nns:
+            building, install, _, _ = create_building_install_node_and_device(self.member, nn)
+            # A second install at the same building, which shouldn't be used as the label
+            Install(
+                install_number=nn + 10000,
+                member=self.member,
+                building=building,
+                status=Install.InstallStatus.REQUEST_RECEIVED,
+                request_date=datetime.datetime.now(datetime.timezone.utc),
+            ).save()
+            LOS(
+                from_building=self.hub_building,
+                to_building=building,
+                source=LOS.LOSSource.HUMAN_ANNOTATED,
+                analysis_date=datetime.date(2024, 1, 1),
+            ).save()
+
+    def get_kml(self):
+        with CaptureQueriesContext(connection) as queries:
+            content = b"".join(iter_whole_mesh_kml_chunks())
+        return len(queries), content
+
+    def test_los_query_count_does_not_grow(self):
+        self.add_los([10, 11])
+        small_query_count, small_content = self.get_kml()
+
+        self.add_los(range(20, 40))
+        large_query_count, large_content = self.get_kml()
+
+        self.assertIn(b"<name>Links-1934-10</name>", small_content)
+        self.assertIn(b"<name>Links-1934-39</name>", large_content)
+        self.assertEqual(large_content.count(b"<styleUrl>#grey_line</styleUrl>"), 22)
+        self.assertEqual(small_query_count, large_query_count)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestKMZAndHierarchicalKML(TestCase):
+    c = Client()
+
+    def setUp(self):
+        member = Member(name="Stacy Fakename")
+        member.save()
+
+        _, _, _, active_device = create_building_install_node_and_device(member, 227)
+        building, _, node, other_device = create_building_install_node_and_device(member, 1934)
+        building.city = "Brooklyn"
+        for location in [building, node]:
+            location.latitude = 40.68
+            location.longitude = -73.95
+            location.save()
+        _, inactive_install, _, _ = create_building_install_node_and_device(member, 713)
+        inactive_install.status = Install.InstallStatus.INACTIVE
+        inactive_install.save()
+
+        Link(
+            from_device=active_device,
+            to_device=other_device,
+            status=Link.LinkStatus.ACTIVE,
+            type=Link.LinkType.FIVE_GHZ,
+        ).save()
+
+    def test_kmz(self):
+        response = self.c.get("/api/v1/geography/whole-mesh.kmz", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/vnd.google-earth.kmz")
+        # A zip archive is already compressed
+        self.assertNotIn("Content-Encoding", response)
+
+        with zipfile.ZipFile(io.BytesIO(response.content)) as kmz:
+            self.assertEqual(kmz.namelist(), ["doc.kml"])
+            self.assertEqual(kmz.read("doc.kml"), b"".join(iter_whole_mesh_kml_chunks()))
+
+        response = self.c.get("/api/v1/geography/whole-mesh.kmz", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def get_kml(self, path):
+        response = self.c.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/vnd.google-earth.kml+xml; charset=utf-8")
+        return etree.fromstring(response.getvalue())
+
+    def test_index(self):
+        index = self.get_kml("/api/v1/geography/whole-mesh/index.kml")
+        namespaces = {"kml": "http://www.opengis.net/kml/2.2"}
+
+        network_links = {
+            network_link.findtext("kml:Link/kml:href", namespaces=namespaces): network_link
+            for network_link in index.iterfind(".//kml:NetworkLink", namespaces)
+        }
+        # Only the folders with something in them
+        self.assertEqual(
+            set(network_links.keys()),
+            {"nodes/active/other.kml", "nodes/active/brooklyn.kml", "nodes/inactive/other.kml", "links/active.kml"},
+        )
+
+        brooklyn = network_links["nodes/active/brooklyn.kml"]
+        self.assertEqual(brooklyn.findtext("kml:name", namespaces=namespaces), "Brooklyn")
+        box = brooklyn.find("kml:Region/kml:LatLonAltBox", namespaces)
+        self.assertAlmostEqual(float(box.findtext("kml:north", namespaces=namespaces)), 40.685)
+        self.assertAlmostEqual(float(box.findtext("kml:west", namespaces=namespaces)), -73.955)
+        self.assertEqual(brooklyn.findtext("kml:Region/kml:Lod/kml:minLodPixels", namespaces=namespaces), "128")
+        self.assertEqual(
+            network_links["nodes/inactive/other.kml"].findtext(
+                "kml:Region/kml:Lod/kml:minLodPixels", namespaces=namespaces
+            ),
+            "512",
+        )
+
+        # The link runs from the "Other" folder's node at 0,0 to Brooklyn
+        box = network_links["links/active.kml"].find("kml:Region/kml:LatLonAltBox", namespaces)
+        self.assertAlmostEqual(float(box.findtext("kml:south", namespaces=namespaces)), -0.005)
+        self.assertAlmostEqual(float(box.findtext("kml:north", namespaces=namespaces)), 40.685)
+
+    def test_folder_documents(self):
+        namespaces = {"kml": "http://www.opengis.net/kml/2.2"}
+        styles = self.get_kml("/api/v1/geography/whole-mesh/styles.kml")
+        self.assertEqual(
+            [style.get("id") for style in styles.iterfind("kml:Document/kml:Style", namespaces)],
+            ["grey_dot", "red_dot", "red_line", "grey_line", "dark_grey_line"],
+        )
+
+        brooklyn = self.get_kml("/api/v1/geography/whole-mesh/nodes/active/brooklyn.kml")
+        self.assertEqual(
+            [
+                (
+                    placemark.findtext("kml:name", namespaces=namespaces),
+                    placemark.findtext("kml:styleUrl", namespaces=namespaces),
+                )
+                for placemark in brooklyn.iterfind(".//kml:Placemark", namespaces)
+            ],
+            [("1934", "../../styles.kml#red_dot"), ("1934", "../../styles.kml#grey_dot")],
+        )
+
+        inactive = self.get_kml("/api/v1/geography/whole-mesh/nodes/inactive/other.kml")
+        self.assertEqual(
+            [
+                placemark.findtext("kml:name", namespaces=namespaces)
+                for placemark in inactive.iterfind(".//kml:Placemark", namespaces)
+            ],
+            ["713", "713"],
+        )
+
+        links = self.get_kml("/api/v1/geography/whole-mesh/links/active.kml")
+        self.assertEqual(
+            [
+                placemark.findtext("kml:styleUrl", namespaces=namespaces)
+                for placemark in links.iterfind(".//kml:Placemark", namespaces)
+            ],
+            ["../styles.kml#red_line"],
+        )
+        self.assertEqual(len(self.get_kml("/api/v1/geography/whole-mesh/links/inactive.kml")[0]), 1)
+
+        # Each document is cached separately
+        response = self.c.get("/api/v1/geography/whole-mesh/nodes/active/brooklyn.kml")
+        self.assertFalse(response.streaming)
+        response = self.c.get(
+            "/api/v1/geography/whole-mesh/nodes/active/brooklyn.kml", HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_folder(self):
+        for path in [
+            "/api/v1/geography/whole-mesh/nodes/active/hoboken.kml",
+            "/api/v1/geography/whole-mesh/nodes/pending/brooklyn.kml",
+            "/api/v1/geography/whole-mesh/links/pending.kml",
+        ]:
+            self.assertEqual(self.c.get(path).status_code, 404, path)
+
+    def test_inactive_links_skip_los_duplicating_active_links(self):
+        LOS(
+            from_building=Building.objects.get(installs__install_number=227),
+            to_building=Building.objects.get(installs__install_number=1934),
+            source=LOS.LOSSource.HUMAN_ANNOTATED,
+            analysis_date=datetime.date(2024, 1, 1),
+        ).save()
+        LOS(
+            from_building=Building.objects.get(installs__install_number=227),
+            to_building=Building.objects.get(installs__install_number=713),
+            source=LOS.LOSSource.HUMAN_ANNOTATED,
+            analysis_date=datetime.date(2024, 1, 1),
+        ).save()
+
+        content = b"".join(iter_link_folder_kml_chunks(False))
+        self.assertNotIn(b"Links-227-1934", content)
+        self.assertIn(b"Links-227-713", content)
@@ -1,15 +1,135 @@
 import datetime
+import gzip
+import itertools
 import json
+import os
+import tempfile
 import uuid
 from unittest.mock import patch
 
+import brotli
+import requests
 import requests_mock
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Prefetch, Q
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from flags.state import disable_flag, enable_flag
+from rest_framework.renderers import JSONRenderer
 
 from meshapi.models import LOS, AccessPoint, Building, Device, Install, Link, Member, Node, Sector
-from meshapi.serializers import JavascriptDateField, JavascriptDatetimeField, MapDataLinkSerializer
+from meshapi.models.util.spatial import MAX_TILE_LATITUDE, BoundingBox, WithinBoundingBox
+from meshapi.serializers import (
+    EXCLUDED_INSTALL_STATUSES,
+    JavascriptDateField,
+    JavascriptDatetimeField,
+    MapDataInstallSerializer,
+    MapDataLinkSerializer,
+)
 from meshapi.tests.sample_kiosk_data import SAMPLE_OPENDATA_NYC_LINKNYC_KIOSK_RESPONSE
-from meshapi.views import LINKNYC_KIOSK_DATA_URL
+from meshapi.util import kiosks
+from meshapi.util.drf_renderer import iter_json_array_chunks
+from meshapi.util.kiosks import LINKNYC_KIOSK_DATA_URL, get_kiosk_list, refresh_kiosk_list
+from meshapi.util.map_data import build_map_node_data
+from meshapi.util.snapshot_cache import choose_content_encoding
+
+
+def legacy_map_node_list():
+    """
+    The website map's list of "nodes" as MapDataNodeList used to build it, to be run through
+    MapDataInstallSerializer. This is the reference for the output of the set-wise builder in
+    meshapi.util.map_data, which is far faster but much harder to read
+    """
+    all_installs = []
+
+    queryset = (
+        Install.objects.select_related("building")
+        .select_related("node")
+        .prefetch_related("node__installs")
+        .prefetch_related("node__devices")
+        .filter(~Q(status__in=EXCLUDED_INSTALL_STATUSES))
+    )
+
+    for install in queryset:
+        all_installs.append(install)
+
+    # We need to make sure there is an entry on the map for every NN, and since we excluded the
+    # NN assigned rows in the query above, we need to go through the Node objects and
+    # include the nns we haven't already covered via install num
+    covered_nns = {install.install_number for install in all_installs}
+    for node in (
+        Node.objects.filter(~Q(status=Node.NodeStatus.INACTIVE))
+        .prefetch_related("devices")
+        .prefetch_related("installs")
+        .prefetch_related("buildings")
+        .prefetch_related(
+            Prefetch(
+                "installs",
+                queryset=Install.objects.all().select_related("building"),
+                to_attr="prefetched_installs",
+            )
+        )
+        .prefetch_related(
+            Prefetch(
+                "installs",
+                queryset=Install.objects.filter(status=Install.InstallStatus.ACTIVE).select_related("building"),
+                to_attr="active_installs",
+            )
+        )
+    ):
+        if node.network_number and node.network_number not in covered_nns:
+            # Arbitrarily pick a representative install for the details of the "Fake" node,
+            # preferring active installs if possible
+            try:
+                representative_install = (
+                    node.active_installs  # type: ignore[attr-defined]
+                    or node.prefetched_installs  # type: ignore[attr-defined]
+                )[0]
+            except IndexError:
+                representative_install = None
+
+            if representative_install:
+                building = representative_install.building
+            else:
+                building = node.buildings.first()
+
+            if not building:
+                # If we couldn't get a building from the install or node,
+                # make a faux one instead, to carry the lat/lon info into the serializer
+                building = Building(
+                    latitude=node.latitude,
+                    longitude=node.longitude,
+                    altitude=node.altitude,
+                )
+
+            request_date = datetime.datetime.fromtimestamp(0)
+            if representative_install:
+                request_date = representative_install.request_date
+            elif node.install_date:
+                request_date = datetime.datetime.combine(
+                    node.install_date,
+                    datetime.datetime.min.time(),
+                )
+
+            all_installs.append(
+                Install(
+                    install_number=node.network_number,
+                    node=node,
+                    status=(
+                        Install.InstallStatus.NN_REASSIGNED
+                        if node.status == node.NodeStatus.ACTIVE
+                        else Install.InstallStatus.REQUEST_RECEIVED
+                    ),
+                    building=building,
+                    request_date=request_date,
+                    roof_access=representative_install.roof_access if representative_install else True,
+                ),
+            )
+            covered_nns.add(node.network_number)
+
+    all_installs.sort(key=lambda i: i.install_number)
+    return all_installs
 
 
 class TestViewsGetUnauthenticated(TestCase):
@@ -1345,6 +1465,89 @@ class TestViewsGetUnauthenticated(TestCase):
             ],
         )
 
+    def test_reversed_links_and_los_are_deduplicated(self):
+        member = Member(name="Fake Name")
+        member.save()
+
+        devices = {}
+        buildings = {}
+        for network_number in [101, 102]:
+            node = Node(network_number=network_number, status=Node.NodeStatus.ACTIVE, latitude=0, longitude=0)
+            node.save()
+            devices[network_number] = [
+                Device(node=node, status=Device.DeviceStatus.ACTIVE),
+                Device(node=node, status=Device.DeviceStatus.ACTIVE),
+            ]
+            for device in devices[network_number]:
+                device.save()
+
+            buildings[network_number] = Building(address_truth_sources=[], latitude=0, longitude=0)
+            buildings[network_number].save()
+            buildings[network_number].nodes.add(node)
+            Install(
+                install_number=network_number,
+                status=Install.InstallStatus.ACTIVE,
+                request_date=datetime.datetime(2015, 3, 15).astimezone(datetime.timezone.utc),
+                node=node,
+                member=member,
+                building=buildings[network_number],
+            ).save()
+
+        # The lowest pk is inactive, so the next link for the pair (in the other direction) takes its place
+        Link(
+            id=uuid.UUID("00000000-0000-0000-0000-000000000001"),
+            from_device=devices[101][0],
+            to_device=devices[102][0],
+            status=Link.LinkStatus.INACTIVE,
+            type=Link.LinkType.FIVE_GHZ,
+        ).save()
+        Link(
+            id=uuid.UUID("00000000-0000-0000-0000-000000000002"),
+            from_device=devices[102][1],
+            to_device=devices[101][1],
+            status=Link.LinkStatus.ACTIVE,
+            type=Link.LinkType.SIXTY_GHZ,
+        ).save()
+        Link(
+            id=uuid.UUID("00000000-0000-0000-0000-000000000003"),
+            from_device=devices[101][1],
+            to_device=devices[102][0],
+            status=Link.LinkStatus.ACTIVE,
+            type=Link.LinkType.FIVE_GHZ,
+        ).save()
+
+        other_building = Building(address_truth_sources=[], latitude=0, longitude=0)
+        other_building.save()
+        Install(
+            install_number=103,
+            status=Install.InstallStatus.REQUEST_RECEIVED,
+            request_date=datetime.datetime(2015, 3, 15).astimezone(datetime.timezone.utc),
+            member=member,
+            building=other_building,
+        ).save()
+        for los_id, from_building, to_building in [
+            ("00000000-0000-0000-0000-000000000004", buildings[101], other_building),
+            ("00000000-0000-0000-0000-000000000005", other_building, buildings[101]),
+        ]:
+            LOS(
+                id=uuid.UUID(los_id),
+                from_building=from_building,
+                to_building=to_building,
+                source=LOS.LOSSource.HUMAN_ANNOTATED,
+                analysis_date=datetime.date(2024, 1, 1),
+            ).save()
+
+        self.maxDiff = None
+        response = self.c.get("/api/v1/mapdata/links/")
+
+        self.assertEqual(
+            json.loads(response.content.decode("UTF8")),
+            [
+                {"from": 102, "to": 101, "status": "60GHz"},
+                {"from": 101, "to": 103, "status": "planned"},
+            ],
+        )
+
     def test_cable_run_links_to_invalid_nodes_are_not_created(self):
         links = []
 
@@ -1711,15 +1914,94 @@ class TestViewsGetUnauthenticated(TestCase):
             ],
         )
 
+    def test_link_query_count_does_not_grow_with_mesh(self):
+        member = Member(name="Fake Name")
+        member.save()
 
+        # Number these ourselves, so that we don't use up the install number sequence other tests rely on
+        install_numbers = itertools.count(5000)
+
+        def add_links_between_nodes_without_nns(count):
+            for _ in range(count):
+                devices = []
+                for _ in range(2):
+                    node = Node(status=Node.NodeStatus.PLANNED, latitude=0, longitude=0)
+                    node.save()
+                    building = Building(address_truth_sources=[], latitude=0, longitude=0)
+                    building.save()
+                    building.nodes.add(node)
+                    Install(
+                        install_number=next(install_numbers),
+                        status=Install.InstallStatus.REQUEST_RECEIVED,
+                        request_date=datetime.datetime(2024, 1, 27).astimezone(datetime.timezone.utc),
+                        node=node,
+                        member=member,
+                        building=building,
+                    ).save()
+                    device = Device(node=node, status=Device.DeviceStatus.ACTIVE)
+                    device.save()
+                    devices.append(device)
+
+                Link(
+                    from_device=devices[0],
+                    to_device=devices[1],
+                    status=Link.LinkStatus.PLANNED,
+                    type=Link.LinkType.FIVE_GHZ,
+                ).save()
+
+        def get_links():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.c.get("/api/v1/mapdata/links/")
+            return len(queries), json.loads(response.content.decode("UTF8"))
+
+        add_links_between_nodes_without_nns(2)
+        small_query_count, small_links = get_links()
+
+        add_links_between_nodes_without_nns(8)
+        large_query_count, large_links = get_links()
+
+        self.assertEqual(len(small_links), 2)
+        self.assertEqual(len(large_links), 10)
+        self.assertTrue(all(link["from"] and link["to"] for link in large_links))
+        self.assertEqual(small_query_count, large_query_count)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
 class TestKiosk(TestCase):
     c = Client()
 
+    def setUp(self):
+        cache.clear()
+        kiosks._local_kiosk_list = None
+
+        snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        self.snapshot_path = os.path.join(snapshot_dir.name, "kiosks.json")
+        snapshot_path_patch = patch("meshapi.util.kiosks.LINKNYC_KIOSK_SNAPSHOT_PATH", self.snapshot_path)
+        snapshot_path_patch.start()
+        self.addCleanup(snapshot_path_patch.stop)
+
+        schedule_refresh_patch = patch("meshapi.util.kiosks.refresh_kiosk_list_task.apply_async")
+        self.mock_schedule_refresh = schedule_refresh_patch.start()
+        self.addCleanup(schedule_refresh_patch.stop)
+
+    def get_kiosks_first_time(self, city_api_call_request_mocker):
+        # With no list yet, the client is asked to come back while we fetch it in the background
+        response = self.c.get("/api/v1/mapdata/kiosks/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "5")
+        self.assertEqual(city_api_call_request_mocker.call_count, 0)
+        self.mock_schedule_refresh.assert_called_once()
+
+        kiosks.refresh_kiosk_list_task()
+        self.mock_schedule_refresh.reset_mock()
+        return self.c.get("/api/v1/mapdata/kiosks/")
+
     @requests_mock.Mocker()
     def test_kiosk_list_good_state(self, city_api_call_request_mocker):
         city_api_call_request_mocker.get(LINKNYC_KIOSK_DATA_URL, json=SAMPLE_OPENDATA_NYC_LINKNYC_KIOSK_RESPONSE)
 
-        response = self.c.get("/api/v1/mapdata/kiosks/")
+        response = self.get_kiosks_first_time(city_api_call_request_mocker)
         self.assertEqual(
             200,
             response.status_code,
@@ -1735,7 +2017,7 @@ class TestKiosk(TestCase):
         # raise Exceptions
         city_api_call_request_mocker.get(LINKNYC_KIOSK_DATA_URL, json=[{}])
 
-        response = self.c.get("/api/v1/mapdata/kiosks/")
+        response = self.get_kiosks_first_time(city_api_call_request_mocker)
         self.assertEqual(
             200,
             response.status_code,
@@ -1748,33 +2030,153 @@ class TestKiosk(TestCase):
     def test_kiosk_list_bad_fetch(self, city_api_call_request_mocker):
         city_api_call_request_mocker.get(LINKNYC_KIOSK_DATA_URL, status_code=500)
 
-        response = self.c.get("/api/v1/mapdata/kiosks/")
+        response = self.get_kiosks_first_time(city_api_call_request_mocker)
         self.assertEqual(
-            502,
+            503,
             response.status_code,
-            f"status code incorrect, should be 200, but got {response.status_code}",
-        )
-        self.assertEqual(
-            json.loads(response.content.decode("UTF8")), {"detail": "Error fetching data from City of New York"}
+            f"status code incorrect, should be 503, but got {response.status_code}",
         )
+        self.assertIsNone(get_kiosk_list())
+
+        # Not tried again until the debounce is up, rather than on every request while the city is down
+        self.mock_schedule_refresh.assert_not_called()
+        self.assertEqual(city_api_call_request_mocker.call_count, 1)
 
     @requests_mock.Mocker()
     def test_kiosk_list_bad_response(self, city_api_call_request_mocker):
         bad_responses = [[], [{"blah": "abc"}]]
 
         for bad_response in bad_responses:
+            cache.clear()
+            self.mock_schedule_refresh.reset_mock()
+            city_api_call_request_mocker.reset_mock()
             city_api_call_request_mocker.get(LINKNYC_KIOSK_DATA_URL, json=bad_response)
 
-            response = self.c.get("/api/v1/mapdata/kiosks/")
+            response = self.get_kiosks_first_time(city_api_call_request_mocker)
             self.assertEqual(
-                502,
+                503,
                 response.status_code,
-                f"status code incorrect, should be 200, but got {response.status_code}",
-            )
-            self.assertEqual(
-                json.loads(response.content.decode("UTF8")),
-                {"detail": "Invalid response received from City of New York"},
+                f"status code incorrect, should be 503, but got {response.status_code}",
             )
+            self.assertIsNone(get_kiosk_list())
+
+    @requests_mock.Mocker()
+    def test_kiosk_list_served_without_the_city(self, city_api_call_request_mocker):
+        city_api_call_request_mocker.get(LINKNYC_KIOSK_DATA_URL, json=SAMPLE_OPENDATA_NYC_LINKNYC_KIOSK_RESPONSE)
+        first_response = self.get_kiosks_first_time(city_api_call_request_mocker)
+        self.assertEqual(first_response.status_code, 200)
+
+        # Only the first fetch (with nothing cached) should have gone to the city
+        city_api_call_request_mocker.get(LINKNYC_KIOSK_DATA_URL, status_code=500)
+        response = self.c.get("/api/v1/mapdata/kiosks/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, first_response.content)
+        self.assertEqual(city_api_call_request_mocker.call_count, 1)
+        self.assertNotIn("Warning", response)
+        self.mock_schedule_refresh.assert_not_called()
+
+        response = self.c.get("/api/v1/mapdata/kiosks/", HTTP_IF_NONE_MATCH=first_response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    @requests_mock.Mocker()
+    def test_kiosk_list_from_disk(self, city_api_call_request_mocker):
+        city_api_call_request_mocker.get(LINKNYC_KIOSK_DATA_URL, json=SAMPLE_OPENDATA_NYC_LINKNYC_KIOSK_RESPONSE)
+        refresh_kiosk_list()
+        self.assertTrue(os.path.exists(self.snapshot_path))
+
+        # Lose the cache (and this worker's copy), we should fall back to the last list written to disk
+        cache.clear()
+        kiosks._local_kiosk_list = None
+        city_api_call_request_mocker.get(LINKNYC_KIOSK_DATA_URL, status_code=500)
+
+        response = self.c.get("/api/v1/mapdata/kiosks/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content.decode("UTF8"))), 7)
+        self.assertEqual(city_api_call_request_mocker.call_count, 1)
+
+        # And put it back in the cache for everyone else
+        kiosks._local_kiosk_list = None
+        with patch("meshapi.util.kiosks._read_kiosk_list_file") as mock_read_file:
+            self.assertIsNotNone(get_kiosk_list())
+            mock_read_file.assert_not_called()
+
+    @requests_mock.Mocker()
+    def test_kiosk_list_conditional_refresh(self, city_api_call_request_mocker):
+        city_api_call_request_mocker.get(
+            LINKNYC_KIOSK_DATA_URL,
+            json=SAMPLE_OPENDATA_NYC_LINKNYC_KIOSK_RESPONSE,
+            headers={"ETag": '"v1"', "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"},
+        )
+        first = refresh_kiosk_list()
+
+        city_api_call_request_mocker.get(LINKNYC_KIOSK_DATA_URL, status_code=304)
+        second = refresh_kiosk_list()
+
+        request_headers = city_api_call_request_mocker.last_request.headers
+        self.assertEqual(request_headers["If-None-Match"], '"v1"')
+        self.assertEqual(request_headers["If-Modified-Since"], "Wed, 01 Jan 2025 00:00:00 GMT")
+        self.assertEqual(second.snapshot, first.snapshot)
+        self.assertGreater(second.refreshed_at, first.refreshed_at)
+
+        # Other workers pick up the new refresh time without re-reading the list
+        kiosks._local_kiosk_list = first
+        self.assertEqual(get_kiosk_list().refreshed_at, second.refreshed_at)
+
+    @requests_mock.Mocker()
+    def test_kiosk_list_stale(self, city_api_call_request_mocker):
+        city_api_call_request_mocker.get(LINKNYC_KIOSK_DATA_URL, json=SAMPLE_OPENDATA_NYC_LINKNYC_KIOSK_RESPONSE)
+        refresh_kiosk_list()
+
+        # The city goes down for a day
+        city_api_call_request_mocker.get(LINKNYC_KIOSK_DATA_URL, exc=requests.exceptions.ConnectTimeout)
+        with self.assertRaises(requests.exceptions.ConnectTimeout):
+            refresh_kiosk_list()
+
+        tomorrow = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+        with patch("django.utils.timezone.now", return_value=tomorrow):
+            response = self.c.get("/api/v1/mapdata/kiosks/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content.decode("UTF8"))), 7)
+        self.assertEqual(response["Warning"], '110 - "Response is Stale"')
+
+        # Which we try to fix in the background, but not on every request
+        with patch("django.utils.timezone.now", return_value=tomorrow):
+            self.c.get("/api/v1/mapdata/kiosks/")
+        self.mock_schedule_refresh.assert_called_once()
+
+    @requests_mock.Mocker()
+    def test_kiosk_list_refreshed_in_the_background(self, city_api_call_request_mocker):
+        city_api_call_request_mocker.get(LINKNYC_KIOSK_DATA_URL, json=SAMPLE_OPENDATA_NYC_LINKNYC_KIOSK_RESPONSE)
+        first = refresh_kiosk_list()
+
+        # Without the hourly task, the next request after an hour is still served straight away, but
+        # kicks off a refresh
+        later = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=2)
+        with patch("django.utils.timezone.now", return_value=later):
+            response = self.c.get("/api/v1/mapdata/kiosks/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Warning", response)
+        self.assertEqual(city_api_call_request_mocker.call_count, 1)
+        self.mock_schedule_refresh.assert_called_once()
+
+        city_api_call_request_mocker.get(LINKNYC_KIOSK_DATA_URL, json=SAMPLE_OPENDATA_NYC_LINKNYC_KIOSK_RESPONSE[:3])
+        kiosks.refresh_kiosk_list_task()
+        response = self.c.get("/api/v1/mapdata/kiosks/")
+        self.assertEqual(len(json.loads(response.content.decode("UTF8"))), 3)
+        self.assertGreater(get_kiosk_list().refreshed_at, first.refreshed_at)
+
+    @requests_mock.Mocker()
+    def test_kiosk_list_first_fetch_in_progress(self, city_api_call_request_mocker):
+        city_api_call_request_mocker.get(LINKNYC_KIOSK_DATA_URL, json=SAMPLE_OPENDATA_NYC_LINKNYC_KIOSK_RESPONSE)
+
+        # Somebody else already had the list fetched for the first time
+        self.assertTrue(kiosks.claim_kiosk_list_refresh())
+        response = self.c.get("/api/v1/mapdata/kiosks/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "5")
+        self.assertEqual(city_api_call_request_mocker.call_count, 0)
+        self.mock_schedule_refresh.assert_not_called()
 
 
 class TestNodeWithoutInstallDoesntCrash(TestCase):
@@ -1824,6 +2226,516 @@ class TestNodeWithoutInstallDoesntCrash(TestCase):
         )
 
 
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestMapDataSnapshotCache(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.node = Node(
+            network_number=123,
+            latitude=40.724868,
+            longitude=-73.987881,
+            altitude=37.0,
+            status=Node.NodeStatus.ACTIVE,
+            install_date=datetime.date(2024, 12, 1),
+        )
+        self.node.save()
+
+    def test_snapshot_served_with_etag(self):
+        for route in ["/api/v1/mapdata/nodes/", "/api/v1/mapdata/links/", "/api/v1/mapdata/sectors/"]:
+            response = self.client.get(route)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Type"], "application/json")
+            self.assertTrue(response["ETag"].startswith('"'))
+
+            with CaptureQueriesContext(connection) as queries:
+                cached_response = self.client.get(route)
+
+            self.assertEqual(cached_response.status_code, 200)
+            self.assertEqual(cached_response.content, response.content)
+            self.assertEqual(cached_response["ETag"], response["ETag"])
+            self.assertFalse(any("meshapi_" in query["sql"] for query in queries.captured_queries))
+
+    def test_if_none_match_returns_304(self):
+        response = self.client.get("/api/v1/mapdata/nodes/")
+        self.assertEqual(response.status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            not_modified_response = self.client.get("/api/v1/mapdata/nodes/", HTTP_IF_NONE_MATCH=response["ETag"])
+
+        self.assertEqual(not_modified_response.status_code, 304)
+        self.assertEqual(not_modified_response.content, b"")
+        self.assertEqual(not_modified_response["ETag"], response["ETag"])
+        self.assertFalse(any("meshapi_" in query["sql"] for query in queries.captured_queries))
+
+        response = self.client.get("/api/v1/mapdata/nodes/", HTTP_IF_NONE_MATCH='"some-other-etag"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_snapshot_invalidated_by_model_changes(self):
+        response = self.client.get("/api/v1/mapdata/nodes/")
+        self.assertEqual([node["id"] for node in json.loads(response.content)], [123])
+
+        node2 = Node(
+            network_number=124,
+            latitude=40.724868,
+            longitude=-73.987881,
+            status=Node.NodeStatus.PLANNED,
+        )
+        node2.save()
+
+        updated_response = self.client.get("/api/v1/mapdata/nodes/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(updated_response.status_code, 200)
+        self.assertNotEqual(updated_response["ETag"], response["ETag"])
+        self.assertEqual([node["id"] for node in json.loads(updated_response.content)], [123, 124])
+
+        node2.delete()
+
+        response = self.client.get("/api/v1/mapdata/nodes/", HTTP_IF_NONE_MATCH=updated_response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([node["id"] for node in json.loads(response.content)], [123])
+
+    def test_snapshot_invalidated_by_m2m_changes(self):
+        building = Building(
+            address_truth_sources=[],
+            latitude=40.724868,
+            longitude=-73.987881,
+        )
+        building.save()
+
+        response = self.client.get("/api/v1/mapdata/links/")
+        self.assertEqual(response.status_code, 200)
+
+        with patch("meshapi.util.events.snapshot_invalidation.invalidate_snapshots") as mock_invalidate:
+            building.nodes.add(self.node)
+
+        mock_invalidate.assert_called()
+
+    def test_cache_outage_falls_back_to_database(self):
+        with patch("meshapi.util.snapshot_cache.cache.get", side_effect=ConnectionError("Redis is down")):
+            response = self.client.get("/api/v1/mapdata/nodes/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([node["id"] for node in json.loads(response.content)], [123])
+
+    def test_compressed_variants(self):
+        # Big enough to be worth compressing
+        for network_number in range(200, 220):
+            Node(network_number=network_number, latitude=40.7, longitude=-73.9, status=Node.NodeStatus.ACTIVE).save()
+
+        response = self.client.get("/api/v1/mapdata/nodes/")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+        gzip_response = self.client.get("/api/v1/mapdata/nodes/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(gzip_response.status_code, 200)
+        self.assertEqual(gzip_response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", gzip_response["Vary"])
+        self.assertEqual(gzip_response["ETag"], response["ETag"][:-1] + '-gzip"')
+        self.assertEqual(gzip.decompress(gzip_response.content), response.content)
+
+        brotli_response = self.client.get("/api/v1/mapdata/nodes/", HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+        self.assertEqual(brotli_response["Content-Encoding"], "br")
+        self.assertEqual(brotli_response["ETag"], response["ETag"][:-1] + '-br"')
+        self.assertEqual(brotli.decompress(brotli_response.content), response.content)
+
+        # The compressed variant is only built once, even across invalidations which don't change the content
+        self.node.save()
+        with patch("meshapi.util.snapshot_cache.compress_content") as mock_compress:
+            cached_response = self.client.get("/api/v1/mapdata/nodes/", HTTP_ACCEPT_ENCODING="gzip")
+            not_modified_response = self.client.get(
+                "/api/v1/mapdata/nodes/", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=gzip_response["ETag"]
+            )
+
+        mock_compress.assert_not_called()
+        self.assertEqual(cached_response.content, gzip_response.content)
+        self.assertEqual(not_modified_response.status_code, 304)
+
+    def test_small_snapshots_not_compressed(self):
+        response = self.client.get("/api/v1/mapdata/nodes/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_choose_content_encoding(self):
+        def choose(accept_encoding):
+            return choose_content_encoding(RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding))
+
+        self.assertEqual(choose("gzip, deflate, br"), "br")
+        self.assertEqual(choose("*"), "br")
+        self.assertEqual(choose("gzip;q=0.5, br;q=0"), "gzip")
+        self.assertEqual(choose("gzip;q=0, br;q=0"), None)
+        self.assertEqual(choose("identity"), None)
+        self.assertEqual(choose(""), None)
+
+
+class TestMapDataNodeBuilder(TestCase):
+    def setUp(self):
+        member = Member(name="Fake Name")
+        member.save()
+
+        def make_building(lat, lon, panoramas=(), nodes=()):
+            building = Building(
+                address_truth_sources=[],
+                latitude=lat,
+                longitude=lon,
+                altitude=10,
+                panoramas=list(panoramas),
+                primary_node=nodes[0] if nodes else None,
+            )
+            building.save()
+            for node in nodes:
+                building.nodes.add(node)
+            return building
+
+        def make_install(install_number, building, status, node=None, **kwargs):
+            install = Install(
+                install_number=install_number,
+                building=building,
+                status=status,
+                node=node,
+                member=member,
+                request_date=datetime.datetime(2023, 1, install_number % 28 + 1, 12).astimezone(datetime.timezone.utc),
+                roof_access=install_number % 2 == 0,
+                **kwargs,
+            )
+            install.save()
+            return install
+
+        # NN matches an install number, with a couple of omnis
+        hub = Node(
+            network_number=101,
+            name="Hub",
+            type=Node.NodeType.HUB,
+            status=Node.NodeStatus.ACTIVE,
+            latitude=40.1,
+            longitude=-73.1,
+            altitude=50,
+        )
+        hub.save()
+        Device(node=hub, name="nycmesh-101-omni", status=Device.DeviceStatus.ACTIVE).save()
+        Device(node=hub, name="nycmesh-101-OMNI2", status=Device.DeviceStatus.INACTIVE).save()
+        Device(node=hub, name="nycmesh-101-lbe", status=Device.DeviceStatus.ACTIVE).save()
+        hub_building = make_building(
+            40.11,
+            -73.11,
+            ["https://node-db.netlify.app/panoramas/101.jpg", "https://node-db.netlify.app/panoramas/101a.jpg"],
+            [hub],
+        )
+        make_install(101, hub_building, Install.InstallStatus.ACTIVE, hub, install_date=datetime.date(2020, 1, 1))
+        make_install(5001, hub_building, Install.InstallStatus.PENDING, hub)
+        make_install(5002, hub_building, Install.InstallStatus.CLOSED, hub)
+
+        # NN doesn't match any (non-closed) install, so a fake install is generated from the active one
+        reassigned = Node(
+            network_number=102,
+            name="Reassigned",
+            status=Node.NodeStatus.ACTIVE,
+            latitude=40.2,
+            longitude=-73.2,
+        )
+        reassigned.save()
+        reassigned_building = make_building(40.21, -73.21, ["https://node-db.netlify.app/panoramas/102.jpg"])
+        make_install(5003, reassigned_building, Install.InstallStatus.ACTIVE, reassigned)
+        make_install(5004, reassigned_building, Install.InstallStatus.INACTIVE, reassigned)
+        make_install(102, reassigned_building, Install.InstallStatus.NN_REASSIGNED, reassigned)
+
+        # A planned node without an NN, the lowest install number becomes the node dot
+        planned = Node(
+            name="Planned",
+            type=Node.NodeType.SUPERNODE,
+            status=Node.NodeStatus.PLANNED,
+            latitude=40.3,
+            longitude=-73.3,
+        )
+        planned.save()
+        Device(node=planned, name="planned omni", status=Device.DeviceStatus.POTENTIAL).save()
+        planned_building = make_building(40.31, -73.31, nodes=[planned])
+        make_install(5006, planned_building, Install.InstallStatus.REQUEST_RECEIVED, planned)
+        make_install(5005, planned_building, Install.InstallStatus.BLOCKED, planned)
+        make_install(5000, planned_building, Install.InstallStatus.CLOSED, planned)
+
+        # Nodes with buildings but no installs, and with neither
+        lonely = Node(
+            network_number=103,
+            name="Lonely",
+            status=Node.NodeStatus.PLANNED,
+            latitude=40.4,
+            longitude=-73.4,
+            install_date=datetime.date(2022, 6, 1),
+        )
+        lonely.save()
+        make_building(40.41, -73.41, ["https://node-db.netlify.app/panoramas/103.png"], [lonely])
+        make_building(40.42, -73.42, ["https://node-db.netlify.app/panoramas/103b.png"], [lonely])
+        Node(network_number=104, status=Node.NodeStatus.ACTIVE, latitude=40.5, longitude=-73.5).save()
+
+        # Inactive nodes don't get a fake install, but their installs still show up
+        inactive = Node(network_number=105, status=Node.NodeStatus.INACTIVE, latitude=40.6, longitude=-73.6)
+        inactive.save()
+        make_install(5007, make_building(40.61, -73.61), Install.InstallStatus.INACTIVE, inactive)
+
+        # No node at all
+        make_install(5008, make_building(40.71, -73.71), Install.InstallStatus.REQUEST_RECEIVED)
+
+    def test_builder_matches_serializer(self):
+        self.maxDiff = None
+        expected = JSONRenderer().render(MapDataInstallSerializer(legacy_map_node_list(), many=True).data)
+        actual = JSONRenderer().render(build_map_node_data())
+        self.assertEqual(json.loads(expected), json.loads(actual))
+        self.assertEqual(expected, actual)
+
+    def test_builder_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as queries:
+            build_map_node_data()
+
+        self.assertLessEqual(len(queries), 5)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestMapDataStreaming(TestCase):
+    def setUp(self):
+        cache.clear()
+        enable_flag("STREAM_MAP_DATA")
+
+        member = Member(name="Fake Name")
+        member.save()
+        for network_number in range(100, 110):
+            node = Node(
+                network_number=network_number,
+                name=f"Node \u2028{network_number}",
+                status=Node.NodeStatus.ACTIVE,
+                latitude=40.1,
+                longitude=-73.1,
+            )
+            node.save()
+            building = Building(
+                address_truth_sources=[],
+                latitude=40.11,
+                longitude=-73.11,
+                panoramas=[f"https://node-db.netlify.app/panoramas/{network_number}.jpg"],
+            )
+            building.save()
+            Install(
+                install_number=network_number,
+                status=Install.InstallStatus.ACTIVE,
+                request_date=datetime.datetime(2024, 1, 27).astimezone(datetime.timezone.utc),
+                node=node,
+                member=member,
+                building=building,
+            ).save()
+
+    def get_unstreamed_content(self, route):
+        disable_flag("STREAM_MAP_DATA")
+        cache.clear()
+        response = self.client.get(route)
+        enable_flag("STREAM_MAP_DATA")
+        cache.clear()
+        return response.content
+
+    def test_stale_snapshot_is_streamed_then_cached(self):
+        for route in ["/api/v1/mapdata/nodes/", "/api/v1/mapdata/links/", "/api/v1/mapdata/sectors/"]:
+            expected = self.get_unstreamed_content(route)
+
+            response = self.client.get(route)
+            self.assertTrue(response.streaming)
+            self.assertEqual(response["Content-Type"], "application/json")
+            self.assertEqual(b"".join(response.streaming_content), expected)
+
+            # Having streamed it once, the next request should be served from the snapshot
+            response = self.client.get(route)
+            self.assertFalse(response.streaming)
+            self.assertEqual(response.content, expected)
+            self.assertIn("ETag", response)
+
+    def test_streamed_output_matches_serializer(self):
+        response = self.client.get("/api/v1/mapdata/nodes/")
+        self.assertEqual(
+            b"".join(response.streaming_content),
+            JSONRenderer().render(MapDataInstallSerializer(legacy_map_node_list(), many=True).data),
+        )
+
+    def test_json_array_chunks_match_json_renderer(self):
+        for rows in [
+            [],
+            [{}],
+            [{"name": "caf\u00e9 \u2028 \u2029 \U0001F4E1", "coordinates": [-73.98, 40.7, None], "ok": True}],
+            [{"id": i, "value": i / 7, "big": 1e16 * i} for i in range(1000)],
+        ]:
+            for chunk_size in [1, 100, 64 * 1024]:
+                chunks = list(iter_json_array_chunks(iter(rows), chunk_size=chunk_size))
+                self.assertEqual(b"".join(chunks), JSONRenderer().render(rows))
+                self.assertTrue(all(len(chunk) < chunk_size + 1024 for chunk in chunks))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestMapDataTiles(TestCase):
+    # Roughly lower Manhattan
+    bbox = "-74.02,40.70,-73.97,40.74"
+
+    def setUp(self):
+        cache.clear()
+        member = Member(name="Fake Name")
+        member.save()
+
+        def make_node(network_number, latitude, longitude, building_latitude=None, building_longitude=None):
+            node = Node(
+                network_number=network_number,
+                status=Node.NodeStatus.ACTIVE,
+                latitude=latitude,
+                longitude=longitude,
+            )
+            node.save()
+            building = Building(
+                address_truth_sources=[],
+                latitude=building_latitude or latitude,
+                longitude=building_longitude or longitude,
+            )
+            building.save()
+            building.nodes.add(node)
+            Install(
+                install_number=network_number,
+                status=Install.InstallStatus.ACTIVE,
+                request_date=datetime.datetime(2024, 1, 27).astimezone(datetime.timezone.utc),
+                node=node,
+                member=member,
+                building=building,
+            ).save()
+            Install(
+                install_number=network_number + 10000,
+                status=Install.InstallStatus.PENDING,
+                request_date=datetime.datetime(2024, 1, 27).astimezone(datetime.timezone.utc),
+                node=node,
+                member=member,
+                building=building,
+            ).save()
+            device = Device(node=node, status=Device.DeviceStatus.ACTIVE)
+            device.save()
+            return device
+
+        inside = make_node(100, 40.72, -73.99)
+        inside2 = make_node(101, 40.71, -74.01)
+        outside = make_node(200, 40.80, -73.95)
+        outside2 = make_node(201, 40.65, -73.90)
+        # The node is drawn outside the box, but this building (and its non-node-dot install) is inside it
+        make_node(202, 40.85, -73.85, building_latitude=40.73, building_longitude=-74.0)
+
+        for from_device, to_device in [(inside, inside2), (inside, outside), (outside, outside2)]:
+            Link(
+                from_device=from_device,
+                to_device=to_device,
+                status=Link.LinkStatus.ACTIVE,
+                type=Link.LinkType.FIVE_GHZ,
+            ).save()
+
+        Sector(node=inside.node, status=Device.DeviceStatus.ACTIVE, radius=1, azimuth=0, width=120).save()
+        Sector(node=outside.node, status=Device.DeviceStatus.ACTIVE, radius=1, azimuth=0, width=120).save()
+
+        access_point = AccessPoint(
+            node=inside.node, status=Device.DeviceStatus.ACTIVE, latitude=40.72, longitude=-73.99, name="ap"
+        )
+        access_point.save()
+        Link(
+            from_device=access_point,
+            to_device=outside,
+            status=Link.LinkStatus.ACTIVE,
+            type=Link.LinkType.FIVE_GHZ,
+        ).save()
+
+        LOS(
+            from_building=inside2.node.buildings.first(),
+            to_building=outside2.node.buildings.first(),
+            source=LOS.LOSSource.HUMAN_ANNOTATED,
+            analysis_date=datetime.date(2024, 1, 27),
+        ).save()
+
+    def test_bbox(self):
+        response = self.client.get(f"/api/v1/mapdata/tiles/?bbox={self.bbox}")
+        self.assertEqual(response.status_code, 200)
+        features = response.json()
+
+        # The tile should contain exactly the rows from the full map endpoint that fall inside the box
+        all_nodes = self.client.get("/api/v1/mapdata/nodes/").json()
+        west, south, east, north = (float(v) for v in self.bbox.split(","))
+        self.assertEqual(
+            features["nodes"],
+            [
+                node
+                for node in all_nodes
+                if west <= node["coordinates"][0] <= east and south <= node["coordinates"][1] <= north
+            ],
+        )
+        self.assertEqual(
+            [node["id"] for node in features["nodes"] if node["id"] < 1_000_000], [100, 101, 10100, 10101, 10202]
+        )
+
+        # Likewise the links, including the ones the links endpoint makes up for LOSes and APs
+        all_links = self.client.get("/api/v1/mapdata/links/").json()
+        tile_map_numbers = {node["id"] for node in features["nodes"]}
+        self.assertEqual(
+            features["links"],
+            [link for link in all_links if link["from"] in tile_map_numbers or link["to"] in tile_map_numbers],
+        )
+        access_point_number = next(node["id"] for node in features["nodes"] if node.get("notes") == "AP")
+        self.assertEqual(
+            sorted((link["from"], link["to"], link["status"]) for link in features["links"]),
+            [
+                (100, 101, "active"),
+                (100, 200, "active"),
+                (101, 201, "planned"),
+                (101, 10201, "planned"),
+                (10101, 201, "planned"),
+                (10101, 10201, "planned"),
+                (access_point_number, 200, "active"),
+            ],
+        )
+        self.assertEqual([sector["nodeId"] for sector in features["sectors"]], [100])
+
+    def test_tile(self):
+        # The zoom 12 tile which contains lower Manhattan
+        response = self.client.get("/api/v1/mapdata/tiles/12/1206/1539/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("ETag", response)
+        self.assertEqual(
+            [node["id"] for node in response.json()["nodes"] if node["id"] < 1_000_000],
+            [100, 10100, 10202],
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/v1/mapdata/tiles/12/1206/1539/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if "meshapi_" in query["sql"]])
+
+    def test_tile_bounds(self):
+        world = BoundingBox.from_tile(0, 0, 0)
+        self.assertEqual((world.west, world.east), (-180, 180))
+        self.assertAlmostEqual(world.north, MAX_TILE_LATITUDE)
+        self.assertAlmostEqual(world.south, -MAX_TILE_LATITUDE)
+
+        tile = BoundingBox.from_tile(12, 1206, 1539)
+        self.assertTrue(tile.contains(-73.99, 40.72))
+        self.assertFalse(tile.contains(-73.95, 40.80))
+
+    def test_invalid_requests(self):
+        for route in [
+            "/api/v1/mapdata/tiles/",
+            "/api/v1/mapdata/tiles/?bbox=1,2,3",
+            "/api/v1/mapdata/tiles/?bbox=a,b,c,d",
+            "/api/v1/mapdata/tiles/?bbox=-73,40,-74,41",
+            "/api/v1/mapdata/tiles/?bbox=nan,40,-74,41",
+            "/api/v1/mapdata/tiles/2/4/0/",
+            "/api/v1/mapdata/tiles/30/0/0/",
+        ]:
+            response = self.client.get(route)
+            self.assertEqual(response.status_code, 400, route)
+
+    def test_bbox_queries_can_use_spatial_index(self):
+        bbox = BoundingBox.from_string(self.bbox)
+        with connection.cursor() as cursor:
+            # The tables are far too small here for the planner to prefer the index on its own
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+        self.assertIn("meshapi_building_location_gist", Building.objects.filter(WithinBoundingBox(bbox)).explain())
+        self.assertIn("meshapi_node_location_gist", Node.objects.filter(WithinBoundingBox(bbox)).explain())
+
+
 class TestJavascriptDateSerializerField(TestCase):
     def test_to_interal_value(self):
         dt_serializer_field = JavascriptDatetimeField()
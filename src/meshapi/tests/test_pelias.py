@@ -0,0 +1,95 @@
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+from django.core import management
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from meshapi.models import Building
+from meshapi.pelias import humanify_street_address, humanify_street_address_locally, humanify_street_address_with_pelias
+
+# DOB addresses we can humanify without Pelias, and what we expect back
+LOCAL_ADDRESS_CORPUS = [
+    ("229 EAST 13 STREET", "229 East 13th Street"),
+    ("215A WEST 23 STREET", "215A West 23rd Street"),
+    ("37-12 80 STREET", "37-12 80th Street"),
+    ("151 BROOME STREET", "151 Broome Street"),
+    ("151 Broome St", "151 Broome St"),
+    ("100 BROADWAY", "100 Broadway"),
+    ("3 SAINT MARK'S PLACE", "3 Saint Mark's Place"),
+    ("711 FORT WASHINGTON AVENUE", "711 Fort Washington Avenue"),
+    ("2 BEACH 9 STREET", "2 Beach 9th Street"),
+    ("4 EAST 2 ROAD", "4 East 2nd Road"),
+]
+
+# Which need Pelias to tell the house number from the street
+AMBIGUOUS_ADDRESS_CORPUS = [
+    "12 AVENUE C",
+    "1 AVENUE OF THE AMERICAS",
+    "ONE WORLD TRADE CENTER",
+    "229 EAST 13 STREET APT 4",
+    "80 WILKES-BARRE STREET",
+    "",
+]
+
+
+def mock_pelias_response(address):
+    # What Pelias says about a "<housenumber> <street>" address
+    housenumber, street = address.split(" ", 1)
+    response = MagicMock()
+    response.json.return_value = {
+        "solutions": [
+            {
+                "score": 0.9,
+                "classifications": [
+                    {"label": "housenumber", "start": 0, "end": len(housenumber), "value": housenumber},
+                    {"label": "street", "start": len(housenumber) + 1, "end": len(address), "value": street},
+                ],
+            }
+        ]
+    }
+    return response
+
+
+@patch("meshapi.pelias.http_client.get", side_effect=lambda url, params, timeout: mock_pelias_response(params["text"]))
+class TestHumanifyStreetAddress(TestCase):
+    def setUp(self):
+        humanify_street_address.cache_clear()
+
+    def test_local_matches_pelias(self, mock_requests):
+        for dob_address, humanified in LOCAL_ADDRESS_CORPUS:
+            with self.subTest(dob_address):
+                self.assertEqual(humanify_street_address_locally(dob_address), humanified)
+                self.assertEqual(humanify_street_address_with_pelias(dob_address), humanified)
+
+    def test_ambiguous(self, mock_requests):
+        for dob_address in AMBIGUOUS_ADDRESS_CORPUS:
+            with self.subTest(dob_address):
+                self.assertIsNone(humanify_street_address_locally(dob_address))
+
+    def test_pelias_only_when_ambiguous(self, mock_requests):
+        self.assertEqual(humanify_street_address("229 EAST 13 STREET"), "229 East 13th Street")
+        mock_requests.assert_not_called()
+
+        self.assertEqual(humanify_street_address("12 AVENUE C"), "12 Avenue C")
+        self.assertEqual(mock_requests.call_count, 1)
+
+        # Memoized
+        self.assertEqual(humanify_street_address("12 AVENUE C"), "12 Avenue C")
+        self.assertEqual(mock_requests.call_count, 1)
+
+    def test_compare_command(self, mock_requests):
+        for street_address in ["229 East 13th Street", "12 Avenue C", "37-12 80th Street"]:
+            Building(address_truth_sources=[], latitude=40.7, longitude=-73.9, street_address=street_address).save()
+
+        out = StringIO()
+        management.call_command("compare_address_normalizer", stdout=out)
+        self.assertIn("Checked 3 addresses, 2 of which can be humanified locally. 0 mismatches.", out.getvalue())
+        self.assertEqual(mock_requests.call_count, 2)
+
+        # e.g. if Pelias decided "EAST" was part of the house number
+        mock_requests.side_effect = lambda url, params, timeout: mock_pelias_response(
+            params["text"].replace("229 EAST", "229-EAST")
+        )
+        with self.assertRaises(CommandError):
+            management.call_command("compare_address_normalizer", stdout=StringIO())
@@ -1,10 +1,13 @@
 import json
+from dataclasses import asdict, replace
 from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
 
 from django.core import management
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from moto import mock_aws
+from rest_framework.response import Response
 
 from meshapi.models.install import Install
 from meshapi.tests.sample_join_records import (
@@ -22,6 +25,11 @@ from meshapi.util.join_records import (
     s3_content_to_join_record,
 )
 from meshapi.validation import NYCAddressInfo
+from meshapi.views.forms import JoinFormRequest, get_stored_join_form_response, store_join_form_response
+
+
+def join_form_request(record: JoinRecord) -> JoinFormRequest:
+    return JoinFormRequest(**{k: v for k, v in asdict(record).items() if k in JoinFormRequest.__dataclass_fields__})
 
 
 # Integration test to ensure that we can fetch JoinRecords from an S3 bucket,
@@ -280,6 +288,99 @@ class TestReplayJoinRecords(TestCase):
         )
         self.assertEqual(0, r.replayed, "Did not get expected replay count.")
 
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    @patch("meshapi.management.commands.replay_join_records.Command.past_week")
+    @patch("meshapi.views.forms.geocode_nyc_address")
+    @patch("meshapi.views.forms.validate_email_address", return_value=True)
+    def test_replay_join_records_already_processed(self, mock_validate_email, mock_geocode_func, past_week_function):
+        cache.clear()
+        halloween_minus_one_week = datetime(2024, 10, 31, 8, 0, 0, 0, tzinfo=timezone.utc) - timedelta(days=7)
+        past_week_function.return_value = halloween_minus_one_week
+
+        # Benjamin's submission went through, we just never heard back about it
+        benjamin = basic_sample_pre_submission_join_records[
+            f"{MOCK_JOIN_RECORD_PREFIX}/v3/pre/2024/10/30/12/34/58/e4f1.json"
+        ]
+        store_join_form_response(
+            benjamin.uuid,
+            join_form_request(benjamin),
+            Response({"detail": "Thanks! A volunteer will email you shortly", "install_number": 12345}, status=201),
+        )
+
+        def address_info(street_address: str, zip_code: str, bin: int) -> NYCAddressInfo:
+            return NYCAddressInfo.from_cache_dict(
+                {
+                    "street_address": street_address,
+                    "city": "Brooklyn",
+                    "state": "NY",
+                    "zip": zip_code,
+                    "longitude": -73.9,
+                    "latitude": 40.7,
+                    "altitude": 10.0,
+                    "bin": bin,
+                }
+            )
+
+        mock_geocode_func.side_effect = [
+            address_info("197 Prospect Place", "11238", 3000001),
+            ValueError("NJ not allowed yet!"),
+            address_info("99 Kane Street", "11231", 3000002),
+            address_info("99 Kane Street", "11231", 3000002),
+        ]
+
+        management.call_command("replay_join_records", "--noinput", "--write")
+
+        records = self.p.get_all(submission_prefix=SubmissionStage.POST)
+        self.assertEqual(5, len(records), "Got unexpected number of records in mocked S3 bucket.")
+
+        # Not replayed, but the record now knows how it went
+        r = records[2]
+        self.assertEqual("201", r.code)
+        self.assertEqual(0, r.replayed)
+        self.assertEqual(12345, r.install_number)
+        self.assertFalse(Install.objects.filter(member__name="Benjamin Doe").exists())
+
+        # Everyone else was replayed as usual, and the successful replays won't be replayed again
+        self.assertEqual(4, mock_geocode_func.call_count)
+        self.assertEqual("201", records[0].code)
+        self.assertEqual(
+            records[0].install_number,
+            get_stored_join_form_response(records[0].uuid, join_form_request(records[0])).data["install_number"],
+        )
+        self.assertIsNone(get_stored_join_form_response(records[1].uuid, join_form_request(records[1])))
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    @patch("meshapi.management.commands.replay_join_records.Command.past_week")
+    def test_replay_join_records_different_submission_processed(self, past_week_function):
+        cache.clear()
+        halloween_minus_one_week = datetime(2024, 10, 31, 8, 0, 0, 0, tzinfo=timezone.utc) - timedelta(days=7)
+        past_week_function.return_value = halloween_minus_one_week
+
+        # Something else was submitted under Benjamin's UUID
+        benjamin = basic_sample_pre_submission_join_records[
+            f"{MOCK_JOIN_RECORD_PREFIX}/v3/pre/2024/10/30/12/34/58/e4f1.json"
+        ]
+        store_join_form_response(
+            benjamin.uuid,
+            replace(join_form_request(benjamin), apartment="5B"),
+            Response({"detail": "Thanks! A volunteer will email you shortly", "install_number": 12345}, status=201),
+        )
+
+        with patch(
+            "meshapi.management.commands.replay_join_records.process_join_form",
+            return_value=Response({"detail": "Address error"}, status=400),
+        ) as mock_process_join_form:
+            management.call_command("replay_join_records", "--noinput", "--write")
+
+        # Neither replayed, nor taken to be the stored submission
+        replayed_names = [call.args[0].first_name for call in mock_process_join_form.call_args_list]
+        self.assertNotIn("Benjamin", replayed_names)
+        self.assertEqual(3, len(replayed_names))
+
+        # Nor is the record updated
+        records = self.p.get_all(submission_prefix=SubmissionStage.POST)
+        self.assertNotIn(benjamin.uuid, [r.uuid for r in records])
+
 
 # codecov moment
 @mock_aws
@@ -23,7 +23,8 @@ class TestSlackNotification(TestCase):
         self.sample_member.save()
         self.sample_install_copy["member"] = self.sample_member
 
-        self.install = Install(**self.sample_install_copy)
+        # Not from the sequence, which other tests may have brought up to the NNs used below
+        self.install = Install(**self.sample_install_copy, install_number=45)
         self.install.save()
 
     @requests_mock.Mocker()
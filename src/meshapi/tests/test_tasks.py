@@ -4,7 +4,13 @@ from unittest import mock
 from django.test import TestCase
 from flags.state import enable_flag
 
-from meshapi.tasks import reset_dev_database, run_database_backup, run_update_panoramas
+from meshapi.tasks import (
+    refresh_linknyc_kiosks,
+    reset_dev_database,
+    run_database_backup,
+    run_update_panoramas,
+    run_warm_email_domain_cache,
+)
 
 from meshdb.environment import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY
 
@@ -70,6 +76,38 @@ class TestResetDevDatabaseTask(TestCase):
             reset_dev_database()
 
 
+class TestRefreshLinkNYCKiosksTask(TestCase):
+    @mock.patch("meshapi.tasks.refresh_kiosk_list")
+    def test_refresh_linknyc_kiosks(self, mock_refresh_kiosk_list):
+        enable_flag("TASK_ENABLED_REFRESH_LINKNYC_KIOSKS")
+        refresh_linknyc_kiosks()
+        mock_refresh_kiosk_list.assert_called_once()
+
+    @mock.patch("meshapi.tasks.refresh_kiosk_list")
+    def test_refresh_linknyc_kiosks_flag_disabled(self, mock_refresh_kiosk_list):
+        refresh_linknyc_kiosks()
+        mock_refresh_kiosk_list.assert_not_called()
+
+    @mock.patch("meshapi.tasks.refresh_kiosk_list", side_effect=ValueError("Bad data"))
+    def test_refresh_linknyc_kiosks_failure(self, mock_refresh_kiosk_list):
+        enable_flag("TASK_ENABLED_REFRESH_LINKNYC_KIOSKS")
+        with self.assertRaises(ValueError):
+            refresh_linknyc_kiosks()
+
+
+class TestWarmEmailDomainCacheTask(TestCase):
+    @mock.patch("meshapi.tasks.warm_email_domain_cache", return_value=3)
+    def test_warm_email_domain_cache(self, mock_warm_email_domain_cache):
+        enable_flag("TASK_ENABLED_WARM_EMAIL_DOMAIN_CACHE")
+        run_warm_email_domain_cache()
+        mock_warm_email_domain_cache.assert_called_once()
+
+    @mock.patch("meshapi.tasks.warm_email_domain_cache")
+    def test_warm_email_domain_cache_flag_disabled(self, mock_warm_email_domain_cache):
+        run_warm_email_domain_cache()
+        mock_warm_email_domain_cache.assert_not_called()
+
+
 @mock.patch("meshapi.util.panoramas.get_head_tree_sha", return_value="mockedsha")
 @mock.patch("meshapi.util.panoramas.list_files_in_git_directory", return_value=["713a.jpg", "713b.jpg"])
 class TestUpdatePanoramasTask:
@@ -203,7 +203,7 @@ class TestPanoUtils(TestCase):
                 PanoramaTitle.from_filename(case)
 
     # Crude test to sanity check the API functions
-    @patch("meshapi.views.requests.get")
+    @patch("meshapi.util.panoramas.http_client.get")
     def test_github_API(self, mock_requests):
         mock_response = MagicMock()
         mock_response.status_code = 200
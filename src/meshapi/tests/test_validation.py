@@ -1,11 +1,17 @@
+import datetime
 import json
+import threading
 from unittest.mock import MagicMock, patch
 
 from django.test import TestCase
+from django.utils import timezone
 
 from meshapi.exceptions import AddressAPIError, AddressError
+from meshapi.models import GeocodeCacheEntry
 from meshapi.tests.sample_data import sample_address_response
-from meshapi.validation import NYCAddressInfo
+from meshapi.validation import DOB_BUILDING_HEIGHT_API_URL, NYCAddressInfo, geocode_nyc_address, get_geocode_cache_key
+
+from .util import mock_nyc_address_apis
 
 
 class TestValidationNYCAddressInfo(TestCase):
@@ -13,7 +19,7 @@ class TestValidationNYCAddressInfo(TestCase):
         with self.assertRaises(ValueError):
             NYCAddressInfo("151 Broome St", "New York", "ny", "10002")
 
-    @patch("meshapi.validation.requests.get")
+    @patch("meshapi.validation.http_client.get")
     def test_validate_address_geosearch_unexpected_responses(self, mock_requests):
         mock_1 = MagicMock()
         mock_1.content = '{"features":[]}'.encode("utf-8")
@@ -31,12 +37,12 @@ class TestValidationNYCAddressInfo(TestCase):
                 mock_requests.return_value = test_case["mock"]
                 NYCAddressInfo("151 Broome St", "New York", "NY", "10002")
 
-    @patch("meshapi.validation.requests.get", side_effect=Exception("Pretend this is a network issue"))
+    @patch("meshapi.validation.http_client.get", side_effect=Exception("Pretend this is a network issue"))
     def test_validate_address_geosearch_network(self, mock_requests):
         with self.assertRaises(AddressAPIError):
             NYCAddressInfo("151 Broome St", "New York", "NY", "10002")
 
-    @patch("meshapi.validation.requests.get")
+    @patch("meshapi.validation.http_client.get")
     def test_validate_address_good(self, mock_requests):
         mock_1 = MagicMock()
         mock_1.content = json.dumps(sample_address_response).encode("utf-8")
@@ -47,7 +53,7 @@ class TestValidationNYCAddressInfo(TestCase):
         mock_3 = MagicMock()
         mock_3.content = '[{"heightroof":123.456, "groundelev":76.544}]'.encode("utf-8")
 
-        mock_requests.side_effect = [mock_1, mock_2, mock_3]
+        mock_requests.side_effect = mock_nyc_address_apis(mock_1, mock_2, mock_3)
 
         nyc_addr_info = NYCAddressInfo("151 Broome St", "New York", "NY", "10002")
 
@@ -61,7 +67,7 @@ class TestValidationNYCAddressInfo(TestCase):
         assert nyc_addr_info.altitude == 61.0
         assert nyc_addr_info.bin == 1234
 
-    @patch("meshapi.validation.requests.get")
+    @patch("meshapi.validation.http_client.get")
     def test_validate_address_open_data_invalid_response(self, mock_requests):
         mock_series_of_tubes = MagicMock()
         mock_series_of_tubes.content = "a series of tubes".encode("utf-8")
@@ -94,7 +100,7 @@ class TestValidationNYCAddressInfo(TestCase):
             mock_2 = MagicMock()
             mock_2.content = "{}".encode("utf-8")
 
-            mock_requests.side_effect = [mock_1, mock_2, mock_test_case]
+            mock_requests.side_effect = mock_nyc_address_apis(mock_1, mock_2, mock_test_case)
 
             nyc_addr_info = NYCAddressInfo("151 Broome St", "New York", "NY", "10002")
 
@@ -107,3 +113,108 @@ class TestValidationNYCAddressInfo(TestCase):
             assert nyc_addr_info.latitude == 40.716245
             assert nyc_addr_info.altitude is None
             assert nyc_addr_info.bin == 1234
+
+    @patch("meshapi.validation.ADDRESS_ENRICHMENT_DEADLINE_SECONDS", 0.2)
+    @patch("meshapi.validation.http_client.get")
+    def test_validate_address_enrichment_deadline(self, mock_requests):
+        mock_1 = MagicMock()
+        mock_1.content = json.dumps(sample_address_response).encode("utf-8")
+
+        mock_2 = MagicMock()
+        mock_2.content = "{}".encode("utf-8")
+
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def get(url, *args, **kwargs):
+            if url == DOB_BUILDING_HEIGHT_API_URL:
+                release.wait()
+            return mock_nyc_address_apis(mock_1, mock_2)(url, *args, **kwargs)
+
+        mock_requests.side_effect = get
+
+        # A slow DOB costs us the altitude, but not the address
+        nyc_addr_info = NYCAddressInfo("151 Broome St", "New York", "NY", "10002")
+        assert nyc_addr_info.street_address == "151 Broome St"
+        assert nyc_addr_info.altitude is None
+
+        # Whereas we can't do without Pelias
+        with patch("meshapi.validation.humanify_street_address", side_effect=lambda address: release.wait()):
+            with self.assertRaises(AddressAPIError):
+                NYCAddressInfo("151 Broome St", "New York", "NY", "10002")
+
+
+class TestGeocodeCache(TestCase):
+    def mock_responses(self, mock_requests, heightroof='{"heightroof":123.456, "groundelev":76.544}'):
+        mock_1 = MagicMock()
+        mock_1.content = json.dumps(sample_address_response).encode("utf-8")
+
+        mock_2 = MagicMock()
+        mock_2.content = "{}".encode("utf-8")
+
+        mock_3 = MagicMock()
+        mock_3.content = f"[{heightroof}]".encode("utf-8")
+
+        mock_requests.side_effect = mock_nyc_address_apis(mock_1, mock_2, mock_3)
+
+    def test_cache_key(self):
+        self.assertEqual(
+            get_geocode_cache_key("151 Broome St.", "New York", "New York", "10002"),
+            get_geocode_cache_key(" 151  broome st", "new york", "NY", "10002 "),
+        )
+        self.assertNotEqual(
+            get_geocode_cache_key("151 Broome St", "New York", "NY", "10002"),
+            get_geocode_cache_key("153 Broome St", "New York", "NY", "10002"),
+        )
+
+    @patch("meshapi.validation.http_client.get")
+    def test_hit_skips_lookups(self, mock_requests):
+        self.mock_responses(mock_requests)
+        nyc_addr_info = geocode_nyc_address("151 Broome St", "New York", "NY", "10002")
+        # Geosearch and the DOB, the address is simple enough to humanify without Pelias
+        self.assertEqual(mock_requests.call_count, 2)
+
+        cached_addr_info = geocode_nyc_address("151 broome st.", "New York", "New York", "10002")
+        self.assertEqual(mock_requests.call_count, 2)
+        self.assertEqual(cached_addr_info, nyc_addr_info)
+        self.assertEqual(cached_addr_info.altitude, 61.0)
+        self.assertEqual(cached_addr_info.address, nyc_addr_info.address)
+
+    @patch("meshapi.validation.http_client.get")
+    def test_negative_hit(self, mock_requests):
+        not_found = MagicMock()
+        not_found.content = '{"features":[]}'.encode("utf-8")
+        mock_requests.return_value = not_found
+
+        with self.assertRaises(AddressError):
+            geocode_nyc_address("151 Broome St", "New York", "NY", "10002")
+        with self.assertRaises(AddressError) as e:
+            geocode_nyc_address("151 Broome St", "New York", "NY", "10002")
+
+        self.assertEqual(mock_requests.call_count, 1)
+        self.assertIn("not found in geosearch.planninglabs.nyc", e.exception.args[0])
+
+    @patch("meshapi.validation.http_client.get")
+    def test_expired(self, mock_requests):
+        self.mock_responses(mock_requests)
+        geocode_nyc_address("151 Broome St", "New York", "NY", "10002")
+        GeocodeCacheEntry.objects.update(expires=timezone.now() - datetime.timedelta(seconds=1))
+
+        self.mock_responses(mock_requests)
+        geocode_nyc_address("151 Broome St", "New York", "NY", "10002")
+        self.assertEqual(mock_requests.call_count, 4)
+        self.assertEqual(GeocodeCacheEntry.objects.count(), 1)
+        self.assertGreater(GeocodeCacheEntry.objects.get().expires, timezone.now())
+
+    @patch("meshapi.validation.http_client.get")
+    def test_missing_altitude_not_cached(self, mock_requests):
+        self.mock_responses(mock_requests, heightroof='{"heightroof":null, "groundelev":null}')
+        nyc_addr_info = geocode_nyc_address("151 Broome St", "New York", "NY", "10002")
+
+        self.assertIsNone(nyc_addr_info.altitude)
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+
+    def test_invalid_state_not_cached(self):
+        with self.assertRaises(ValueError):
+            geocode_nyc_address("151 Broome St", "Jersey City", "NJ", "07302")
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
@@ -1,8 +1,12 @@
 from threading import Thread
+from typing import Any, Callable
 
 from bs4 import BeautifulSoup
 from django.db import connection
 
+from meshapi.validation import DOB_BUILDING_HEIGHT_API_URL, NYC_PLANNING_LABS_GEOCODE_URL
+from meshdb.environment import PELIAS_ADDRESS_PARSER_URL
+
 
 class TestThread(Thread):
     def run(self):
@@ -19,3 +23,24 @@ def get_admin_results_count(html_string: str):
         return 0
 
     return sum(1 for tr in result_list.find("tbody").find_all("tr") if tr.find_all("td"))
+
+
+def mock_nyc_address_apis(geosearch: Any, pelias: Any, open_data: Any = None) -> Callable[..., Any]:
+    """
+    A side_effect for a mocked requests.get() which answers each of the APIs NYCAddressInfo uses with the
+    given response (or raises it, if it's an exception). They're called concurrently, so the order of the
+    calls isn't something a list of responses can rely on
+    """
+    responses = {
+        NYC_PLANNING_LABS_GEOCODE_URL: geosearch,
+        PELIAS_ADDRESS_PARSER_URL: pelias,
+        DOB_BUILDING_HEIGHT_API_URL: open_data,
+    }
+
+    def get(url: str, *args: Any, **kwargs: Any) -> Any:
+        response = responses[url]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    return get
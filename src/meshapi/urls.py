@@ -55,6 +55,44 @@ urlpatterns = [
     path("mapdata/links/", views.MapDataLinkList.as_view(), name="meshapi-v1-map-data-links"),
     path("mapdata/sectors/", views.MapDataSectorList.as_view(), name="meshapi-v1-map-data-sectors"),
     path("mapdata/kiosks/", views.KioskListWrapper.as_view(), name="meshapi-v1-map-data-kiosks"),
+    path("mapdata/tiles/", views.MapDataTile.as_view(), name="meshapi-v1-map-data-bbox"),
+    path("mapdata/tiles/<int:z>/<int:x>/<int:y>/", views.MapDataTile.as_view(), name="meshapi-v1-map-data-tile"),
     path("geography/whole-mesh.kml", views.WholeMeshKML.as_view(), name="meshapi-v1-geography-whole-mesh-kml"),
+    path("geography/whole-mesh.kmz", views.WholeMeshKMZ.as_view(), name="meshapi-v1-geography-whole-mesh-kmz"),
+    path(
+        "geography/whole-mesh/index.kml",
+        views.WholeMeshKMLIndex.as_view(),
+        name="meshapi-v1-geography-whole-mesh-kml-index",
+    ),
+    path(
+        "geography/whole-mesh/styles.kml",
+        views.WholeMeshKMLStyles.as_view(),
+        name="meshapi-v1-geography-whole-mesh-kml-styles",
+    ),
+    path(
+        "geography/whole-mesh/nodes/<slug:folder_status>/<slug:borough>.kml",
+        views.WholeMeshKMLNodeFolder.as_view(),
+        name="meshapi-v1-geography-whole-mesh-kml-nodes",
+    ),
+    path(
+        "geography/whole-mesh/links/<slug:folder_status>.kml",
+        views.WholeMeshKMLLinkFolder.as_view(),
+        name="meshapi-v1-geography-whole-mesh-kml-links",
+    ),
+    path(
+        "geography/whole-mesh.geojson",
+        views.WholeMeshGeoJSON.as_view(),
+        name="meshapi-v1-geography-whole-mesh-geojson",
+    ),
+    path(
+        "geography/tiles/<int:z>/<int:x>/<int:y>.mvt",
+        views.MeshVectorTile.as_view(),
+        name="meshapi-v1-geography-tile",
+    ),
     path("geography/nyc-geocode/v2/search", views.NYCGeocodeWrapper.as_view(), name="meshapi-v1-geography-geocode"),
+    path(
+        "geography/nyc-geocode/v2/batch",
+        views.NYCGeocodeBatchWrapper.as_view(),
+        name="meshapi-v1-geography-geocode-batch",
+    ),
 ]
@@ -3,12 +3,12 @@ import logging
 import os
 from typing import Optional, Sequence, Type
 
-import requests
 from django.db.models import Model
 from django.http import HttpRequest
 from rest_framework.serializers import Serializer
 from meshdb.environment import SLACK_ADMIN_NOTIFICATIONS_WEBHOOK_URL, SITE_BASE_URL
 from meshapi.admin.utils import get_admin_url
+from meshapi.util import http_client
 
 
 def escape_slack_text(text: str) -> str:
@@ -55,7 +55,7 @@ def notify_administrators_of_data_issue(
         )
         return
 
-    response = requests.post(SLACK_ADMIN_NOTIFICATIONS_WEBHOOK_URL, json=slack_message)
+    response = http_client.post(SLACK_ADMIN_NOTIFICATIONS_WEBHOOK_URL, json=slack_message)
 
     if raise_exception_on_failure:
         response.raise_for_status()
@@ -0,0 +1,136 @@
+import datetime
+import re
+from typing import Any, List, Type
+
+from django.db.models import Model, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+# Historical rows are stamped when the object is saved, but only become visible once the
+# transaction commits. The cursor we hand back trails the current time by this much, so that
+# the next poll picks up writes from transactions that were still in flight
+CHANGE_FEED_SETTLE_SECONDS = 60
+
+# The change feed isn't paginated, so past this many upserted objects we tell the client to download the
+# (paginated) full list again instead
+CHANGE_FEED_MAX_UPSERTED = 1000
+
+CHANGE_FEED_SINCE_PARAMETER = OpenApiParameter(
+    "since",
+    type=str,
+    location=OpenApiParameter.QUERY,
+    required=False,
+    description="An ISO 8601 timestamp, or the cursor from a previous response. If provided, rather than the "
+    "usual (paginated) list, return only the objects which have been created, modified, or deleted since then, "
+    'as {"cursor": ..., "upserted": [...], "deleted": [...ids]}. Pass the returned cursor as since= on the '
+    "next request to resume from where this one left off. Changes made close to the time of the request may be "
+    f"reported twice. If more than {CHANGE_FEED_MAX_UPSERTED} objects have changed since then, responds with "
+    "410 Gone, and the client should download the full list again instead",
+)
+
+
+def parse_since(since: str) -> datetime.datetime:
+    """
+    Parse the ?since= query parameter, an ISO 8601 timestamp (assumed to be in the server's
+    timezone if it doesn't have one) such as a cursor returned by get_change_feed_cursor()
+    """
+    # An unescaped + in the query string is decoded to a space, put it back for the UTC offset
+    parsed = parse_datetime(re.sub(r"(\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?) (\d{2}(?::?\d{2})?)$", r"\1+\2", since.strip()))
+    if parsed is None:
+        raise ValueError(f"'{since}' is not an ISO 8601 timestamp")
+
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+
+    return parsed
+
+
+def get_change_feed_cursor(since: datetime.datetime) -> str:
+    """
+    The cursor a client should resume from after a change feed request for everything since
+    `since`. Call this before reading any changes, so that nothing written during the request
+    can slip between the cursor and the changes we report
+    """
+    return max(since, timezone.now() - datetime.timedelta(seconds=CHANGE_FEED_SETTLE_SECONDS)).isoformat()
+
+
+def get_pk_name(model: Type[Model]) -> str:
+    # Multi-table children like Sector are keyed by their pointer to the parent (device_ptr_id)
+    pk = model._meta.pk
+    if pk is None:
+        raise ValueError(f"{model.__name__} has no primary key")
+    return pk.attname
+
+
+def get_changed_history(model: Type[Model], since: datetime.datetime) -> QuerySet:
+    """
+    The history entries of the given model recorded after `since`, answered from the
+    history_date index on its historical table
+    """
+    return model.history.filter(history_date__gt=since).order_by()  # type: ignore[attr-defined]
+
+
+def get_upserted_ids(model: Type[Model], since: datetime.datetime) -> QuerySet:
+    """
+    A subquery of the pks of every object of the given model which has been created or modified
+    since `since`. This includes objects which have since been deleted, so filter the model's
+    queryset with it rather than using it directly
+    """
+    pk_name = get_pk_name(model)
+    return get_changed_history(model, since).exclude(history_type="-").values(pk_name)
+
+
+def get_deleted_ids(model: Type[Model], since: datetime.datetime) -> List[Any]:
+    pk_name = get_pk_name(model)
+    return list(
+        get_changed_history(model, since)
+        .filter(history_type="-")
+        # Objects can be restored from history, so make sure they're actually gone
+        .exclude(**{f"{pk_name}__in": model._default_manager.values("pk")})
+        .values_list(pk_name, flat=True)
+        .distinct()
+    )
+
+
+class ChangeFeedListMixin:
+    """
+    Add a "delta" mode to a ListAPIView: with ?since=<timestamp>, rather than listing every object,
+    return only those which were upserted or deleted since then (according to their history tables)
+    along with a cursor to resume from. This lets clients which keep a copy of the list in sync poll
+    for changes rather than re-downloading the whole thing
+    """
+
+    def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        if "since" not in request.query_params:
+            return super().list(request, *args, **kwargs)  # type: ignore[misc]
+
+        try:
+            since = parse_since(request.query_params["since"])
+        except ValueError as e:
+            return Response({"detail": f"Invalid since: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        cursor = get_change_feed_cursor(since)
+
+        queryset = self.filter_queryset(self.get_queryset())  # type: ignore[attr-defined]
+        model = queryset.model
+        upserted = list(queryset.filter(pk__in=get_upserted_ids(model, since))[: CHANGE_FEED_MAX_UPSERTED + 1])
+        if len(upserted) > CHANGE_FEED_MAX_UPSERTED:
+            return Response(
+                {
+                    "detail": f"More than {CHANGE_FEED_MAX_UPSERTED} objects have changed since {since.isoformat()}, "
+                    "download the full list instead"
+                },
+                status=status.HTTP_410_GONE,
+            )
+
+        return Response(
+            {
+                "cursor": cursor,
+                "upserted": self.get_serializer(upserted, many=True).data,  # type: ignore[attr-defined]
+                "deleted": get_deleted_ids(model, since),
+            }
+        )
@@ -3,3 +3,4 @@ INVALID_ALTITUDE = None
 
 RECAPTCHA_CHECKBOX_TOKEN_HEADER = "X-Recaptcha-V2-Token"
 RECAPTCHA_INVISIBLE_TOKEN_HEADER = "X-Recaptcha-V3-Token"
+JOIN_FORM_IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
@@ -1,7 +1,49 @@
-from rest_framework.renderers import BrowsableAPIRenderer
+from typing import Any, Iterable, Iterator
+
+from rest_framework.compat import LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.serializers import BaseSerializer
 
+# Large enough to keep the number of writes to the socket reasonable, small enough that we
+# never hold much more than one chunk of encoded output at a time
+JSON_STREAM_CHUNK_SIZE = 64 * 1024
+
 
 class OnlyRawBrowsableAPIRenderer(BrowsableAPIRenderer):
     def render_form_for_serializer(self, serializer: BaseSerializer) -> str:
         return ""
+
+
+def iter_json_array_chunks(items: Iterable[Any], chunk_size: int = JSON_STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Encode `items` as a JSON array, producing exactly the same bytes as JSONRenderer().render(list(items)),
+    but yielding them in chunks as the items are produced rather than encoding everything in one go
+    :param items: the rows of the array, in order, e.g. from a generator over a queryset
+    :param chunk_size: the (approximate) size in bytes of each chunk
+    :return: an iterator over the encoded array
+    """
+    renderer = JSONRenderer()
+    encoder = renderer.encoder_class(
+        ensure_ascii=renderer.ensure_ascii,
+        allow_nan=not renderer.strict,
+        separators=SHORT_SEPARATORS if renderer.compact else LONG_SEPARATORS,
+    )
+    item_separator = encoder.item_separator.encode()
+
+    buffer = [b"["]
+    buffered_bytes = 1
+    for i, item in enumerate(items):
+        # Match JSONRenderer, which escapes these so that the output is a strict javascript subset
+        encoded = encoder.encode(item).replace("\u2028", "\\u2028").replace("\u2029", "\\u2029").encode()
+        if i:
+            buffer.append(item_separator)
+        buffer.append(encoded)
+        buffered_bytes += len(encoded) + 1
+
+        if buffered_bytes >= chunk_size:
+            yield b"".join(buffer)
+            buffer = []
+            buffered_bytes = 0
+
+    buffer.append(b"]")
+    yield b"".join(buffer)
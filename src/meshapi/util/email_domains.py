@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Type
+
+from datadog import statsd
+from django.core.cache import cache
+from django.db.models import Count, Value
+from django.db.models.functions import Lower, StrIndex, Substr
+from validate_email.dns_check import dns_check
+from validate_email.email_address import EmailAddress
+from validate_email.exceptions import (
+    DNSConfigurationError,
+    DomainNotFoundError,
+    EmailValidationError,
+    NoMXError,
+    NoNameserverError,
+    NoValidMXError,
+)
+
+# Nearly everyone who fills out the join form uses one of a handful of email providers, so rather than
+# asking DNS for the same MX records on every submission, we remember whether each domain can receive
+# email, in memory and in Redis (so that a fresh process doesn't have to start from scratch)
+
+EMAIL_DOMAIN_CACHE_TTL_SECONDS = 24 * 60 * 60
+# A domain with no MX records is usually a typo, but it might also be someone setting up their mail
+EMAIL_DOMAIN_NEGATIVE_CACHE_TTL_SECONDS = 60 * 60
+EMAIL_DOMAIN_CACHE_MAX_ENTRIES = 10000
+EMAIL_DOMAIN_CACHE_KEY_PREFIX = "meshdb:email-domain-dns:"
+
+# How many of our members' most common domains warm_email_domain_cache() looks up
+EMAIL_DOMAIN_CACHE_WARM_COUNT = 100
+
+# Only DNS answering with "no" is worth remembering. A timeout (DNSTimeoutError) says nothing about
+# the domain, so we always ask again
+CACHEABLE_DNS_ERRORS: Dict[str, Type[EmailValidationError]] = {
+    error.__name__: error
+    for error in [DomainNotFoundError, NoNameserverError, DNSConfigurationError, NoMXError, NoValidMXError]
+}
+
+# Cached as the name of the error DNS gave us, or "" if the domain is fine
+_DNS_OK = ""
+
+# domain -> (expiry, as per time.monotonic(), outcome)
+_memory_cache: Dict[str, Tuple[float, str]] = {}
+_memory_cache_lock = threading.Lock()
+
+
+def _get_cache_key(domain: str) -> str:
+    return f"{EMAIL_DOMAIN_CACHE_KEY_PREFIX}{domain}"
+
+
+def _get_ttl_seconds(outcome: str) -> int:
+    return EMAIL_DOMAIN_CACHE_TTL_SECONDS if outcome == _DNS_OK else EMAIL_DOMAIN_NEGATIVE_CACHE_TTL_SECONDS
+
+
+def _remember(domain: str, outcome: str, ttl_seconds: float) -> None:
+    with _memory_cache_lock:
+        if len(_memory_cache) >= EMAIL_DOMAIN_CACHE_MAX_ENTRIES:
+            # Anything worth keeping will be back from Redis soon enough
+            _memory_cache.clear()
+        _memory_cache[domain] = (time.monotonic() + ttl_seconds, outcome)
+
+
+def _recall(domain: str) -> Optional[str]:
+    with _memory_cache_lock:
+        entry = _memory_cache.get(domain)
+    if entry is None or entry[0] <= time.monotonic():
+        return None
+    return entry[1]
+
+
+def clear_email_domain_cache() -> None:
+    """
+    Forget every domain held in this process's memory (but not in Redis)
+    """
+    with _memory_cache_lock:
+        _memory_cache.clear()
+
+
+def remember_email_domain(domain: str) -> None:
+    """
+    Treat `domain` as able to receive email in this process (but not in Redis), without asking DNS
+    until it expires. For made-up domains, e.g. the benchmark_forms command's
+    """
+    _remember(domain.lower(), _DNS_OK, EMAIL_DOMAIN_CACHE_TTL_SECONDS)
+
+
+def _lookup_outcome(email_address: EmailAddress, timeout: float) -> str:
+    try:
+        dns_check(email_address=email_address, timeout=timeout)
+    except EmailValidationError as e:
+        if type(e).__name__ not in CACHEABLE_DNS_ERRORS:
+            raise
+        return type(e).__name__
+    return _DNS_OK
+
+
+def _store_outcome(domain: str, outcome: str) -> None:
+    ttl_seconds = _get_ttl_seconds(outcome)
+    _remember(domain, outcome, ttl_seconds)
+    try:
+        cache.set(_get_cache_key(domain), outcome, timeout=ttl_seconds)
+    except Exception:
+        logging.exception(f"Unable to cache the DNS outcome for {domain}")
+
+
+def check_email_domain_dns(email_address: str, timeout: float) -> None:
+    """
+    Like validate_email's own DNS check, raise the EmailValidationError explaining why the domain of
+    `email_address` can't receive email (DNSTimeoutError if DNS took longer than `timeout`), but
+    looking in memory, then Redis, before asking DNS
+    """
+    address = EmailAddress(address=email_address)
+    if address.domain_literal_ip:
+        # e.g. user@[192.0.2.1], there's nothing to look up
+        return
+
+    domain = address.domain.lower()
+    outcome = _recall(domain)
+    if outcome is not None:
+        statsd.increment("meshdb.email_domain_cache.lookup", tags=["status:memory_hit"])
+    else:
+        try:
+            outcome = cache.get(_get_cache_key(domain))
+        except Exception:
+            logging.exception(f"Unable to look up the cached DNS outcome for {domain}")
+
+        if outcome is not None:
+            statsd.increment("meshdb.email_domain_cache.lookup", tags=["status:redis_hit"])
+            # Redis will forget it within the TTL, and so should we
+            _remember(domain, outcome, _get_ttl_seconds(outcome))
+        else:
+            statsd.increment("meshdb.email_domain_cache.lookup", tags=["status:miss"])
+            outcome = _lookup_outcome(address, timeout)
+            _store_outcome(domain, outcome)
+
+    if outcome != _DNS_OK:
+        raise CACHEABLE_DNS_ERRORS[outcome]()
+
+
+def get_most_common_email_domains(count: int) -> List[str]:
+    # meshapi.models needs meshapi.validation, which needs us
+    from meshapi.models import Member
+
+    return list(
+        Member.objects.exclude(primary_email_address__isnull=True)
+        .filter(primary_email_address__contains="@")
+        .annotate(domain=Lower(Substr("primary_email_address", StrIndex("primary_email_address", Value("@")) + 1)))
+        .values("domain")
+        .annotate(members=Count("id"))
+        .order_by("-members", "domain")
+        .values_list("domain", flat=True)[:count]
+    )
+
+
+def warm_email_domain_cache(count: int = EMAIL_DOMAIN_CACHE_WARM_COUNT, timeout: float = 5) -> int:
+    """
+    Look up the `count` most common email domains among our members, and cache the outcome, so that
+    people signing up with them never have to wait for DNS. Returns how many domains were looked up
+    """
+    warmed = 0
+    for domain in get_most_common_email_domains(count):
+        try:
+            _store_outcome(domain, _lookup_outcome(EmailAddress(address=f"postmaster@{domain}"), timeout))
+            warmed += 1
+        except EmailValidationError:
+            # A timeout (or a domain validate_email can't make sense of), try again next time
+            logging.warning(f"Unable to look up the MX records for {domain}")
+    return warmed
@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from datadog import statsd
+from ddtrace import tracer
+from ddtrace.trace import Context
+
+# Enrichment steps spend nearly all of their time waiting on other people's APIs, so this is about how
+# many lookups we're willing to have in flight at once per process, rather than how many CPUs we have
+ENRICHMENT_MAX_WORKERS = 8
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Created on first use rather than at import, threads don't survive the fork into
+    # gunicorn/celery workers
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ENRICHMENT_MAX_WORKERS, thread_name_prefix="meshdb-enrichment")
+        return _executor
+
+
+class EnrichmentGraph:
+    """
+    A handful of blocking steps (usually calls to external APIs), some of which may need the results of
+    others, run concurrently on a shared thread pool. Each step starts as soon as it's added, and the whole
+    graph must finish within `deadline_seconds` of being created, after which result() raises TimeoutError
+    (the step carries on in the background, but nobody waits for it). Each step is timed to statsd as
+    meshdb.<name>.step, and traced as <name>.<step>
+    """
+
+    def __init__(self, name: str, deadline_seconds: float) -> None:
+        self.name = name
+        self.deadline = time.monotonic() + deadline_seconds
+        self._futures: Dict[str, Future] = {}
+
+    def _remaining_seconds(self) -> float:
+        return max(self.deadline - time.monotonic(), 0)
+
+    def add(self, step: str, function: Callable[..., Any], depends_on: Sequence[str] = ()) -> None:
+        """
+        Start `step`, which calls `function` with the results of the steps in `depends_on` (which must
+        already have been added), in that order
+        """
+        dependencies = [self._futures[dependency] for dependency in depends_on]
+        self._futures[step] = _get_executor().submit(
+            self._run_step, step, function, dependencies, tracer.current_trace_context()
+        )
+
+    def _run_step(
+        self, step: str, function: Callable[..., Any], dependencies: List[Future], trace_context: Optional[Context]
+    ) -> Any:
+        # Dependencies were submitted before us, so they're already running (or done) by the time a
+        # worker picks us up, and waiting on them here can't starve the pool
+        arguments = [dependency.result(timeout=self._remaining_seconds()) for dependency in dependencies]
+
+        tracer.context_provider.activate(trace_context)
+        start = time.monotonic()
+        status = "failure"
+        try:
+            with tracer.trace(f"{self.name}.{step}", resource=step):
+                result = function(*arguments)
+            status = "success"
+            return result
+        finally:
+            statsd.timing(
+                f"meshdb.{self.name}.step",
+                (time.monotonic() - start) * 1000,
+                tags=[f"step:{step}", f"status:{status}"],
+            )
+            tracer.context_provider.activate(None)
+
+    def result(self, step: str) -> Any:
+        """
+        Wait for `step` to finish, and return its result (or raise whatever it raised). Raises TimeoutError
+        if it hasn't finished by the deadline
+        """
+        future = self._futures[step]
+        try:
+            return future.result(timeout=self._remaining_seconds())
+        except TimeoutError:
+            if not future.done():
+                statsd.increment(f"meshdb.{self.name}.deadline_exceeded", tags=[f"step:{step}"])
+            raise
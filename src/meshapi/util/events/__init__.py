@@ -1,2 +1,3 @@
 from .join_requests_slack_channel import send_join_request_slack_message
 from .osticket_creation import create_os_ticket_for_install
+from .snapshot_invalidation import invalidate_snapshots_on_change
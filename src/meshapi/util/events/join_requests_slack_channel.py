@@ -1,16 +1,43 @@
 import logging
-import os
-import time
+from typing import List, Optional
 
 import requests
+from celery import Task
+from datadog import statsd
+from django.core.cache import cache
+from django.db import transaction
 from django.db.models.base import ModelBase
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 from meshapi.models import Install
+from meshapi.util import http_client
 from meshapi.util.django_flag_decorator import skip_if_flag_disabled
+from meshdb.celery import app as celery_app
 from meshdb.environment import SLACK_JOIN_REQUESTS_CHANNEL_WEBHOOK_URL
 
+SLACK_DELIVERY_ATTEMPTS = 4
+# Doubled after each failed attempt
+SLACK_RETRY_BACKOFF_SECONDS = 2
+
+# Join requests tend to come in bursts (e.g. after a talk, or a building-wide flyer), so rather than a
+# message each, we wait this long after the first one and post everything that's come in since together
+SLACK_COALESCE_SECONDS = 10
+SLACK_SCHEDULED_CACHE_KEY = "meshdb:join-requests-slack:scheduled"
+
+# Each install waiting to be announced gets a slot in a queue kept in the cache: a sequence number
+# (SLACK_QUEUED_CACHE_KEY), and a key per slot holding the install number. SLACK_SENT_CACHE_KEY is the
+# last slot we've taken off the queue
+SLACK_QUEUED_CACHE_KEY = "meshdb:join-requests-slack:queued"
+SLACK_SENT_CACHE_KEY = "meshdb:join-requests-slack:sent"
+SLACK_SLOT_CACHE_KEY_PREFIX = "meshdb:join-requests-slack:slot:"
+SLACK_MISSING_SLOT_CACHE_KEY = "meshdb:join-requests-slack:missing-slot"
+SLACK_QUEUE_TTL_SECONDS = 24 * 60 * 60
+
+# Set once an install has been announced, so that nobody hears about it twice
+SLACK_IDEMPOTENCY_KEY_PREFIX = "meshdb:join-requests-slack:announced:"
+SLACK_IDEMPOTENCY_TTL_SECONDS = 7 * 24 * 60 * 60
+
 
 @receiver(post_save, sender=Install, dispatch_uid="join_requests_slack_channel")
 @skip_if_flag_disabled("INTEGRATION_ENABLED_SEND_JOIN_REQUEST_SLACK_MESSAGES")
@@ -18,36 +45,114 @@ def send_join_request_slack_message(sender: ModelBase, instance: Install, create
     if not created:
         return
 
-    install: Install = instance
+    # Slack can be slow, so we don't make whoever saved the install (e.g. the join form) wait for it. And
+    # until the transaction commits, the worker wouldn't be able to see the install anyway
+    install_number = instance.install_number
+    transaction.on_commit(lambda: enqueue_join_request_slack_message(install_number))
+
+
+def enqueue_join_request_slack_message(install_number: int) -> None:
+    try:
+        cache.add(SLACK_QUEUED_CACHE_KEY, 0, timeout=None)
+        slot = cache.incr(SLACK_QUEUED_CACHE_KEY)
+        cache.set(f"{SLACK_SLOT_CACHE_KEY_PREFIX}{slot}", install_number, timeout=SLACK_QUEUE_TTL_SECONDS)
+
+        # Whoever sees no message scheduled schedules one, which picks up everyone queued behind them too
+        if cache.add(SLACK_SCHEDULED_CACHE_KEY, True, timeout=SLACK_COALESCE_SECONDS * 2):
+            send_join_request_slack_messages_task.apply_async(countdown=SLACK_COALESCE_SECONDS)
+    except Exception:
+        logging.exception(f"Unable to queue install #{install_number} for the join requests channel")
+        statsd.increment("meshdb.join_requests_slack.schedule", tags=["status:failure"])
+        try:
+            # Without the cache to coalesce with, just send it on its own
+            send_join_request_slack_messages_task.apply_async([[install_number]])
+        except Exception:
+            logging.exception(f"Unable to schedule a join requests channel message for install #{install_number}")
+
+
+def take_queued_install_numbers() -> List[int]:
+    """
+    Take every install number waiting to be announced off the queue, in the order they were queued
+    """
+    # Cleared first, so that anything queued from here on schedules another message rather than
+    # counting on this one
+    cache.delete(SLACK_SCHEDULED_CACHE_KEY)
+
+    previously_sent = sent = cache.get(SLACK_SENT_CACHE_KEY, 0)
+    queued = cache.get(SLACK_QUEUED_CACHE_KEY, 0)
+    slot_keys = [f"{SLACK_SLOT_CACHE_KEY_PREFIX}{slot}" for slot in range(sent + 1, queued + 1)]
+    install_numbers_by_key = cache.get_many(slot_keys)
+
+    install_numbers = []
+    for slot_key in slot_keys:
+        if slot_key in install_numbers_by_key:
+            install_numbers.append(install_numbers_by_key[slot_key])
+        elif cache.get(SLACK_MISSING_SLOT_CACHE_KEY) != slot_key:
+            # Someone took this slot but hasn't filled it in yet. Leave it (and everything after it) for
+            # another message, and if it's still empty by then, they're never going to fill it in
+            cache.set(SLACK_MISSING_SLOT_CACHE_KEY, slot_key, timeout=SLACK_QUEUE_TTL_SECONDS)
+            if cache.add(SLACK_SCHEDULED_CACHE_KEY, True, timeout=SLACK_COALESCE_SECONDS * 2):
+                send_join_request_slack_messages_task.apply_async(countdown=SLACK_COALESCE_SECONDS)
+            break
+        sent += 1
+
+    cache.set(SLACK_SENT_CACHE_KEY, sent, timeout=None)
+    cache.delete_many(slot_keys[: sent - previously_sent])
+    return install_numbers
+
+
+def build_join_request_slack_message(install: Install) -> str:
+    building_height = str(int(install.building.altitude)) + "m" if install.building.altitude else "Altitude not found"
+    roof_access = "Roof access" if install.roof_access else "No roof access"
+
+    return (
+        f"*<https://www.nycmesh.net/map/nodes/{install.install_number}"
+        f"|{install.building.one_line_complete_address}>*\n"
+        f"{building_height} · {roof_access} · No LoS Data Available"
+    )
+
+
+@celery_app.task(bind=True, max_retries=SLACK_DELIVERY_ATTEMPTS - 1)
+def send_join_request_slack_messages_task(self: Task, install_numbers: Optional[List[int]] = None) -> None:
+    """
+    Announce the given installs (or, by default, everything queued) in the join requests channel, in
+    one message
+    """
+    if install_numbers is None:
+        install_numbers = [
+            install_number
+            for install_number in take_queued_install_numbers()
+            if cache.add(f"{SLACK_IDEMPOTENCY_KEY_PREFIX}{install_number}", True, timeout=SLACK_IDEMPOTENCY_TTL_SECONDS)
+        ]
+    if not install_numbers:
+        return
+
     if not SLACK_JOIN_REQUESTS_CHANNEL_WEBHOOK_URL:
         logging.error(
-            f"Unable to send join request notification for install {str(install)}, did you set the "
+            f"Unable to send join request notification for installs {install_numbers}, did you set the "
             f"SLACK_JOIN_REQUESTS_CHANNEL_WEBHOOK_URL environment variable?"
         )
         return
 
-    building_height = str(int(install.building.altitude)) + "m" if install.building.altitude else "Altitude not found"
-    roof_access = "Roof access" if install.roof_access else "No roof access"
-
-    attempts = 0
-    while attempts < 4:
-        attempts += 1
-        response = requests.post(
-            SLACK_JOIN_REQUESTS_CHANNEL_WEBHOOK_URL,
-            json={
-                "text": f"*<https://www.nycmesh.net/map/nodes/{install.install_number}"
-                f"|{install.building.one_line_complete_address}>*\n"
-                f"{building_height} · {roof_access} · No LoS Data Available"
-            },
-        )
+    installs = Install.objects.select_related("building").filter(install_number__in=install_numbers)
+    text = "\n".join(
+        build_join_request_slack_message(install) for install in sorted(installs, key=lambda i: i.install_number)
+    )
+    if not text:
+        return
 
+    try:
+        response = http_client.post(SLACK_JOIN_REQUESTS_CHANNEL_WEBHOOK_URL, json={"text": text})
         if response.status_code == 200:
-            break
+            statsd.increment("meshdb.join_requests_slack.send", len(install_numbers), tags=["status:success"])
+            return
+        error = f"HTTP {response.status_code}. HTTP response was {response.text}"
+    except requests.RequestException as e:
+        error = repr(e)
 
-        time.sleep(1)
+    if self.request.retries < self.max_retries:
+        # With the installs we took off the queue, so that a retry doesn't go looking for more
+        raise self.retry(args=[install_numbers], countdown=SLACK_RETRY_BACKOFF_SECONDS * 2**self.request.retries)
 
-    if response.status_code != 200:
-        logging.error(
-            f"Got HTTP {response.status_code} while sending install create notification to "
-            f"join-requests channel. HTTP response was {response.text}"
-        )
+    logging.error(f"Got {error} while sending install create notification to join-requests channel")
+    statsd.increment("meshdb.join_requests_slack.send", len(install_numbers), tags=["status:failure"])
@@ -1,16 +1,37 @@
 import logging
-import os
-import time
+from typing import Any, Dict, Optional
 
 import requests
+from celery import Task
+from datadog import statsd
+from django.core.cache import cache
+from django.db import transaction
 from django.db.models.base import ModelBase
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from flags.state import flag_enabled
 
 from meshapi.models import Install, Node
+from meshapi.util import http_client
 from meshapi.util.django_flag_decorator import skip_if_flag_disabled
-from meshdb.environment import OSTICKET_API_TOKEN, OSTICKET_NEW_TICKET_ENDPOINT, OSTICKET_URL
+from meshdb.celery import app as celery_app
+from meshdb.environment import OSTICKET_API_TOKEN, OSTICKET_NEW_TICKET_ENDPOINT
+
+OSTICKET_DELIVERY_ATTEMPTS = 4
+# Doubled after each failed attempt
+OSTICKET_RETRY_BACKOFF_SECONDS = 2
+
+# Taken while a ticket is being created for an install, and kept once it has been, so that the same
+# install never gets two tickets, however many times its task is delivered
+OSTICKET_IDEMPOTENCY_KEY_PREFIX = "meshdb:osticket-creation:"
+OSTICKET_IN_PROGRESS_TTL_SECONDS = 10 * 60
+OSTICKET_CREATED_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# OSTicket can take a while to open a ticket (it sends the member an email while we wait). We'd rather wait
+# than give up, since once the request has been sent we can't know whether the ticket was opened, and so
+# can't safely try again
+OSTICKET_CREATE_TIMEOUT_SECONDS = 60
+
 
 @receiver(post_save, sender=Install, dispatch_uid="create_os_ticket_for_install")
 @skip_if_flag_disabled("INTEGRATION_ENABLED_CREATE_OSTICKET_TICKETS")
@@ -18,15 +39,26 @@ def create_os_ticket_for_install(sender: ModelBase, instance: Install, created:
     if not created:
         return
 
-    install: Install = instance
-    install.refresh_from_db()
-    if not OSTICKET_API_TOKEN or not OSTICKET_NEW_TICKET_ENDPOINT:
-        logging.error(
-            f"Unable to create ticket for install {str(install)}, did you set the OSTICKET_API_TOKEN "
-            f"and OSTICKET_NEW_TICKET_ENDPOINT env vars?"
-        )
-        return
+    # OSTicket can be slow, so we don't make whoever saved the install (e.g. the join form) wait for
+    # it. And until the transaction commits, the worker wouldn't be able to see the install anyway
+    install_number = instance.install_number
+    transaction.on_commit(lambda: enqueue_os_ticket_creation(install_number))
+
+
+def enqueue_os_ticket_creation(install_number: int) -> None:
+    try:
+        create_os_ticket_task.apply_async([install_number])
+    except Exception:
+        # Never let this break a database write
+        logging.exception(f"Unable to schedule OSTicket creation for install #{install_number}")
+        statsd.increment("meshdb.osticket_creation.schedule", tags=["status:failure"])
+
 
+def build_os_ticket_data(install: Install) -> Optional[Dict[str, Any]]:
+    """
+    The body of the OSTicket API request which opens a ticket for `install`, or None if we shouldn't
+    open one
+    """
     name = install.member.name
     email = install.member.primary_email_address
     phone = install.member.phone_number
@@ -41,7 +73,7 @@ def create_os_ticket_for_install(sender: ModelBase, instance: Install, created:
             f"Not creating OSTicket for install {str(install)}. Member {str(install.member)} "
             f"does not have a primary email address"
         )
-        return
+        return None
 
     if rooftop_access:
         rooftop = "Rooftop install"
@@ -81,27 +113,64 @@ def create_os_ticket_for_install(sender: ModelBase, instance: Install, created:
         else:
             data["existingNetworkNumber"] = ""
 
-    attempts = 0
-    while attempts < 4:
-        attempts += 1
-        response = requests.post(
-            OSTICKET_NEW_TICKET_ENDPOINT,
-            json=data,
-            headers={"X-API-Key": OSTICKET_API_TOKEN},
+    return data
+
+
+@celery_app.task(bind=True, max_retries=OSTICKET_DELIVERY_ATTEMPTS - 1)
+def create_os_ticket_task(self: Task, install_number: int) -> None:
+    if not OSTICKET_API_TOKEN or not OSTICKET_NEW_TICKET_ENDPOINT:
+        logging.error(
+            f"Unable to create ticket for install #{install_number}, did you set the OSTICKET_API_TOKEN "
+            f"and OSTICKET_NEW_TICKET_ENDPOINT env vars?"
         )
+        return
 
-        if response.status_code == 201:
-            break
+    install = Install.objects.select_related("member", "building", "node").get(install_number=install_number)
+    data = build_os_ticket_data(install)
+    if data is None:
+        return
 
-        time.sleep(1)
+    idempotency_key = f"{OSTICKET_IDEMPOTENCY_KEY_PREFIX}{install_number}"
+    if not cache.add(idempotency_key, True, timeout=OSTICKET_IN_PROGRESS_TTL_SECONDS):
+        logging.warning(f"Not creating a second OSTicket for install #{install_number}")
+        return
 
-    if response.status_code != 201:
+    try:
+        response = http_client.post(
+            OSTICKET_NEW_TICKET_ENDPOINT,
+            json=data,
+            headers={"X-API-Key": OSTICKET_API_TOKEN},
+            timeout=OSTICKET_CREATE_TIMEOUT_SECONDS,
+        )
+        error = None if response.status_code == 201 else f"HTTP {response.status_code}: {response.text}"
+    except requests.ConnectionError as e:
+        # We never got through to OSTicket, so it's safe to try again
+        error = repr(e)
+    except requests.RequestException as e:
+        # e.g. we timed out waiting for an answer. OSTicket may well have opened the ticket, so we keep the
+        # idempotency key rather than risk opening a second one, and leave it to a human to check
+        cache.set(idempotency_key, True, timeout=OSTICKET_CREATED_TTL_SECONDS)
         logging.error(
-            f"Unable to create ticket for install {str(install)}. OSTicket returned "
-            f"HTTP {response.status_code}: {response.text}"
+            f"Unknown whether a ticket was created for install {str(install)}, please check OSTicket and set "
+            f"its ticket number by hand. Got {repr(e)}"
         )
+        statsd.increment("meshdb.osticket_creation.create", tags=["status:unknown"])
+        return
+
+    if error:
+        cache.delete(idempotency_key)
+        if self.request.retries < self.max_retries:
+            raise self.retry(countdown=OSTICKET_RETRY_BACKOFF_SECONDS * 2**self.request.retries)
+
+        logging.error(f"Unable to create ticket for install {str(install)}. OSTicket returned {error}")
+        statsd.increment("meshdb.osticket_creation.create", tags=["status:failure"])
         return
 
-    # If we got a good response, update the install object to reflect the ticket ID we just created
+    # If we got a good response, update the install object to reflect the ticket ID we just created. Someone
+    # may have edited the install while we were waiting on OSTicket, so re-read it rather than overwriting
+    # their changes with our stale copy, and only write the ticket number
+    install = Install.objects.get(install_number=install_number)
     install.ticket_number = response.text
-    install.save()
+    install.save(update_fields=["ticket_number"])
+    cache.set(idempotency_key, True, timeout=OSTICKET_CREATED_TTL_SECONDS)
+    statsd.increment("meshdb.osticket_creation.create", tags=["status:success"])
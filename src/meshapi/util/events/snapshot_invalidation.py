@@ -0,0 +1,47 @@
+from typing import Any
+
+from django.db import transaction
+from django.db.models.base import ModelBase
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from meshapi.models import LOS, AccessPoint, Building, Device, Install, Link, Node, Sector
+from meshapi.util.geography_artifacts import schedule_geography_artifact_rebuild
+from meshapi.util.snapshot_cache import invalidate_snapshots
+
+# Every model which contributes to a cached snapshot (e.g. the website map data)
+SNAPSHOT_SOURCE_MODELS = [Install, Node, Building, Device, Link, LOS, Sector, AccessPoint]
+
+
+def invalidate_snapshots_on_change(sender: ModelBase, **kwargs: Any) -> None:
+    action = kwargs.get("action")
+    if action and not action.startswith("post_"):
+        # m2m_changed fires before and after each change, we only care about the latter
+        return
+
+    # Invalidate right away so that this request sees its own writes, and again once the
+    # transaction commits, so that a concurrent request which rebuilt a snapshot in between
+    # (and therefore couldn't see our uncommitted rows) doesn't get to keep it
+    invalidate_snapshots()
+    transaction.on_commit(invalidate_snapshots)
+
+    # The pre-built files nginx serves can't be invalidated, so they're rebuilt instead (at most once a minute)
+    transaction.on_commit(schedule_geography_artifact_rebuild)
+
+
+for model in SNAPSHOT_SOURCE_MODELS:
+    post_save.connect(
+        invalidate_snapshots_on_change,
+        sender=model,
+        dispatch_uid=f"invalidate_snapshots_post_save_{model.__name__}",
+    )
+    post_delete.connect(
+        invalidate_snapshots_on_change,
+        sender=model,
+        dispatch_uid=f"invalidate_snapshots_post_delete_{model.__name__}",
+    )
+
+m2m_changed.connect(
+    invalidate_snapshots_on_change,
+    sender=Building.nodes.through,
+    dispatch_uid="invalidate_snapshots_m2m_changed_building_nodes",
+)
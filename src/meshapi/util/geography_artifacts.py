@@ -0,0 +1,136 @@
+import gzip
+import logging
+import os
+import tempfile
+from typing import Iterable, Iterator, Optional
+
+from datadog import statsd
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponse
+from django.http.response import HttpResponseBase
+
+from meshdb.celery import app as celery_app
+from meshdb.environment import GEOGRAPHY_ARTIFACT_ACCEL_REDIRECT_PREFIX, GEOGRAPHY_ARTIFACT_DIR
+
+# The whole mesh geographic exports are expensive to generate, and the same for everyone, so a
+# Celery task writes them to disk whenever the mesh changes, for nginx to serve as static files
+
+GEOGRAPHY_ARTIFACT_REBUILD_TASK = "meshapi.tasks.build_geography_artifacts"
+
+# Rebuild at most this often, however many writes we get (e.g. from the UISP import)
+GEOGRAPHY_ARTIFACT_REBUILD_DEBOUNCE_SECONDS = 60
+GEOGRAPHY_ARTIFACT_REBUILD_SCHEDULED_CACHE_KEY = "meshdb:geography-artifacts-rebuild-scheduled"
+
+GEOGRAPHY_ARTIFACT_READ_CHUNK_SIZE = 64 * 1024
+
+
+def get_artifact_path(name: str) -> Optional[str]:
+    """
+    Where the artifact called `name` (e.g. "whole-mesh.kml") is kept, or None if artifacts are disabled
+    """
+    if not GEOGRAPHY_ARTIFACT_DIR:
+        return None
+    return os.path.join(GEOGRAPHY_ARTIFACT_DIR, name)
+
+
+def _replace_file(path: str, chunks: Iterable[bytes], compress: bool = False) -> None:
+    # Write to a temporary file and swap it in, so that nginx never serves half a file
+    fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if compress:
+                # A fixed mtime keeps the compressed output (and so nginx's ETag) stable
+                with gzip.GzipFile(fileobj=f, mode="wb", mtime=0) as gzip_file:
+                    for chunk in chunks:
+                        gzip_file.write(chunk)
+            else:
+                for chunk in chunks:
+                    f.write(chunk)
+        # mkstemp() only lets the owner read it, and nginx usually runs as someone else
+        os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def write_artifact(name: str, chunks: Iterable[bytes], compressible: bool = True) -> None:
+    """
+    Atomically replace the artifact called `name` with the given content, along with a gzipped copy
+    for nginx's gzip_static, unless it's `compressible=False` (e.g. a zip archive)
+    """
+    path = get_artifact_path(name)
+    if path is None:
+        raise ValueError("GEOGRAPHY_ARTIFACT_DIR is not set, there is nowhere to write artifacts")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _replace_file(path, chunks)
+
+    gzip_path = f"{path}.gz"
+    if compressible:
+        _replace_file(gzip_path, iter_artifact_chunks(name), compress=True)
+    elif os.path.exists(gzip_path):
+        os.unlink(gzip_path)
+
+
+def iter_artifact_chunks(name: str) -> Iterator[bytes]:
+    path = get_artifact_path(name)
+    if path is None:
+        return
+
+    with open(path, "rb") as f:
+        while chunk := f.read(GEOGRAPHY_ARTIFACT_READ_CHUNK_SIZE):
+            yield chunk
+
+
+def artifact_http_response(name: str, content_type: str) -> Optional[HttpResponseBase]:
+    """
+    Hand the artifact called `name` off to nginx (or, without nginx in front of us, stream it from
+    disk ourselves), or None if it hasn't been built yet, in which case the caller should build the
+    content on demand
+    """
+    path = get_artifact_path(name)
+    if path is None or not os.path.exists(path):
+        statsd.increment("meshdb.geography_artifacts.lookup", tags=[f"artifact:{name}", "status:missing"])
+        return None
+
+    statsd.increment("meshdb.geography_artifacts.lookup", tags=[f"artifact:{name}", "status:hit"])
+    if GEOGRAPHY_ARTIFACT_ACCEL_REDIRECT_PREFIX:
+        # nginx keeps our Content-Type, and takes care of ETags, ranges, and compression
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = f"{GEOGRAPHY_ARTIFACT_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{name}"
+        return response
+
+    try:
+        return FileResponse(open(path, "rb"), content_type=content_type)
+    except FileNotFoundError:
+        return None
+
+
+def schedule_geography_artifact_rebuild() -> None:
+    """
+    Rebuild the artifacts once the debounce period is up, unless a rebuild is already scheduled (in
+    which case it will pick up whatever changed). Call this once the changes have been committed
+    """
+    if not GEOGRAPHY_ARTIFACT_DIR:
+        return
+
+    try:
+        if not cache.add(
+            GEOGRAPHY_ARTIFACT_REBUILD_SCHEDULED_CACHE_KEY, True, timeout=GEOGRAPHY_ARTIFACT_REBUILD_DEBOUNCE_SECONDS
+        ):
+            return
+
+        celery_app.send_task(GEOGRAPHY_ARTIFACT_REBUILD_TASK, countdown=GEOGRAPHY_ARTIFACT_REBUILD_DEBOUNCE_SECONDS)
+    except Exception:
+        # Never let this break a database write, the hourly rebuild will catch up
+        logging.exception("Unable to schedule a rebuild of the geography artifacts")
+        statsd.increment("meshdb.geography_artifacts.schedule", tags=["status:failure"])
+
+
+def clear_scheduled_geography_artifact_rebuild() -> None:
+    # Called as a rebuild starts, so that anything written from here on schedules another one
+    try:
+        cache.delete(GEOGRAPHY_ARTIFACT_REBUILD_SCHEDULED_CACHE_KEY)
+    except Exception:
+        logging.exception("Unable to clear the scheduled geography artifact rebuild")
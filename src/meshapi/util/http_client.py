@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Callable, Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+from datadog import statsd
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import InvalidHeader
+from urllib3.util.retry import Retry
+
+from meshapi.util.constants import DEFAULT_EXTERNAL_API_TIMEOUT_SECONDS
+
+# Every request we make to another service (the city's APIs, Pelias, Slack, OSTicket, GitHub, webhooks)
+# goes through one session per process, so that we keep connections to each host alive between requests
+# rather than paying for a new TCP and TLS handshake every time
+
+# Connecting shouldn't take anywhere near as long as waiting for an answer. Requests can still pass
+# their own timeout (e.g. for large downloads)
+HTTP_CONNECT_TIMEOUT_SECONDS = 3.05
+DEFAULT_HTTP_TIMEOUT = (HTTP_CONNECT_TIMEOUT_SECONDS, DEFAULT_EXTERNAL_API_TIMEOUT_SECONDS)
+
+# How many hosts we keep connections to, and how many connections we keep to each of them (we still
+# make more requests than that at once if we need to, we just don't keep the extra connections)
+HTTP_POOL_HOSTS = 20
+HTTP_POOL_CONNECTIONS_PER_HOST = 10
+
+# Only idempotent requests are retried (so never a POST, it's up to the caller whether it's safe to
+# send one twice), with jittered exponential backoff so that we don't all retry in lockstep. We never
+# retry a request which timed out waiting for an answer: the service is slow rather than unreachable, and
+# somebody (e.g. the join form) is usually waiting on us, so trying again would just multiply how long
+# they wait. For the same reason, we don't wait out a Retry-After (which can be minutes long), see
+# notify_retry_after() for batch jobs which can
+HTTP_RETRY = Retry(
+    total=2,
+    read=False,
+    backoff_factor=0.25,
+    backoff_jitter=0.25,
+    status_forcelist=[502, 503, 504],
+    allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+    raise_on_status=False,
+    respect_retry_after_header=False,
+)
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+# See notify_retry_after()
+_retry_after_listeners = threading.local()
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    # The session is shared by every integration (and thread), so don't let a response leave
+    # anything behind for the next request
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_HOSTS,
+        pool_maxsize=HTTP_POOL_CONNECTIONS_PER_HOST,
+        max_retries=HTTP_RETRY,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    global _session, _session_pid
+    with _session_lock:
+        # Connections can't be shared with a forked child (e.g. a celery worker), it gets its own
+        if _session is None or _session_pid != os.getpid():
+            _session = _create_session()
+            _session_pid = os.getpid()
+        return _session
+
+
+@contextmanager
+def notify_retry_after(listener: Callable[[float], None]) -> Iterator[None]:
+    """
+    While in this context (on this thread), whenever a service answers with a Retry-After header (e.g. on
+    a 429), call `listener` with the number of seconds it asked us to wait, so that a batch job can hold
+    off its next request to that service
+    """
+    previous = getattr(_retry_after_listeners, "listener", None)
+    _retry_after_listeners.listener = listener
+    try:
+        yield
+    finally:
+        _retry_after_listeners.listener = previous
+
+
+def _notify_retry_after(response: requests.Response) -> None:
+    listener = getattr(_retry_after_listeners, "listener", None)
+    retry_after = response.headers.get("Retry-After")
+    if listener is None or not retry_after or response.status_code not in Retry.RETRY_AFTER_STATUS_CODES:
+        return
+
+    try:
+        listener(HTTP_RETRY.parse_retry_after(retry_after))
+    except InvalidHeader:
+        pass
+
+
+def request(method: str, url: str, **kwargs: Any) -> requests.Response:
+    """
+    Make an HTTP request on the shared session, with DEFAULT_HTTP_TIMEOUT unless `timeout` is given.
+    Takes the same arguments as requests.request(). Reports the latency of every request to statsd as
+    meshdb.http.request, and anything which goes wrong as meshdb.http.error, tagged by host
+    """
+    kwargs.setdefault("timeout", DEFAULT_HTTP_TIMEOUT)
+    host = urlsplit(url).hostname or "unknown"
+
+    start = time.monotonic()
+    status = "exception"
+    try:
+        response = get_session().request(method, url, **kwargs)
+        status = str(response.status_code)
+    except requests.RequestException as e:
+        statsd.increment("meshdb.http.error", tags=[f"host:{host}", f"error:{type(e).__name__}"])
+        raise
+    finally:
+        statsd.timing(
+            "meshdb.http.request",
+            (time.monotonic() - start) * 1000,
+            tags=[f"host:{host}", f"method:{method}", f"status:{status}"],
+        )
+
+    if response.status_code >= 500:
+        statsd.increment("meshdb.http.error", tags=[f"host:{host}", f"error:http_{response.status_code}"])
+    _notify_retry_after(response)
+    return response
+
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs: Any) -> requests.Response:
+    return request("POST", url, **kwargs)
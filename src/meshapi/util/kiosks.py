@@ -0,0 +1,272 @@
+import datetime
+import json
+import logging
+import os
+import tempfile
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional
+
+from datadog import statsd
+from django.core.cache import cache
+from django.utils import timezone
+
+from meshapi.util import http_client
+from meshapi.util.snapshot_cache import Snapshot, compute_etag
+from meshdb.celery import app as celery_app
+from meshdb.environment import LINKNYC_KIOSK_SNAPSHOT_PATH
+
+LINKNYC_KIOSK_DATA_URL = "https://data.cityofnewyork.us/resource/s4kf-3yrf.json?$limit=100000"
+
+LINKNYC_KIOSK_STATUS_TRANSLATION = {
+    "Live": "active",
+    "Ready for Activation": "pending",
+    "Installed": "installed",
+}
+
+# The full dataset is a few MB, so this is more generous than DEFAULT_EXTERNAL_API_TIMEOUT_SECONDS. Only
+# the refresh tasks fetch it, requests never wait on it
+LINKNYC_KIOSK_FETCH_TIMEOUT_SECONDS = 60
+
+# The list is refreshed hourly, if we haven't managed to do that in this long, we start telling clients
+LINKNYC_KIOSK_STALE_AFTER_SECONDS = 6 * 60 * 60
+
+# Whoever asks for a list older than this (e.g. because the hourly refresh_linknyc_kiosks task is
+# disabled) kicks off a refresh in the background, and is served what we have in the meantime
+LINKNYC_KIOSK_REFRESH_AFTER_SECONDS = 60 * 60
+
+# Taken when a background refresh is scheduled, so that everyone else who finds the list out of date (or
+# missing) leaves it to that one. Kept for a while afterwards, so that while the city is down we don't go
+# back to it on every request
+LINKNYC_KIOSK_REFRESH_CACHE_KEY = "meshdb:linknyc-kiosks-refreshing"
+LINKNYC_KIOSK_REFRESH_DEBOUNCE_SECONDS = 5 * 60
+
+# How long we ask clients to wait while we fetch the list for the first time
+LINKNYC_KIOSK_FIRST_FETCH_RETRY_AFTER_SECONDS = 5
+
+LINKNYC_KIOSK_CACHE_KEY = "meshdb:linknyc-kiosks"
+# Just the ETag and refresh time, so each worker can check that its in-memory copy is current
+# without pulling the whole list out of the cache
+LINKNYC_KIOSK_METADATA_CACHE_KEY = "meshdb:linknyc-kiosks-metadata"
+
+
+@dataclass
+class KioskList:
+    """
+    The kiosk list as we serve it, along with what we need to conditionally re-fetch it from the city
+    """
+
+    snapshot: Snapshot
+    refreshed_at: datetime.datetime
+    upstream_etag: Optional[str] = None
+    upstream_last_modified: Optional[str] = None
+
+    def is_stale(self) -> bool:
+        age = timezone.now() - self.refreshed_at
+        return age > datetime.timedelta(seconds=LINKNYC_KIOSK_STALE_AFTER_SECONDS)
+
+    def needs_refresh(self) -> bool:
+        age = timezone.now() - self.refreshed_at
+        return age > datetime.timedelta(seconds=LINKNYC_KIOSK_REFRESH_AFTER_SECONDS)
+
+
+# This worker's copy of the list, checked against the shared cache before each use
+_local_kiosk_list: Optional[KioskList] = None
+
+
+def transform_kiosk_rows(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Convert the rows of the City of New York LinkNYC kiosk dataset into the format the website map expects
+    """
+    if not data:
+        raise ValueError("Expected at least one kiosk to be returned from the City of New York dataset")
+
+    kiosks = []
+    for row in data:
+        if not row:
+            logging.warning("Got empty row from City of New York LinkNYC kiosk dataset. Skipping row and moving on.")
+            continue
+        coordinates = [float(row["longitude"]), float(row["latitude"])]
+        kiosk_status = LINKNYC_KIOSK_STATUS_TRANSLATION.get(row["link_installation_status"])
+        kiosks.append(
+            {
+                "street_address": row["street_address"],
+                "type": row["planned_kiosk_type"],
+                "id": row["link_site_id"],
+                "coordinates": coordinates,
+                "status": kiosk_status,
+            }
+        )
+
+    return kiosks
+
+
+def _read_kiosk_list_file() -> Optional[KioskList]:
+    try:
+        with open(LINKNYC_KIOSK_SNAPSHOT_PATH) as f:
+            stored = json.load(f)
+
+        content = json.dumps(stored["kiosks"]).encode("utf-8")
+        return KioskList(
+            snapshot=Snapshot(content=content, etag=compute_etag(content)),
+            refreshed_at=datetime.datetime.fromisoformat(stored["refreshed_at"]),
+            upstream_etag=stored.get("upstream_etag"),
+            upstream_last_modified=stored.get("upstream_last_modified"),
+        )
+    except FileNotFoundError:
+        return None
+    except (OSError, KeyError, ValueError):
+        logging.exception("Unable to read the LinkNYC kiosk list from disk")
+        return None
+
+
+def _write_kiosk_list_file(kiosk_list: KioskList) -> None:
+    temporary_path = None
+    try:
+        # Write to a temporary file and swap it in, so that readers never see half a list
+        fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(LINKNYC_KIOSK_SNAPSHOT_PATH) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(
+                {
+                    "kiosks": json.loads(kiosk_list.snapshot.content),
+                    "refreshed_at": kiosk_list.refreshed_at.isoformat(),
+                    "upstream_etag": kiosk_list.upstream_etag,
+                    "upstream_last_modified": kiosk_list.upstream_last_modified,
+                },
+                f,
+            )
+        os.replace(temporary_path, LINKNYC_KIOSK_SNAPSHOT_PATH)
+    except OSError:
+        logging.exception("Unable to write the LinkNYC kiosk list to disk")
+        if temporary_path and os.path.exists(temporary_path):
+            os.unlink(temporary_path)
+
+
+def _cache_kiosk_list(kiosk_list: KioskList) -> None:
+    global _local_kiosk_list
+    _local_kiosk_list = kiosk_list
+
+    try:
+        cache.set(LINKNYC_KIOSK_CACHE_KEY, kiosk_list, timeout=None)
+        cache.set(
+            LINKNYC_KIOSK_METADATA_CACHE_KEY,
+            (kiosk_list.snapshot.etag, kiosk_list.refreshed_at),
+            timeout=None,
+        )
+    except Exception:
+        logging.exception("Unable to write the LinkNYC kiosk list to cache")
+
+
+def store_kiosk_list(kiosk_list: KioskList) -> None:
+    """
+    Save the kiosk list to the shared cache (for every worker) and to disk (in case the cache is lost)
+    """
+    _cache_kiosk_list(kiosk_list)
+    _write_kiosk_list_file(kiosk_list)
+
+
+def get_kiosk_list() -> Optional[KioskList]:
+    """
+    The most recently fetched kiosk list, from this worker's memory if it's still current, otherwise from
+    the shared cache, or from disk as a last resort. None if we have never managed to fetch it
+    """
+    global _local_kiosk_list
+
+    try:
+        metadata = cache.get(LINKNYC_KIOSK_METADATA_CACHE_KEY)
+        if metadata is not None:
+            etag, refreshed_at = metadata
+            if _local_kiosk_list is not None and _local_kiosk_list.snapshot.etag == etag:
+                if _local_kiosk_list.refreshed_at != refreshed_at:
+                    # The city told the refresh task nothing has changed
+                    _local_kiosk_list = replace(_local_kiosk_list, refreshed_at=refreshed_at)
+                return _local_kiosk_list
+
+            kiosk_list = cache.get(LINKNYC_KIOSK_CACHE_KEY)
+            if kiosk_list is not None:
+                _local_kiosk_list = kiosk_list
+                return kiosk_list
+    except Exception:
+        logging.exception("Unable to read the LinkNYC kiosk list from cache")
+        statsd.increment("meshdb.kiosks.lookup", tags=["status:cache_failure"])
+        # Whatever we have is better than nothing
+        if _local_kiosk_list is not None:
+            return _local_kiosk_list
+
+    kiosk_list = _read_kiosk_list_file()
+    if kiosk_list is not None:
+        statsd.increment("meshdb.kiosks.lookup", tags=["status:disk"])
+        # Repopulate the cache for everyone else
+        _cache_kiosk_list(kiosk_list)
+
+    return kiosk_list
+
+
+def refresh_kiosk_list() -> KioskList:
+    """
+    Fetch the kiosk list from the City of New York, skipping the download if it hasn't changed since
+    we last fetched it. Raises (leaving the existing list in place) if the city is unreachable or
+    returns something we can't make sense of
+    """
+    previous = get_kiosk_list()
+
+    headers = {}
+    if previous and previous.upstream_etag:
+        headers["If-None-Match"] = previous.upstream_etag
+    if previous and previous.upstream_last_modified:
+        headers["If-Modified-Since"] = previous.upstream_last_modified
+
+    response = http_client.get(LINKNYC_KIOSK_DATA_URL, headers=headers, timeout=LINKNYC_KIOSK_FETCH_TIMEOUT_SECONDS)
+    if previous and response.status_code == 304:
+        statsd.increment("meshdb.kiosks.refresh", tags=["status:not_modified"])
+        kiosk_list = replace(previous, refreshed_at=timezone.now())
+    else:
+        response.raise_for_status()
+        content = json.dumps(transform_kiosk_rows(response.json())).encode("utf-8")
+        statsd.increment("meshdb.kiosks.refresh", tags=["status:modified"])
+        kiosk_list = KioskList(
+            snapshot=Snapshot(content=content, etag=compute_etag(content)),
+            refreshed_at=timezone.now(),
+            upstream_etag=response.headers.get("ETag"),
+            upstream_last_modified=response.headers.get("Last-Modified"),
+        )
+
+    store_kiosk_list(kiosk_list)
+    return kiosk_list
+
+
+def claim_kiosk_list_refresh() -> bool:
+    """
+    Whether it's up to us to refresh the kiosk list, False if somebody else has recently started to
+    """
+    try:
+        return cache.add(LINKNYC_KIOSK_REFRESH_CACHE_KEY, True, timeout=LINKNYC_KIOSK_REFRESH_DEBOUNCE_SECONDS)
+    except Exception:
+        # Without the cache to coordinate through, everyone is on their own
+        logging.exception("Unable to claim the LinkNYC kiosk list refresh")
+        return True
+
+
+def schedule_kiosk_list_refresh() -> None:
+    """
+    Refresh the kiosk list in the background, unless somebody has recently started to
+    """
+    if not claim_kiosk_list_refresh():
+        return
+
+    try:
+        refresh_kiosk_list_task.apply_async()
+    except Exception:
+        logging.exception("Unable to schedule a refresh of the LinkNYC kiosk list")
+        statsd.increment("meshdb.kiosks.schedule", tags=["status:failure"])
+
+
+@celery_app.task
+def refresh_kiosk_list_task() -> None:
+    # Unlike the hourly refresh_linknyc_kiosks task, this isn't behind a flag, since it only runs when
+    # somebody has asked for the list and found it out of date (or missing)
+    try:
+        refresh_kiosk_list()
+    except Exception:
+        # Whoever asked is still being served the last list we fetched
+        logging.exception("Unable to refresh the LinkNYC kiosk list")
+        statsd.increment("meshdb.kiosks.refresh", tags=["status:failure"])
@@ -0,0 +1,215 @@
+import io
+import zipfile
+from contextlib import contextmanager
+from typing import Any, ContextManager, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from lxml import etree
+
+from meshapi.models.util.spatial import BoundingBox
+
+KML_NAMESPACE = "http://www.opengis.net/kml/2.2"
+
+# Earth expects the main document of a KMZ archive to be the first entry, and conventionally calls it this
+KMZ_DOCUMENT_NAME = "doc.kml"
+# Zip entries carry a timestamp, a fixed one keeps the archive (and so its ETag) stable
+KMZ_DOCUMENT_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Same idea as JSON_STREAM_CHUNK_SIZE, large enough to keep the number of writes to the socket
+# reasonable, small enough that we never hold much more than one chunk of encoded output at a time
+KML_STREAM_CHUNK_SIZE = 64 * 1024
+
+_INDENT = "  "
+
+Coordinate = Tuple[float, float, float]
+
+
+def format_coordinates(coordinates: Sequence[Coordinate]) -> str:
+    # Formatted like fastkml (and so pygeoif), which skips repeated points
+    distinct_coordinates: List[Coordinate] = []
+    for coordinate in coordinates:
+        if not distinct_coordinates or distinct_coordinates[-1] != coordinate:
+            distinct_coordinates.append(coordinate)
+
+    return " ".join(f"{c[0]:.6f},{c[1]:.6f},{c[2]:.6f}" for c in distinct_coordinates)
+
+
+def _text_element(parent: etree._Element, tag: str, text: str) -> etree._Element:
+    element = etree.SubElement(parent, tag)
+    element.text = text
+    return element
+
+
+def build_icon_style(style_id: str, icon_href: str) -> etree._Element:
+    style = etree.Element("Style", id=style_id)
+    icon_style = etree.SubElement(style, "IconStyle")
+    icon = etree.SubElement(icon_style, "Icon")
+    _text_element(icon, "href", icon_href)
+    hot_spot = etree.SubElement(icon_style, "hotSpot")
+    # Attribute order matters if we want to match fastkml byte for byte
+    for name, value in [("x", "0.5"), ("y", "0.5"), ("xunits", "fraction"), ("yunits", "fraction")]:
+        hot_spot.set(name, value)
+    return style
+
+
+def build_line_style(style_id: str, color: str, width: int) -> etree._Element:
+    style = etree.Element("Style", id=style_id)
+    line_style = etree.SubElement(style, "LineStyle")
+    _text_element(line_style, "color", color)
+    _text_element(line_style, "width", str(width))
+    poly_style = etree.SubElement(style, "PolyStyle")
+    _text_element(poly_style, "color", "00000000")
+    _text_element(poly_style, "fill", "0")
+    _text_element(poly_style, "outline", "1")
+    return style
+
+
+def build_placemark(
+    name: str,
+    style_url: str,
+    extended_data: Dict[str, Any],
+    coordinates: Sequence[Coordinate],
+    is_line: bool,
+) -> etree._Element:
+    """
+    Build a Placemark element, laid out exactly as fastkml would lay out the equivalent
+    kml.Placemark (with an absolute altitude mode, and extruded if it's a line)
+    """
+    placemark = etree.Element("Placemark")
+    _text_element(placemark, "name", name)
+    _text_element(placemark, "styleUrl", style_url)
+
+    extended_data_element = etree.SubElement(placemark, "ExtendedData")
+    for key, value in extended_data.items():
+        # Like fastkml, leave out missing values, and leave empty values empty
+        if value is None:
+            continue
+        data = etree.SubElement(extended_data_element, "Data", name=key)
+        if value:
+            _text_element(data, "value", str(value))
+
+    geometry = etree.SubElement(placemark, "LineString" if is_line else "Point")
+    if is_line:
+        _text_element(geometry, "extrude", "1")
+    _text_element(geometry, "altitudeMode", "absolute")
+    _text_element(geometry, "coordinates", format_coordinates(coordinates))
+
+    return placemark
+
+
+def build_network_link(name: str, href: str, region: BoundingBox, min_lod_pixels: int) -> etree._Element:
+    """
+    Build a NetworkLink to another KML document, which Earth only fetches once `region` takes up at
+    least `min_lod_pixels` on screen (i.e. once the user has zoomed in far enough to see it)
+    """
+    network_link = etree.Element("NetworkLink")
+    _text_element(network_link, "name", name)
+
+    region_element = etree.SubElement(network_link, "Region")
+    lat_lon_alt_box = etree.SubElement(region_element, "LatLonAltBox")
+    _text_element(lat_lon_alt_box, "north", f"{region.north:.6f}")
+    _text_element(lat_lon_alt_box, "south", f"{region.south:.6f}")
+    _text_element(lat_lon_alt_box, "east", f"{region.east:.6f}")
+    _text_element(lat_lon_alt_box, "west", f"{region.west:.6f}")
+    lod = etree.SubElement(region_element, "Lod")
+    _text_element(lod, "minLodPixels", str(min_lod_pixels))
+    _text_element(lod, "maxLodPixels", "-1")
+
+    link = etree.SubElement(network_link, "Link")
+    _text_element(link, "href", href)
+    _text_element(link, "viewRefreshMode", "onRegion")
+
+    return network_link
+
+
+def build_kmz(kml_chunks: Iterable[bytes]) -> bytes:
+    """
+    Compress a KML document, given chunk by chunk, into a KMZ archive
+    """
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as kmz:
+        document_info = zipfile.ZipInfo(KMZ_DOCUMENT_NAME, date_time=KMZ_DOCUMENT_DATE_TIME)
+        document_info.compress_type = zipfile.ZIP_DEFLATED
+        with kmz.open(document_info, "w") as document:
+            for chunk in kml_chunks:
+                document.write(chunk)
+
+    return archive.getvalue()
+
+
+class KMLStreamWriter:
+    """
+    Write a pretty-printed KML document incrementally, so that it can be sent to the client as it is
+    generated rather than building the whole tree in memory first. Within document(), open containers
+    (Document, Folder) with element() and write complete subtrees (Style, Placemark) with write(),
+    collecting the output as you go with take_chunk(), and finally final_chunk(). Elements are written
+    without a namespace, they pick up KML's from the (default) namespace declared on the root
+    """
+
+    def __init__(self, chunk_size: Optional[int] = None) -> None:
+        self.chunk_size = chunk_size or KML_STREAM_CHUNK_SIZE
+        self.depth = 0
+        self._buffer = io.BytesIO()
+        self._xmlfile: Optional[Any] = None
+
+    def _newline(self) -> None:
+        assert self._xmlfile is not None
+        self._xmlfile.write("\n" + _INDENT * self.depth)
+
+    @contextmanager
+    def document(self) -> Iterator[None]:
+        with etree.xmlfile(self._buffer, encoding="utf-8") as xmlfile:
+            self._xmlfile = xmlfile
+            with xmlfile.element("kml", nsmap={None: KML_NAMESPACE}):
+                self.depth += 1
+                yield
+                self.depth -= 1
+                self._newline()
+
+            self._xmlfile = None
+
+    @contextmanager
+    def element(self, tag: str) -> Iterator[None]:
+        assert self._xmlfile is not None
+        self._newline()
+        with self._xmlfile.element(tag):
+            self.depth += 1
+            yield
+            self.depth -= 1
+            self._newline()
+
+    @contextmanager
+    def named_element(self, tag: str, name: str) -> Iterator[None]:
+        with self.element(tag):
+            name_element = etree.Element("name")
+            name_element.text = name
+            self.write(name_element)
+            yield
+
+    def folder(self, name: str) -> ContextManager[None]:
+        return self.named_element("Folder", name)
+
+    def write(self, element: etree._Element) -> None:
+        assert self._xmlfile is not None
+        etree.indent(element, space=_INDENT, level=self.depth)
+        self._newline()
+        self._xmlfile.write(element)
+
+    def take_chunk(self, force: bool = False) -> Optional[bytes]:
+        """
+        The output written since the last chunk was taken, if there's enough of it to be worth
+        sending (or any at all, if `force`)
+        """
+        if self._xmlfile is not None:
+            self._xmlfile.flush()
+
+        if self._buffer.tell() < (1 if force else self.chunk_size):
+            return None
+
+        chunk = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return chunk
+
+    def final_chunk(self) -> bytes:
+        # Like fastkml, end with a newline
+        return (self.take_chunk(force=True) or b"") + b"\n"
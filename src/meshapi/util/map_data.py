@@ -0,0 +1,416 @@
+import datetime
+import heapq
+import os
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Type
+from urllib.parse import urlparse
+from uuid import UUID
+
+from django.db.models import Count, Exists, IntegerField, Min, Model, OuterRef, Q, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+
+from meshapi.models import LOS, AccessPoint, Building, Device, Install, Link, Node, Sector
+from meshapi.models.util.spatial import BoundingBox, WithinBoundingBox
+from meshapi.serializers.javascript_date_field import date_to_javascript_time, dt_to_javascript_time
+from meshapi.serializers.map import EXCLUDED_INSTALL_STATUSES
+from meshapi.util.change_feed import get_changed_history, get_pk_name
+
+# Mirrors MapDataInstallSerializer.convert_status_to_spreadsheet_status()
+INSTALL_STATUS_TO_SPREADSHEET_STATUS: Dict[str, Optional[str]] = {
+    Install.InstallStatus.REQUEST_RECEIVED: None,
+    Install.InstallStatus.PENDING: "Interested",
+    Install.InstallStatus.BLOCKED: "No Los",
+    Install.InstallStatus.ACTIVE: "Installed",
+    Install.InstallStatus.INACTIVE: "Powered Off",
+    Install.InstallStatus.CLOSED: "Abandoned",
+    Install.InstallStatus.NN_REASSIGNED: "NN assigned",
+}
+
+MAP_NODE_FIELDS_OMITTED_WHEN_NULL = ["name", "status", "notes", "installDate"]
+
+
+def convert_access_point_id_to_fake_node_number(access_point_id: UUID) -> int:
+    # Hacky, but we have no choice, we need this to present as a "node" object to the
+    # map frontend and not conflict with any existing installs
+    return 1_000_000 + (access_point_id.int % 1_000_000)
+
+
+class MapNodeNumberResolver:
+    """
+    Looks up the number the website map uses to identify each node (its network number, falling back
+    to its lowest install number for nodes which don't have one yet) for every node in the mesh, with
+    a single aggregate query. Create one per request and share it, rather than walking each node's
+    installs as we come across it
+    """
+
+    def __init__(self) -> None:
+        self.network_numbers: Dict[UUID, Optional[int]] = {}
+        self.map_numbers: Dict[UUID, Optional[int]] = {}
+
+        for node_id, network_number, min_install_number in (
+            Node.objects.order_by()
+            .annotate(min_install_number=Min("installs__install_number"))
+            .values_list("id", "network_number", "min_install_number")
+        ):
+            self.network_numbers[node_id] = network_number
+            self.map_numbers[node_id] = network_number or min_install_number
+
+    def get_network_number(self, node_id: UUID) -> Optional[int]:
+        return self.network_numbers.get(node_id)
+
+    def get_map_number(self, node_id: UUID) -> Optional[int]:
+        return self.map_numbers.get(node_id)
+
+
+def get_panorama_filenames(panoramas: Optional[Iterable[str]]) -> List[str]:
+    # We're storing full URLs for each pano to make the system more flexible, so to
+    # make it "map friendly", we gotta strip it down to just the filename.
+    return [os.path.basename(urlparse(panorama).path) for panorama in panoramas or []]
+
+
+def _build_map_node(
+    install_number: int,
+    node: Optional[Dict[str, Any]],
+    is_node_dot: bool,
+    status: Optional[str],
+    coordinates: List[Optional[float]],
+    request_date: Optional[int],
+    install_date: Optional[int],
+    roof_access: bool,
+    panoramas: List[str],
+) -> dict:
+    name = None
+    notes = None
+    if node:
+        if is_node_dot:
+            name = node["name"]
+
+        synthetic_notes = []
+        if is_node_dot and node["type"] != Node.NodeType.STANDARD:
+            synthetic_notes.append(node["type"])
+        synthetic_notes.extend(["Omni"] * node["omni_device_count"])
+        notes = " ".join(synthetic_notes) if synthetic_notes else None
+
+    result = {
+        "id": install_number,
+        "name": name,
+        "status": status,
+        "coordinates": coordinates,
+        "requestDate": request_date,
+        "installDate": install_date,
+        "roofAccess": roof_access,
+        "notes": notes,
+        "panoramas": panoramas,
+    }
+
+    # Remove null fields when applicable to match the existing interface
+    for key in MAP_NODE_FIELDS_OMITTED_WHEN_NULL:
+        if result[key] is None:
+            del result[key]
+
+    return result
+
+
+def _iter_install_map_nodes(
+    nodes: Dict[UUID, Dict[str, Any]],
+    get_building_panoramas: Callable[[UUID, Optional[List[str]]], List[str]],
+    bbox: Optional[BoundingBox],
+) -> Iterator[dict]:
+    installs = Install.objects.exclude(status__in=EXCLUDED_INSTALL_STATUSES)
+    if bbox:
+        # Installs are drawn at either their building or their node, we check which below
+        installs = installs.filter(
+            WithinBoundingBox(bbox, "building__longitude", "building__latitude")
+            | WithinBoundingBox(bbox, "node__longitude", "node__latitude")
+        )
+
+    for install in (
+        installs.order_by("install_number")
+        .values(
+            "install_number",
+            "status",
+            "request_date",
+            "install_date",
+            "roof_access",
+            "node_id",
+            "building_id",
+            "building__latitude",
+            "building__longitude",
+            "building__altitude",
+            "building__panoramas",
+        )
+        .iterator(chunk_size=2000)
+    ):
+        install_number = install["install_number"]
+        node = nodes[install["node_id"]] if install["node_id"] else None
+
+        # Check if this is an old-school "node as install" situation, see MapDataInstallSerializer._is_node_dot()
+        is_node_dot = False
+        if node:
+            if node["network_number"]:
+                is_node_dot = node["network_number"] == install_number
+            else:
+                is_node_dot = node["min_install_number"] == install_number
+
+        if node and is_node_dot:
+            coordinates = [node["longitude"], node["latitude"], node["altitude"]]
+        else:
+            coordinates = [install["building__longitude"], install["building__latitude"], install["building__altitude"]]
+
+        if bbox and not bbox.contains(coordinates[0], coordinates[1]):
+            continue
+
+        yield _build_map_node(
+            install_number=install_number,
+            node=node,
+            is_node_dot=is_node_dot,
+            status=INSTALL_STATUS_TO_SPREADSHEET_STATUS.get(install["status"], install["status"]),
+            coordinates=coordinates,
+            request_date=dt_to_javascript_time(install["request_date"]),
+            install_date=date_to_javascript_time(install["install_date"]),
+            roof_access=install["roof_access"],
+            panoramas=get_building_panoramas(install["building_id"], install["building__panoramas"]),
+        )
+
+
+def _build_fake_map_nodes(
+    nodes: Dict[UUID, Dict[str, Any]],
+    get_building_panoramas: Callable[[UUID, Optional[List[str]]], List[str]],
+    bbox: Optional[BoundingBox],
+) -> List[dict]:
+    # We need to make sure there is an entry on the map for every NN, and since we excluded the
+    # NN assigned installs, we need to go through the Nodes and include the nns we haven't
+    # already covered via install num
+    uncovered_nodes = [
+        node
+        for node in nodes.values()
+        if node["status"] != Node.NodeStatus.INACTIVE
+        and node["network_number"]
+        and not node["has_covering_install"]
+        and (not bbox or bbox.contains(node["longitude"], node["latitude"]))
+    ]
+    uncovered_node_ids = [node["id"] for node in uncovered_nodes]
+
+    # Arbitrarily pick a representative install for the details of the "Fake" node,
+    # preferring active installs if possible
+    representative_installs: Dict[UUID, Dict[str, Any]] = {}
+    for install in (
+        Install.objects.filter(node_id__in=uncovered_node_ids)
+        .order_by("-install_number")
+        .values("node_id", "status", "request_date", "roof_access", "building_id", "building__panoramas")
+    ):
+        current = representative_installs.get(install["node_id"])
+        if current is None or (
+            current["status"] != Install.InstallStatus.ACTIVE and install["status"] == Install.InstallStatus.ACTIVE
+        ):
+            representative_installs[install["node_id"]] = install
+
+    # Fall back to the first building of the node for nodes without any installs
+    fallback_panoramas: Dict[UUID, List[str]] = {}
+    for node_id, building_id, panoramas in (
+        Building.nodes.through.objects.filter(node_id__in=uncovered_node_ids)
+        .exclude(node_id__in=representative_installs.keys())
+        .order_by("-building_id")
+        .values_list("node_id", "building_id", "building__panoramas")
+    ):
+        fallback_panoramas[node_id] = get_building_panoramas(building_id, panoramas)
+
+    fake_map_nodes = []
+    for node in uncovered_nodes:
+        representative_install = representative_installs.get(node["id"])
+
+        request_date = datetime.datetime.fromtimestamp(0)
+        if representative_install:
+            request_date = representative_install["request_date"]
+        elif node["install_date"]:
+            request_date = datetime.datetime.combine(
+                node["install_date"],
+                datetime.datetime.min.time(),
+            )
+
+        if representative_install:
+            panoramas = get_building_panoramas(
+                representative_install["building_id"], representative_install["building__panoramas"]
+            )
+        else:
+            panoramas = fallback_panoramas.get(node["id"], [])
+
+        fake_map_nodes.append(
+            _build_map_node(
+                install_number=node["network_number"],
+                node=node,
+                is_node_dot=True,
+                status=(
+                    INSTALL_STATUS_TO_SPREADSHEET_STATUS[Install.InstallStatus.NN_REASSIGNED]
+                    if node["status"] == Node.NodeStatus.ACTIVE
+                    else None
+                ),
+                coordinates=[node["longitude"], node["latitude"], node["altitude"]],
+                request_date=dt_to_javascript_time(request_date),
+                install_date=None,
+                roof_access=representative_install["roof_access"] if representative_install else True,
+                panoramas=panoramas,
+            )
+        )
+
+    fake_map_nodes.sort(key=lambda n: n["id"])
+    return fake_map_nodes
+
+
+def iter_map_node_data(bbox: Optional[BoundingBox] = None) -> Iterator[dict]:
+    """
+    Build the website map's list of "nodes" (mostly Installs, with some fake installs generated to
+    solve NN re-use) directly from .values() rows. This produces exactly the same output as running
+    MapDataInstallSerializer over the Install objects the map used to be built from (which the tests keep
+    as a reference, see legacy_map_node_list() in test_map_endpoints), but computes the per-node details
+    (the minimum install number, omni count, panorama filenames, etc.) once per node, in a fixed
+    number of queries, rather than once per install. Installs are streamed from the database in
+    order, so the caller can encode each row as soon as it is yielded
+    :param bbox: if provided, only include the rows which are drawn inside this bounding box
+    """
+    node_queryset = Node.objects.order_by()
+    if bbox:
+        node_queryset = node_queryset.filter(
+            WithinBoundingBox(bbox)
+            | Exists(
+                Install.objects.filter(
+                    WithinBoundingBox(bbox, "building__longitude", "building__latitude"), node=OuterRef("pk")
+                )
+            )
+        )
+
+    nodes = {
+        node["id"]: node
+        for node in node_queryset.annotate(
+            min_install_number=Subquery(
+                Install.objects.filter(node=OuterRef("pk"))
+                .order_by()
+                .values("node")
+                .annotate(min_install_number=Min("install_number"))
+                .values("min_install_number"),
+                output_field=IntegerField(),
+            ),
+            omni_device_count=Coalesce(
+                Subquery(
+                    Device.objects.filter(Q(node=OuterRef("pk")) & Q(name__icontains="omni"))
+                    .order_by()
+                    .values("node")
+                    .annotate(omni_device_count=Count("id"))
+                    .values("omni_device_count"),
+                    output_field=IntegerField(),
+                ),
+                0,
+            ),
+            has_covering_install=Exists(
+                Install.objects.exclude(status__in=EXCLUDED_INSTALL_STATUSES).filter(
+                    install_number=OuterRef("network_number")
+                )
+            ),
+        ).values(
+            "id",
+            "network_number",
+            "name",
+            "type",
+            "status",
+            "latitude",
+            "longitude",
+            "altitude",
+            "install_date",
+            "min_install_number",
+            "omni_device_count",
+            "has_covering_install",
+        )
+    }
+
+    panoramas_by_building: Dict[UUID, List[str]] = {}
+
+    def get_building_panoramas(building_id: UUID, panoramas: Optional[List[str]]) -> List[str]:
+        if building_id not in panoramas_by_building:
+            panoramas_by_building[building_id] = get_panorama_filenames(panoramas)
+        return panoramas_by_building[building_id]
+
+    yield from heapq.merge(
+        _iter_install_map_nodes(nodes, get_building_panoramas, bbox),
+        _build_fake_map_nodes(nodes, get_building_panoramas, bbox),
+        key=lambda n: n["id"],
+    )
+
+
+def build_map_node_data() -> List[dict]:
+    return list(iter_map_node_data())
+
+
+def _get_every_version_of_changed(model: Type[Model], since: datetime.datetime) -> QuerySet:
+    # Every version of each object changed since `since`, not just the latest one, so that we also
+    # catch whatever it has moved away from (e.g. the node a device used to belong to)
+    pk_name = get_pk_name(model)
+    return (
+        model.history.order_by()  # type: ignore[attr-defined]
+        .filter(**{f"{pk_name}__in": get_changed_history(model, since).values(pk_name)})
+        .distinct()
+    )
+
+
+def get_changed_map_numbers(since: datetime.datetime) -> Set[int]:
+    """
+    The numbers (install numbers, node numbers as given by MapNodeNumberResolver, and fake access
+    point numbers) of every row on the website map which may have changed since `since`, worked out
+    from the history tables. This errs on the side of including too much: a number is included if
+    anything its rows are built from (installs, nodes, buildings, devices, links, LOSes) has changed
+    """
+    map_numbers: Set[Optional[int]] = set()
+    node_ids: Set[Optional[UUID]] = set()
+    building_ids: Set[UUID] = set()
+    device_ids: Set[UUID] = set()
+
+    for install_number, node_id, building_id in _get_every_version_of_changed(Install, since).values_list(
+        "install_number", "node_id", "building_id"
+    ):
+        map_numbers.add(install_number)
+        node_ids.add(node_id)
+        building_ids.add(building_id)
+
+    for node_id, network_number in _get_every_version_of_changed(Node, since).values_list("id", "network_number"):
+        node_ids.add(node_id)
+        map_numbers.add(network_number)
+
+    building_ids.update(_get_every_version_of_changed(Building, since).values_list("id", flat=True))
+    for from_building_id, to_building_id in _get_every_version_of_changed(LOS, since).values_list(
+        "from_building_id", "to_building_id"
+    ):
+        building_ids.update([from_building_id, to_building_id])
+
+    for from_device_id, to_device_id in _get_every_version_of_changed(Link, since).values_list(
+        "from_device_id", "to_device_id"
+    ):
+        device_ids.update([from_device_id, to_device_id])
+
+    for device_model in [Device, Sector, AccessPoint]:
+        for device_id, node_id in _get_every_version_of_changed(device_model, since).values_list(
+            get_pk_name(device_model), "node_id"
+        ):
+            device_ids.add(device_id)
+            node_ids.add(node_id)
+
+    access_point_ids = set(_get_every_version_of_changed(AccessPoint, since).values_list("device_ptr_id", flat=True))
+    access_point_ids.update(AccessPoint.objects.filter(device_ptr_id__in=device_ids).values_list("pk", flat=True))
+    map_numbers.update(convert_access_point_id_to_fake_node_number(ap_id) for ap_id in access_point_ids)
+
+    node_ids.update(Device.objects.filter(id__in=device_ids).values_list("node_id", flat=True))
+    node_ids.update(
+        Building.nodes.through.objects.filter(building_id__in=building_ids).values_list("node_id", flat=True)
+    )
+
+    # Anything drawn at (or linked to) one of these nodes or buildings may have changed too
+    map_numbers.update(
+        Install.objects.filter(Q(node_id__in=node_ids) | Q(building_id__in=building_ids)).values_list(
+            "install_number", flat=True
+        )
+    )
+    for network_number, min_install_number in (
+        Node.objects.filter(id__in=node_ids)
+        .annotate(min_install_number=Min("installs__install_number"))
+        .values_list("network_number", "min_install_number")
+    ):
+        map_numbers.update([network_number, min_install_number])
+
+    return {map_number for map_number in map_numbers if map_number is not None}
@@ -0,0 +1,171 @@
+import math
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from meshapi.models.util.spatial import MAX_TILE_LATITUDE
+
+# A minimal encoder for Mapbox Vector Tiles (https://github.com/mapbox/vector-tile-spec/tree/master/2.1),
+# we only ever need to write points and lines, which doesn't justify pulling in a protobuf toolchain
+
+MVT_EXTENT = 4096
+
+GEOM_TYPE_POINT = 1
+GEOM_TYPE_LINESTRING = 2
+
+_COMMAND_MOVE_TO = 1
+_COMMAND_LINE_TO = 2
+
+_WIRE_TYPE_VARINT = 0
+_WIRE_TYPE_64_BIT = 1
+_WIRE_TYPE_LENGTH_DELIMITED = 2
+
+TileCoordinate = Tuple[int, int]
+
+
+def _encode_varint(value: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+
+def _encode_zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _encode_key(field_number: int, wire_type: int) -> bytes:
+    return _encode_varint((field_number << 3) | wire_type)
+
+
+def _encode_varint_field(field_number: int, value: int) -> bytes:
+    return _encode_key(field_number, _WIRE_TYPE_VARINT) + _encode_varint(value)
+
+
+def _encode_bytes_field(field_number: int, value: bytes) -> bytes:
+    return _encode_key(field_number, _WIRE_TYPE_LENGTH_DELIMITED) + _encode_varint(len(value)) + value
+
+
+def _encode_packed_field(field_number: int, values: Iterable[int]) -> bytes:
+    return _encode_bytes_field(field_number, b"".join(_encode_varint(value) for value in values))
+
+
+def _encode_value(value: Any) -> bytes:
+    # See the Value message in the spec, bool must be checked first since it's a subclass of int
+    if isinstance(value, bool):
+        return _encode_varint_field(7, int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return _encode_varint_field(5, value)
+        return _encode_varint_field(6, _encode_zigzag(value))
+    if isinstance(value, float):
+        return _encode_key(3, _WIRE_TYPE_64_BIT) + struct.pack("<d", value)
+    return _encode_bytes_field(1, str(value).encode("utf-8"))
+
+
+def _command(command_id: int, count: int) -> int:
+    return (command_id & 0x7) | (count << 3)
+
+
+def lon_lat_to_tile_coordinate(longitude: float, latitude: float, z: int, x: int, y: int) -> TileCoordinate:
+    """
+    Project a point into the (web mercator) pixel grid of the given tile, where (0, 0) is the top left of the
+    tile and (MVT_EXTENT, MVT_EXTENT) is the bottom right. Points outside the tile end up outside that range
+    """
+    tile_count = 2**z
+    latitude = max(-MAX_TILE_LATITUDE, min(MAX_TILE_LATITUDE, latitude))
+    latitude_radians = math.radians(latitude)
+
+    world_x = (longitude + 180) / 360 * tile_count
+    world_y = (1 - math.asinh(math.tan(latitude_radians)) / math.pi) / 2 * tile_count
+    return round((world_x - x) * MVT_EXTENT), round((world_y - y) * MVT_EXTENT)
+
+
+class MVTLayer:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.features: List[bytes] = []
+        self.keys: Dict[str, int] = {}
+        self.values: Dict[Tuple[type, Any], int] = {}
+        self.encoded_values: List[bytes] = []
+
+    def _get_tags(self, properties: Dict[str, Any]) -> List[int]:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+
+            key_index = self.keys.setdefault(key, len(self.keys))
+
+            # Keep e.g. True and 1 apart, since they're equal (and hash the same) in python
+            value_key = (type(value), value)
+            if value_key not in self.values:
+                self.values[value_key] = len(self.encoded_values)
+                self.encoded_values.append(_encode_value(value))
+
+            tags.extend([key_index, self.values[value_key]])
+
+        return tags
+
+    def _add_feature(self, geom_type: int, geometry: List[int], properties: Dict[str, Any]) -> None:
+        self.features.append(
+            _encode_packed_field(2, self._get_tags(properties))
+            + _encode_varint_field(3, geom_type)
+            + _encode_packed_field(4, geometry)
+        )
+
+    def add_point(self, point: TileCoordinate, properties: Dict[str, Any]) -> None:
+        self._add_feature(
+            GEOM_TYPE_POINT,
+            [_command(_COMMAND_MOVE_TO, 1), _encode_zigzag(point[0]), _encode_zigzag(point[1])],
+            properties,
+        )
+
+    def add_line(self, points: Sequence[TileCoordinate], properties: Dict[str, Any]) -> bool:
+        """
+        Add a line through the given points, dropping repeated points. Returns False (and adds nothing)
+        if the line collapses to a single point at this zoom level
+        """
+        distinct_points: List[TileCoordinate] = []
+        for point in points:
+            if not distinct_points or distinct_points[-1] != point:
+                distinct_points.append(point)
+
+        if len(distinct_points) < 2:
+            return False
+
+        geometry = []
+        cursor = (0, 0)
+        for i, point in enumerate(distinct_points):
+            if i == 0:
+                geometry.append(_command(_COMMAND_MOVE_TO, 1))
+            elif i == 1:
+                geometry.append(_command(_COMMAND_LINE_TO, len(distinct_points) - 1))
+            geometry.extend([_encode_zigzag(point[0] - cursor[0]), _encode_zigzag(point[1] - cursor[1])])
+            cursor = point
+
+        self._add_feature(GEOM_TYPE_LINESTRING, geometry, properties)
+        return True
+
+    def encode(self) -> Optional[bytes]:
+        if not self.features:
+            # Empty layers are allowed, but pointless
+            return None
+
+        return (
+            _encode_varint_field(15, 2)  # Spec version
+            + _encode_bytes_field(1, self.name.encode("utf-8"))
+            + b"".join(_encode_bytes_field(2, feature) for feature in self.features)
+            + b"".join(_encode_bytes_field(3, key.encode("utf-8")) for key in self.keys)
+            + b"".join(_encode_bytes_field(4, value) for value in self.encoded_values)
+            + _encode_varint_field(5, MVT_EXTENT)
+        )
+
+
+def encode_tile(layers: Iterable[MVTLayer]) -> bytes:
+    encoded_layers = (layer.encode() for layer in layers)
+    return b"".join(_encode_bytes_field(3, layer) for layer in encoded_layers if layer is not None)
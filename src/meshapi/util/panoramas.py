@@ -4,12 +4,12 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
 
-import requests
 from django.db import transaction
 
 from meshapi.models import Install
 from meshapi.models.building import Building
 from meshapi.models.node import Node
+from meshapi.util import http_client
 from meshdb.environment import PANO_GITHUB_TOKEN
 from meshapi.util.django_pglocks import advisory_lock
 
@@ -255,7 +255,7 @@ def set_panoramas(panos: dict[str, list[PanoramaTitle]]) -> tuple[int, list[str]
 # 100k/7MB of data)
 def get_head_tree_sha(owner: str, repo: str, branch: str, token: str = "") -> Optional[str]:
     url = f"https://api.github.com/repos/{owner}/{repo}/branches/{branch}"
-    master = requests.get(
+    master = http_client.get(
         url,
         headers={"Authorization": f"Bearer {token}"} if token != "" else {},
         timeout=GITHUB_API_TIMEOUT_SECONDS,
@@ -272,7 +272,7 @@ def list_files_in_git_directory(
     owner: str, repo: str, directory: str, tree: str, token: str = ""
 ) -> Optional[list[str]]:
     url = f"https://api.github.com/repos/{owner}/{repo}/git/trees/{tree}?recursive=1"
-    response = requests.get(
+    response = http_client.get(
         url, headers={"Authorization": f"Bearer {token}"} if token != "" else {}, timeout=GITHUB_API_TIMEOUT_SECONDS
     )
     if response.status_code != 200:
@@ -0,0 +1,38 @@
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """
+    Spaces out calls to acquire(), from however many threads, so that there are at most `rate_per_second`
+    of them a second. Each caller blocks until its turn
+    """
+
+    def __init__(self, rate_per_second: float) -> None:
+        self.interval_seconds = 1 / rate_per_second
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: Optional[float] = None) -> bool:
+        """
+        Wait for our turn and return True, unless it wouldn't come until after `deadline` (as per
+        time.monotonic()), in which case give it up and return False straight away
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            if deadline is not None and slot > deadline:
+                return False
+            self._next_slot = slot + self.interval_seconds
+
+        if slot > now:
+            time.sleep(slot - now)
+        return True
+
+    def defer(self, seconds: float) -> None:
+        """
+        Hold off everybody's next turn for at least `seconds`, e.g. when we've been told to slow down
+        """
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
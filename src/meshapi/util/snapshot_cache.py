@@ -0,0 +1,249 @@
+import gzip
+import hashlib
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+import brotli
+from datadog import statsd
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+SNAPSHOT_VERSION_CACHE_KEY = "meshdb:snapshot-version"
+SNAPSHOT_CACHE_KEY_PREFIX = "meshdb:snapshot"
+SNAPSHOT_ENCODED_CACHE_KEY_PREFIX = "meshdb:snapshot-encoded"
+
+# Snapshots are invalidated by model signals (see meshapi.util.events.snapshot_invalidation), this
+# timeout is just a backstop for writes that don't fire signals (e.g. QuerySet.update())
+SNAPSHOT_TIMEOUT_SECONDS = 60 * 60
+
+# Compressed variants are keyed by the hash of the content they were made from, so they never go
+# stale, and survive invalidations which don't end up changing the content
+SNAPSHOT_ENCODED_TIMEOUT_SECONDS = 24 * 60 * 60
+
+# Not worth the CPU (or the extra cache entries) below this size
+MIN_COMPRESSIBLE_SNAPSHOT_BYTES = 1024
+
+# We compress while the first client to ask for each variant waits. Maximum gzip is cheap enough,
+# but stop short of brotli's (very slow) maximum quality of 11
+GZIP_COMPRESS_LEVEL = 9
+BROTLI_QUALITY = 9
+
+
+@dataclass
+class Snapshot:
+    content: bytes
+    etag: str
+
+
+def compute_etag(content: bytes) -> str:
+    """
+    Compute a strong ETag for the given payload. We hash the content (rather than using the
+    snapshot version) so that clients don't re-download when an unrelated write bumps the version
+    """
+    return quote_etag(hashlib.sha256(content).hexdigest())
+
+
+# In order of preference
+SUPPORTED_CONTENT_ENCODINGS = ["br", "gzip"]
+
+
+def choose_content_encoding(request: HttpRequest) -> Optional[str]:
+    """
+    Pick the best compression we support from the request's Accept-Encoding header, if any
+    """
+    accepted: Dict[str, float] = {}
+    for coding in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = coding.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0
+        if name.strip():
+            accepted[name.strip().lower()] = quality
+
+    for encoding in SUPPORTED_CONTENT_ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+
+    return None
+
+
+def compress_content(content: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        # A fixed mtime keeps the output (and so the ETag) stable
+        return gzip.compress(content, compresslevel=GZIP_COMPRESS_LEVEL, mtime=0)
+    raise ValueError(f"Unsupported content encoding {encoding}")
+
+
+def _unquote_etag(etag: str) -> str:
+    return etag.strip('"')
+
+
+def get_encoded_etag(etag: str, encoding: str) -> str:
+    # Each encoding is a different representation, so needs its own ETag
+    return quote_etag(f"{_unquote_etag(etag)}-{encoding}")
+
+
+def get_encoded_snapshot_content(snapshot: Snapshot, encoding: str) -> bytes:
+    """
+    Fetch the compressed variant of the snapshot from the shared cache, compressing (and storing) it
+    if this is the first time anyone has asked for it. These are keyed by the content hash rather
+    than the snapshot version, so we only ever compress each distinct payload once
+    """
+    cache_key: Optional[str] = f"{SNAPSHOT_ENCODED_CACHE_KEY_PREFIX}:{encoding}:{_unquote_etag(snapshot.etag)}"
+    try:
+        encoded = cache.get(cache_key)
+    except Exception:
+        logging.exception("Unable to read compressed snapshot from cache")
+        encoded = None
+        cache_key = None
+
+    if encoded is not None:
+        statsd.increment("meshdb.snapshot_cache.encoded_lookup", tags=[f"encoding:{encoding}", "status:hit"])
+        return encoded
+
+    statsd.increment("meshdb.snapshot_cache.encoded_lookup", tags=[f"encoding:{encoding}", "status:miss"])
+    encoded = compress_content(snapshot.content, encoding)
+    if cache_key is not None:
+        try:
+            cache.set(cache_key, encoded, timeout=SNAPSHOT_ENCODED_TIMEOUT_SECONDS)
+        except Exception:
+            logging.exception("Unable to write compressed snapshot to cache")
+
+    return encoded
+
+
+def snapshot_http_response(
+    request: HttpRequest, snapshot: Snapshot, content_type: str, compressible: bool = True
+) -> HttpResponse:
+    """
+    Serve the snapshot (compressed, if the client supports it), or a 304 if the client already has
+    this version of it
+    :param compressible: False if the payload is already compressed (e.g. a zip archive), so
+    compressing it again would only waste CPU
+    """
+    encoding = None
+    if compressible and len(snapshot.content) >= MIN_COMPRESSIBLE_SNAPSHOT_BYTES:
+        encoding = choose_content_encoding(request)
+
+    if encoding:
+        etag = get_encoded_etag(snapshot.etag, encoding)
+        response = HttpResponse(get_encoded_snapshot_content(snapshot, encoding), content_type=content_type)
+        response["Content-Encoding"] = encoding
+    else:
+        etag = snapshot.etag
+        response = HttpResponse(snapshot.content, content_type=content_type)
+
+    response["ETag"] = etag
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return get_conditional_response(request, etag=etag, response=response) or response
+
+
+def get_snapshot_version() -> str:
+    version = cache.get(SNAPSHOT_VERSION_CACHE_KEY)
+    if version is None:
+        # add() is a noop if another worker beat us to it, so re-read to make sure we all agree
+        cache.add(SNAPSHOT_VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(SNAPSHOT_VERSION_CACHE_KEY)
+
+    return version
+
+
+def invalidate_snapshots() -> None:
+    """
+    Mark every cached snapshot as stale. Rather than hunting down and deleting each snapshot key, we
+    rotate the version which is embedded in all of them, the old entries will age out on their own
+    """
+    try:
+        cache.set(SNAPSHOT_VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+    except Exception:
+        # Never let a cache outage break a database write
+        logging.exception("Unable to invalidate snapshot cache")
+        statsd.increment("meshdb.snapshot_cache.invalidate", tags=["status:failure"])
+
+
+def lookup_snapshot(name: str) -> Tuple[Optional[Snapshot], Optional[str]]:
+    """
+    Fetch the current snapshot for `name` from the shared cache
+    :param name: a unique identifier for this payload, e.g. "mapdata-nodes"
+    :return: the snapshot (or None if it needs to be rebuilt) and the key a rebuilt snapshot should be
+    stored under (or None if the cache is unreachable)
+    """
+    try:
+        cache_key = f"{SNAPSHOT_CACHE_KEY_PREFIX}:{name}:{get_snapshot_version()}"
+        snapshot = cache.get(cache_key)
+    except Exception:
+        logging.exception(f"Unable to read snapshot {name} from cache, building it from the database instead")
+        statsd.increment("meshdb.snapshot_cache.lookup", tags=[f"snapshot:{name}", "status:failure"])
+        return None, None
+
+    if snapshot is not None:
+        statsd.increment("meshdb.snapshot_cache.lookup", tags=[f"snapshot:{name}", "status:hit"])
+        return snapshot, cache_key
+
+    statsd.increment("meshdb.snapshot_cache.lookup", tags=[f"snapshot:{name}", "status:miss"])
+    return None, cache_key
+
+
+def store_snapshot(name: str, cache_key: Optional[str], content: bytes) -> Snapshot:
+    snapshot = Snapshot(content=content, etag=compute_etag(content))
+    if cache_key is None:
+        return snapshot
+
+    try:
+        cache.set(cache_key, snapshot, timeout=SNAPSHOT_TIMEOUT_SECONDS)
+    except Exception:
+        logging.exception(f"Unable to write snapshot {name} to cache")
+
+    return snapshot
+
+
+def get_or_build_snapshot(name: str, build_content: Callable[[], bytes]) -> Snapshot:
+    """
+    Fetch the current snapshot for `name` from the shared cache, building (and storing) it with
+    `build_content` if it has been invalidated or has never been built. If the cache is
+    unreachable, we fall back to building the content on every call
+    :param name: a unique identifier for this payload, e.g. "mapdata-nodes"
+    :param build_content: a function which produces the encoded payload from the database
+    :return: the snapshot, containing the encoded payload and its ETag
+    """
+    snapshot, cache_key = lookup_snapshot(name)
+    if snapshot is not None:
+        return snapshot
+
+    return store_snapshot(name, cache_key, build_content())
+
+
+def get_or_stream_snapshot(name: str, build_chunks: Callable[[], Iterable[bytes]]) -> Union[Snapshot, Iterator[bytes]]:
+    """
+    Like get_or_build_snapshot(), but rather than building the whole payload up front when the
+    snapshot is stale, return an iterator which yields it chunk by chunk as it is built, storing
+    the complete snapshot once the last chunk has been produced
+    :param name: a unique identifier for this payload, e.g. "mapdata-nodes"
+    :param build_chunks: a function which produces the encoded payload from the database, in chunks
+    :return: the snapshot if it is fresh, otherwise an iterator over the freshly built payload
+    """
+    snapshot, cache_key = lookup_snapshot(name)
+    if snapshot is not None:
+        return snapshot
+
+    def stream_and_store() -> Iterator[bytes]:
+        chunks = []
+        for chunk in build_chunks():
+            if cache_key is not None:
+                chunks.append(chunk)
+            yield chunk
+
+        if cache_key is not None:
+            store_snapshot(name, cache_key, b"".join(chunks))
+
+    return stream_and_store()
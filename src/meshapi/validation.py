@@ -1,13 +1,19 @@
+import datetime
 import json
 import logging
 import os
+import re
 import time
-from dataclasses import dataclass
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from functools import partial
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import phonenumbers
-import requests
+from datadog import statsd
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.utils import timezone
 from flags.state import flag_state
 from validate_email import validate_email_or_fail
 from validate_email.exceptions import (
@@ -19,10 +25,17 @@ from validate_email.exceptions import (
 )
 
 from meshapi.exceptions import AddressAPIError, AddressError, OpenDataAPIError
+from meshapi.models.building_footprint import BuildingFootprint, get_absolute_altitude
+from meshapi.models.geocode_cache import GeocodeCacheEntry
+from meshapi.util import http_client
 from meshapi.util.constants import DEFAULT_EXTERNAL_API_TIMEOUT_SECONDS, INVALID_ALTITUDE
+from meshapi.util.email_domains import check_email_domain_dns
+from meshapi.util.enrichment import EnrichmentGraph
+from meshapi.util.rate_limiter import RateLimiter
 from meshapi.zips import NYCZipCodes
 
 from .pelias import humanify_street_address
+from meshdb.environment import GEOCODE_BATCH_MAX_ADDRESSES_PER_SECOND, GEOCODE_BATCH_MAX_CONCURRENCY
 from meshdb.environment import RECAPTCHA_SECRET_KEY_V2, RECAPTCHA_SECRET_KEY_V3, RECAPTCHA_INVISIBLE_TOKEN_SCORE_THRESHOLD
 
 
@@ -35,17 +48,38 @@ RECAPTCHA_TOKEN_VALIDATION_URL = "https://www.google.com/recaptcha/api/siteverif
 
 INVALID_BIN_NUMBERS = [-2, -1, 0, 1000000, 2000000, 3000000, 4000000]
 
+# Pelias and the DOB each get DEFAULT_EXTERNAL_API_TIMEOUT_SECONDS per request, and we ask them at the
+# same time, so this leaves a little room on top of one slow request, rather than adding up
+ADDRESS_ENRICHMENT_DEADLINE_SECONDS = DEFAULT_EXTERNAL_API_TIMEOUT_SECONDS + 2
+
+# How long to keep the outcome of geocoding an address (see GeocodeCacheEntry). Buildings don't move,
+# but the city does correct its data from time to time
+GEOCODE_CACHE_TTL = datetime.timedelta(days=30)
+# Addresses the city couldn't find are usually typos, and get resubmitted unchanged, but they might
+# also be new construction which hasn't made it into the city's data yet
+GEOCODE_NEGATIVE_CACHE_TTL = datetime.timedelta(days=1)
+
+# gunicorn kills a worker which spends more than 30s on a request, throwing away every lookup it's done,
+# so a batch stops starting new lookups after this long (leaving time for those still going to finish),
+# and reports whatever's left as something to try again
+GEOCODE_BATCH_DEADLINE_SECONDS = 15
+
+EMAIL_DNS_TIMEOUT_SECONDS = 5
+
 
 def validate_email_address(email_address: str) -> Optional[bool]:
     try:
-        return validate_email_or_fail(
+        # The format and blacklist checks don't leave the process. We look up the domain's MX records
+        # ourselves, so that we can remember the answer for everyone else using the same domain
+        validate_email_or_fail(
             email_address=email_address,
             check_format=True,
             check_blacklist=True,
-            check_dns=True,
-            dns_timeout=5,
+            check_dns=False,
             check_smtp=False,
         )
+        check_email_domain_dns(email_address, timeout=EMAIL_DNS_TIMEOUT_SECONDS)
+        return True
     except SMTPTemporaryError:
         # SMTPTemporaryError indicates address validity
         # is ambiguous. We give the submitter the benefit of the doubt in this case
@@ -76,6 +110,50 @@ def validate_phone_number(phone_number: str) -> Optional[phonenumbers.PhoneNumbe
         return None
 
 
+def get_building_footprint_altitude(bin: int) -> Optional[float]:
+    """
+    The altitude of the building with the given BIN, from our copy of the DOB building footprints
+    (see the import_building_footprints command), or None if we don't have it
+    """
+    footprint = BuildingFootprint.objects.filter(bin=bin).first()
+    altitude = footprint.altitude if footprint else None
+    statsd.increment("meshdb.building_footprints.lookup", tags=[f"status:{'miss' if altitude is None else 'hit'}"])
+    return altitude
+
+
+def get_open_data_altitude(bin: Optional[int]) -> Optional[float]:
+    """
+    The altitude of the building with the given BIN according to NYC OpenData, or INVALID_ALTITUDE if
+    we couldn't get it
+    """
+    try:
+        query_params = {
+            "$where": f"bin={bin}",
+            "$select": "heightroof,groundelev",
+            "$limit": "1",
+        }
+        nyc_dataset_req = http_client.get(
+            DOB_BUILDING_HEIGHT_API_URL,
+            params=query_params,
+            timeout=DEFAULT_EXTERNAL_API_TIMEOUT_SECONDS,
+        )
+        nyc_dataset_resp = json.loads(nyc_dataset_req.content.decode("utf-8"))
+
+        if len(nyc_dataset_resp) == 0:
+            logging.warning(f"Empty response from nyc open data about altitude of ({bin})")
+            raise OpenDataAPIError
+
+        return get_absolute_altitude(float(nyc_dataset_resp[0]["heightroof"]), float(nyc_dataset_resp[0]["groundelev"]))
+    except OpenDataAPIError:
+        logging.warning(
+            f"(NYC) DOB BIN ({bin}) not found in NYC OpenData while trying to query for altitude information"
+        )
+    except Exception:
+        logging.exception(f"An error occurred while trying to find ({bin}) in NYC OpenData")
+
+    return INVALID_ALTITUDE
+
+
 # Used to obtain info about addresses within NYC. Uses a pair of APIs
 # hosted by the city with all kinds of good info. Unfortunately, there's
 # not a solid way to check if an address is actually _within_ NYC, so this
@@ -108,7 +186,7 @@ class NYCAddressInfo:
                 "text": self.address,
                 "size": "1",
             }
-            nyc_planning_req = requests.get(
+            nyc_planning_req = http_client.get(
                 NYC_PLANNING_LABS_GEOCODE_URL,
                 params=query_params,
                 timeout=DEFAULT_EXTERNAL_API_TIMEOUT_SECONDS,
@@ -135,9 +213,15 @@ class NYCAddressInfo:
 
         addr_props = nyc_planning_resp["features"][0]["properties"]
 
-        # Get the rest of the address info
-        self.street_address = humanify_street_address(f"{addr_props['housenumber']} {addr_props['street']}")
+        # Once we have the address from the city, humanifying the street address (with Pelias) and
+        # looking up the height of the building (with the DOB) don't depend on each other, so we do both at once
+        enrichment = EnrichmentGraph("address_enrichment", ADDRESS_ENRICHMENT_DEADLINE_SECONDS)
+        enrichment.add(
+            "humanify_street_address",
+            partial(humanify_street_address, f"{addr_props['housenumber']} {addr_props['street']}"),
+        )
 
+        # Get the rest of the address info
         self.city = addr_props["borough"].replace("Manhattan", "New York")
 
         # Queens addresses are special and different, but it seems the neighborhood name
@@ -159,41 +243,38 @@ class NYCAddressInfo:
         self.bin = addr_props["addendum"]["pad"]["bin"]
         self.longitude, self.latitude = nyc_planning_resp["features"][0]["geometry"]["coordinates"]
 
-        # Now that we have the bin, we can definitively get the height from
-        # NYC OpenData
+        # Now that we have the bin, we can definitively get the height, from our
+        # copy of the DOB building footprints if it's there, otherwise from NYC OpenData
+        footprint_altitude = get_building_footprint_altitude(int(addr_props["addendum"]["pad"]["bin"]))
+        if footprint_altitude is None:
+            enrichment.add("open_data_altitude", partial(get_open_data_altitude, self.bin))
+
         try:
-            query_params = {
-                "$where": f"bin={self.bin}",
-                "$select": "heightroof,groundelev",
-                "$limit": "1",
-            }
-            nyc_dataset_req = requests.get(
-                DOB_BUILDING_HEIGHT_API_URL,
-                params=query_params,
-                timeout=DEFAULT_EXTERNAL_API_TIMEOUT_SECONDS,
-            )
-            nyc_dataset_resp = json.loads(nyc_dataset_req.content.decode("utf-8"))
-
-            if len(nyc_dataset_resp) == 0:
-                logging.warning(f"Empty response from nyc open data about altitude of ({self.bin})")
-                raise OpenDataAPIError
-            else:
-                # Convert relative to ground altitude to absolute altitude AMSL,
-                # convert feet to meters, and round to the nearest 0.1 m
-                FEET_PER_METER = 3.28084
-                self.altitude = round(
-                    (float(nyc_dataset_resp[0]["heightroof"]) + float(nyc_dataset_resp[0]["groundelev"]))
-                    / FEET_PER_METER,
-                    1,
-                )
-        except OpenDataAPIError:
-            self.altitude = INVALID_ALTITUDE
-            logging.warning(
-                f"(NYC) DOB BIN ({self.bin}) not found in NYC OpenData while trying to query for altitude information"
-            )
-        except Exception:
+            self.street_address = enrichment.result("humanify_street_address")
+        except TimeoutError:
+            logging.warning(f"Timed out humanifying the street address of '{self.address}' with Pelias")
+            raise AddressAPIError
+
+        if footprint_altitude is not None:
+            self.altitude = footprint_altitude
+            return
+
+        try:
+            self.altitude = enrichment.result("open_data_altitude")
+        except TimeoutError:
             self.altitude = INVALID_ALTITUDE
-            logging.exception(f"An error occurred while trying to find ({self.bin}) in NYC OpenData")
+            logging.warning(f"Timed out looking for ({self.bin}) in NYC OpenData")
+
+    def to_cache_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "address": self.address}
+
+    @classmethod
+    def from_cache_dict(cls, cached: Dict[str, Any]) -> "NYCAddressInfo":
+        # Skip __init__(), we already know everything it would go and look up
+        nyc_addr_info = cls.__new__(cls)
+        for key, value in cached.items():
+            setattr(nyc_addr_info, key, value)
+        return nyc_addr_info
 
 
 def validate_multi_phone_number_field(phone_number_list: List[str]) -> None:
@@ -206,17 +287,79 @@ def validate_phone_number_field(phone_number: str) -> None:
         raise ValidationError(f"Invalid phone number: {phone_number}")
 
 
+def get_geocode_cache_key(street_address: str, city: str, state: str, zip_code: str) -> str:
+    """
+    Normalize an address for use as a GeocodeCacheEntry key, so that trivial differences in
+    punctuation, case, and whitespace between submissions still find the same entry
+    """
+    parts = [re.sub(r"[^\w]+", " ", part).strip().lower() for part in [street_address, city, state, zip_code]]
+    # NYCAddressInfo accepts either name for the state
+    if parts[2] == "new york":
+        parts[2] = "ny"
+    return "|".join(parts)
+
+
+def get_cached_geocode(cache_key: str) -> Optional[GeocodeCacheEntry]:
+    entry = GeocodeCacheEntry.objects.filter(address_key=cache_key, expires__gt=timezone.now()).first()
+    if entry is None:
+        status = "miss"
+    else:
+        status = "negative_hit" if entry.result is None else "hit"
+    statsd.increment("meshdb.geocode_cache.lookup", tags=[f"status:{status}"])
+    return entry
+
+
+def store_cached_geocode(
+    cache_key: str, nyc_addr_info: Optional[NYCAddressInfo] = None, error: Optional[AddressError] = None
+) -> None:
+    ttl = GEOCODE_CACHE_TTL if nyc_addr_info else GEOCODE_NEGATIVE_CACHE_TTL
+    GeocodeCacheEntry.objects.update_or_create(
+        address_key=cache_key,
+        defaults={
+            "result": nyc_addr_info.to_cache_dict() if nyc_addr_info else None,
+            "error": error.args[0] if error and error.args else None,
+            "expires": timezone.now() + ttl,
+        },
+    )
+
+
+def _from_cached_geocode(cached: GeocodeCacheEntry, street_address: str) -> NYCAddressInfo:
+    if cached.result is None:
+        raise AddressError(cached.error or f"(NYC) Address '{street_address}' not found.")
+    return NYCAddressInfo.from_cache_dict(cached.result)
+
+
 def geocode_nyc_address(street_address: str, city: str, state: str, zip_code: str) -> Optional[NYCAddressInfo]:
+    cache_key = get_geocode_cache_key(street_address, city, state, zip_code)
+    cached = get_cached_geocode(cache_key)
+    if cached:
+        return _from_cached_geocode(cached, street_address)
+
+    return _geocode_uncached_nyc_address(cache_key, street_address, city, state, zip_code)
+
+
+def _geocode_uncached_nyc_address(
+    cache_key: str, street_address: str, city: str, state: str, zip_code: str, deadline: Optional[float] = None
+) -> Optional[NYCAddressInfo]:
     attempts_remaining = 2
     while attempts_remaining > 0:
+        if deadline is not None and attempts_remaining < 2 and time.monotonic() > deadline:
+            # Whoever's waiting on us can't wait for another attempt
+            break
         attempts_remaining -= 1
         try:
             nyc_addr_info = NYCAddressInfo(street_address, city, state, zip_code)
+            if nyc_addr_info.altitude != INVALID_ALTITUDE:
+                # Otherwise, try again for the altitude next time
+                store_cached_geocode(cache_key, nyc_addr_info=nyc_addr_info)
             return nyc_addr_info
         # If the user has given us an invalid address. Tell them to buzz
         # off.
         except (AddressError, ValueError) as e:
             logging.exception("AddressError when validating address")
+            if isinstance(e, AddressError):
+                # So that we can turn this address away straight away next time
+                store_cached_geocode(cache_key, error=e)
             # Raise to next level
             raise e
 
@@ -231,15 +374,93 @@ def geocode_nyc_address(street_address: str, city: str, state: str, zip_code: st
     return None
 
 
+@dataclass
+class GeocodeResult:
+    """
+    The outcome of geocoding one address of a batch: what geocode_nyc_address() would have returned,
+    or the error it would have raised (AddressError, or ValueError for an address outside of NYC).
+    Neither means we couldn't get an answer out of the city's APIs, and it's worth trying again later
+    """
+
+    nyc_addr_info: Optional[NYCAddressInfo] = None
+    error: Optional[Exception] = None
+
+
+# Shared by every batch, the city doesn't care how many of them we're running
+_geocode_batch_rate_limiter = RateLimiter(GEOCODE_BATCH_MAX_ADDRESSES_PER_SECOND)
+
+
+def _geocode_batch_address(cache_key: str, address: Tuple[str, str, str, str], deadline: float) -> GeocodeResult:
+    try:
+        if not _geocode_batch_rate_limiter.acquire(deadline=deadline):
+            # Out of time, this one can be tried again later
+            return GeocodeResult()
+
+        # Unlike the rest of our requests, we can afford to wait if the city asks us to slow down. Everyone
+        # else's lookups hold off too, and any which can't within the deadline are given up on
+        with http_client.notify_retry_after(_geocode_batch_rate_limiter.defer):
+            return GeocodeResult(nyc_addr_info=_geocode_uncached_nyc_address(cache_key, *address, deadline=deadline))
+    except (AddressError, ValueError) as e:
+        return GeocodeResult(error=e)
+    finally:
+        # We're on a thread of our own, nobody else is going to close its database connection
+        connection.close()
+
+
+def geocode_nyc_addresses(
+    addresses: Sequence[Tuple[str, str, str, str]], max_concurrency: Optional[int] = None
+) -> List[GeocodeResult]:
+    """
+    Geocode each of the given (street_address, city, state, zip_code) addresses like geocode_nyc_address(),
+    looking up as many at once as `max_concurrency` (or GEOCODE_BATCH_MAX_CONCURRENCY) allows. Addresses in
+    the geocode cache are answered with a single query, and the rest are sent to the city no faster than
+    GEOCODE_BATCH_MAX_ADDRESSES_PER_SECOND, until GEOCODE_BATCH_DEADLINE_SECONDS is up. Returns a result for
+    each address, in the same order
+    """
+    deadline = time.monotonic() + GEOCODE_BATCH_DEADLINE_SECONDS
+    cache_keys = [get_geocode_cache_key(*address) for address in addresses]
+    cached_entries = {
+        entry.address_key: entry
+        for entry in GeocodeCacheEntry.objects.filter(address_key__in=set(cache_keys), expires__gt=timezone.now())
+    }
+
+    results: Dict[str, GeocodeResult] = {}
+    uncached_addresses: Dict[str, Tuple[str, str, str, str]] = {}
+    for cache_key, address in zip(cache_keys, addresses):
+        cached = cached_entries.get(cache_key)
+        if cached is None:
+            # The same address can come up more than once (e.g. several installs in one building)
+            uncached_addresses.setdefault(cache_key, address)
+        elif cache_key not in results:
+            try:
+                results[cache_key] = GeocodeResult(nyc_addr_info=_from_cached_geocode(cached, address[0]))
+            except AddressError as e:
+                results[cache_key] = GeocodeResult(error=e)
+
+    statsd.increment("meshdb.geocode_cache.lookup", len(cached_entries), tags=["status:batch_hit"])
+    statsd.increment("meshdb.geocode_cache.lookup", len(uncached_addresses), tags=["status:batch_miss"])
+
+    if uncached_addresses:
+        with ThreadPoolExecutor(
+            max_workers=max(min(max_concurrency or GEOCODE_BATCH_MAX_CONCURRENCY, len(uncached_addresses)), 1),
+            thread_name_prefix="meshdb-geocode-batch",
+        ) as executor:
+            futures = {
+                cache_key: executor.submit(_geocode_batch_address, cache_key, address, deadline)
+                for cache_key, address in uncached_addresses.items()
+            }
+            for cache_key, future in futures.items():
+                results[cache_key] = future.result()
+
+    return [results[cache_key] for cache_key in cache_keys]
+
+
 def check_recaptcha_token(token: Optional[str], server_secret: str, remote_ip: Optional[str]) -> float:
     payload = {"secret": server_secret, "response": token}
     if remote_ip:
         payload["remoteip"] = remote_ip
 
-    captcha_response = requests.post(
-        RECAPTCHA_TOKEN_VALIDATION_URL,
-        payload,
-    )
+    captcha_response = http_client.post(RECAPTCHA_TOKEN_VALIDATION_URL, data=payload)
 
     captcha_response.raise_for_status()
 
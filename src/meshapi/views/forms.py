@@ -1,13 +1,17 @@
+import hashlib
 import json
 import logging
 import os
-from dataclasses import dataclass
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import asdict, dataclass
 from datetime import date, datetime, timezone
 from json.decoder import JSONDecodeError
-from typing import Optional
+from typing import Iterator, List, Optional
 
 from datadog import statsd
 from ddtrace import tracer
+from django.core.cache import cache
 from django.db import IntegrityError, transaction
 from django.db.models import Q
 from drf_spectacular.utils import OpenApiResponse, extend_schema, extend_schema_view, inline_serializer
@@ -24,7 +28,11 @@ from meshapi.models import AddressTruthSource, Building, Install, Member, Node
 from meshapi.permissions import HasNNAssignPermission, LegacyNNAssignmentPassword
 from meshapi.serializers import MemberSerializer
 from meshapi.util.admin_notifications import notify_administrators_of_data_issue
-from meshapi.util.constants import RECAPTCHA_CHECKBOX_TOKEN_HEADER, RECAPTCHA_INVISIBLE_TOKEN_HEADER
+from meshapi.util.constants import (
+    JOIN_FORM_IDEMPOTENCY_KEY_HEADER,
+    RECAPTCHA_CHECKBOX_TOKEN_HEADER,
+    RECAPTCHA_INVISIBLE_TOKEN_HEADER,
+)
 from meshapi.util.django_pglocks import advisory_lock
 from meshapi.util.network_number import NETWORK_NUMBER_MAX, NETWORK_NUMBER_MIN, get_next_available_network_number
 from meshapi.validation import (
@@ -35,11 +43,18 @@ from meshapi.validation import (
     validate_phone_number,
     validate_recaptcha_tokens,
 )
+from meshdb.environment import JOIN_FORM_IDEMPOTENCY_TTL_SECONDS
 
 logging.basicConfig()
 
 DISABLE_RECAPTCHA_VALIDATION = os.environ.get("RECAPTCHA_DISABLE_VALIDATION", "").lower() == "true"
 
+# The website retries join form submissions which time out, sending the UUID of the submission's join
+# record as its Idempotency-Key, so we keep the response to each one and send it straight back. Along
+# with a hash of the submission, so that a key re-used for a different submission isn't mistaken for a retry
+JOIN_FORM_IDEMPOTENCY_KEY_PREFIX = "meshdb:join-form-response:"
+JOIN_FORM_IDEMPOTENCY_KEY_MAX_LENGTH = 128
+
 
 # Join Form
 @dataclass
@@ -90,18 +105,22 @@ form_err_response_schema = inline_serializer("ErrorResponse", fields={"detail":
                     },
                 ),
                 description="Request received, an install has been created (along with member and "
-                "building objects if necessary).",
+                "building objects if necessary). Also sent in response to a retry of a submission which "
+                "has already succeeded (with the same Idempotency-Key header), without processing it again.",
             ),
             "400": OpenApiResponse(
                 form_err_response_schema, description="Invalid request body JSON or missing required fields"
             ),
+            "422": OpenApiResponse(
+                form_err_response_schema,
+                description="The Idempotency-Key header has already been used for a different submission",
+            ),
             "500": OpenApiResponse(form_err_response_schema, description="Unexpected internal error"),
         },
     ),
 )
 @api_view(["POST"])
 @permission_classes([permissions.AllowAny])
-@advisory_lock("join_form_lock")
 def join_form(request: Request) -> Response:
     statsd.increment("meshdb.join_form.request", tags=[])
     request_json = json.loads(request.body)
@@ -111,6 +130,18 @@ def join_form(request: Request) -> Response:
         logging.exception("TypeError while processing JoinForm")
         return Response({"detail": "Got incomplete form request"}, status=status.HTTP_400_BAD_REQUEST)
 
+    idempotency_key = request.headers.get(JOIN_FORM_IDEMPOTENCY_KEY_HEADER) or None
+    if idempotency_key and len(idempotency_key) > JOIN_FORM_IDEMPOTENCY_KEY_MAX_LENGTH:
+        return Response(
+            {"detail": f"{JOIN_FORM_IDEMPOTENCY_KEY_HEADER} is too long"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Before the captcha, since the tokens in a retry have usually already been used up by the original
+    stored_response = get_stored_join_form_response(idempotency_key, r)
+    if stored_response:
+        statsd.increment("meshdb.join_form.response", tags=[f"status:{stored_response.status_code}", "replayed:true"])
+        return stored_response
+
     if not DISABLE_RECAPTCHA_VALIDATION:
         try:
             request_source_ip, request_source_ip_is_routable = get_client_ip(request)
@@ -130,19 +161,109 @@ def join_form(request: Request) -> Response:
             logging.exception("Captcha validation failed")
             return Response({"detail": "Captcha verification failed"}, status=status.HTTP_401_UNAUTHORIZED)
 
-    response = process_join_form(r, request)
+    response = process_join_form(r, request, idempotency_key)
     statsd.increment("meshdb.join_form.response", tags=[f"status:{response.status_code}"])
     return response
 
 
-def process_join_form(r: JoinFormRequest, request: Optional[Request] = None) -> Response:
+def get_join_form_request_hash(r: JoinFormRequest) -> str:
+    return hashlib.sha256(json.dumps(asdict(r), sort_keys=True).encode()).hexdigest()
+
+
+def get_stored_join_form_response(idempotency_key: Optional[str], r: JoinFormRequest) -> Optional[Response]:
+    """
+    The response we sent to the join form submission with this idempotency key, if it succeeded within
+    the last JOIN_FORM_IDEMPOTENCY_TTL_SECONDS. If that submission wasn't `r`, a 422 response instead
+    """
+    if not idempotency_key:
+        return None
+
+    try:
+        stored = cache.get(f"{JOIN_FORM_IDEMPOTENCY_KEY_PREFIX}{idempotency_key}")
+    except Exception:
+        logging.exception(f"Unable to look up the stored response for join form submission {idempotency_key}")
+        return None
+
+    if stored is None:
+        return None
+
+    request_hash, status_code, data = stored
+    if request_hash != get_join_form_request_hash(r):
+        logging.warning(f"Join form submission {idempotency_key} doesn't match the one we stored a response for")
+        return Response(
+            {"detail": f"{JOIN_FORM_IDEMPOTENCY_KEY_HEADER} has already been used for a different submission"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+    return Response(data, status=status_code)
+
+
+def store_join_form_response(idempotency_key: Optional[str], r: JoinFormRequest, response: Response) -> None:
+    # Only once the submission has gone through. Anything else (e.g. asking the member to confirm their
+    # address, or the city's APIs being down) deserves another go when they try again
+    if not idempotency_key or not status.is_success(response.status_code):
+        return
+
+    try:
+        cache.set(
+            f"{JOIN_FORM_IDEMPOTENCY_KEY_PREFIX}{idempotency_key}",
+            (get_join_form_request_hash(r), response.status_code, response.data),
+            timeout=JOIN_FORM_IDEMPOTENCY_TTL_SECONDS,
+        )
+    except Exception:
+        logging.exception(f"Unable to store the response for join form submission {idempotency_key}")
+
+
+@dataclass
+class ValidatedJoinForm:
+    formatted_phone_number: Optional[str]
+    nyc_addr_info: NYCAddressInfo
+
+
+def join_form_lock_ids(email_address: str, bin: int | str) -> List[str]:
+    # The member and building are what we de-duplicate submissions on, so only submissions for the
+    # same email address or the same structure need to wait for each other. Always taken in this
+    # order, so that two submissions can never each be holding the lock the other one wants
+    return [f"join_form_building:{bin}", f"join_form_member:{email_address.strip().lower()}"]
+
+
+@contextmanager
+def join_form_locks(email_address: str, bin: int | str) -> Iterator[None]:
+    start = time.monotonic()
+    with ExitStack() as stack:
+        for lock_id in join_form_lock_ids(email_address, bin):
+            stack.enter_context(advisory_lock(lock_id))
+        statsd.timing("meshdb.join_form.lock_wait", (time.monotonic() - start) * 1000, tags=[])
+        yield
+
+
+def process_join_form(
+    r: JoinFormRequest, request: Optional[Request] = None, idempotency_key: Optional[str] = None
+) -> Response:
+    # Validating the submission means waiting on DNS and the city's APIs, so we do all of that before
+    # taking any locks, and only hold them (against submissions for the same member or building)
+    # while we look for existing objects and save new ones
+    validated = validate_join_form(r)
+    if isinstance(validated, Response):
+        return validated
+
+    with join_form_locks(r.email_address, validated.nyc_addr_info.bin):
+        response = save_join_form(r, validated, request)
+
+    store_join_form_response(idempotency_key, r, response)
+    return response
+
+
+def validate_join_form(r: JoinFormRequest) -> ValidatedJoinForm | Response:
+    """
+    Check everything about a join form submission which doesn't depend on what's already in the
+    database, returning the error Response to send back if there's a problem with it
+    """
     if not r.ncl:
         return Response(
             {"detail": "You must agree to the Network Commons License!"}, status=status.HTTP_400_BAD_REQUEST
         )
 
-    join_form_full_name = f"{r.first_name} {r.last_name}"
-
     if not r.email_address:
         return Response({"detail": "Must provide an email"}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -231,6 +352,18 @@ def process_join_form(r: JoinFormRequest, request: Optional[Request] = None) ->
                 status=status.HTTP_409_CONFLICT,
             )
 
+    return ValidatedJoinForm(formatted_phone_number=formatted_phone_number, nyc_addr_info=nyc_addr_info)
+
+
+def save_join_form(r: JoinFormRequest, validated: ValidatedJoinForm, request: Optional[Request] = None) -> Response:
+    """
+    Create the objects for a validated join form submission, re-using the member, building and install
+    if we already have them. Must be called while holding join_form_locks()
+    """
+    join_form_full_name = f"{r.first_name} {r.last_name}"
+    formatted_phone_number = validated.formatted_phone_number
+    nyc_addr_info = validated.nyc_addr_info
+
     # A member can have multiple install requests, if they move apartments for example, so we
     # check if there's an existing member. Group members by matching only on primary email address
     # This is sublte but important. We do NOT want to dedupe on phone number, or even on additional
@@ -448,6 +581,15 @@ class NetworkNumberAssignmentRequestSerializer(DataclassSerializer):
     password = serializers.CharField()
 
 
+@contextmanager
+def nn_assignment_lock() -> Iterator[None]:
+    # Every assignment waits for the one before it, so that two can't pick the same number
+    start = time.monotonic()
+    with advisory_lock("nn_assignment_lock"):
+        statsd.timing("meshdb.nn_assignment.lock_wait", (time.monotonic() - start) * 1000, tags=[])
+        yield
+
+
 nn_form_success_schema = inline_serializer(
     "NNFormSuccessResponse",
     fields={
@@ -488,8 +630,10 @@ nn_form_success_schema = inline_serializer(
 )
 @api_view(["POST"])
 @permission_classes([HasNNAssignPermission | LegacyNNAssignmentPassword])
+# Outside the transaction, so that the lock is only released once this assignment has committed, and the
+# next one can see the number we took
+@nn_assignment_lock()
 @transaction.atomic
-@advisory_lock("nn_assignment_lock")
 def network_number_assignment(request: Request) -> Response:
     """
     Takes an install number, and assigns the install a network number,
@@ -1,15 +1,17 @@
+import json
 import logging
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple, TypedDict, cast
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypedDict, cast
+from uuid import UUID
 
-from django.db.models import Exists, F, OuterRef, Q
-from django.db.models.functions import Greatest
-from django.http import HttpRequest, HttpResponse
+from django.db.models import Case, Exists, F, Max, Min, OuterRef, Q, QuerySet, Subquery, Value, When
+from django.db.models.functions import Greatest, Least
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from django.utils.text import slugify
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiResponse, extend_schema, extend_schema_view, inline_serializer
-from fastkml import Data, ExtendedData, geometry, kml, styles
-from fastkml.enums import AltitudeMode
-from pygeoif import LineString, Point
+from lxml import etree
 from rest_framework import permissions, serializers, status
 from rest_framework.negotiation import BaseContentNegotiation
 from rest_framework.parsers import BaseParser
@@ -21,12 +23,58 @@ from rest_framework_dataclasses.serializers import DataclassSerializer
 
 from meshapi.exceptions import AddressError
 from meshapi.models import LOS, Install, Link
-from meshapi.validation import geocode_nyc_address
+from meshapi.models.util.spatial import BoundingBox, WithinBoundingBox
+from meshapi.util.geography_artifacts import (
+    artifact_http_response,
+    clear_scheduled_geography_artifact_rebuild,
+    iter_artifact_chunks,
+    write_artifact,
+)
+from meshapi.util.kml import (
+    KMLStreamWriter,
+    build_icon_style,
+    build_kmz,
+    build_line_style,
+    build_network_link,
+    build_placemark,
+)
+from meshapi.util.mvt import MVT_EXTENT, MVTLayer, encode_tile, lon_lat_to_tile_coordinate
+from meshapi.util.snapshot_cache import Snapshot, get_or_build_snapshot, get_or_stream_snapshot, snapshot_http_response
+from meshapi.validation import GEOCODE_BATCH_DEADLINE_SECONDS, GeocodeResult, geocode_nyc_address, geocode_nyc_addresses
+from meshdb.environment import GEOCODE_BATCH_MAX_ADDRESSES_PER_SECOND, GEOCODE_BATCH_MAX_CONCURRENCY
 
 KML_CONTENT_TYPE = "application/vnd.google-earth.kml+xml"
 KML_CONTENT_TYPE_WITH_CHARSET = f"{KML_CONTENT_TYPE}; charset=utf-8"
+KMZ_CONTENT_TYPE = "application/vnd.google-earth.kmz"
+GEOJSON_CONTENT_TYPE = "application/geo+json"
+MVT_CONTENT_TYPE = "application/vnd.mapbox-vector-tile"
 DEFAULT_ALTITUDE = 5  # Meters (absolute)
 
+# The names of the pre-built files (see write_geography_artifacts()) under GEOGRAPHY_ARTIFACT_DIR
+WHOLE_MESH_KML_ARTIFACT = "whole-mesh.kml"
+WHOLE_MESH_KMZ_ARTIFACT = "whole-mesh.kmz"
+WHOLE_MESH_GEOJSON_ARTIFACT = "whole-mesh.geojson"
+
+# Rows fetched from the database at a time while streaming the KML file
+KML_QUERY_CHUNK_SIZE = 2000
+
+# The hierarchical KML splits the whole mesh file into one document per folder, named after these
+KML_FOLDER_STATUSES = {True: "active", False: "inactive"}
+# Relative to the hierarchical KML index
+KML_STYLES_PATH = "styles.kml"
+# How large (in screen pixels) a folder's area has to be before Earth fetches its document. Inactive
+# placemarks are far more numerous, and mostly clutter until the user is looking at a neighborhood
+KML_MIN_LOD_PIXELS = {True: 128, False: 512}
+# Around the edges of each folder's area, in degrees (about 500m)
+KML_REGION_PADDING_DEGREES = 0.005
+
+# Vector tiles include features slightly beyond their edges (in tile pixels, out of MVT_EXTENT),
+# so that markers near a tile boundary aren't cut in half
+MVT_BUFFER = 64
+# Below these zoom levels, leave out potential LOS lines and inactive installs/links respectively
+MVT_LOS_MIN_ZOOM = 13
+MVT_INACTIVE_MIN_ZOOM = 11
+
 ACTIVE_COLOR = "#F00"
 INACTIVE_COLOR = "#777"
 POTENTIAL_COLOR = "#CCC"
@@ -53,6 +101,21 @@ LinkKMLDict = TypedDict(
 )
 
 
+NodeKMLDict = TypedDict(
+    "NodeKMLDict",
+    {
+        "identifier": str,
+        "is_node": bool,
+        "mark_active": bool,
+        "folder_active": bool,
+        "city": Optional[str],
+        "status": str,
+        "roof_access": bool,
+        "coord": Tuple[float, float, float],
+    },
+)
+
+
 class IgnoreClientContentNegotiation(BaseContentNegotiation):
     def select_parser(self, request: HttpRequest, parsers: List[BaseParser]) -> BaseParser:  # type: ignore[override]
         """
@@ -72,17 +135,8 @@ class IgnoreClientContentNegotiation(BaseContentNegotiation):
         return renderers[0], renderers[0].media_type
 
 
-def create_placemark(identifier: str, point: Point, active: bool, status: str, roof_access: bool) -> kml.Placemark:
-    placemark = kml.Placemark(
-        name=identifier,
-        style_url=styles.StyleUrl(url="#red_dot" if active else "#grey_dot"),
-        kml_geometry=geometry.Point(
-            geometry=point,
-            altitude_mode=AltitudeMode.absolute,
-        ),
-    )
-
-    extended_data = {
+def get_placemark_extended_data(identifier: str, active: bool, status: str, roof_access: bool) -> Dict[str, Any]:
+    return {
         "name": identifier,
         "roofAccess": str(roof_access),
         "marker-color": ACTIVE_COLOR if active else INACTIVE_COLOR,
@@ -92,9 +146,608 @@ def create_placemark(identifier: str, point: Point, active: bool, status: str, r
         # "notes": install.notes,
     }
 
-    placemark.extended_data = ExtendedData(elements=[Data(name=key, value=val) for key, val in extended_data.items()])
 
-    return placemark
+def _get_kml_installs() -> QuerySet[Install]:
+    return Install.objects.filter(
+        ~Q(status__in=[Install.InstallStatus.CLOSED, Install.InstallStatus.NN_REASSIGNED])
+        & Q(building__longitude__isnull=False)
+        & Q(building__latitude__isnull=False)
+    )
+
+
+def _get_install_kml_dict(install: Install) -> NodeKMLDict:
+    install_active = install.status == Install.InstallStatus.ACTIVE
+    return {
+        "identifier": str(install.install_number),
+        "is_node": False,
+        "mark_active": install_active,
+        "folder_active": install_active,
+        "city": install.building.city,
+        "status": install.status,
+        "roof_access": install.roof_access,
+        "coord": (
+            install.building.longitude,
+            install.building.latitude,
+            install.building.altitude or DEFAULT_ALTITUDE,
+        ),
+    }
+
+
+def _get_node_kml_dict(install: Install) -> NodeKMLDict:
+    # The extra placemark for install's node, filed alongside install
+    assert install.node
+    return {
+        "identifier": str(install.node.network_number),
+        "is_node": True,
+        "mark_active": False,
+        "folder_active": install.status == Install.InstallStatus.ACTIVE,
+        "city": install.building.city,
+        "status": install.node.status,
+        "roof_access": False,
+        "coord": (
+            install.node.longitude,
+            install.node.latitude,
+            install.node.altitude or DEFAULT_ALTITUDE,
+        ),
+    }
+
+
+def get_node_kml_dicts(bbox: Optional[BoundingBox] = None) -> List[NodeKMLDict]:
+    """
+    The points of the whole mesh geographic exports (KML, GeoJSON, vector tiles): a placemark for each
+    install, plus one for each NN at the node's location, which makes searching much easier
+    :param bbox: if provided, only include the placemarks which are inside this bounding box
+    """
+    installs = _get_kml_installs().prefetch_related("node").prefetch_related("building")
+    if bbox:
+        installs = installs.filter(
+            WithinBoundingBox(bbox, "building__longitude", "building__latitude")
+            | WithinBoundingBox(bbox, "node__longitude", "node__latitude")
+        )
+
+    node_dicts: List[NodeKMLDict] = []
+    mapped_nns = set()
+    for install in installs.order_by("install_number"):
+        if not bbox or bbox.contains(install.building.longitude, install.building.latitude):
+            node_dicts.append(_get_install_kml_dict(install))
+
+        # Add an extra placemark for the Node, once for each NN
+        # this makes searching much easier
+        if install.node and install.node.network_number and install.node.network_number not in mapped_nns:
+            mapped_nns.add(install.node.network_number)
+            if not bbox or bbox.contains(install.node.longitude, install.node.latitude):
+                node_dicts.append(_get_node_kml_dict(install))
+
+    return node_dicts
+
+
+def get_city_folder(city: Optional[str]) -> Optional[str]:
+    # The key of CITY_FOLDER_MAP for the folder placemarks in this city are filed under
+    return city if city in CITY_FOLDER_MAP else None
+
+
+def _get_city_folder_order() -> Case:
+    # The position in CITY_FOLDER_MAP of the folder each install is filed under
+    return Case(
+        *[When(building__city=city, then=Value(i)) for i, city in enumerate(CITY_FOLDER_MAP) if city is not None],
+        default=Value(list(CITY_FOLDER_MAP).index(None)),
+    )
+
+
+def _get_folder_active() -> Case:
+    return Case(When(status=Install.InstallStatus.ACTIVE, then=Value(True)), default=Value(False))
+
+
+def iter_node_kml_dicts_by_folder(folder: Optional[Tuple[bool, Optional[str]]] = None) -> Iterator[NodeKMLDict]:
+    """
+    The same placemarks as get_node_kml_dicts(), but streamed from the database in the order they
+    appear in the KML file: grouped into active and then inactive, each in CITY_FOLDER_MAP order
+    :param folder: if provided, only include the placemarks in this (active, city) folder
+    """
+    # The node placemark goes next to the lowest numbered install of the node
+    first_install_number = Subquery(
+        _get_kml_installs().filter(node=OuterRef("node")).order_by("install_number").values("install_number")[:1]
+    )
+
+    installs = (
+        _get_kml_installs()
+        .select_related("node", "building")
+        .annotate(
+            folder_active=_get_folder_active(),
+            city_folder_order=_get_city_folder_order(),
+            node_first_install_number=first_install_number,
+        )
+        .order_by("-folder_active", "city_folder_order", "install_number")
+    )
+    if folder:
+        folder_active, city = folder
+        installs = installs.filter(folder_active=folder_active, city_folder_order=list(CITY_FOLDER_MAP).index(city))
+
+    for install in installs.iterator(chunk_size=KML_QUERY_CHUNK_SIZE):
+        yield _get_install_kml_dict(install)
+
+        if (
+            install.node
+            and install.node.network_number
+            and install.install_number == install.node_first_install_number  # type: ignore[attr-defined]
+        ):
+            yield _get_node_kml_dict(install)
+
+
+def _filter_lines_intersecting(queryset: QuerySet, bbox: BoundingBox, from_prefix: str, to_prefix: str) -> QuerySet:
+    # Keep any line whose bounding box overlaps bbox, so that long lines still show up in the
+    # tiles they pass through, even if neither end is inside them
+    return queryset.annotate(
+        min_longitude=Least(f"{from_prefix}__longitude", f"{to_prefix}__longitude"),
+        max_longitude=Greatest(f"{from_prefix}__longitude", f"{to_prefix}__longitude"),
+        min_latitude=Least(f"{from_prefix}__latitude", f"{to_prefix}__latitude"),
+        max_latitude=Greatest(f"{from_prefix}__latitude", f"{to_prefix}__latitude"),
+    ).filter(
+        min_longitude__lte=bbox.east,
+        max_longitude__gte=bbox.west,
+        min_latitude__lte=bbox.north,
+        max_latitude__gte=bbox.south,
+    )
+
+
+def _get_kml_links(bbox: Optional[BoundingBox] = None) -> QuerySet[Link]:
+    links = (
+        Link.objects.filter(~Q(status=Link.LinkStatus.INACTIVE))
+        .filter(from_device__node__network_number__isnull=False)
+        .filter(to_device__node__network_number__isnull=False)
+        .exclude(type=Link.LinkType.VPN)
+    )
+    if bbox:
+        links = _filter_lines_intersecting(links, bbox, "from_device__node", "to_device__node")
+    return links
+
+
+def _get_kml_los(bbox: Optional[BoundingBox] = None) -> QuerySet[LOS]:
+    los_queryset = LOS.objects.filter(
+        Exists(Install.objects.filter(building=OuterRef("from_building")))
+        & Exists(Install.objects.filter(building=OuterRef("to_building")))
+        & ~Q(from_building=F("to_building"))
+    ).exclude(
+        # Remove any LOS objects that would duplicate Link objects,
+        # to avoid cluttering the file
+        Exists(
+            Link.objects.filter(
+                (
+                    Q(from_device__node__buildings=OuterRef("from_building"))
+                    & Q(to_device__node__buildings=OuterRef("to_building"))
+                )
+                | (
+                    Q(from_device__node__buildings=OuterRef("to_building"))
+                    & Q(to_device__node__buildings=OuterRef("from_building"))
+                )
+            )
+        )
+    )
+    if bbox:
+        los_queryset = _filter_lines_intersecting(los_queryset, bbox, "from_building", "to_building")
+    return los_queryset
+
+
+def _iter_link_kml_dicts(links: QuerySet[Link], all_links_set: Set[Tuple[int, ...]]) -> Iterator[LinkKMLDict]:
+    """
+    The lines for the given Links, lowest first, recording the pair of NNs each one joins in all_links_set
+    """
+    for link in (
+        links.select_related("from_device__node", "to_device__node")
+        .annotate(highest_altitude=Greatest("from_device__node__altitude", "to_device__node__altitude"))
+        .order_by(F("highest_altitude").asc(nulls_first=True))
+        .iterator(chunk_size=KML_QUERY_CHUNK_SIZE)
+    ):
+        mark_active: bool = link.status == Link.LinkStatus.ACTIVE
+        link_label: str = f"{str(link.from_device.node)}-{str(link.to_device.node)}"
+        from_identifier = cast(  # Cast is safe due to corresponding filter above
+            int, link.from_device.node.network_number
+        )
+        to_identifier = cast(int, link.to_device.node.network_number)  # Cast is safe due to corresponding filter above
+
+        all_links_set.add(tuple(sorted((from_identifier, to_identifier))))
+        yield {
+            "link_label": link_label,
+            "mark_active": mark_active,
+            "is_los": False,
+            "from_coord": (
+                link.from_device.node.longitude,
+                link.from_device.node.latitude,
+                link.from_device.node.altitude or DEFAULT_ALTITUDE,
+            ),
+            "to_coord": (
+                link.to_device.node.longitude,
+                link.to_device.node.latitude,
+                link.to_device.node.altitude or DEFAULT_ALTITUDE,
+            ),
+            "extended_data": {
+                "name": f"Links-{link.id}-{link_label}",
+                "stroke": ACTIVE_COLOR if mark_active else INACTIVE_COLOR,
+                "fill": "#000000",
+                "fill-opacity": "0",
+                "from": str(from_identifier),
+                "to": str(to_identifier),
+                "status": link.status,
+                "type": link.type,
+            },
+        }
+
+
+def get_representative_install_numbers(los_queryset: QuerySet[LOS]) -> Dict[UUID, int]:
+    """
+    The lowest install number at each building at either end of the given LOSes, which we use to label
+    them. This is a single grouped query, rather than two for every LOS
+    """
+    return dict(
+        Install.objects.filter(
+            Q(building__in=los_queryset.values("from_building")) | Q(building__in=los_queryset.values("to_building"))
+        )
+        .order_by()
+        .values("building")
+        .annotate(representative_install_number=Min("install_number"))
+        .values_list("building", "representative_install_number")
+    )
+
+
+def _iter_los_kml_dicts(los_queryset: QuerySet[LOS], all_links_set: Set[Tuple[int, ...]]) -> Iterator[LinkKMLDict]:
+    """
+    The lines for the given LOSes, lowest first, skipping any between a pair of installs already in all_links_set
+    """
+    representative_installs = get_representative_install_numbers(los_queryset)
+
+    for los in (
+        los_queryset.select_related("from_building", "to_building")
+        .annotate(highest_altitude=Greatest("from_building__altitude", "to_building__altitude"))
+        .order_by(F("highest_altitude").asc(nulls_first=True))
+        .iterator(chunk_size=KML_QUERY_CHUNK_SIZE)
+    ):
+        # The queryset only includes LOSes with installs at both ends
+        representative_from_install = representative_installs[los.from_building_id]
+        representative_to_install = representative_installs[los.to_building_id]
+        link_label = f"{representative_from_install}-{representative_to_install}"
+
+        link_tuple = tuple(sorted((representative_from_install, representative_to_install)))
+        if link_tuple not in all_links_set:
+            all_links_set.add(link_tuple)
+            yield {
+                "link_label": link_label,
+                "mark_active": False,
+                "is_los": True,
+                "from_coord": (
+                    los.from_building.longitude,
+                    los.from_building.latitude,
+                    los.from_building.altitude or DEFAULT_ALTITUDE,
+                ),
+                "to_coord": (
+                    los.to_building.longitude,
+                    los.to_building.latitude,
+                    los.to_building.altitude or DEFAULT_ALTITUDE,
+                ),
+                "extended_data": {
+                    "name": f"LOS-{los.id} {link_label}",
+                    "stroke": POTENTIAL_COLOR,
+                    "fill": "#000000",
+                    "fill-opacity": "0",
+                    "from": f"#{representative_from_install} ({los.from_building.street_address})",
+                    "to": f"#{representative_to_install} ({los.to_building.street_address})",
+                    "source": los.source,
+                },
+            }
+
+
+def get_link_kml_dicts(bbox: Optional[BoundingBox] = None) -> List[LinkKMLDict]:
+    """
+    The lines of the whole mesh geographic exports (KML, GeoJSON, vector tiles): every Link between
+    two NNs, plus every LOS which doesn't duplicate one of them
+    :param bbox: if provided, only include the lines which pass through this bounding box
+    """
+    all_links_set: Set[Tuple[int, ...]] = set()
+    kml_links = list(_iter_link_kml_dicts(_get_kml_links(bbox), all_links_set))
+    kml_links.extend(_iter_los_kml_dicts(_get_kml_los(bbox), all_links_set))
+    return kml_links
+
+
+def iter_link_kml_dicts_by_folder(active: Optional[bool] = None) -> Iterator[LinkKMLDict]:
+    """
+    The same lines as get_link_kml_dicts(), but streamed from the database in the order they appear
+    in the KML file: active links, then inactive links, then the LOSes (which are all inactive)
+    :param active: if provided, only include the lines in the active (True) or inactive (False) folder
+    """
+    all_links_set: Set[Tuple[int, ...]] = set()
+    links = _get_kml_links()
+    active_links = links.filter(status=Link.LinkStatus.ACTIVE)
+
+    if active is False:
+        # We still mustn't duplicate any active links with LOSes
+        all_links_set.update(
+            tuple(sorted(nns))
+            for nns in active_links.values_list(
+                "from_device__node__network_number", "to_device__node__network_number"
+            ).iterator(chunk_size=KML_QUERY_CHUNK_SIZE)
+        )
+    else:
+        yield from _iter_link_kml_dicts(active_links, all_links_set)
+
+    if active is not True:
+        yield from _iter_link_kml_dicts(links.exclude(status=Link.LinkStatus.ACTIVE), all_links_set)
+        yield from _iter_los_kml_dicts(_get_kml_los(), all_links_set)
+
+
+def _build_node_placemark(node_dict: NodeKMLDict, styles_href: str = "") -> etree._Element:
+    return build_placemark(
+        node_dict["identifier"],
+        f"{styles_href}#red_dot" if node_dict["mark_active"] else f"{styles_href}#grey_dot",
+        get_placemark_extended_data(
+            node_dict["identifier"], node_dict["mark_active"], node_dict["status"], node_dict["roof_access"]
+        ),
+        [node_dict["coord"]],
+        is_line=False,
+    )
+
+
+def _build_link_placemark(link_dict: LinkKMLDict, styles_href: str = "") -> etree._Element:
+    if link_dict["is_los"]:
+        style_url = f"{styles_href}#grey_line"
+    else:
+        style_url = f"{styles_href}#red_line" if link_dict["mark_active"] else f"{styles_href}#dark_grey_line"
+
+    return build_placemark(
+        f"Links-{link_dict['link_label']}",
+        style_url,
+        link_dict["extended_data"],
+        [link_dict["from_coord"], link_dict["to_coord"]],
+        is_line=True,
+    )
+
+
+def _write_kml_styles(writer: KMLStreamWriter) -> None:
+    writer.write(build_icon_style("grey_dot", "http://maps.google.com/mapfiles/kml/shapes/shaded_dot.png"))
+    writer.write(build_icon_style("red_dot", "http://maps.google.com/mapfiles/kml/paddle/red-circle.png"))
+    writer.write(build_line_style("red_line", "ff0000ff", 2))
+    writer.write(build_line_style("grey_line", "ffcccccc", 2))
+    writer.write(build_line_style("dark_grey_line", "ff777777", 2))
+
+
+def _iter_placemark_chunks(writer: KMLStreamWriter, placemarks: Iterable[etree._Element]) -> Iterator[bytes]:
+    for placemark in placemarks:
+        writer.write(placemark)
+
+        chunk = writer.take_chunk()
+        if chunk:
+            yield chunk
+
+
+def iter_whole_mesh_kml_chunks() -> Iterator[bytes]:
+    """
+    Generate the whole mesh KML file, yielding it chunk by chunk as the placemarks come out of the
+    database rather than building the whole document up front
+    """
+    writer = KMLStreamWriter()
+    with writer.document():
+        with writer.element("Document"):
+            _write_kml_styles(writer)
+
+            with writer.folder("Nodes"):
+                node_dicts = iter_node_kml_dicts_by_folder()
+                node_dict = next(node_dicts, None)
+                for folder_active, folder_name in [(True, "Active"), (False, "Inactive")]:
+                    with writer.folder(folder_name):
+                        for city, city_folder_name in CITY_FOLDER_MAP.items():
+                            with writer.folder(city_folder_name):
+                                while (
+                                    node_dict
+                                    and node_dict["folder_active"] == folder_active
+                                    and get_city_folder(node_dict["city"]) == city
+                                ):
+                                    yield from _iter_placemark_chunks(writer, [_build_node_placemark(node_dict)])
+                                    node_dict = next(node_dicts, None)
+
+            with writer.folder("Links"):
+                # Every LOS is inactive, they go after the inactive links (if they don't duplicate any links)
+                link_dicts = iter_link_kml_dicts_by_folder()
+                link_dict = next(link_dicts, None)
+                for folder_active, folder_name in [(True, "Active"), (False, "Inactive")]:
+                    with writer.folder(folder_name):
+                        while link_dict and link_dict["mark_active"] == folder_active:
+                            yield from _iter_placemark_chunks(writer, [_build_link_placemark(link_dict)])
+                            link_dict = next(link_dicts, None)
+
+    yield writer.final_chunk()
+
+
+def _get_kml_region(west: float, south: float, east: float, north: float) -> BoundingBox:
+    # Earth never considers a region with no area to be in view, so give lone points some room
+    return BoundingBox(
+        west=max(-180, west - KML_REGION_PADDING_DEGREES),
+        south=max(-90, south - KML_REGION_PADDING_DEGREES),
+        east=min(180, east + KML_REGION_PADDING_DEGREES),
+        north=min(90, north + KML_REGION_PADDING_DEGREES),
+    )
+
+
+def get_node_folder_regions() -> Dict[Tuple[bool, Optional[str]], BoundingBox]:
+    """
+    The area covered by the placemarks in each (active, city) folder of the whole mesh KML file which
+    has any placemarks in it, found with a single grouped query
+    """
+    city_folders = list(CITY_FOLDER_MAP)
+    folder_bounds = (
+        _get_kml_installs()
+        .annotate(folder_active=_get_folder_active(), city_folder_order=_get_city_folder_order())
+        .order_by()
+        .values("folder_active", "city_folder_order")
+        # Node placemarks sit at the node rather than the building (postgres' LEAST/GREATEST skip nulls)
+        .annotate(
+            west=Least(Min("building__longitude"), Min("node__longitude")),
+            south=Least(Min("building__latitude"), Min("node__latitude")),
+            east=Greatest(Max("building__longitude"), Max("node__longitude")),
+            north=Greatest(Max("building__latitude"), Max("node__latitude")),
+        )
+    )
+    return {
+        (bounds["folder_active"], city_folders[bounds["city_folder_order"]]): _get_kml_region(
+            bounds["west"], bounds["south"], bounds["east"], bounds["north"]
+        )
+        for bounds in folder_bounds
+    }
+
+
+def _get_line_bounds(queryset: QuerySet, from_prefix: str, to_prefix: str) -> Optional[Tuple[float, ...]]:
+    bounds = queryset.aggregate(
+        west=Least(Min(f"{from_prefix}__longitude"), Min(f"{to_prefix}__longitude")),
+        south=Least(Min(f"{from_prefix}__latitude"), Min(f"{to_prefix}__latitude")),
+        east=Greatest(Max(f"{from_prefix}__longitude"), Max(f"{to_prefix}__longitude")),
+        north=Greatest(Max(f"{from_prefix}__latitude"), Max(f"{to_prefix}__latitude")),
+    )
+    if bounds["west"] is None:
+        return None
+    return bounds["west"], bounds["south"], bounds["east"], bounds["north"]
+
+
+def get_link_folder_regions() -> Dict[bool, BoundingBox]:
+    """
+    The area covered by the lines in the active (True) and inactive (False) link folders of the whole
+    mesh KML file, for each of them which has any lines in it
+    """
+    links = _get_kml_links()
+    folder_bounds = {
+        True: [_get_line_bounds(links.filter(status=Link.LinkStatus.ACTIVE), "from_device__node", "to_device__node")],
+        False: [
+            _get_line_bounds(links.exclude(status=Link.LinkStatus.ACTIVE), "from_device__node", "to_device__node"),
+            _get_line_bounds(_get_kml_los(), "from_building", "to_building"),
+        ],
+    }
+
+    regions = {}
+    for folder_active, bounds_list in folder_bounds.items():
+        bounds = [b for b in bounds_list if b is not None]
+        if bounds:
+            regions[folder_active] = _get_kml_region(
+                min(b[0] for b in bounds),
+                min(b[1] for b in bounds),
+                max(b[2] for b in bounds),
+                max(b[3] for b in bounds),
+            )
+
+    return regions
+
+
+def get_node_folder_kml_path(folder_active: bool, city: Optional[str]) -> str:
+    # Relative to the hierarchical KML index
+    return f"nodes/{KML_FOLDER_STATUSES[folder_active]}/{slugify(CITY_FOLDER_MAP[city])}.kml"
+
+
+def get_link_folder_kml_path(folder_active: bool) -> str:
+    # Relative to the hierarchical KML index
+    return f"links/{KML_FOLDER_STATUSES[folder_active]}.kml"
+
+
+def iter_whole_mesh_kml_index_chunks() -> Iterator[bytes]:
+    """
+    Generate the root of the hierarchical whole mesh KML, the same folders as the whole mesh KML file,
+    but with a NetworkLink to a separate document in place of each folder's placemarks. Earth only
+    fetches each of those once the user zooms in on the area it covers
+    """
+    node_regions = get_node_folder_regions()
+    link_regions = get_link_folder_regions()
+
+    writer = KMLStreamWriter()
+    with writer.document():
+        with writer.named_element("Document", "NYC Mesh"):
+            with writer.folder("Nodes"):
+                for folder_active, folder_name in [(True, "Active"), (False, "Inactive")]:
+                    with writer.folder(folder_name):
+                        for city, city_folder_name in CITY_FOLDER_MAP.items():
+                            region = node_regions.get((folder_active, city))
+                            if region:
+                                writer.write(
+                                    build_network_link(
+                                        city_folder_name,
+                                        get_node_folder_kml_path(folder_active, city),
+                                        region,
+                                        KML_MIN_LOD_PIXELS[folder_active],
+                                    )
+                                )
+
+            with writer.folder("Links"):
+                for folder_active, folder_name in [(True, "Active"), (False, "Inactive")]:
+                    region = link_regions.get(folder_active)
+                    if region:
+                        writer.write(
+                            build_network_link(
+                                folder_name,
+                                get_link_folder_kml_path(folder_active),
+                                region,
+                                KML_MIN_LOD_PIXELS[folder_active],
+                            )
+                        )
+
+    yield writer.final_chunk()
+
+
+def iter_whole_mesh_kml_styles_chunks() -> Iterator[bytes]:
+    """
+    Generate the document holding the styles shared by all of the hierarchical whole mesh KML documents
+    """
+    writer = KMLStreamWriter()
+    with writer.document():
+        with writer.element("Document"):
+            _write_kml_styles(writer)
+
+    yield writer.final_chunk()
+
+
+def iter_node_folder_kml_chunks(folder_active: bool, city: Optional[str]) -> Iterator[bytes]:
+    """
+    Generate the hierarchical whole mesh KML document for the placemarks in one (active, city) folder
+    """
+    styles_href = "../../" + KML_STYLES_PATH
+    folder_name = f"{'Active' if folder_active else 'Inactive'} - {CITY_FOLDER_MAP[city]}"
+
+    writer = KMLStreamWriter()
+    with writer.document():
+        with writer.named_element("Document", folder_name):
+            yield from _iter_placemark_chunks(
+                writer,
+                (
+                    _build_node_placemark(node_dict, styles_href)
+                    for node_dict in iter_node_kml_dicts_by_folder((folder_active, city))
+                ),
+            )
+
+    yield writer.final_chunk()
+
+
+def iter_link_folder_kml_chunks(folder_active: bool) -> Iterator[bytes]:
+    """
+    Generate the hierarchical whole mesh KML document for the lines in the active or inactive folder
+    """
+    styles_href = "../" + KML_STYLES_PATH
+    folder_name = "Active" if folder_active else "Inactive"
+
+    writer = KMLStreamWriter()
+    with writer.document():
+        with writer.named_element("Document", folder_name):
+            yield from _iter_placemark_chunks(
+                writer,
+                (
+                    _build_link_placemark(link_dict, styles_href)
+                    for link_dict in iter_link_kml_dicts_by_folder(folder_active)
+                ),
+            )
+
+    yield writer.final_chunk()
+
+
+def kml_snapshot_http_response(
+    request: HttpRequest, name: str, build_chunks: Callable[[], Iterable[bytes]]
+) -> HttpResponseBase:
+    snapshot = get_or_stream_snapshot(name, build_chunks)
+    if not isinstance(snapshot, Snapshot):
+        # As with the map data, the next request will be served from the stored snapshot (with an ETag)
+        return StreamingHttpResponse(snapshot, content_type=KML_CONTENT_TYPE_WITH_CHARSET)
+
+    return snapshot_http_response(request, snapshot, KML_CONTENT_TYPE_WITH_CHARSET)
 
 
 class WholeMeshKML(APIView):
@@ -112,273 +765,272 @@ class WholeMeshKML(APIView):
             )
         },
     )
-    def get(self, request: HttpRequest) -> HttpResponse:
-        kml_root = kml.KML()
-        ns = "{http://www.opengis.net/kml/2.2}"
-
-        grey_dot = styles.Style(
-            id="grey_dot",
-            styles=[
-                styles.IconStyle(
-                    icon=styles.Icon(href="http://maps.google.com/mapfiles/kml/shapes/shaded_dot.png"),
-                    hot_spot=styles.HotSpot(x=0.5, y=0.5, xunits=styles.Units.fraction, yunits=styles.Units.fraction),
-                )
-            ],
+    def get(self, request: HttpRequest) -> HttpResponseBase:
+        return artifact_http_response(WHOLE_MESH_KML_ARTIFACT, KML_CONTENT_TYPE_WITH_CHARSET) or (
+            kml_snapshot_http_response(request, "geography-whole-mesh-kml", iter_whole_mesh_kml_chunks)
         )
 
-        red_dot = styles.Style(
-            id="red_dot",
-            styles=[
-                styles.IconStyle(
-                    icon=styles.Icon(href="http://maps.google.com/mapfiles/kml/paddle/red-circle.png"),
-                    hot_spot=styles.HotSpot(x=0.5, y=0.5, xunits=styles.Units.fraction, yunits=styles.Units.fraction),
-                )
-            ],
+
+class WholeMeshKMZ(APIView):
+    permission_classes = [permissions.AllowAny]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    @extend_schema(
+        tags=["Geographic & KML Data"],
+        auth=[],
+        summary="Generate a KMZ (zipped KML) file which contains all nodes and links on the mesh",
+        responses={
+            (200, KMZ_CONTENT_TYPE): OpenApiResponse(
+                OpenApiTypes.BINARY,
+                description="Succesfully generated KMZ file. Returns a zip archive containing the whole mesh KML file",
+            )
+        },
+    )
+    def get(self, request: HttpRequest) -> HttpResponseBase:
+        return artifact_http_response(WHOLE_MESH_KMZ_ARTIFACT, KMZ_CONTENT_TYPE) or snapshot_http_response(
+            request,
+            get_or_build_snapshot("geography-whole-mesh-kmz", lambda: build_kmz(iter_whole_mesh_kml_chunks())),
+            KMZ_CONTENT_TYPE,
+            # Already compressed
+            compressible=False,
         )
 
-        red_line = styles.Style(
-            id="red_line",
-            styles=[
-                styles.LineStyle(color="ff0000ff", width=2),
-                styles.PolyStyle(color="00000000", fill=False, outline=True),
-            ],
+
+class WholeMeshKMLIndex(APIView):
+    permission_classes = [permissions.AllowAny]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    @extend_schema(
+        tags=["Geographic & KML Data"],
+        auth=[],
+        summary="Generate the root of a hierarchical KML file which contains all nodes and links on the mesh, "
+        "split into one document per folder, which are only loaded once the viewer zooms in on them",
+        responses={
+            (200, KML_CONTENT_TYPE): OpenApiResponse(
+                OpenApiTypes.BINARY,
+                description="Succesfully generated KML file. Returns XML Data conforming to the KML specification",
+            )
+        },
+    )
+    def get(self, request: HttpRequest) -> HttpResponseBase:
+        return kml_snapshot_http_response(request, "geography-whole-mesh-kml-index", iter_whole_mesh_kml_index_chunks)
+
+
+class WholeMeshKMLStyles(APIView):
+    permission_classes = [permissions.AllowAny]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    @extend_schema(
+        tags=["Geographic & KML Data"],
+        auth=[],
+        summary="Generate the styles shared by the documents of the hierarchical whole mesh KML file",
+        responses={
+            (200, KML_CONTENT_TYPE): OpenApiResponse(
+                OpenApiTypes.BINARY,
+                description="Succesfully generated KML file. Returns XML Data conforming to the KML specification",
+            )
+        },
+    )
+    def get(self, request: HttpRequest) -> HttpResponseBase:
+        return kml_snapshot_http_response(request, "geography-whole-mesh-kml-styles", iter_whole_mesh_kml_styles_chunks)
+
+
+class WholeMeshKMLNodeFolder(APIView):
+    permission_classes = [permissions.AllowAny]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    @extend_schema(
+        tags=["Geographic & KML Data"],
+        auth=[],
+        summary="Generate the document of the hierarchical whole mesh KML file which contains the active or "
+        "inactive installs and nodes in one borough",
+        responses={
+            (200, KML_CONTENT_TYPE): OpenApiResponse(
+                OpenApiTypes.BINARY,
+                description="Succesfully generated KML file. Returns XML Data conforming to the KML specification",
+            ),
+            "404": OpenApiResponse(description="No such folder"),
+        },
+    )
+    def get(self, request: HttpRequest, folder_status: str, borough: str) -> HttpResponseBase:
+        cities = {slugify(city_folder_name): city for city, city_folder_name in CITY_FOLDER_MAP.items()}
+        folder_active = {value: key for key, value in KML_FOLDER_STATUSES.items()}.get(folder_status)
+        if folder_active is None or borough not in cities:
+            return HttpResponse("No such folder", status=status.HTTP_404_NOT_FOUND, content_type="text/plain")
+
+        return kml_snapshot_http_response(
+            request,
+            f"geography-whole-mesh-kml-nodes-{folder_status}-{borough}",
+            lambda: iter_node_folder_kml_chunks(folder_active, cities[borough]),
         )
 
-        grey_line = styles.Style(
-            id="grey_line",
-            styles=[
-                styles.LineStyle(color="ffcccccc", width=2),
-                styles.PolyStyle(color="00000000", fill=False, outline=True),
-            ],
+
+class WholeMeshKMLLinkFolder(APIView):
+    permission_classes = [permissions.AllowAny]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    @extend_schema(
+        tags=["Geographic & KML Data"],
+        auth=[],
+        summary="Generate the document of the hierarchical whole mesh KML file which contains the active or "
+        "inactive links (including potential LOS lines)",
+        responses={
+            (200, KML_CONTENT_TYPE): OpenApiResponse(
+                OpenApiTypes.BINARY,
+                description="Succesfully generated KML file. Returns XML Data conforming to the KML specification",
+            ),
+            "404": OpenApiResponse(description="No such folder"),
+        },
+    )
+    def get(self, request: HttpRequest, folder_status: str) -> HttpResponseBase:
+        folder_active = {value: key for key, value in KML_FOLDER_STATUSES.items()}.get(folder_status)
+        if folder_active is None:
+            return HttpResponse("No such folder", status=status.HTTP_404_NOT_FOUND, content_type="text/plain")
+
+        return kml_snapshot_http_response(
+            request,
+            f"geography-whole-mesh-kml-links-{folder_status}",
+            lambda: iter_link_folder_kml_chunks(folder_active),
         )
 
-        dark_grey_line = styles.Style(
-            id="dark_grey_line",
-            styles=[
-                styles.LineStyle(color="ff777777", width=2),
-                styles.PolyStyle(color="00000000", fill=False, outline=True),
-            ],
+
+def build_whole_mesh_geojson() -> bytes:
+    features = []
+    for node_dict in get_node_kml_dicts():
+        properties = get_placemark_extended_data(
+            node_dict["identifier"], node_dict["mark_active"], node_dict["status"], node_dict["roof_access"]
+        )
+        properties["kind"] = "node" if node_dict["is_node"] else "install"
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": node_dict["coord"]},
+                "properties": properties,
+            }
         )
 
-        kml_document = kml.Document(ns, styles=[grey_dot, red_dot, red_line, grey_line, dark_grey_line])
-        kml_root.append(kml_document)
-
-        nodes_folder = kml.Folder(name="Nodes")
-        kml_document.append(nodes_folder)
-
-        active_nodes_folder = kml.Folder(name="Active")
-        nodes_folder.append(active_nodes_folder)
-        inactive_nodes_folder = kml.Folder(name="Inactive")
-        nodes_folder.append(inactive_nodes_folder)
-
-        links_folder = kml.Folder(name="Links")
-        kml_document.append(links_folder)
-
-        active_links_folder = kml.Folder(name="Active")
-        links_folder.append(active_links_folder)
-        inactive_links_folder = kml.Folder(name="Inactive")
-        links_folder.append(inactive_links_folder)
-
-        active_folder_map: Dict[Optional[str], kml.Folder] = {}
-        inactive_folder_map: Dict[Optional[str], kml.Folder] = {}
-
-        for city_name, folder_name in CITY_FOLDER_MAP.items():
-            active_folder_map[city_name] = kml.Folder(name=folder_name)
-            inactive_folder_map[city_name] = kml.Folder(name=folder_name)
-            active_nodes_folder.append(active_folder_map[city_name])
-            inactive_nodes_folder.append(inactive_folder_map[city_name])
-
-        mapped_nns = set()
-        for install in (
-            Install.objects.prefetch_related("node")
-            .prefetch_related("building")
-            .filter(
-                ~Q(status__in=[Install.InstallStatus.CLOSED, Install.InstallStatus.NN_REASSIGNED])
-                & Q(building__longitude__isnull=False)
-                & Q(building__latitude__isnull=False)
-            )
-            .order_by("install_number")
-        ):
-            if install.status == Install.InstallStatus.ACTIVE:
-                folder_map = active_folder_map
-            else:
-                folder_map = inactive_folder_map
-
-            folder = folder_map[install.building.city if install.building.city in folder_map.keys() else None]
-
-            install_placemark = create_placemark(
-                str(install.install_number),
-                Point(
-                    install.building.longitude,
-                    install.building.latitude,
-                    install.building.altitude or DEFAULT_ALTITUDE,
-                ),
-                install.status == Install.InstallStatus.ACTIVE,
-                install.status,
-                install.roof_access,
-            )
-            folder.append(install_placemark)
-
-            # Add an extra placemark for the Node, once for each NN
-            # this makes searching much easier
-            if install.node and install.node.network_number and install.node.network_number not in mapped_nns:
-                node_placemark = create_placemark(
-                    str(install.node.network_number),
-                    Point(
-                        install.node.longitude,
-                        install.node.latitude,
-                        install.node.altitude or DEFAULT_ALTITUDE,
-                    ),
-                    False,
-                    install.node.status,
-                    roof_access=False,
-                )
-                folder.append(node_placemark)
-                mapped_nns.add(install.node.network_number)
-
-        all_links_set = set()
-        kml_links: List[LinkKMLDict] = []
-        for link in (
-            Link.objects.prefetch_related("from_device")
-            .prefetch_related("to_device")
-            .filter(~Q(status=Link.LinkStatus.INACTIVE))
-            .filter(from_device__node__network_number__isnull=False)
-            .filter(to_device__node__network_number__isnull=False)
-            .exclude(type=Link.LinkType.VPN)
-            .annotate(highest_altitude=Greatest("from_device__node__altitude", "to_device__node__altitude"))
-            .order_by(F("highest_altitude").asc(nulls_first=True))
-        ):
-            mark_active: bool = link.status == Link.LinkStatus.ACTIVE
-            link_label: str = f"{str(link.from_device.node)}-{str(link.to_device.node)}"
-            from_identifier = cast(  # Cast is safe due to corresponding filter above
-                int, link.from_device.node.network_number
-            )
-            to_identifier = cast(  # Cast is safe due to corresponding filter above
-                int, link.to_device.node.network_number
-            )
+    for link_dict in get_link_kml_dicts():
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": [link_dict["from_coord"], link_dict["to_coord"]]},
+                "properties": {**link_dict["extended_data"], "kind": "los" if link_dict["is_los"] else "link"},
+            }
+        )
 
-            all_links_set.add(tuple(sorted((from_identifier, to_identifier))))
-            kml_links.append(
-                {
-                    "link_label": link_label,
-                    "mark_active": mark_active,
-                    "is_los": False,
-                    "from_coord": (
-                        link.from_device.node.longitude,
-                        link.from_device.node.latitude,
-                        link.from_device.node.altitude or DEFAULT_ALTITUDE,
-                    ),
-                    "to_coord": (
-                        link.to_device.node.longitude,
-                        link.to_device.node.latitude,
-                        link.to_device.node.altitude or DEFAULT_ALTITUDE,
-                    ),
-                    "extended_data": {
-                        "name": f"Links-{link.id}-{link_label}",
-                        "stroke": ACTIVE_COLOR if mark_active else INACTIVE_COLOR,
-                        "fill": "#000000",
-                        "fill-opacity": "0",
-                        "from": str(from_identifier),
-                        "to": str(to_identifier),
-                        "status": link.status,
-                        "type": link.type,
-                    },
-                }
-            )
+    return json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":")).encode("utf-8")
 
-        for los in (
-            LOS.objects.filter(
-                Exists(Install.objects.filter(building=OuterRef("from_building")))
-                & Exists(Install.objects.filter(building=OuterRef("to_building")))
-                & ~Q(from_building=F("to_building"))
-            )
-            .exclude(
-                # Remove any LOS objects that would duplicate Link objects,
-                # to avoid cluttering the file
-                Exists(
-                    Link.objects.filter(
-                        (
-                            Q(from_device__node__buildings=OuterRef("from_building"))
-                            & Q(to_device__node__buildings=OuterRef("to_building"))
-                        )
-                        | (
-                            Q(from_device__node__buildings=OuterRef("to_building"))
-                            & Q(to_device__node__buildings=OuterRef("from_building"))
-                        )
-                    )
-                )
-            )
-            .prefetch_related("from_building")
-            .prefetch_related("from_building__installs")
-            .prefetch_related("to_building")
-            .prefetch_related("to_building__installs")
-            .annotate(highest_altitude=Greatest("from_building__altitude", "to_building__altitude"))
-            .order_by(F("highest_altitude").asc(nulls_first=True))
-        ):
-            representative_from_install = min(los.from_building.installs.all().values_list("install_number", flat=True))
-            representative_to_install = min(los.to_building.installs.all().values_list("install_number", flat=True))
-            link_label = f"{representative_from_install}-{representative_to_install}"
-
-            link_tuple = tuple(sorted((representative_from_install, representative_to_install)))
-            if link_tuple not in all_links_set:
-                all_links_set.add(link_tuple)
-                kml_links.append(
-                    {
-                        "link_label": link_label,
-                        "mark_active": False,
-                        "is_los": True,
-                        "from_coord": (
-                            los.from_building.longitude,
-                            los.from_building.latitude,
-                            los.from_building.altitude or DEFAULT_ALTITUDE,
-                        ),
-                        "to_coord": (
-                            los.to_building.longitude,
-                            los.to_building.latitude,
-                            los.to_building.altitude or DEFAULT_ALTITUDE,
-                        ),
-                        "extended_data": {
-                            "name": f"LOS-{los.id} {link_label}",
-                            "stroke": POTENTIAL_COLOR,
-                            "fill": "#000000",
-                            "fill-opacity": "0",
-                            "from": f"#{representative_from_install} ({los.from_building.street_address})",
-                            "to": f"#{representative_to_install} ({los.to_building.street_address})",
-                            "source": los.source,
-                        },
-                    }
-                )
 
-        for link_dict in kml_links:
-            placemark = kml.Placemark(
-                name=f"Links-{link_dict['link_label']}",
-                style_url=styles.StyleUrl(
-                    url=(
-                        "#grey_line"
-                        if link_dict["is_los"]
-                        else ("#red_line" if link_dict["mark_active"] else "#dark_grey_line")
-                    )
-                ),
-                kml_geometry=geometry.LineString(
-                    geometry=LineString([link_dict["from_coord"], link_dict["to_coord"]]),
-                    altitude_mode=AltitudeMode.absolute,
-                    extrude=True,
-                ),
-            )
+class WholeMeshGeoJSON(APIView):
+    permission_classes = [permissions.AllowAny]
+    content_negotiation_class = IgnoreClientContentNegotiation
 
-            placemark.extended_data = ExtendedData(
-                elements=[Data(name=key, value=val) for key, val in link_dict["extended_data"].items()]
+    @extend_schema(
+        tags=["Geographic & KML Data"],
+        auth=[],
+        summary="Generate a GeoJSON FeatureCollection which contains all nodes and links on the mesh (the same "
+        "features as the KML file)",
+        responses={
+            (200, GEOJSON_CONTENT_TYPE): OpenApiResponse(
+                OpenApiTypes.BINARY,
+                description="Succesfully generated GeoJSON file",
             )
+        },
+    )
+    def get(self, request: HttpRequest) -> HttpResponseBase:
+        return artifact_http_response(WHOLE_MESH_GEOJSON_ARTIFACT, GEOJSON_CONTENT_TYPE) or snapshot_http_response(
+            request,
+            get_or_build_snapshot("geography-whole-mesh-geojson", build_whole_mesh_geojson),
+            GEOJSON_CONTENT_TYPE,
+        )
 
-            if link_dict["mark_active"]:
-                active_links_folder.append(placemark)
-            else:
-                inactive_links_folder.append(placemark)
 
-        return HttpResponse(
-            kml_root.to_string(),
-            content_type=KML_CONTENT_TYPE_WITH_CHARSET,
-            status=status.HTTP_200_OK,
+def write_geography_artifacts() -> None:
+    """
+    Rebuild the whole mesh KML, KMZ, and GeoJSON files on disk, for nginx to serve in place of the views above
+    """
+    clear_scheduled_geography_artifact_rebuild()
+
+    write_artifact(WHOLE_MESH_KML_ARTIFACT, iter_whole_mesh_kml_chunks())
+    # Zip up the file we just wrote, rather than going back to the database for a second copy
+    write_artifact(
+        WHOLE_MESH_KMZ_ARTIFACT, [build_kmz(iter_artifact_chunks(WHOLE_MESH_KML_ARTIFACT))], compressible=False
+    )
+    write_artifact(WHOLE_MESH_GEOJSON_ARTIFACT, [build_whole_mesh_geojson()])
+
+
+def build_mesh_vector_tile(z: int, x: int, y: int) -> bytes:
+    """
+    Encode the features of the whole mesh exports which fall within the given tile. To keep tiles
+    at low zoom levels small (and legible) we leave out potential LOS lines, along with inactive
+    installs and links, until the user zooms in. Lines which are shorter than a pixel at this zoom
+    level are dropped entirely
+    """
+    bbox = BoundingBox.from_tile(z, x, y).buffered(MVT_BUFFER / MVT_EXTENT)
+
+    nodes_layer = MVTLayer("nodes")
+    for node_dict in get_node_kml_dicts(bbox):
+        # Installs and Nodes both call their active status "Active"
+        if z < MVT_INACTIVE_MIN_ZOOM and node_dict["status"] != Install.InstallStatus.ACTIVE:
+            continue
+
+        longitude, latitude, _ = node_dict["coord"]
+        properties: Dict[str, Any] = get_placemark_extended_data(
+            node_dict["identifier"], node_dict["mark_active"], node_dict["status"], node_dict["roof_access"]
+        )
+        properties["kind"] = "node" if node_dict["is_node"] else "install"
+        nodes_layer.add_point(lon_lat_to_tile_coordinate(longitude, latitude, z, x, y), properties)
+
+    links_layer = MVTLayer("links")
+    los_layer = MVTLayer("los")
+    for link_dict in get_link_kml_dicts(bbox):
+        if link_dict["is_los"]:
+            if z < MVT_LOS_MIN_ZOOM:
+                continue
+            layer = los_layer
+        else:
+            if z < MVT_INACTIVE_MIN_ZOOM and not link_dict["mark_active"]:
+                continue
+            layer = links_layer
+
+        layer.add_line(
+            [
+                lon_lat_to_tile_coordinate(link_dict["from_coord"][0], link_dict["from_coord"][1], z, x, y),
+                lon_lat_to_tile_coordinate(link_dict["to_coord"][0], link_dict["to_coord"][1], z, x, y),
+            ],
+            link_dict["extended_data"],
+        )
+
+    return encode_tile([los_layer, links_layer, nodes_layer])
+
+
+class MeshVectorTile(APIView):
+    permission_classes = [permissions.AllowAny]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    @extend_schema(
+        tags=["Geographic & KML Data"],
+        auth=[],
+        summary="Generate a Mapbox Vector Tile (by z/x/y in the usual web mercator scheme) containing the nodes "
+        "and links on the mesh, in the layers nodes, links, and los",
+        responses={
+            (200, MVT_CONTENT_TYPE): OpenApiResponse(
+                OpenApiTypes.BINARY,
+                description="Succesfully generated vector tile",
+            ),
+            "400": OpenApiResponse(description="Invalid tile"),
+        },
+    )
+    def get(self, request: HttpRequest, z: int, x: int, y: int) -> HttpResponse:
+        try:
+            BoundingBox.from_tile(z, x, y)
+        except ValueError as e:
+            return HttpResponse(f"Invalid tile: {e}", status=status.HTTP_400_BAD_REQUEST, content_type="text/plain")
+
+        return snapshot_http_response(
+            request,
+            get_or_build_snapshot(f"geography-tile-{z}-{x}-{y}", lambda: build_mesh_vector_tile(z, x, y)),
+            MVT_CONTENT_TYPE,
         )
 
 
@@ -468,3 +1120,93 @@ class NYCGeocodeWrapper(APIView):
             },
             status=status.HTTP_200_OK,
         )
+
+
+# As many addresses as we can send to the city before GEOCODE_BATCH_DEADLINE_SECONDS is up (150 by default),
+# so that a batch of addresses we've never seen before can still be answered within one request. Bigger
+# imports or backfills need to be split up
+GEOCODE_BATCH_MAX_ADDRESSES = int(GEOCODE_BATCH_DEADLINE_SECONDS * GEOCODE_BATCH_MAX_ADDRESSES_PER_SECOND)
+
+
+class GeocodeBatchSerializer(serializers.Serializer):
+    addresses = serializers.ListField(
+        child=GeocodeSerializer(), allow_empty=False, max_length=GEOCODE_BATCH_MAX_ADDRESSES
+    )
+    max_concurrency = serializers.IntegerField(required=False, min_value=1, max_value=GEOCODE_BATCH_MAX_CONCURRENCY)
+
+
+def geocode_result_to_dict(result: GeocodeResult) -> Dict[str, Any]:
+    if isinstance(result.error, ValueError):
+        return {
+            "status": "not_found",
+            "detail": "Non-NYC registrations are not supported at this time. "
+            "Please email support@nycmesh.net for more information",
+        }
+    if result.error is not None:
+        return {"status": "not_found", "detail": result.error.args[0]}
+    if not result.nyc_addr_info:
+        # We failed to contact the city, this is probably a retryable error
+        return {"status": "error", "detail": "Your address could not be validated."}
+
+    return {
+        "status": "ok",
+        "BIN": result.nyc_addr_info.bin,
+        "latitude": result.nyc_addr_info.latitude,
+        "longitude": result.nyc_addr_info.longitude,
+        "altitude": result.nyc_addr_info.altitude,
+    }
+
+
+@extend_schema_view(
+    post=extend_schema(
+        tags=["Geographic & KML Data"],
+        summary="Use the NYC geocoding APIs to look up a list of addresses at once, and return the lat/lon/alt "
+        "corresponding to each of them, in the same order. Addresses which cannot be found within NYC, or "
+        "couldn't be looked up, are reported individually rather than failing the whole request",
+        request=GeocodeBatchSerializer,
+        responses={
+            "200": OpenApiResponse(
+                inline_serializer(
+                    "GeocodeBatchSuccessResponse",
+                    fields={
+                        "results": serializers.ListField(
+                            child=inline_serializer(
+                                "GeocodeBatchResult",
+                                fields={
+                                    "status": serializers.ChoiceField(choices=["ok", "not_found", "error"]),
+                                    "detail": serializers.CharField(required=False),
+                                    "BIN": serializers.IntegerField(required=False),
+                                    "latitude": serializers.FloatField(required=False),
+                                    "longitude": serializers.FloatField(required=False),
+                                    "altitude": serializers.FloatField(required=False),
+                                },
+                            )
+                        ),
+                    },
+                ),
+                description="A result for each address, in the order they were given. Those with status "
+                "'not_found' are invalid or outside of NYC, and those with status 'error' could not be "
+                "looked up right now (e.g. the city asked us to slow down, and we ran out of time). Try again?",
+            ),
+            "400": OpenApiResponse(
+                inline_serializer("ErrorResponseInvalidBatch", fields={"detail": serializers.DictField()}),
+                description="Invalid request body JSON, missing required fields, or too many addresses",
+            ),
+        },
+    )
+)
+class NYCGeocodeBatchWrapper(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request: Request) -> Response:
+        serializer = GeocodeBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"detail": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        raw_addrs: List[GeocodeRequest] = serializer.validated_data["addresses"]
+        results = geocode_nyc_addresses(
+            [(raw_addr.street_address, raw_addr.city, raw_addr.state, raw_addr.zip) for raw_addr in raw_addrs],
+            max_concurrency=serializer.validated_data.get("max_concurrency"),
+        )
+
+        return Response({"results": [geocode_result_to_dict(result) for result in results]}, status=status.HTTP_200_OK)
@@ -1,38 +1,186 @@
-import logging
+import json
 import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
 from datetime import datetime, timezone
-from json import JSONDecodeError
-from typing import Any, Dict, List
-
-import requests
-from django.db.models import Count, Exists, F, OuterRef, Prefetch, Q, Subquery
-from drf_spectacular.utils import OpenApiResponse, extend_schema, extend_schema_view, inline_serializer
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Union
+
+from django.db.models import Case, Count, Exists, F, OuterRef, Prefetch, Q, QuerySet, Subquery, When, Window
+from django.db.models.functions import Greatest, Least, RowNumber
+from django.http import StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response
+from drf_spectacular.utils import (
+    OpenApiParameter,
+    OpenApiResponse,
+    extend_schema,
+    extend_schema_view,
+    inline_serializer,
+)
+from flags.state import flag_enabled
 from rest_framework import generics, permissions, serializers, status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from meshapi.models import LOS, AccessPoint, Building, Device, Install, Link, Node, Sector
-from meshapi.serializers import (
-    EXCLUDED_INSTALL_STATUSES,
-    MapDataInstallSerializer,
-    MapDataLinkSerializer,
-    MapDataSectorSerializer,
+from meshapi.models.util.spatial import BoundingBox, WithinBoundingBox
+from meshapi.serializers import MapDataInstallSerializer, MapDataLinkSerializer, MapDataSectorSerializer
+from meshapi.util.change_feed import get_change_feed_cursor, parse_since
+from meshapi.util.drf_renderer import iter_json_array_chunks
+from meshapi.util.kiosks import (
+    LINKNYC_KIOSK_FIRST_FETCH_RETRY_AFTER_SECONDS,
+    get_kiosk_list,
+    schedule_kiosk_list_refresh,
+)
+from meshapi.util.map_data import (
+    MapNodeNumberResolver,
+    convert_access_point_id_to_fake_node_number,
+    get_changed_map_numbers,
+    iter_map_node_data,
 )
+from meshapi.util.snapshot_cache import (
+    Snapshot,
+    compute_etag,
+    get_or_build_snapshot,
+    get_or_stream_snapshot,
+    snapshot_http_response,
+)
+
+MAP_DATA_SINCE_PARAMETER = OpenApiParameter(
+    "since",
+    type=str,
+    location=OpenApiParameter.QUERY,
+    required=False,
+    description="An ISO 8601 timestamp, or the cursor from a previous response. If provided, rather than the "
+    'whole list, return {"cursor": ..., "invalidated": [...], "upserted": [...]}, where invalidated holds the '
+    "node/install numbers whose rows may have changed since then. Drop every row which references an "
+    "invalidated number, then add the upserted rows. Pass the returned cursor as since= on the next request",
+)
+
+
+def iter_access_point_map_nodes(access_points: Iterable[AccessPoint]) -> Iterator[dict]:
+    # Present each AP as a "node" in the format expected by the website map
+    for ap in access_points:
+        install_date = (
+            int(
+                datetime.combine(
+                    ap.install_date,
+                    datetime.min.time(),
+                )
+                .astimezone(timezone.utc)
+                .timestamp()
+                * 1000
+            )
+            if ap.install_date
+            else None
+        )
+        ap_json = {
+            "id": convert_access_point_id_to_fake_node_number(ap.id),
+            "name": ap.name,
+            "status": "Installed",
+            "coordinates": [ap.longitude, ap.latitude, None],
+            "roofAccess": False,
+            "notes": "AP",
+            "panoramas": [],
+        }
+
+        if install_date:
+            ap_json["requestDate"] = install_date
+            ap_json["installDate"] = install_date
+
+        yield ap_json
+
+
+def snapshot_response(request: Request, snapshot: Snapshot) -> HttpResponseBase:
+    if isinstance(request.accepted_renderer, JSONRenderer):
+        return snapshot_http_response(request, snapshot, JSONRenderer.media_type)
+
+    # Let DRF render the browsable API as usual
+    response = Response(json.loads(snapshot.content))
+    response["ETag"] = snapshot.etag
+    return get_conditional_response(request, etag=snapshot.etag, response=response) or response
+
+
+class SnapshotCachedListAPIView(generics.ListAPIView, ABC):
+    """
+    A ListAPIView which serves its (unpaginated) output from a snapshot held in the shared cache,
+    rebuilding it from iter_rows() only after the underlying models have changed. Responses carry a
+    strong ETag, so clients which poll with If-None-Match get a 304 without us touching the database.
+
+    With the STREAM_MAP_DATA flag enabled, a stale snapshot is instead encoded and sent to the client
+    row by row as it is rebuilt, so that we never hold the whole payload in memory as Python objects.
+
+    With ?since=<timestamp>, only the rows which may have changed since then are returned, see
+    get_changes()
+    """
+
+    snapshot_name: str
+
+    def iter_rows(self, request: Request) -> Iterator[Any]:
+        yield from super().list(request).data
+
+    @abstractmethod
+    def get_row_map_numbers(self, row: Dict[str, Any]) -> List[Optional[int]]:
+        """
+        The numbers of the map "nodes" this row is drawn at (see get_changed_map_numbers())
+        """
+
+    def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        return Response(list(self.iter_rows(request)))
+
+    def get_snapshot_rows(self, request: Request) -> List[Any]:
+        """
+        Every row of the list, from the snapshot (which is built first if it is stale)
+        """
+        snapshot = get_or_build_snapshot(
+            self.snapshot_name, lambda: b"".join(iter_json_array_chunks(self.iter_rows(request)))
+        )
+        return json.loads(snapshot.content)
+
+    def get_changes(self, request: Request) -> Response:
+        """
+        Rather than the whole list, return the cursor to resume from, the "invalidated" map numbers
+        which have changed since ?since=, and the current rows which reference any of them. Clients
+        should drop every row they hold which references an invalidated number, then add the new rows
+        """
+        try:
+            since = parse_since(request.query_params["since"])
+        except ValueError as e:
+            return Response({"detail": f"Invalid since: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        cursor = get_change_feed_cursor(since)
+        invalidated = get_changed_map_numbers(since)
 
-LINKNYC_KIOSK_DATA_URL = "https://data.cityofnewyork.us/resource/s4kf-3yrf.json?$limit=100000"
+        upserted = []
+        if invalidated:
+            upserted = [
+                row
+                for row in self.get_snapshot_rows(request)
+                if invalidated.intersection(self.get_row_map_numbers(row))
+            ]
 
-LINKNYC_KIOSK_STATUS_TRANSLATION = {
-    "Live": "active",
-    "Ready for Activation": "pending",
-    "Installed": "installed",
-}
+        return Response({"cursor": cursor, "invalidated": sorted(invalidated), "upserted": upserted})
 
+    def get(self, request: Request, *args: Any, **kwargs: Any) -> HttpResponseBase:  # type: ignore[override]
+        if "since" in request.query_params:
+            return self.get_changes(request)
 
-def convert_access_point_id_to_fake_node_number(access_point_id: uuid.UUID) -> int:
-    # Hacky, but we have no choice, we need this to present as a "node" object to the
-    # map frontend and not conflict with any existing installs
-    return 1_000_000 + (access_point_id.int % 1_000_000)
+        def build_chunks() -> Iterator[bytes]:
+            return iter_json_array_chunks(self.iter_rows(request))
+
+        snapshot: Union[Snapshot, Iterator[bytes]]
+        if isinstance(request.accepted_renderer, JSONRenderer) and flag_enabled("STREAM_MAP_DATA", request=request):
+            snapshot = get_or_stream_snapshot(self.snapshot_name, build_chunks)
+            if not isinstance(snapshot, Snapshot):
+                # We can't know the ETag until we've sent the whole thing, but the next request
+                # will be served from the stored snapshot and get one then
+                return StreamingHttpResponse(snapshot, content_type=JSONRenderer.media_type)
+        else:
+            snapshot = get_or_build_snapshot(self.snapshot_name, lambda: b"".join(build_chunks()))
+
+        return snapshot_response(request, snapshot)
 
 
 @extend_schema_view(
@@ -42,141 +190,26 @@ def convert_access_point_id_to_fake_node_number(access_point_id: uuid.UUID) -> i
         summary='Complete list of all "Nodes" (mostly Installs with some fake installs generated to solve NN re-use), '
         "unpaginated, in the format expected by the website map. (Warning: This endpoint is a legacy format and may be "
         "deprecated/removed in the future)",
+        parameters=[MAP_DATA_SINCE_PARAMETER],
     ),
 )
-class MapDataNodeList(generics.ListAPIView):
+class MapDataNodeList(SnapshotCachedListAPIView):
+    snapshot_name = "mapdata-nodes"
     permission_classes = [permissions.AllowAny]
     serializer_class = MapDataInstallSerializer
     pagination_class = None
+    # Only for the API schema, the rows are built by iter_rows()
+    queryset = Install.objects.none()
 
-    def get_queryset(self) -> List[Install]:  # type: ignore[override]
-        all_installs = []
-
-        queryset = (
-            Install.objects.select_related("building")
-            .select_related("node")
-            .prefetch_related("node__installs")
-            .prefetch_related("node__devices")
-            .filter(~Q(status__in=EXCLUDED_INSTALL_STATUSES))
-        )
-
-        for install in queryset:
-            all_installs.append(install)
-
-        # We need to make sure there is an entry on the map for every NN, and since we excluded the
-        # NN assigned rows in the query above, we need to go through the Node objects and
-        # include the nns we haven't already covered via install num
-        covered_nns = {install.install_number for install in all_installs}
-        for node in (
-            Node.objects.filter(~Q(status=Node.NodeStatus.INACTIVE))
-            .prefetch_related("devices")
-            .prefetch_related("installs")
-            .prefetch_related("buildings")
-            .prefetch_related(
-                Prefetch(
-                    "installs",
-                    queryset=Install.objects.all().select_related("building"),
-                    to_attr="prefetched_installs",
-                )
-            )
-            .prefetch_related(
-                Prefetch(
-                    "installs",
-                    queryset=Install.objects.filter(status=Install.InstallStatus.ACTIVE).select_related("building"),
-                    to_attr="active_installs",
-                )
-            )
-        ):
-            if node.network_number and node.network_number not in covered_nns:
-                # Arbitrarily pick a representative install for the details of the "Fake" node,
-                # preferring active installs if possible
-                try:
-                    representative_install = (
-                        node.active_installs  # type: ignore[attr-defined]
-                        or node.prefetched_installs  # type: ignore[attr-defined]
-                    )[0]
-                except IndexError:
-                    representative_install = None
-
-                if representative_install:
-                    building = representative_install.building
-                else:
-                    building = node.buildings.first()
-
-                if not building:
-                    # If we couldn't get a building from the install or node,
-                    # make a faux one instead, to carry the lat/lon info into the serializer
-                    building = Building(
-                        latitude=node.latitude,
-                        longitude=node.longitude,
-                        altitude=node.altitude,
-                    )
-
-                request_date = datetime.fromtimestamp(0)
-                if representative_install:
-                    request_date = representative_install.request_date
-                elif node.install_date:
-                    request_date = datetime.combine(
-                        node.install_date,
-                        datetime.min.time(),
-                    )
-
-                all_installs.append(
-                    Install(
-                        install_number=node.network_number,
-                        node=node,
-                        status=(
-                            Install.InstallStatus.NN_REASSIGNED
-                            if node.status == node.NodeStatus.ACTIVE
-                            else Install.InstallStatus.REQUEST_RECEIVED
-                        ),
-                        building=building,
-                        request_date=request_date,
-                        roof_access=representative_install.roof_access if representative_install else True,
-                    ),
-                )
-                covered_nns.add(node.network_number)
-
-        all_installs.sort(key=lambda i: i.install_number)
-        return all_installs
-
-    def list(self, request: Request, *args: List[Any], **kwargs: Dict[str, Any]) -> Response:
-        response = super().list(request, args, kwargs)
-
-        access_points = []
-        for ap in AccessPoint.objects.filter(Q(status=Device.DeviceStatus.ACTIVE)):
-            install_date = (
-                int(
-                    datetime.combine(
-                        ap.install_date,
-                        datetime.min.time(),
-                    )
-                    .astimezone(timezone.utc)
-                    .timestamp()
-                    * 1000
-                )
-                if ap.install_date
-                else None
-            )
-            ap_json = {
-                "id": convert_access_point_id_to_fake_node_number(ap.id),
-                "name": ap.name,
-                "status": "Installed",
-                "coordinates": [ap.longitude, ap.latitude, None],
-                "roofAccess": False,
-                "notes": "AP",
-                "panoramas": [],
-            }
+    def iter_rows(self, request: Request) -> Iterator[Any]:
+        # serializer_class above defines the output format (and the API schema), but we build the response
+        # set-wise, since running the serializer row by row is far too slow
+        yield from iter_map_node_data()
 
-            if install_date:
-                ap_json["requestDate"] = install_date
-                ap_json["installDate"] = install_date
+        yield from iter_access_point_map_nodes(AccessPoint.objects.filter(Q(status=Device.DeviceStatus.ACTIVE)))
 
-            access_points.append(ap_json)
-
-        response.data.extend(access_points)
-
-        return response
+    def get_row_map_numbers(self, row: Dict[str, Any]) -> List[Optional[int]]:
+        return [row["id"]]
 
 
 @extend_schema_view(
@@ -185,9 +218,11 @@ class MapDataNodeList(generics.ListAPIView):
         auth=[],
         summary="Complete list of all Links, unpaginated, in the format expected by the website map. "
         "(Warning: This endpoint is a legacy format and may be deprecated/removed in the future)",
+        parameters=[MAP_DATA_SINCE_PARAMETER],
     ),
 )
-class MapDataLinkList(generics.ListAPIView):
+class MapDataLinkList(SnapshotCachedListAPIView):
+    snapshot_name = "mapdata-links"
     permission_classes = [permissions.AllowAny]
     serializer_class = MapDataLinkSerializer
     pagination_class = None
@@ -196,30 +231,30 @@ class MapDataLinkList(generics.ListAPIView):
         .exclude(to_device__node__status=Node.NodeStatus.INACTIVE)
         .exclude(from_device__node__status=Node.NodeStatus.INACTIVE)
         .exclude(from_device__node__network_number=F("to_device__node__network_number"))
-        .prefetch_related("to_device__node")
-        .prefetch_related("from_device__node")
-        .filter(
-            Q(  # This horrible monster query exists to de-duplicate links between the same node pairs
-                # so that the map doesn't freak out. These often exist because different devices on
-                # the same nodes can be linked. This deduplication happens somewhat arbitrarily
-                # and is borrowed from https://stackoverflow.com/a/69938289
-                pk__in=Link.objects.values("from_device__node__network_number", "to_device__node__network_number")
-                .distinct()
-                .annotate(
-                    pk=Subquery(
-                        Link.objects.filter(
-                            from_device__node__network_number=OuterRef("from_device__node__network_number"),
-                            to_device__node__network_number=OuterRef("to_device__node__network_number"),
+        .select_related("to_device")
+        .select_related("from_device")
+        .annotate(
+            # De-duplicate links between the same node pairs (in either direction) so that the map
+            # doesn't freak out. These often exist because different devices on the same nodes can be
+            # linked. We arbitrarily keep the link with the lowest pk for each pair. Links which have no
+            # NN on one side can't be matched up this way, so each of them gets a partition to itself
+            node_pair_rank=Window(
+                RowNumber(),
+                partition_by=[
+                    Least("from_device__node__network_number", "to_device__node__network_number"),
+                    Greatest("from_device__node__network_number", "to_device__node__network_number"),
+                    Case(
+                        When(
+                            Q(from_device__node__network_number__isnull=True)
+                            | Q(to_device__node__network_number__isnull=True),
+                            then=F("pk"),
                         )
-                        .order_by("pk")
-                        .values("pk")[:1]
-                    )
-                )
-                .values_list("pk", flat=True)
+                    ),
+                ],
+                order_by="pk",
             )
-            | Q(from_device__node__network_number__isnull=True)
-            | Q(to_device__node__network_number__isnull=True)
         )
+        .filter(node_pair_rank=1)
         .order_by("from_device__node__network_number", "to_device__node__network_number")
         # TODO: Possibly re-enable the below filters? They make make the map arguably more accurate,
         #  but less consistent with the current one by removing links between devices that are
@@ -229,10 +264,63 @@ class MapDataLinkList(generics.ListAPIView):
         # .exclude(to_device__status=Device.DeviceStatus.INACTIVE)
     )
 
-    def list(self, request: Request, *args: List[Any], **kwargs: Dict[str, Any]) -> Response:
-        response = super().list(request, *args, **kwargs)
+    @staticmethod
+    def get_los_queryset() -> QuerySet[LOS]:
+        # For our purposes here, we only care about LOS entries between buildings that have
+        # install numbers. If one side of an LOS is a building that has no installs associated with
+        # it, we exclude it
+        return (
+            LOS.objects.filter(
+                Exists(Install.objects.filter(building=OuterRef("from_building")))
+                & Exists(Install.objects.filter(building=OuterRef("to_building")))
+                & ~Q(from_building=F("to_building"))
+            )
+            .exclude(
+                # Remove any LOS objects that would duplicate Link objects, to avoid cluttering the map.
+                # We check each direction separately, since the planner can't use the join indexes
+                # for an OR across both
+                Exists(
+                    Link.objects.filter(
+                        from_device__node__buildings=OuterRef("from_building"),
+                        to_device__node__buildings=OuterRef("to_building"),
+                    )
+                )
+            )
+            .exclude(
+                Exists(
+                    Link.objects.filter(
+                        from_device__node__buildings=OuterRef("to_building"),
+                        to_device__node__buildings=OuterRef("from_building"),
+                    )
+                )
+            )
+            .annotate(
+                # De-duplicate LOSes between the same building pairs (in either direction) so that the
+                # map doesn't freak out, arbitrarily keeping the LOS with the lowest pk for each pair
+                building_pair_rank=Window(
+                    RowNumber(),
+                    partition_by=[Least("from_building", "to_building"), Greatest("from_building", "to_building")],
+                    order_by="pk",
+                )
+            )
+            .filter(building_pair_rank=1)
+        )
+
+    def get_row_map_numbers(self, row: Dict[str, Any]) -> List[Optional[int]]:
+        return [row["from"], row["to"]]
 
-        covered_links = {(link["from"], link["to"]) for link in response.data}
+    def iter_rows(self, request: Request) -> Iterator[Any]:
+        # Shared by every section below, so that we work out each node's number once per request
+        node_number_resolver = MapNodeNumberResolver()
+
+        covered_links = set()
+        link_serializer = MapDataLinkSerializer(
+            context={**self.get_serializer_context(), "node_number_resolver": node_number_resolver}
+        )
+        for link in self.filter_queryset(self.get_queryset()).iterator():
+            link_json = link_serializer.to_representation(link)
+            covered_links.add((link_json["from"], link_json["to"]))
+            yield link_json
 
         # Slightly hacky way to show ethernet cable runs on the old map.
         # We just look for nodes where there are installs on separate buildings
@@ -254,85 +342,44 @@ class MapDataLinkList(generics.ListAPIView):
             )
             .order_by("network_number")
         ):
+            node_number = node_number_resolver.get_map_number(node.id)
             for building in node.buildings.all():
                 active_installs = building.active_installs  # type: ignore[attr-defined]
                 if active_installs:
                     from_install = active_installs[0].install_number
-                    if from_install != node.network_number:
-                        if (from_install, node.network_number) not in covered_links:
+                    if from_install != node_number:
+                        if (from_install, node_number) not in covered_links:
                             cable_runs.append(
                                 {
                                     "from": from_install,
-                                    "to": node.network_number,
+                                    "to": node_number,
                                     "status": "active",
                                 }
                             )
 
-        response.data.extend(cable_runs)
+        yield from cable_runs
 
         # Since the old school map has no concept of a LOS, only potential Links, we need to
         # create a fake potential Link object to represent each of our LOS entries
-        # For our purposes here, we only care about LOS entries between buildings that have
-        # install numbers. If one side of an LOS is a building that has no installs associated with
-        # it, we exclude it
-        los_objects_with_installs = (
-            LOS.objects.filter(
-                Exists(Install.objects.filter(building=OuterRef("from_building")))
-                & Exists(Install.objects.filter(building=OuterRef("to_building")))
-                & ~Q(from_building=F("to_building"))
-            )
-            .exclude(
-                # Remove any LOS objects that would duplicate Link objects,
-                # to avoid cluttering the map
-                Exists(
-                    Link.objects.filter(
-                        (
-                            Q(from_device__node__buildings=OuterRef("from_building"))
-                            & Q(to_device__node__buildings=OuterRef("to_building"))
-                        )
-                        | (
-                            Q(from_device__node__buildings=OuterRef("to_building"))
-                            & Q(to_device__node__buildings=OuterRef("from_building"))
-                        )
-                    )
-                )
-            )
-            .filter(
-                # This horrible monster query exists to de-duplicate LOSes between the same building
-                # pairs so that the map doesn't freak out. This deduplication happens somewhat
-                # arbitrarily and is borrowed from https://stackoverflow.com/a/69938289
-                pk__in=LOS.objects.values("from_building", "to_building")
-                .distinct()
-                .annotate(
-                    pk=Subquery(
-                        LOS.objects.filter(
-                            from_building=OuterRef("from_building"),
-                            to_building=OuterRef("to_building"),
-                        )
-                        .order_by("pk")
-                        .values("pk")[:1]
-                    )
-                )
-                .values_list("pk", flat=True)
-            )
-            .prefetch_related("from_building__installs")
-            .prefetch_related("from_building__nodes")
-            .prefetch_related("to_building__installs")
-            .prefetch_related("to_building__nodes")
-        )
-
-        los_based_potential_links = []
-        for los in los_objects_with_installs:
-            from_numbers = set(i.install_number for i in los.from_building.installs.all()).union(
-                set(n.network_number for n in los.from_building.nodes.all() if n.network_number)
-            )
+        los_building_pairs = list(self.get_los_queryset().values_list("from_building_id", "to_building_id"))
+        los_building_ids = {building_id for building_pair in los_building_pairs for building_id in building_pair}
 
-            to_numbers = set(i.install_number for i in los.to_building.installs.all()).union(
-                set(n.network_number for n in los.to_building.nodes.all() if n.network_number)
-            )
+        numbers_by_building: Dict[uuid.UUID, Set[int]] = defaultdict(set)
+        for building_id, install_number in Install.objects.filter(building_id__in=los_building_ids).values_list(
+            "building_id", "install_number"
+        ):
+            numbers_by_building[building_id].add(install_number)
+        for building_id, node_id in Building.nodes.through.objects.filter(building_id__in=los_building_ids).values_list(
+            "building_id", "node_id"
+        ):
+            network_number = node_number_resolver.get_network_number(node_id)
+            if network_number:
+                numbers_by_building[building_id].add(network_number)
 
-            for from_number in from_numbers:
-                for to_number in to_numbers:
+        los_based_potential_links = []
+        for from_building_id, to_building_id in los_building_pairs:
+            for from_number in numbers_by_building[from_building_id]:
+                for to_number in numbers_by_building[to_building_id]:
                     los_based_potential_links.append(
                         {
                             "from": from_number,
@@ -341,17 +388,15 @@ class MapDataLinkList(generics.ListAPIView):
                         }
                     )
 
-        response.data.extend(los_based_potential_links)
+        yield from los_based_potential_links
 
         # Since all of the above logic is focused on node <-> node links (and install <-> node links)
         # it excludes device <-> AP and node <-> AP links for campus access points. We add these back
         # manually here
         ap_links_queryset = (
             Link.objects.filter(Q(from_device__accesspoint__isnull=False) | Q(to_device__accesspoint__isnull=False))
-            .prefetch_related("to_device")
-            .prefetch_related("from_device")
-            .prefetch_related("to_device__node")
-            .prefetch_related("from_device__node")
+            .select_related("to_device")
+            .select_related("from_device")
             .annotate(
                 from_ap_id=Subquery(
                     AccessPoint.objects.filter(device_ptr=OuterRef("from_device")).values("device_ptr_id")[:1]
@@ -371,20 +416,18 @@ class MapDataLinkList(generics.ListAPIView):
                     "from": (
                         convert_access_point_id_to_fake_node_number(link.from_ap_id)
                         if link.from_ap_id
-                        else link.from_device.node.network_number
+                        else link_serializer.get_from_node_number(link)
                     ),
                     "to": (
                         convert_access_point_id_to_fake_node_number(link.to_ap_id)
                         if link.to_ap_id
-                        else link.to_device.node.network_number
+                        else link_serializer.get_to_node_number(link)
                     ),
-                    "status": MapDataLinkSerializer().convert_status_to_spreadsheet_status(link),
+                    "status": link_serializer.convert_status_to_spreadsheet_status(link),
                 }
             )
 
-        response.data.extend(ap_links)
-
-        return response
+        yield from ap_links
 
 
 @extend_schema_view(
@@ -393,9 +436,11 @@ class MapDataLinkList(generics.ListAPIView):
         auth=[],
         summary="Complete list of all Sectors, unpaginated, in the format expected by the website map. "
         "(Warning: This endpoint is a legacy format and may be deprecated/removed in the future)",
+        parameters=[MAP_DATA_SINCE_PARAMETER],
     ),
 )
-class MapDataSectorList(generics.ListAPIView):
+class MapDataSectorList(SnapshotCachedListAPIView):
+    snapshot_name = "mapdata-sectors"
     permission_classes = [permissions.AllowAny]
     serializer_class = MapDataSectorSerializer
     pagination_class = None
@@ -406,6 +451,97 @@ class MapDataSectorList(generics.ListAPIView):
         .prefetch_related("node__installs")
     )
 
+    def get_row_map_numbers(self, row: Dict[str, Any]) -> List[Optional[int]]:
+        return [row["nodeId"]]
+
+
+@extend_schema_view(
+    get=extend_schema(
+        tags=["Website Map Data"],
+        auth=[],
+        summary="The Nodes, Links, and Sectors within a map tile (by z/x/y in the usual web mercator scheme) or "
+        "bounding box (via ?bbox=west,south,east,north), in the same format as the other website map endpoints. "
+        "Links are the same as those of the links endpoint (LOS-based potential links, cable runs, and AP links "
+        "included), for any link with either end drawn within the tile",
+        parameters=[
+            OpenApiParameter(
+                "bbox",
+                type=str,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                description="Bounding box as west,south,east,north in decimal degrees (when not requesting a tile)",
+            ),
+        ],
+        responses={
+            "200": OpenApiResponse(
+                inline_serializer(
+                    "MapDataTile",
+                    fields={
+                        "nodes": MapDataInstallSerializer(many=True),
+                        "links": MapDataLinkSerializer(many=True),
+                        "sectors": MapDataSectorSerializer(many=True),
+                    },
+                ),
+                description="The map features within the tile",
+            ),
+            "400": OpenApiResponse(description="Invalid tile or bounding box"),
+        },
+    ),
+)
+class MapDataTile(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(
+        self, request: Request, z: Optional[int] = None, x: Optional[int] = None, y: Optional[int] = None
+    ) -> HttpResponseBase:
+        try:
+            if z is not None and x is not None and y is not None:
+                bbox = BoundingBox.from_tile(z, x, y)
+            else:
+                bbox = BoundingBox.from_string(request.query_params["bbox"])
+        except KeyError:
+            return Response({"detail": "Must provide a tile or a bbox"}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            return Response({"detail": f"Invalid tile or bbox: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        def build_content() -> bytes:
+            return JSONRenderer().render(self.get_features(request, bbox))
+
+        if z is None:
+            # Arbitrary bounding boxes are too varied to be worth caching
+            content = build_content()
+            return snapshot_response(request, Snapshot(content=content, etag=compute_etag(content)))
+
+        return snapshot_response(request, get_or_build_snapshot(f"mapdata-tile-{z}-{x}-{y}", build_content))
+
+    def get_features(self, request: Request, bbox: BoundingBox) -> Dict[str, List[Any]]:
+        nodes = list(iter_map_node_data(bbox))
+        nodes.extend(
+            iter_access_point_map_nodes(
+                AccessPoint.objects.filter(WithinBoundingBox(bbox), status=Device.DeviceStatus.ACTIVE)
+            )
+        )
+
+        # The links endpoint makes up a lot of its links (e.g. from LOSes), which have nowhere to look up
+        # a location, so we go by the numbers of the nodes drawn here instead. Taken from the links
+        # snapshot, so that a tile never disagrees with the full map
+        tile_map_numbers = {node["id"] for node in nodes}
+        link_list = MapDataLinkList(request=request, format_kwarg=None)
+        links = [
+            row
+            for row in link_list.get_snapshot_rows(request)
+            if tile_map_numbers.intersection(link_list.get_row_map_numbers(row))
+        ]
+        sectors = (
+            MapDataSectorList().get_queryset().filter(WithinBoundingBox(bbox, "node__longitude", "node__latitude"))
+        )
+
+        return {
+            "nodes": nodes,
+            "links": links,
+            "sectors": MapDataSectorSerializer(sectors, many=True).data,
+        }
+
 
 @extend_schema_view(
     get=extend_schema(
@@ -429,11 +565,14 @@ class MapDataSectorList(generics.ListAPIView):
                     },
                     many=True,
                 ),
-                description="Successfully fetched a list of all linkNYC kiosks in the city",
+                description="Successfully fetched a list of all linkNYC kiosks in the city. This is refreshed "
+                "hourly (or in the background, if it's older than that when requested), if the city has been "
+                "unreachable for a while it is served with a Warning header",
             ),
-            "502": OpenApiResponse(
-                inline_serializer("CityErrorResponse", fields={"detail": serializers.CharField()}),
-                description="Missing or invalid response received from NYC dataset",
+            "503": OpenApiResponse(
+                inline_serializer("KioskFetchInProgressResponse", fields={"detail": serializers.CharField()}),
+                description="We have never fetched the NYC dataset, and are fetching it in the background right "
+                "now. Try again after the number of seconds in the Retry-After header",
             ),
         },
     )
@@ -441,46 +580,23 @@ class MapDataSectorList(generics.ListAPIView):
 class KioskListWrapper(APIView):
     permission_classes = [permissions.AllowAny]
 
-    def get(self, request: Request) -> Response:
-        try:
-            response = requests.get(LINKNYC_KIOSK_DATA_URL)
-            response.raise_for_status()
-            data = response.json()
-
-            if not data:
-                raise ValueError("Expected at least one kiosk to be returned from the City of New York dataset")
-
-            kiosks = []
-            for row in data:
-                if not row:
-                    logging.warning(
-                        "Got empty row from City of New York LinkNYC kiosk dataset. Skipping row and moving on."
-                    )
-                    continue
-                coordinates = [float(row["longitude"]), float(row["latitude"])]
-                kiosk_status = LINKNYC_KIOSK_STATUS_TRANSLATION.get(row["link_installation_status"])
-                kiosks.append(
-                    {
-                        "street_address": row["street_address"],
-                        "type": row["planned_kiosk_type"],
-                        "id": row["link_site_id"],
-                        "coordinates": coordinates,
-                        "status": kiosk_status,
-                    }
-                )
-            return Response(
-                kiosks,
-                status=status.HTTP_200_OK,
-            )
-        except requests.exceptions.RequestException:
-            logging.exception("Error fetching data from City of New York LinkNYC kiosk dataset")
-            return Response(
-                {"detail": "Error fetching data from City of New York"},
-                status=status.HTTP_502_BAD_GATEWAY,
-            )
-        except (KeyError, JSONDecodeError, ValueError):
-            logging.exception("Error decoding data from City of New York LinkNYC kiosk dataset")
-            return Response(
-                {"detail": "Invalid response received from City of New York"},
-                status=status.HTTP_502_BAD_GATEWAY,
+    def get(self, request: Request) -> HttpResponseBase:
+        # This is kept up to date in the background, and fetching it can take a while, so we never make
+        # the client wait on the city. Not even if we've never fetched the list before
+        kiosk_list = get_kiosk_list()
+        if kiosk_list is None:
+            schedule_kiosk_list_refresh()
+            response = Response(
+                {"detail": "Fetching data from City of New York, try again shortly"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
             )
+            response["Retry-After"] = str(LINKNYC_KIOSK_FIRST_FETCH_RETRY_AFTER_SECONDS)
+            return response
+
+        if kiosk_list.needs_refresh():
+            schedule_kiosk_list_refresh()
+
+        response = snapshot_http_response(request, kiosk_list.snapshot, "application/json")
+        if kiosk_list.is_stale():
+            response["Warning"] = '110 - "Response is Stale"'
+        return response
@@ -20,6 +20,7 @@ from meshapi.serializers import (
     NodeSerializer,
     SectorSerializer,
 )
+from meshapi.util.change_feed import CHANGE_FEED_SINCE_PARAMETER, ChangeFeedListMixin
 
 
 @extend_schema_view(
@@ -46,10 +47,10 @@ def api_root(request: Request, format: Any = None) -> Response:
 
 
 @extend_schema_view(
-    get=extend_schema(tags=["Buildings"]),
+    get=extend_schema(tags=["Buildings"], parameters=[CHANGE_FEED_SINCE_PARAMETER]),
     post=extend_schema(tags=["Buildings"]),
 )
-class BuildingList(generics.ListCreateAPIView):
+class BuildingList(ChangeFeedListMixin, generics.ListCreateAPIView):
     queryset = Building.objects.all()
     serializer_class = BuildingSerializer
 
@@ -66,10 +67,10 @@ class BuildingDetail(generics.RetrieveUpdateDestroyAPIView):
 
 
 @extend_schema_view(
-    get=extend_schema(tags=["Members"]),
+    get=extend_schema(tags=["Members"], parameters=[CHANGE_FEED_SINCE_PARAMETER]),
     post=extend_schema(tags=["Members"]),
 )
-class MemberList(generics.ListCreateAPIView):
+class MemberList(ChangeFeedListMixin, generics.ListCreateAPIView):
     queryset = Member.objects.all()
     serializer_class = MemberSerializer
 
@@ -86,10 +87,10 @@ class MemberDetail(generics.RetrieveUpdateDestroyAPIView):
 
 
 @extend_schema_view(
-    get=extend_schema(tags=["Installs"]),
+    get=extend_schema(tags=["Installs"], parameters=[CHANGE_FEED_SINCE_PARAMETER]),
     post=extend_schema(tags=["Installs"]),
 )
-class InstallList(generics.ListCreateAPIView):
+class InstallList(ChangeFeedListMixin, generics.ListCreateAPIView):
     queryset = Install.objects.all()
     serializer_class = InstallSerializer
 
@@ -116,10 +117,10 @@ class InstallDetailByInstallNumber(InstallDetail):
 
 
 @extend_schema_view(
-    get=extend_schema(tags=["Nodes"]),
+    get=extend_schema(tags=["Nodes"], parameters=[CHANGE_FEED_SINCE_PARAMETER]),
     post=extend_schema(tags=["Nodes"]),
 )
-class NodeList(generics.ListCreateAPIView):
+class NodeList(ChangeFeedListMixin, generics.ListCreateAPIView):
     queryset = Node.objects.all()
     serializer_class = NodeSerializer
 
@@ -146,10 +147,10 @@ class NodeDetailByNetworkNumber(NodeDetail):
 
 
 @extend_schema_view(
-    get=extend_schema(tags=["Links"]),
+    get=extend_schema(tags=["Links"], parameters=[CHANGE_FEED_SINCE_PARAMETER]),
     post=extend_schema(tags=["Links"]),
 )
-class LinkList(generics.ListCreateAPIView):
+class LinkList(ChangeFeedListMixin, generics.ListCreateAPIView):
     queryset = Link.objects.all()
     serializer_class = LinkSerializer
 
@@ -166,10 +167,10 @@ class LinkDetail(generics.RetrieveUpdateDestroyAPIView):
 
 
 @extend_schema_view(
-    get=extend_schema(tags=["LOSes"]),
+    get=extend_schema(tags=["LOSes"], parameters=[CHANGE_FEED_SINCE_PARAMETER]),
     post=extend_schema(tags=["LOSes"]),
 )
-class LOSList(generics.ListCreateAPIView):
+class LOSList(ChangeFeedListMixin, generics.ListCreateAPIView):
     queryset = LOS.objects.all()
     serializer_class = LOSSerializer
 
@@ -186,10 +187,10 @@ class LOSDetail(generics.RetrieveUpdateDestroyAPIView):
 
 
 @extend_schema_view(
-    get=extend_schema(tags=["Devices"]),
+    get=extend_schema(tags=["Devices"], parameters=[CHANGE_FEED_SINCE_PARAMETER]),
     post=extend_schema(tags=["Devices"]),
 )
-class DeviceList(generics.ListCreateAPIView):
+class DeviceList(ChangeFeedListMixin, generics.ListCreateAPIView):
     queryset = Device.objects.all().prefetch_related("node")
     serializer_class = DeviceSerializer
 
@@ -206,10 +207,10 @@ class DeviceDetail(generics.RetrieveUpdateDestroyAPIView):
 
 
 @extend_schema_view(
-    get=extend_schema(tags=["Sectors"]),
+    get=extend_schema(tags=["Sectors"], parameters=[CHANGE_FEED_SINCE_PARAMETER]),
     post=extend_schema(tags=["Sectors"]),
 )
-class SectorList(generics.ListCreateAPIView):
+class SectorList(ChangeFeedListMixin, generics.ListCreateAPIView):
     queryset = Sector.objects.all()
     serializer_class = SectorSerializer
 
@@ -226,10 +227,10 @@ class SectorDetail(generics.RetrieveUpdateDestroyAPIView):
 
 
 @extend_schema_view(
-    get=extend_schema(tags=["Access Points"]),
+    get=extend_schema(tags=["Access Points"], parameters=[CHANGE_FEED_SINCE_PARAMETER]),
     post=extend_schema(tags=["Access Points"]),
 )
-class AccessPointList(generics.ListCreateAPIView):
+class AccessPointList(ChangeFeedListMixin, generics.ListCreateAPIView):
     queryset = AccessPoint.objects.all()
     serializer_class = AccessPointSerializer
 
@@ -4,6 +4,7 @@ import requests
 from celery import Task, shared_task
 from celery.exceptions import MaxRetriesExceededError
 
+from meshapi.util import http_client
 from meshapi_hooks.hooks import CelerySerializerHook
 
 HTTP_ATTEMPT_COUNT_PER_DELIVERY_ATTEMPT = 4
@@ -14,10 +15,10 @@ def deliver_webhook_task(self: Task, hook_id: int, payload: Dict[str, Any]) -> N
     """Deliver the payload to the hook target"""
     hook = CelerySerializerHook.objects.get(id=hook_id)
     try:
-        response = requests.post(url=hook.target, data=payload, headers=hook.headers)
+        response = http_client.post(hook.target, data=payload, headers=hook.headers)
         if response.status_code >= 400:
             response.raise_for_status()
-    except (requests.ConnectionError, requests.HTTPError) as exc:
+    except (requests.ConnectionError, requests.HTTPError, requests.Timeout) as exc:
         try:
             self.retry(countdown=2**self.request.retries)
         except MaxRetriesExceededError:
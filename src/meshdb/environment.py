@@ -23,6 +23,26 @@ DB_PASSWORD_RO = os.environ.get("DB_PASSWORD_RO")
 # from celery.py
 CELERY_BROKER = os.environ.get("CELERY_BROKER", "redis://localhost:6379/0")
 
+# Shared cache (snapshots of the website map data, etc.). Kept in a different Redis DB than the broker
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/1")
+
+# Last known good copy of the LinkNYC kiosk list, so we can still serve it if both the cache and the city are down
+LINKNYC_KIOSK_SNAPSHOT_PATH = os.environ.get("LINKNYC_KIOSK_SNAPSHOT_PATH", "/tmp/meshdb_linknyc_kiosks.json")
+
+# Pre-built whole mesh KML/KMZ/GeoJSON files, on a volume shared with nginx. Unset to always build them on demand
+GEOGRAPHY_ARTIFACT_DIR = os.environ.get("GEOGRAPHY_ARTIFACT_DIR")
+# The internal nginx location which serves GEOGRAPHY_ARTIFACT_DIR. Unset to send the files from Django instead
+GEOGRAPHY_ARTIFACT_ACCEL_REDIRECT_PREFIX = os.environ.get("GEOGRAPHY_ARTIFACT_ACCEL_REDIRECT_PREFIX")
+
+# How many addresses a batch geocode looks up at once, and how many new addresses (i.e. not already in the
+# geocode cache) we send to the city's APIs per second, across all batches in this process
+GEOCODE_BATCH_MAX_CONCURRENCY = int(os.environ.get("GEOCODE_BATCH_MAX_CONCURRENCY", 8))
+GEOCODE_BATCH_MAX_ADDRESSES_PER_SECOND = float(os.environ.get("GEOCODE_BATCH_MAX_ADDRESSES_PER_SECOND", 10))
+
+# How long we remember the response to a join form submission, so that a retry of it (same Idempotency-Key, i.e.
+# the UUID of its join record) gets the same answer rather than being processed all over again
+JOIN_FORM_IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("JOIN_FORM_IDEMPOTENCY_TTL_SECONDS", 7 * 24 * 60 * 60))
+
 
 #from pelias.py
 PELIAS_ADDRESS_PARSER_URL = os.environ.get("PELIAS_ADDRESS_PARSER_URL", "http://localhost:6800/parser/parse")
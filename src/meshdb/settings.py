@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 import logging
 import os
+import sys
 import environment
 from pathlib import Path
 from typing import Any, Dict, List
@@ -20,7 +21,11 @@ from corsheaders.defaults import default_headers
 from django.http.request import HttpRequest
 from dotenv import load_dotenv
 
-from meshapi.util.constants import RECAPTCHA_CHECKBOX_TOKEN_HEADER, RECAPTCHA_INVISIBLE_TOKEN_HEADER
+from meshapi.util.constants import (
+    JOIN_FORM_IDEMPOTENCY_KEY_HEADER,
+    RECAPTCHA_CHECKBOX_TOKEN_HEADER,
+    RECAPTCHA_INVISIBLE_TOKEN_HEADER,
+)
 
 
 load_dotenv()
@@ -50,6 +55,7 @@ PROFILING_ENABLED = DEBUG and not environment.DEBUG
 FLAGS: Dict[str, Any] = {
     "MAINTENANCE_MODE": [],
     "EDIT_PANORAMAS": [],
+    "STREAM_MAP_DATA": [],
     "JOIN_FORM_FAIL_ALL_INVISIBLE_RECAPTCHAS": [],
     "INTEGRATION_ENABLED_SEND_JOIN_REQUEST_SLACK_MESSAGES": [],
     "INTEGRATION_ENABLED_CREATE_OSTICKET_TICKETS": [],
@@ -58,6 +64,9 @@ FLAGS: Dict[str, Any] = {
     "TASK_ENABLED_RESET_DEV_DATABASE": [],
     "TASK_ENABLED_UPDATE_PANORAMAS": [],
     "TASK_ENABLED_SYNC_WITH_UISP": [],
+    "TASK_ENABLED_REFRESH_LINKNYC_KIOSKS": [],
+    "TASK_ENABLED_BUILD_GEOGRAPHY_ARTIFACTS": [],
+    "TASK_ENABLED_WARM_EMAIL_DOMAIN_CACHE": [],
 }
 
 USE_X_FORWARDED_HOST = True
@@ -153,6 +162,7 @@ CORS_ALLOW_HEADERS = [
     *default_headers,
     RECAPTCHA_CHECKBOX_TOKEN_HEADER,
     RECAPTCHA_INVISIBLE_TOKEN_HEADER,
+    JOIN_FORM_IDEMPOTENCY_KEY_HEADER,
 ]
 
 
@@ -287,6 +297,25 @@ DATABASES = {
     },
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": environment.CACHE_REDIS_URL,
+    },
+}
+
+# Tests get a cache of their own in memory, rather than sharing whatever is in Redis with each other and
+# with the developer running them
+if len(sys.argv) > 1 and sys.argv[1] == "test":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+
 # django-dbbackup
 # https://django-dbbackup.readthedocs.io/en/master/installation.html
 
@@ -15,6 +15,7 @@ from django.urls import reverse
 from matplotlib import ticker
 
 from meshapi.models import Install
+from meshapi.util.snapshot_cache import get_or_build_snapshot, snapshot_http_response
 
 # Make the SVG output include text instead of strokes
 plt.rcParams["svg.fonttype"] = "none"
@@ -220,12 +221,17 @@ def website_stats_graph(request: HttpRequest) -> HttpResponse:
     except EnvironmentError as e:
         return HttpResponse(status=500, content=e.args[0])
 
-    datapoints = compute_graph_stats(data_source, start_datetime, end_datetime)
+    def build_graph() -> bytes:
+        datapoints = compute_graph_stats(data_source, start_datetime, end_datetime)
 
-    with matplotlib_lock:
-        return HttpResponse(
-            render_graph(data_source, datapoints, start_datetime, end_datetime), content_type="image/svg+xml"
-        )
+        with matplotlib_lock:
+            return render_graph(data_source, datapoints, start_datetime, end_datetime).encode("utf-8")
+
+    # The graph only changes when the installs do (the time axis creeps forward too, but that isn't
+    # noticeable within the lifetime of a snapshot), so render it once and share it
+    days = int(request.GET.get("days", 0))
+    snapshot = get_or_build_snapshot(f"website-stats-svg-{data_source}-{days}", build_graph)
+    return snapshot_http_response(request, snapshot, "image/svg+xml")
 
 
 def website_stats_json(request: HttpRequest) -> HttpResponse: